@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of per-step agent loop overhead, excluding the network.
+
+Runs ReActAgent from tech-writer-from-scratch.py against a fake client that
+answers instantly with one cheap tool call per step, so the measured time is
+the agent's own work per round trip: building the request (including the
+tool definitions), recording the reply and dispatching the tool (through the
+ToolExecutor thread pool). Compares
+the cached ToolRegistry payload with rebuilding every schema on every step,
+as call_llm used to, at increasing numbers of registered tools.
+
+Usage:
+    python bench_agent_loop.py --runs 200 --tools 6,25,50,100
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+import time
+from types import SimpleNamespace
+
+from tool_registry import ToolRegistry, schema_from_function
+
+STEPS_PER_RUN = 15
+
+
+def load_agent_module():
+    """Import tech-writer-from-scratch.py, which cannot be imported by name."""
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tech-writer-from-scratch.py")
+    spec = importlib.util.spec_from_file_location("tech_writer_from_scratch", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    logging.disable(logging.CRITICAL)
+    return module
+
+
+class FakeClient:
+    """Stands in for the OpenAI client: a calculate tool call each step, then a final answer."""
+
+    def __init__(self, steps: int):
+        self.steps = steps
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, tools, temperature):
+        self.calls += 1
+        if self.calls >= self.steps:
+            message = SimpleNamespace(role="assistant", content="Done.", tool_calls=None)
+        else:
+            call = SimpleNamespace(
+                id=f"call_{self.calls}",
+                type="function",
+                function=SimpleNamespace(name="calculate", arguments='{"expression": "2 + 2"}'),
+            )
+            message = SimpleNamespace(role="assistant", content=None, tool_calls=[call])
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def build_tools(module, count: int) -> ToolRegistry:
+    """Register the agent's tools, padded with copies of them up to count tools."""
+    tools = ToolRegistry(dict(module.TOOLS))
+    originals = list(module.TOOLS.items())
+    i = 0
+    while len(tools) < count:
+        name, func = originals[i % len(originals)]
+        tools.register(f"{name}_{i}", func)
+        i += 1
+    return tools
+
+
+def measure(module, tools: ToolRegistry, rebuild: bool, runs: int) -> float:
+    """Return the mean seconds per agent step."""
+    module.TOOLS = tools
+    if rebuild:
+        # The old behaviour: regenerate every schema from its function on each call
+        tools.definitions = lambda: [
+            {"type": "function", "function": {"name": name, **schema_from_function(func)}}
+            for name, func in tools.items()
+        ]
+    agent = module.ReActAgent(transcript_dir=None)
+    steps = 0
+    start = time.perf_counter()
+    for _ in range(runs):
+        agent.client = FakeClient(STEPS_PER_RUN)
+        agent.run("Describe the codebase.", "/repo")
+        steps += agent.client.calls
+    elapsed = time.perf_counter() - start
+    agent.tool_executor.close()
+    if rebuild:
+        del tools.definitions
+    return elapsed / steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-step agent loop overhead without the network")
+    parser.add_argument("--runs", type=int, default=200, help="Agent runs per measurement (default: 200)")
+    parser.add_argument("--tools", default="6,25,50,100", help="Comma-separated tool counts (default: 6,25,50,100)")
+    args = parser.parse_args()
+
+    module = load_agent_module()
+    original_tools = module.TOOLS
+    print(f"{args.runs} runs of {STEPS_PER_RUN} steps per measurement\n")
+    print(f"{'Tools':>6} {'Rebuild us/step':>16} {'Cached us/step':>15} {'Saved':>7}")
+    print("-" * 48)
+    for count in [int(c) for c in args.tools.split(",")]:
+        tools = build_tools(module, count)
+        rebuild = measure(module, tools, True, args.runs)
+        cached = measure(module, tools, False, args.runs)
+        print(f"{count:>6} {rebuild * 1e6:>16.1f} {cached * 1e6:>15.1f} {1 - cached / rebuild:>6.0%}")
+    module.TOOLS = original_tools
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for running many analyses in one process with asyncio.
+
+Runs analyse_many_async from tech-writer-from-scratch.py against a fake
+async client that waits a fixed latency per LLM call (standing in for the
+API) and asks for a read_file call on each step, then reports wall-clock
+time, analyses per second and memory per concurrent analysis at increasing
+concurrency limits. With a fixed API latency, throughput should grow with
+the concurrency limit until the process runs out of CPU, rather than
+needing one process per analysis.
+
+Memory per analysis is the tracemalloc peak of the whole run divided by the
+concurrency limit, alongside the size of one finished analysis's messages.
+
+Usage:
+    python bench_async_agents.py --analyses 200 --latency 0.2 --concurrency 1,8,32,128
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from bench_agent_loop import load_agent_module
+
+
+class FakeAsyncClient:
+    """Stands in for AsyncOpenAI: waits, then asks for a file read until the step budget is used."""
+
+    def __init__(self, latency: float, steps: int, file_path: str):
+        self.latency = latency
+        self.steps = steps
+        self.file_path = file_path
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, tools, temperature):
+        await asyncio.sleep(self.latency)
+        step = sum(1 for m in messages if isinstance(m, dict) and m.get("role") == "tool")
+        if step + 1 >= self.steps:
+            message = SimpleNamespace(role="assistant", content="# Analysis\n\nDone.", tool_calls=None)
+        else:
+            call = SimpleNamespace(
+                id=f"call_{step}",
+                type="function",
+                function=SimpleNamespace(name="read_file", arguments=json.dumps({"file_path": self.file_path})),
+            )
+            message = SimpleNamespace(role="assistant", content=None, tool_calls=[call])
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent analyses in one process")
+    parser.add_argument("--analyses", type=int, default=200, help="Number of analyses (default: 200)")
+    parser.add_argument("--steps", type=int, default=8, help="LLM calls per analysis (default: 8)")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per fake LLM call (default: 0.2)")
+    parser.add_argument("--concurrency", default="1,8,32,128", help="Comma-separated limits (default: 1,8,32,128)")
+    args = parser.parse_args()
+
+    module = load_agent_module()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_path = os.path.join(temp_dir, "main.py")
+        with open(file_path, "w") as f:
+            f.write("def main():\n    return 42\n" * 200)
+        directories = [temp_dir] * args.analyses
+        client = FakeAsyncClient(args.latency, args.steps, file_path)
+
+        # Warm up so that one-off imports and caches are not counted against the first run
+        asyncio.run(module.analyse_many_async(directories[:2], "Warm up.", "gpt-4o-mini", client=client,
+                                           transcript_dir=None))
+
+        print(f"{args.analyses} analyses of {args.steps} steps, {args.latency}s per LLM call\n")
+        print(f"{'Concurrency':>11} {'Seconds':>8} {'Analyses/s':>11} {'Peak KiB/analysis':>18} {'Messages KiB':>13}")
+        print("-" * 66)
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            tracemalloc.start()
+            start = time.perf_counter()
+            results = asyncio.run(module.analyse_many_async(
+                directories, "Describe the codebase.", "gpt-4o-mini", concurrency=concurrency, client=client,
+                transcript_dir=None
+            ))
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            messages_kib = results[0]["memory_bytes"] / 1024
+            print(f"{concurrency:>11} {elapsed:>8.2f} {len(results) / elapsed:>11.1f} "
+                  f"{peak / min(concurrency, len(results)) / 1024:>18.0f} {messages_kib:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Connection reuse benchmark for the pooled HTTP clients in http_clients.py.
+
+Starts a local stub of the chat completions endpoint that counts the TCP
+connections it accepts and, to stand in for the TCP and TLS handshakes with
+a remote API, waits a fixed time before serving each new connection. It
+then runs a number of short agents, each making a few requests, on a few
+threads, and reports the connections opened and time per request:
+
+- http.client with a new connection per request, and with one kept-alive
+  connection per agent, to show what a handshake costs;
+- an OpenAI client per agent, as every TechWriterAgent used to create,
+  against get_openai_client's shared pool (needs openai and httpx);
+- requests.post, as the OpenRouter agent used to call, against
+  get_requests_session's shared session (needs requests).
+
+Modes whose library is not installed are skipped.
+
+Usage:
+    python bench_http_pool.py --agents 40 --steps 4 --threads 4 --handshake-ms 30
+"""
+
+import argparse
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+import http_clients
+
+COMPLETION = json.dumps({
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "bench",
+    "choices": [{"index": 0, "finish_reason": "stop",
+                 "message": {"role": "assistant", "content": "# Analysis\n\nDone."}}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+}).encode("utf-8")
+
+REQUEST = {"model": "bench", "messages": [{"role": "user", "content": "Describe the codebase."}]}
+
+
+class StubServer(ThreadingHTTPServer):
+    """Chat completions stub that keeps connections alive and counts the ones it accepts."""
+
+    daemon_threads = True
+
+    def __init__(self, handshake_seconds: float):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.handshake_seconds = handshake_seconds
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, delayed ACKs stall kept-alive connections
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+        time.sleep(self.server.handshake_seconds)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def http_client_agent(server: StubServer, steps: int, keep_alive: bool) -> None:
+    body = json.dumps(REQUEST)
+    headers = {"Content-Type": "application/json"}
+    connection = None
+    for _ in range(steps):
+        if connection is None:
+            connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+        connection.request("POST", "/v1/chat/completions", body, headers)
+        connection.getresponse().read()
+        if not keep_alive:
+            connection.close()
+            connection = None
+    if connection is not None:
+        connection.close()
+
+
+def openai_agent(server: StubServer, steps: int, pooled: bool) -> None:
+    if pooled:
+        client = http_clients.get_openai_client("bench", server.base_url)
+    else:
+        from openai import OpenAI
+        client = OpenAI(api_key="bench", base_url=server.base_url, max_retries=0)
+    for _ in range(steps):
+        client.chat.completions.create(**REQUEST)
+    if not pooled:
+        client.close()
+
+
+def requests_agent(server: StubServer, steps: int, pooled: bool) -> None:
+    url = f"{server.base_url}/chat/completions"
+    if pooled:
+        post = http_clients.get_requests_session(url).post
+    else:
+        import requests
+        post = requests.post
+    for _ in range(steps):
+        post(url, json=REQUEST, timeout=30).raise_for_status()
+
+
+def run(server: StubServer, agent: Callable[[StubServer], None], agents: int, threads: int) -> tuple:
+    server.connections = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(agent, server) for _ in range(agents)]:
+            future.result()
+    return time.perf_counter() - start, server.connections
+
+
+def installed(*modules: str) -> Optional[str]:
+    """Return the first of the modules that cannot be imported, or None."""
+    for module in modules:
+        try:
+            __import__(module)
+        except ImportError:
+            return module
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark connection reuse against a local stub API")
+    parser.add_argument("--agents", type=int, default=40, help="Number of agents (default: 40)")
+    parser.add_argument("--steps", type=int, default=4, help="Requests per agent (default: 4)")
+    parser.add_argument("--threads", type=int, default=4, help="Agents running at once (default: 4)")
+    parser.add_argument("--handshake-ms", type=float, default=30.0,
+                        help="Delay before serving each new connection, standing in for TCP and TLS setup (default: 30)")
+    args = parser.parse_args()
+
+    modes = [
+        ("http.client, connection per request", None,
+         lambda s: http_client_agent(s, args.steps, keep_alive=False)),
+        ("http.client, kept alive per agent", None,
+         lambda s: http_client_agent(s, args.steps, keep_alive=True)),
+        ("OpenAI client per agent", installed("openai", "httpx"),
+         lambda s: openai_agent(s, args.steps, pooled=False)),
+        ("OpenAI, shared pool", installed("openai", "httpx"),
+         lambda s: openai_agent(s, args.steps, pooled=True)),
+        ("requests.post", installed("requests"),
+         lambda s: requests_agent(s, args.steps, pooled=False)),
+        ("requests, shared session", installed("requests"),
+         lambda s: requests_agent(s, args.steps, pooled=True)),
+    ]
+
+    server = StubServer(args.handshake_ms / 1000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        requests_made = args.agents * args.steps
+        print(f"{args.agents} agents x {args.steps} requests on {args.threads} threads, "
+              f"{args.handshake_ms:g} ms per new connection\n")
+        print(f"{'Mode':<38} {'Connections':>11} {'Seconds':>8} {'ms/request':>11}")
+        print("-" * 71)
+        for name, missing, agent in modes:
+            if missing:
+                print(f"{name:<38} skipped: {missing} is not installed")
+                continue
+            seconds, connections = run(server, agent, args.agents, args.threads)
+            print(f"{name:<38} {connections:>11} {seconds:>8.2f} {seconds / requests_made * 1000:>11.2f}")
+    finally:
+        http_clients.close_http_clients()
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
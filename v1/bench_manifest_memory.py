@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for the columnar manifest.
+
+Compares the tracemalloc peak of holding a file listing as:
+- a List[Path], as returned by find_all_matching_files
+- a list of per-file dicts, as built by ResearcherAgent.list_directory
+- the array-backed Manifest from manifest.py
+
+By default the listing is synthetic, so a million-file repository can be
+simulated without touching the disk. Pass --directory to measure a real tree.
+
+Usage:
+    python bench_manifest_memory.py --files 1000000
+    python bench_manifest_memory.py --directory ~/src/some-monorepo
+"""
+
+import argparse
+import gc
+import os
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Iterator, Tuple
+
+from manifest import Manifest, build_manifest
+
+Entry = Tuple[str, str, int, float, int]
+
+
+def synthetic_entries(count: int) -> Iterator[Entry]:
+    """Yield (directory, name, size, mtime, lines) tuples shaped like a large monorepo."""
+    extensions = [".py", ".ts", ".tsx", ".go", ".md", ".json", ".rs", ".java"]
+    for i in range(count):
+        directory = f"services/svc{i % 200:03d}/src/pkg{(i // 7) % 50:02d}/mod{(i // 3) % 20:02d}/"
+        name = f"file_{i:07d}{extensions[i % len(extensions)]}"
+        yield directory, name, 1000 + i % 50000, 1.7e9 + i, 20 + i % 800
+
+
+def build_path_list(root: str, entries: Iterator[Entry]):
+    return [Path(root, directory, name) for directory, name, _, _, _ in entries]
+
+
+def build_dict_list(root: str, entries: Iterator[Entry]):
+    return [
+        {
+            "name": name,
+            "path": os.path.join(root, directory, name),
+            "type": "file",
+            "size": size,
+            "is_binary": False,
+        }
+        for directory, name, size, _, _ in entries
+    ]
+
+
+def build_columnar(root: str, entries: Iterator[Entry]):
+    manifest = Manifest(root)
+    for directory, name, size, mtime, lines in entries:
+        manifest.append(manifest.add_directory(directory), name, size, mtime, lines, 0)
+    return manifest
+
+
+def measure(label: str, build: Callable[[], object]):
+    """Run a builder under tracemalloc and report its peak allocation."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rows = len(result)
+    del result
+    gc.collect()
+    return {"label": label, "rows": rows, "peak_bytes": peak, "seconds": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark manifest memory use against List[Path]")
+    parser.add_argument("--files", type=int, default=1_000_000, help="Number of synthetic files (default: 1000000)")
+    parser.add_argument("--directory", help="Measure a real directory instead of a synthetic listing")
+    args = parser.parse_args()
+
+    if args.directory:
+        root = str(Path(args.directory).resolve())
+        results = [
+            measure("List[Path] (rglob)", lambda: [p for p in Path(root).rglob("*") if p.is_file()]),
+            measure("Manifest (build_manifest)", lambda: build_manifest(root, respect_gitignore=False, include_hidden=True)),
+        ]
+    else:
+        root = "/repo"
+        results = [
+            measure("List[Path]", lambda: build_path_list(root, synthetic_entries(args.files))),
+            measure("list of dicts", lambda: build_dict_list(root, synthetic_entries(args.files))),
+            measure("Manifest", lambda: build_columnar(root, synthetic_entries(args.files))),
+        ]
+
+    print(f"\n{'Representation':<28} {'Rows':>10} {'Peak MB':>10} {'Bytes/row':>10} {'Seconds':>9}  (timings include tracemalloc overhead)")
+    print("-" * 71)
+    for r in results:
+        per_row = r["peak_bytes"] / r["rows"] if r["rows"] else 0
+        print(f"{r['label']:<28} {r['rows']:>10} {r['peak_bytes'] / 1e6:>10.1f} {per_row:>10.0f} {r['seconds']:>9.2f}")
+
+    baseline = results[0]["peak_bytes"]
+    columnar = results[-1]["peak_bytes"]
+    if baseline:
+        print(f"\nManifest peak relative to {results[0]['label']}: {columnar / baseline:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the estimated tokens of tool observations in each encoding.
+
+Runs a typical first few steps' tool calls against a codebase (listing its
+files, querying and browsing it, searching it and reading its largest
+source file) and encodes each result in every encoding of
+observation_encoder, reporting the estimated tokens (token_estimator's
+estimate) and the saving against "pretty", the indented JSON the agents
+used to send. The encoding each tool uses by default is marked with *.
+
+Usage:
+    python bench_observation_encoding.py --directory .. --pattern "*.py"
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+
+from token_estimator import estimate_tokens
+from observation_encoder import ENCODINGS, ObservationEncoder
+
+
+def load_agent_module():
+    """Import tech-writer-from-scratch.py, which cannot be imported by name."""
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tech-writer-from-scratch.py")
+    spec = importlib.util.spec_from_file_location("tech_writer_from_scratch", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    logging.disable(logging.CRITICAL)
+    return module
+
+
+def tool_calls(module, directory: str, pattern: str):
+    """Return (tool name, result) for the benchmarked calls."""
+    calls = [
+        ("find_all_matching_files", {"directory": directory, "pattern": pattern}),
+        ("query_repo", {"directory": directory, "group_by": "directory", "largest": 10, "largest_by": "loc",
+                        "include_binary": False}),
+        ("browse_directory", {"directory": directory, "max_nodes": 60}),
+        ("search_code", {"directory": directory, "terms": "import"}),
+    ]
+    results = [(name, module.TOOLS[name](**args)) for name, args in calls]
+    largest = results[1][1].get("largest") or []
+    if largest:
+        file_path = os.path.join(directory, largest[0]["path"])
+        results.append(("read_file", module.read_file(file_path)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--directory", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."),
+                        help="Codebase to run the tools on (default: this repository)")
+    parser.add_argument("--pattern", default="*", help="Pattern for find_all_matching_files (default: *)")
+    args = parser.parse_args()
+
+    module = load_agent_module()
+    directory = os.path.abspath(args.directory)
+    print(f"{'tool':<26}" + "".join(f"{name:>10}" for name in ENCODINGS) + f"{'saving':>10}")
+    totals = dict.fromkeys(ENCODINGS, 0)
+    default_total = 0
+    for tool_name, result in tool_calls(module, directory, args.pattern):
+        default = module.TOOLS.options(tool_name)["encoding"]
+        tokens = {}
+        for encoding in ENCODINGS:
+            encoder = ObservationEncoder({tool_name: encoding})
+            encoder.reset(directory)
+            tokens[encoding] = estimate_tokens(encoder.encode(tool_name, result))
+            totals[encoding] += tokens[encoding]
+        default_total += tokens[default]
+        cells = "".join(f"{str(tokens[name]) + ('*' if name == default else ' '):>10}" for name in ENCODINGS)
+        print(f"{tool_name:<26}{cells}{1 - tokens[default] / tokens['pretty']:>10.0%}")
+    cells = "".join(f"{totals[name]:>9} " for name in ENCODINGS)
+    print(f"{'total':<26}{cells}{1 - default_total / totals['pretty']:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
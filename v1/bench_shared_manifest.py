@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark for sharing a manifest across worker processes.
+
+Starts a pool of workers three ways and reports pool start-up time and
+per-worker resident memory once every worker has read its manifest:
+- pickled: each worker receives a pickled copy of the manifest
+- shared memory: workers attach to one SharedManifest segment
+- mmap file: workers memory-map one manifest file
+
+Each worker sums the sizes and line counts and reads every file name, so all
+columns are touched. Private memory is RssAnon from /proc/self/status (Linux);
+pages of the shared segment or file are reported separately.
+
+Usage:
+    python bench_shared_manifest.py --files 500000 --workers 8
+    python bench_shared_manifest.py --directory ~/src/some-monorepo
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import Dict
+
+from bench_manifest_memory import build_columnar, synthetic_entries
+from manifest import Manifest, build_manifest
+from shared_manifest import SharedManifest, open_manifest_file, write_manifest_file
+
+_MANIFEST = None
+_INIT_SECONDS = 0.0
+
+
+def _memory_status() -> Dict[str, int]:
+    """Return the RSS breakdown of this process in kB, or zeros where unavailable."""
+    status = {"VmRSS": 0, "RssAnon": 0, "RssFile": 0, "RssShmem": 0}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in status:
+                    status[key] = int(value.split()[0])
+    except OSError:
+        pass
+    return status
+
+
+def _init_pickled(manifest: Manifest) -> None:
+    global _MANIFEST, _INIT_SECONDS
+    _MANIFEST = manifest
+    _INIT_SECONDS = 0.0
+
+
+def _init_shared(name: str) -> None:
+    global _MANIFEST, _INIT_SECONDS
+    from shared_manifest import attach_manifest
+    start = time.perf_counter()
+    _MANIFEST = attach_manifest(name)
+    _INIT_SECONDS = time.perf_counter() - start
+
+
+def _init_mmap(path: str) -> None:
+    global _MANIFEST, _INIT_SECONDS
+    start = time.perf_counter()
+    _MANIFEST = open_manifest_file(path)
+    _INIT_SECONDS = time.perf_counter() - start
+
+
+def _touch_manifest(_):
+    """Read every column, then report this worker's memory."""
+    total_bytes = sum(_MANIFEST.sizes)
+    total_lines = sum(_MANIFEST.lines)
+    name_chars = sum(map(len, _MANIFEST.names))
+    # Hold the task briefly so that each worker picks up exactly one
+    time.sleep(0.2)
+    return os.getpid(), _memory_status(), _INIT_SECONDS, (total_bytes, total_lines, name_chars)
+
+
+def run_pool(label: str, context, workers: int, initializer, initargs) -> Dict:
+    start = time.perf_counter()
+    with context.Pool(workers, initializer=initializer, initargs=initargs) as pool:
+        results = pool.map(_touch_manifest, range(workers), chunksize=1)
+    elapsed = time.perf_counter() - start
+
+    by_pid = {pid: (status, init) for pid, status, init, _ in results}
+    checksums = {checksum for _, _, _, checksum in results}
+    if len(checksums) != 1:
+        raise RuntimeError(f"{label}: workers disagree about the manifest contents")
+    statuses = [status for status, _ in by_pid.values()]
+    return {
+        "label": label,
+        "workers": len(by_pid),
+        "seconds": elapsed,
+        "rss_kb": sum(s["VmRSS"] for s in statuses) / len(statuses),
+        "private_kb": sum(s["RssAnon"] for s in statuses) / len(statuses),
+        "shared_kb": sum(s["RssShmem"] + s["RssFile"] for s in statuses) / len(statuses),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sharing a manifest across worker processes")
+    parser.add_argument("--files", type=int, default=500_000, help="Number of synthetic files (default: 500000)")
+    parser.add_argument("--directory", help="Build the manifest from a real directory instead")
+    parser.add_argument("--workers", type=int, default=8, help="Number of worker processes (default: 8)")
+    parser.add_argument("--start-method", default="spawn", choices=multiprocessing.get_all_start_methods(),
+                        help="Multiprocessing start method (default: spawn)")
+    args = parser.parse_args()
+
+    if args.directory:
+        manifest = build_manifest(args.directory)
+        manifest.symbols()
+    else:
+        manifest = build_columnar("/repo", synthetic_entries(args.files))
+    print(f"Manifest: {len(manifest)} files, {args.workers} workers, start method {args.start_method}")
+
+    context = multiprocessing.get_context(args.start_method)
+    include_symbols = manifest._symbols is not None
+    results = [run_pool("pickled copy", context, args.workers, _init_pickled, (manifest,))]
+    with SharedManifest(manifest, include_symbols=include_symbols) as shared:
+        results.append(run_pool("shared memory", context, args.workers, _init_shared, (shared.name,)))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = write_manifest_file(manifest, os.path.join(temp_dir, "manifest.bin"), include_symbols=include_symbols)
+        results.append(run_pool("mmap file", context, args.workers, _init_mmap, (path,)))
+
+    print(f"\n{'Mode':<16} {'Workers':>8} {'Start-up s':>11} {'RSS MB':>9} {'Private MB':>11} {'Shared MB':>10}")
+    print("-" * 70)
+    for r in results:
+        print(f"{r['label']:<16} {r['workers']:>8} {r['seconds']:>11.2f} {r['rss_kb'] / 1024:>9.1f} "
+              f"{r['private_kb'] / 1024:>11.1f} {r['shared_kb'] / 1024:>10.1f}")
+    print("\nRSS, private and shared figures are per-worker averages; start-up includes the first task.")
+
+
+if __name__ == "__main__":
+    main()
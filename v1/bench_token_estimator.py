@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the offline token estimators.
+
+Estimates the tokens of each source file of a codebase with the heuristic,
+with a flat four characters per token and, if tiktoken is installed, with
+tiktoken, and reports each estimate's total error against tiktoken (or the
+totals alone without it). It then replays a run's growing memory, one
+message per step, and times a running total kept with MessageTokenCache
+against re-serialising the whole memory on every step.
+
+Usage:
+    python bench_token_estimator.py --directory .. --steps 40
+"""
+
+import argparse
+import math
+import os
+import time
+
+from token_estimator import HeuristicEstimator, MessageTokenCache, TiktokenEstimator
+
+
+def source_texts(directory: str, extensions=(".py", ".js", ".ts", ".md", ".json", ".toml", ".yaml")):
+    """Return the texts of the source files under a directory, skipping hidden directories."""
+    texts = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [name for name in dirs if not name.startswith(".") and name != "__pycache__"]
+        for name in files:
+            if name.endswith(extensions):
+                try:
+                    with open(os.path.join(root, name), encoding="utf-8") as f:
+                        texts.append(f.read())
+                except (OSError, UnicodeDecodeError):
+                    continue
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--directory", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."),
+                        help="Codebase whose files to estimate (default: this repository)")
+    parser.add_argument("--steps", type=int, default=40, help="Steps of the replayed run (default: 40)")
+    args = parser.parse_args()
+
+    texts = source_texts(args.directory)
+    heuristic = HeuristicEstimator()
+    estimators = {"heuristic": heuristic.count, "chars/4": lambda text: math.ceil(len(text) / 4)}
+    try:
+        estimators["tiktoken"] = TiktokenEstimator("gpt-4o-mini").count
+    except ImportError:
+        print("tiktoken is not installed: totals only\n")
+    print(f"{len(texts)} files, {sum(map(len, texts))} characters")
+    print(f"{'estimator':<12}{'tokens':>10}{'error':>10}{'seconds':>10}")
+    exact = sum(map(estimators["tiktoken"], texts)) if "tiktoken" in estimators else None
+    for name, count in estimators.items():
+        start = time.perf_counter()
+        tokens = sum(map(count, texts))
+        seconds = time.perf_counter() - start
+        error = f"{(tokens - exact) / exact:>+10.1%}" if exact else f"{'':>10}"
+        print(f"{name:<12}{tokens:>10}{error}{seconds:>10.3f}")
+
+    memory = [{"role": "system", "content": "You are a technical writer."}]
+    observations = [text for text in texts if text] or ["x = 1\n" * 100]
+    cache = MessageTokenCache(heuristic)
+    incremental = full = 0.0
+    for step in range(args.steps):
+        memory.append({"role": "tool", "content": observations[step % len(observations)]})
+        start = time.perf_counter()
+        cache.total(memory)
+        incremental += time.perf_counter() - start
+        start = time.perf_counter()
+        heuristic.count("".join(str(message) for message in memory))
+        full += time.perf_counter() - start
+    print(f"\nRunning total over {args.steps} steps: {incremental:.3f}s incremental "
+          f"({cache.messages_counted} messages counted), {full:.3f}s re-serialising the memory every step")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Expression calculator tool for the tech writer agent.
+
+calculate is registered with kind="cpu", so ToolExecutor runs it in a
+worker process that can be killed when an expression takes too long. The
+function is sent to the worker by reference to its module, so it lives in
+this small importable module rather than in the agent script: under the
+"spawn" start method (the default on macOS and Windows) the worker has to
+import it by name, and the agent script can be neither imported by name,
+because of the hyphens in its file name, nor loaded without side effects.
+"""
+
+import ast
+import math
+from typing import Any, Dict
+
+
+def calculate(expression: str) -> Dict[str, Any]:
+    """
+    Evaluate a mathematical expression and return the result.
+    
+    Args:
+        expression: Mathematical expression to evaluate (e.g., "2 + 2 * 3")
+        
+    Returns:
+        Dictionary containing the expression and its result
+    """
+    try:
+        # Create a safe environment for evaluating expressions
+        # This uses Python's ast.literal_eval for safety instead of eval()
+        def safe_eval(expr):
+            # Replace common mathematical functions with their math module equivalents
+            expr = expr.replace("^", "**")  # Support for exponentiation
+            
+            # Parse the expression into an AST
+            parsed_expr = ast.parse(expr, mode='eval')
+            
+            # Check that the expression only contains safe operations
+            for node in ast.walk(parsed_expr):
+                # Allow names that are defined in the math module
+                if isinstance(node, ast.Name) and node.id not in math.__dict__:
+                    if node.id not in ['True', 'False', 'None']:
+                        raise ValueError(f"Invalid name in expression: {node.id}")
+                
+                # Only allow safe operations
+                elif isinstance(node, ast.Call):
+                    if not (isinstance(node.func, ast.Name) and node.func.id in math.__dict__):
+                        raise ValueError(f"Invalid function call in expression")
+            
+            # Evaluate the expression with the math module available
+            return eval(compile(parsed_expr, '<string>', 'eval'), {"__builtins__": {}}, math.__dict__)
+        
+        # Evaluate the expression
+        result = safe_eval(expression)
+        
+        return {
+            "expression": expression,
+            "result": result
+        }
+    except SyntaxError as e:
+        return {
+            "error": f"Syntax error in expression: {str(e)}",
+            "expression": expression
+        }
+    except ValueError as e:
+        return {
+            "error": f"Value error in expression: {str(e)}",
+            "expression": expression
+        }
+    except TypeError as e:
+        return {
+            "error": f"Type error in expression: {str(e)}",
+            "expression": expression
+        }
+    except Exception as e:
+        return {
+            "error": f"Unexpected error evaluating expression: {str(e)}",
+            "expression": expression
+        }
@@ -0,0 +1,230 @@
+"""
+Token-budgeted context management for the tech writer agents.
+
+Agent memory only grows, and every message is re-sent on every LLM call, so
+a long run pays for each early file read again and again. ContextBudget
+tracks an estimated token count for each message (see token_estimator.py)
+and, once the memory
+exceeds its budget, replaces the oldest tool observations with compact
+stubs: the tool and its arguments, the size and hash of the original
+result, and an outline of the code it contained. The system prompt, the
+user's request, every assistant message and the most recent observations
+are never touched, and a stubbed observation keeps its tool_call_id, so the
+tool call / tool result pairing the API requires stays valid.
+
+Compaction runs down to a low-water mark below the budget rather than just
+under it, so it happens in occasional batches and the message prefix stays
+stable between them.
+"""
+
+import hashlib
+import json
+import logging
+import re
+from typing import Any, Dict, List
+
+from token_estimator import MessageTokenCache, estimate_tokens, message_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTEXT_BUDGET = 32000
+
+# Marks an observation that has already been compacted
+STUB_PREFIX = "[Compacted observation]"
+
+# Definitions shown in a stub's outline, across the languages the manifest knows
+_OUTLINE_PATTERN = re.compile(
+    r"^\s*(?:export\s+)?(?:async\s+)?(?:def|class|function|func|fn|interface|struct|enum|trait|impl|type)\s+[\w$.]+.*$",
+    re.MULTILINE,
+)
+MAX_OUTLINE_LINES = 20
+
+
+def _field(message: Any, name: str, default: Any = None) -> Any:
+    """Read a field from a message that is either a dict or an API response object."""
+    if isinstance(message, dict):
+        return message.get(name, default)
+    return getattr(message, name, default)
+
+
+def _tool_calls(message: Any) -> List[Any]:
+    return _field(message, "tool_calls") or []
+
+
+def _call_id_and_arguments(tool_call: Any) -> tuple:
+    function = _field(tool_call, "function")
+    return _field(tool_call, "id"), _field(function, "name", ""), _field(function, "arguments", "") or ""
+
+
+def outline(text: str) -> List[str]:
+    """Return the definition lines of a piece of code, with their line numbers."""
+    lines = []
+    for match in _OUTLINE_PATTERN.finditer(text):
+        line_number = text.count("\n", 0, match.start()) + 1
+        lines.append(f"{line_number}: {match.group(0).strip()[:120]}")
+        if len(lines) == MAX_OUTLINE_LINES:
+            lines.append("...")
+            break
+    return lines
+
+
+def make_stub(content: str, tool_name: str, arguments: str,
+              hint: str = "Call the tool again if you need the full result.") -> str:
+    """
+    Build the compact stand-in for a tool observation.
+
+    Args:
+        content: The original observation
+        tool_name: The tool that produced it
+        arguments: The JSON arguments the tool was called with
+        hint: The last line, saying how to get the full result back
+
+    Returns:
+        A short description of the observation that says how to get it back
+    """
+    digest = hashlib.sha1(content.encode("utf-8", "replace")).hexdigest()[:12]
+    parts = [f"{STUB_PREFIX} {tool_name}({arguments}) returned {len(content)} characters (sha1 {digest})."]
+    try:
+        data = json.loads(content)
+    except ValueError:
+        data = content
+    if isinstance(data, dict):
+        if isinstance(data.get("content"), str):
+            code_outline = outline(data["content"])
+            parts.append(f"{data['content'].count(chr(10)) + 1} lines.")
+            if code_outline:
+                parts.append("Outline:\n" + "\n".join(code_outline))
+        else:
+            parts.append(f"Keys: {', '.join(list(data)[:20])}.")
+    elif isinstance(data, list):
+        parts.append(f"{len(data)} items, starting: {', '.join(map(str, data[:5]))}.")
+    elif isinstance(data, str):
+        code_outline = outline(data)
+        if code_outline:
+            parts.append("Outline:\n" + "\n".join(code_outline))
+    parts.append(hint)
+    return "\n".join(parts)
+
+
+class ContextBudget:
+    """
+    Keeps an agent's memory within an estimated token budget.
+
+    Call apply(memory) before each LLM call. Token estimates are cached per
+    message, so only new or changed messages are measured.
+    """
+
+    def __init__(self, max_tokens: int = DEFAULT_CONTEXT_BUDGET, keep_recent: int = 4,
+                 low_water: float = 0.75, min_stub_saving: int = 100, estimator: Any = None):
+        """
+        Initialise the budget.
+
+        Args:
+            max_tokens: Estimated tokens the memory may reach before compaction (0 disables it)
+            keep_recent: Number of most recent tool observations never to compact
+            low_water: Fraction of max_tokens that compaction reduces the memory to
+            min_stub_saving: Observations that a stub would shrink by fewer tokens are left alone
+            estimator: Token estimator (default: token_estimator.get_estimator())
+        """
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.low_water = low_water
+        self.min_stub_saving = min_stub_saving
+        self.messages = MessageTokenCache(estimator)
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget cached estimates and statistics, for a new run."""
+        self.messages.reset()
+        # Tokens that the stubs currently in memory save on every LLM call
+        self._active_saving = 0
+        self.tokens_removed = 0
+        self.tokens_saved = 0
+        self.observations_compacted = 0
+        self.compactions = 0
+        self.peak_tokens = 0
+
+    def _tokens(self, message: Any) -> int:
+        return self.messages.tokens(message)
+
+    def total_tokens(self, memory: List[Any]) -> int:
+        """Return the estimated tokens of the whole memory."""
+        return self.messages.total(memory)
+
+    def apply(self, memory: List[Any]) -> int:
+        """
+        Compact old tool observations in place if the memory is over budget.
+
+        Args:
+            memory: The agent's message list
+
+        Returns:
+            The estimated tokens of the memory after any compaction
+        """
+        total = self.total_tokens(memory)
+        self.peak_tokens = max(self.peak_tokens, total)
+        if self.max_tokens and total > self.max_tokens:
+            total = self._compact(memory, total)
+        self.tokens_saved += self._active_saving
+        return total
+
+    def _compact(self, memory: List[Any], total: int) -> int:
+        """Stub the oldest eligible observations until the memory is under the low-water mark."""
+        calls = {}
+        for message in memory:
+            for tool_call in _tool_calls(message):
+                call_id, name, arguments = _call_id_and_arguments(tool_call)
+                calls[call_id] = (name, arguments)
+
+        tool_indexes = [i for i, m in enumerate(memory) if _field(m, "role") == "tool"]
+        candidates = tool_indexes[:-self.keep_recent] if self.keep_recent else tool_indexes
+        target = int(self.max_tokens * self.low_water)
+        saved = compacted = 0
+        for i in candidates:
+            if total <= target:
+                break
+            message = memory[i]
+            content = _field(message, "content") or ""
+            if content.startswith(STUB_PREFIX):
+                continue
+            name, arguments = calls.get(_field(message, "tool_call_id"), (_field(message, "name", "tool"), ""))
+            stub = make_stub(content, name, arguments)
+            stub_message = {**message, "content": stub}
+            saving = self._tokens(message) - self._tokens(stub_message)
+            if saving < self.min_stub_saving:
+                continue
+            memory[i] = stub_message
+            self.messages.forget(message)
+            total -= saving
+            saved += saving
+            compacted += 1
+
+        if compacted:
+            self.compactions += 1
+            self.tokens_removed += saved
+            self._active_saving += saved
+            self.observations_compacted += compacted
+            logger.info(f"Compacted {compacted} observations, saving about {saved} tokens "
+                        f"(memory now about {total} tokens, budget {self.max_tokens})")
+        if total > self.max_tokens:
+            logger.warning(f"Memory is about {total} tokens, over the budget of {self.max_tokens}, "
+                           f"after compacting every eligible observation")
+        return total
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the compaction statistics for the current run.
+
+        tokens_removed is how much compaction shrank the memory; tokens_saved
+        is the estimated prompt tokens not sent over all the LLM calls since,
+        which is what the compaction saved in cost.
+        """
+        return {
+            "estimator": self.messages.estimator.name,
+            "budget_tokens": self.max_tokens,
+            "peak_tokens": self.peak_tokens,
+            "compactions": self.compactions,
+            "observations_compacted": self.observations_compacted,
+            "tokens_removed": self.tokens_removed,
+            "tokens_saved": self.tokens_saved,
+        }
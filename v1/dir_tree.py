@@ -0,0 +1,251 @@
+"""
+Directory tree tool for the tech writer agent.
+
+This module serves a tree view of a codebase from the manifest instead of
+walking the filesystem. Every directory node carries precomputed aggregates
+over all the files beneath it (file count, bytes, lines of code and dominant
+language), so a collapsed node still says what it contains. Expansion is lazy
+and bounded by a node budget rather than a depth: the agent starts from any
+directory and the largest children are shown first, breadth-first, until the
+budget is spent.
+"""
+
+import logging
+from array import array
+from collections import Counter, deque
+from typing import Any, Dict, List
+
+from manifest import FLAG_BINARY, Manifest, get_manifest
+
+logger = logging.getLogger(__name__)
+
+# Language reported for files whose extension is not recognised
+_OTHER_LANGUAGE = "Other"
+
+
+class DirectoryTree:
+    """
+    Directory nodes of a manifest with aggregates rolled up from their files.
+
+    Nodes are every directory that contains a file at any depth, including
+    intermediate directories with no files of their own. Node 0 is the root.
+    Aggregate columns are typed arrays indexed by node id.
+    """
+
+    def __init__(self, manifest: Manifest):
+        self.manifest = manifest
+        self.paths: List[str] = []
+        self.parents = array("i")
+        self.children: List[List[int]] = []
+        self.rows: List[List[int]] = []
+        self._lookup: Dict[str, int] = {}
+        self._add_node("")
+
+        node_for_dir = [self._add_node(d) for d in manifest.directories]
+        for children in self.children:
+            children.sort(key=self.paths.__getitem__)
+
+        count = len(self.paths)
+        self.files = array("Q", bytes(8 * count))
+        self.bytes = array("Q", bytes(8 * count))
+        self.loc = array("Q", bytes(8 * count))
+        language_loc = [Counter() for _ in range(count)]
+        language_files = [Counter() for _ in range(count)]
+        self.file_languages = [manifest.languages()[e] for e in manifest.ext_ids]
+
+        for row, dir_id in enumerate(manifest.dir_ids):
+            node = node_for_dir[dir_id]
+            self.rows[node].append(row)
+            language = self.file_languages[row]
+            self.files[node] += 1
+            self.bytes[node] += manifest.sizes[row]
+            self.loc[node] += manifest.lines[row]
+            language_loc[node][language] += manifest.lines[row]
+            language_files[node][language] += 1
+
+        # Children are always created after their parents, so rolling up in
+        # reverse creation order visits every child before its parent
+        for node in range(count - 1, 0, -1):
+            parent = self.parents[node]
+            self.files[parent] += self.files[node]
+            self.bytes[parent] += self.bytes[node]
+            self.loc[parent] += self.loc[node]
+            language_loc[parent].update(language_loc[node])
+            language_files[parent].update(language_files[node])
+
+        self.languages = [
+            _dominant_language(loc, files) for loc, files in zip(language_loc, language_files)
+        ]
+        logger.info(f"Built directory tree for {manifest.root}: {count} directories")
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def _add_node(self, rel_dir: str) -> int:
+        """Return the node for a directory, creating it and any missing ancestors."""
+        node = self._lookup.get(rel_dir)
+        if node is not None:
+            return node
+        parent = -1
+        if rel_dir:
+            parent_dir = rel_dir[:-1].rpartition("/")[0]
+            parent = self._add_node(parent_dir + "/" if parent_dir else "")
+        node = len(self.paths)
+        self.paths.append(rel_dir)
+        self.parents.append(parent)
+        self.children.append([])
+        self.rows.append([])
+        self._lookup[rel_dir] = node
+        if parent >= 0:
+            self.children[parent].append(node)
+        return node
+
+    def find(self, rel_dir: str) -> int:
+        """
+        Return the node id of a directory.
+
+        Args:
+            rel_dir: Directory relative to the root, e.g. "src/api"; "" or "." for the root
+
+        Returns:
+            The node id, or -1 if no file lives under that directory
+        """
+        rel_dir = rel_dir.strip().strip("/")
+        if rel_dir in ("", "."):
+            return 0
+        return self._lookup.get(rel_dir + "/", -1)
+
+    def _directory_entry(self, node: int) -> Dict[str, Any]:
+        path = self.paths[node]
+        return {
+            "name": path[:-1].rpartition("/")[2] or ".",
+            "type": "directory",
+            "files": self.files[node],
+            "bytes": self.bytes[node],
+            "loc": self.loc[node],
+            "language": self.languages[node],
+        }
+
+    def _file_entry(self, row: int) -> Dict[str, Any]:
+        manifest = self.manifest
+        entry = {
+            "name": manifest.names[row],
+            "type": "file",
+            "bytes": manifest.sizes[row],
+            "loc": manifest.lines[row],
+        }
+        if manifest.flags[row] & FLAG_BINARY:
+            entry["is_binary"] = True
+        return entry
+
+    def expand(self, node: int, max_nodes: int, include_files: bool = True) -> Dict[str, Any]:
+        """
+        Render a subtree breadth-first until a node budget is spent.
+
+        Within a directory, subdirectories come first, largest (by file count)
+        first, then files, largest (by bytes) first. A directory that is shown
+        but not fully expanded reports how many of its children were left out
+        in "more".
+
+        Args:
+            node: Node id of the directory to start from
+            max_nodes: Maximum number of directories and files to include, including the start
+            include_files: Whether to list individual files as well as directories
+
+        Returns:
+            A nested dictionary of directory and file entries; only the start
+            directory carries its path, children are named relative to their parent
+        """
+        root = {"path": self.paths[node][:-1] or ".", **self._directory_entry(node)}
+        budget = max(1, max_nodes) - 1
+        queue = deque([(node, root)])
+        while queue:
+            current, entry = queue.popleft()
+            subdirs = sorted(self.children[current], key=lambda n: (-self.files[n], self.paths[n]))
+            files = []
+            if include_files:
+                files = sorted(self.rows[current], key=lambda r: (-self.manifest.sizes[r], self.manifest.names[r]))
+            total = len(subdirs) + len(files)
+            if budget <= 0:
+                if total:
+                    entry["more"] = total
+                continue
+
+            entry["children"] = []
+            for child in subdirs[:budget]:
+                child_entry = self._directory_entry(child)
+                entry["children"].append(child_entry)
+                queue.append((child, child_entry))
+            budget -= len(entry["children"])
+            if budget > 0:
+                entry["children"].extend(map(self._file_entry, files[:budget]))
+                budget -= min(budget, len(files))
+            shown = len(entry["children"])
+            if shown < total:
+                entry["more"] = total - shown
+        return root
+
+
+def _dominant_language(language_loc: Counter, language_files: Counter) -> str:
+    """Pick the language with the most lines (then files), preferring recognised languages."""
+    languages = [lang for lang in language_files if lang != _OTHER_LANGUAGE] or list(language_files)
+    if not languages:
+        return ""
+    return max(languages, key=lambda lang: (language_loc[lang], language_files[lang], lang))
+
+
+# Trees of the manifests returned by get_manifest, keyed by root
+_TREE_CACHE: Dict[str, DirectoryTree] = {}
+
+
+def get_directory_tree(directory: str) -> DirectoryTree:
+    """
+    Return the directory tree for a codebase, building it on first use.
+
+    The tree is rebuilt whenever get_manifest returns a different manifest.
+
+    Args:
+        directory: Root of the codebase
+
+    Returns:
+        The cached or newly built DirectoryTree
+    """
+    manifest = get_manifest(directory)
+    tree = _TREE_CACHE.get(manifest.root)
+    if tree is None or tree.manifest is not manifest:
+        tree = _TREE_CACHE[manifest.root] = DirectoryTree(manifest)
+    return tree
+
+
+def browse_directory(directory: str, path: str = "", max_nodes: int = 50, include_files: bool = True) -> Dict[str, Any]:
+    """
+    Show the directory tree of a codebase, or of one directory in it, with sizes.
+
+    Every directory shows the number of files, bytes, lines of code and main
+    language of everything beneath it, so you can see where the code is without
+    listing every file. Large trees are cut off by node count: directories that
+    were not expanded say how many children they have in "more". Call again with
+    path set to one of them to look inside it.
+
+    Args:
+        directory: Root directory of the codebase
+        path: Directory to start from, relative to the root, e.g. "src/api" (default: the root)
+        max_nodes: Maximum number of directories and files to return
+        include_files: Whether to list individual files as well as directories
+
+    Returns:
+        Nested dictionary of directory and file entries
+    """
+    try:
+        tree = get_directory_tree(directory)
+        node = tree.find(path)
+        if node < 0:
+            return {"error": f"No files found under directory: {path}"}
+        return {
+            "directory": tree.manifest.root,
+            "tree": tree.expand(node, max_nodes, include_files),
+        }
+    except FileNotFoundError as e:
+        return {"error": f"Directory not found: {str(e)}"}
+    except Exception as e:
+        return {"error": f"Unexpected error browsing directory: {str(e)}"}
@@ -0,0 +1,165 @@
+"""
+Process-wide pooled HTTP clients for the LLM providers.
+
+Every agent used to construct its own OpenAI client, and the OpenRouter
+variant called requests.post without a session, so each step could pay for a
+fresh TCP and TLS handshake. This module keeps one keep-alive connection pool
+per base URL for the whole process and hands it to every agent:
+
+- get_openai_client / get_async_openai_client return OpenAI clients backed
+  by shared httpx clients, one per (base URL, API key); async clients are
+  also per event loop, since an httpx.AsyncClient cannot outlive its loop;
+- get_requests_session returns a requests.Session per scheme and host, with
+  an adapter sized to the pool.
+
+Pool sizes come from configure_http_pools or, for scripts that are run as
+subprocesses, the TECH_WRITER_HTTP_MAX_CONNECTIONS and
+TECH_WRITER_HTTP_MAX_KEEPALIVE environment variables. httpx and requests are
+imported on first use, so importing this module costs nothing.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import weakref
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+DEFAULT_TIMEOUT = 600.0
+
+_lock = threading.Lock()
+_config: Dict[str, float] = {}
+_clients: Dict[Tuple[Optional[str], str], Any] = {}
+_sessions: Dict[str, Any] = {}
+_async_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def configure_http_pools(max_connections: Optional[int] = None, max_keepalive: Optional[int] = None,
+                         keepalive_expiry: Optional[float] = None) -> None:
+    """
+    Set the pool sizes of clients created from now on.
+
+    Args:
+        max_connections: Most connections open at once per pool
+        max_keepalive: Most idle connections kept open per pool
+        keepalive_expiry: Seconds an idle connection is kept open
+    """
+    with _lock:
+        for name, value in (("max_connections", max_connections), ("max_keepalive", max_keepalive),
+                            ("keepalive_expiry", keepalive_expiry)):
+            if value is not None:
+                _config[name] = value
+
+
+def pool_config() -> Dict[str, float]:
+    """Return the pool sizes in effect: configured values, then environment variables, then defaults."""
+    return {
+        "max_connections": int(_config.get("max_connections") or os.getenv("TECH_WRITER_HTTP_MAX_CONNECTIONS")
+                               or DEFAULT_MAX_CONNECTIONS),
+        "max_keepalive": int(_config.get("max_keepalive") or os.getenv("TECH_WRITER_HTTP_MAX_KEEPALIVE")
+                             or DEFAULT_MAX_KEEPALIVE),
+        "keepalive_expiry": float(_config.get("keepalive_expiry") or DEFAULT_KEEPALIVE_EXPIRY),
+    }
+
+
+def _httpx_options() -> Dict[str, Any]:
+    import httpx
+
+    config = pool_config()
+    limits = httpx.Limits(max_connections=config["max_connections"],
+                          max_keepalive_connections=config["max_keepalive"],
+                          keepalive_expiry=config["keepalive_expiry"])
+    return {"limits": limits, "timeout": httpx.Timeout(DEFAULT_TIMEOUT, connect=10.0)}
+
+
+def get_openai_client(api_key: str, base_url: Optional[str] = None):
+    """
+    Return the process-wide OpenAI client for a base URL and API key.
+
+    The client does not retry on its own; retries are left to llm_retry.
+
+    Args:
+        api_key: The API key
+        base_url: The API base URL (default: OpenAI's)
+
+    Returns:
+        An OpenAI client sharing one keep-alive connection pool with every other caller
+    """
+    key = (base_url, api_key)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            import httpx
+            from openai import OpenAI
+
+            client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0,
+                            http_client=httpx.Client(**_httpx_options()))
+            _clients[key] = client
+            logger.debug(f"Created pooled OpenAI client for {base_url or 'the default base URL'}")
+        return client
+
+
+def get_async_openai_client(api_key: str, base_url: Optional[str] = None):
+    """
+    Return the AsyncOpenAI client for a base URL and API key on the running event loop.
+
+    Must be called from a coroutine. Clients are kept per event loop and
+    dropped with it.
+    """
+    loop = asyncio.get_running_loop()
+    key = (base_url, api_key)
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            import httpx
+            from openai import AsyncOpenAI
+
+            client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0,
+                                 http_client=httpx.AsyncClient(**_httpx_options()))
+            clients[key] = client
+        return client
+
+
+def get_requests_session(url: str):
+    """
+    Return the process-wide requests.Session for the scheme and host of a URL.
+
+    Args:
+        url: Any URL on the host, e.g. the endpoint about to be called
+
+    Returns:
+        A Session whose adapter keeps up to the configured number of connections alive
+    """
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    with _lock:
+        session = _sessions.get(origin)
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            config = pool_config()
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config["max_connections"])
+            session.mount(f"{parts.scheme}://", adapter)
+            _sessions[origin] = session
+        return session
+
+
+def close_http_clients() -> None:
+    """Close every pooled synchronous client and session; later calls create new ones."""
+    with _lock:
+        clients, sessions = list(_clients.values()), list(_sessions.values())
+        _clients.clear()
+        _sessions.clear()
+    for client in clients:
+        client.close()
+    for session in sessions:
+        session.close()
@@ -0,0 +1,189 @@
+"""
+On-disk cache of LLM responses for deterministic replays.
+
+The agents call the LLM with temperature=0, and prompt refinement and
+evaluation re-run the same conversations over and over. LLMCache stores each
+response in a local SQLite database keyed by a canonical hash of the whole
+request (model, messages, tool schemas and sampling parameters), so that
+re-running an unchanged pipeline replays every response from disk without
+an API call. A replayed response includes its tool call ids, so the rest of
+the conversation, and therefore every later request key, is the same as in
+the original run.
+
+The cache is opt-in: pass --llm-cache PATH to the agent scripts or the eval
+script, or set TECH_WRITER_LLM_CACHE. The database is bounded in size; once
+it grows past its limit, the least recently used responses are evicted.
+SQLite's locking lets several processes, such as the agents run by the eval
+shell script, share one cache file.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENV = "TECH_WRITER_LLM_CACHE"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Eviction removes responses until the cache is this fraction of its limit
+EVICT_TO = 0.9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+def plain(value: Any) -> Any:
+    """
+    Convert a request or response to plain JSON data.
+
+    API response objects (pydantic models or SimpleNamespaces) become dicts,
+    and None fields are dropped, so that a message read back from the cache
+    and the original response object it was stored from look the same.
+    """
+    if hasattr(value, "model_dump"):
+        value = value.model_dump(exclude_none=True)
+    elif hasattr(value, "__dict__") and not isinstance(value, type):
+        value = vars(value)
+    if isinstance(value, dict):
+        return {str(k): plain(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [plain(v) for v in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def request_key(**request: Any) -> str:
+    """
+    Return the cache key of an LLM request.
+
+    Args:
+        **request: Everything that determines the response, e.g. model, messages, tools and temperature
+
+    Returns:
+        SHA-256 hex digest of the request in canonical JSON form
+    """
+    canonical = json.dumps(plain(request), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    SQLite store of LLM responses keyed by request_key, with size-based LRU eviction.
+    """
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Open or create a cache.
+
+        Args:
+            path: Path of the SQLite database file
+            max_bytes: Total size of stored responses above which the least recently used are evicted
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(_SCHEMA)
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Return the stored response for a key, or None.
+
+        Args:
+            key: A key from request_key
+
+        Returns:
+            The response as plain JSON data, or None if it is not cached
+        """
+        with self._lock:
+            row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, response: Any, model: str = "") -> None:
+        """
+        Store a response, evicting the least recently used ones if the cache is over its size limit.
+
+        Args:
+            key: A key from request_key
+            response: The response, as an API object or plain JSON data
+            model: The model that produced it, for inspection
+        """
+        text = json.dumps(plain(response), ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, text, len(text.encode("utf-8")), now, now),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = total - int(self.max_bytes * EVICT_TO)
+        removed = 0
+        evicted = []
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            evicted.append((key,))
+            removed += size
+            if removed >= target:
+                break
+        self._db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        logger.info(f"Evicted {len(evicted)} cached LLM responses ({removed} bytes)")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return this process's hits and misses, and the number and total size of stored responses."""
+        with self._lock:
+            entries, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": total}
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._db.close()
+
+
+def open_llm_cache(path: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES) -> Optional[LLMCache]:
+    """
+    Open the LLM cache at a path, falling back to the TECH_WRITER_LLM_CACHE environment variable.
+
+    Args:
+        path: Path of the cache database (optional)
+        max_bytes: Size limit of the cache
+
+    Returns:
+        The cache, or None if neither a path nor the environment variable is set
+    """
+    path = path or os.getenv(LLM_CACHE_ENV)
+    if not path:
+        return None
+    logger.info(f"Using LLM response cache at {path}")
+    return LLMCache(path, max_bytes)
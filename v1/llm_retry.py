@@ -0,0 +1,321 @@
+"""
+Retries, backoff and adaptive concurrency control for LLM requests.
+
+One rate-limit response or transient server error used to abort a whole
+analysis, throwing away every step already paid for. LLMRequestController
+wraps each request instead:
+
+- errors are classified as rate limits (429), transient (5xx, timeouts,
+  dropped connections) or fatal (bad requests, authentication), and only
+  the first two are retried;
+- retries wait with full-jitter exponential backoff, or for as long as the
+  server's Retry-After header asks, up to max_retry_after: an hour-long
+  Retry-After would otherwise park a worker past any deadline. With a
+  deadline, a retry that could not start before it is not attempted;
+- an AIMD limiter shared by every agent in the process bounds the requests
+  in flight: the limit grows by about one per window of successful
+  requests and halves on a rate limit or transient error, so under load
+  throughput degrades gradually instead of every agent retrying at once.
+
+Errors are classified by status code and exception type rather than by
+importing a client library, so the same controller serves the OpenAI
+clients and plain requests calls.
+"""
+
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT = "rate_limit"
+TRANSIENT = "transient"
+FATAL = "fatal"
+
+_TRANSIENT_STATUS = {408, 409, 425, 500, 502, 503, 504, 520, 522, 524, 529}
+_TRANSIENT_NAMES = {"APIConnectionError", "APITimeoutError", "InternalServerError", "Timeout", "ReadTimeout",
+                    "ConnectTimeout", "ConnectionError", "ChunkedEncodingError", "RemoteProtocolError"}
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def classify_error(exc: BaseException) -> str:
+    """
+    Classify a failed request.
+
+    Args:
+        exc: The exception the request raised
+
+    Returns:
+        RATE_LIMIT, TRANSIENT or FATAL
+    """
+    status = _status_code(exc)
+    if status == 429 or type(exc).__name__ == "RateLimitError":
+        return RATE_LIMIT
+    if status is not None:
+        return TRANSIENT if status in _TRANSIENT_STATUS or status >= 500 else FATAL
+    if isinstance(exc, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return TRANSIENT
+    if any(cls.__name__ in _TRANSIENT_NAMES for cls in type(exc).__mro__):
+        return TRANSIENT
+    return FATAL
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """
+    Return the delay in seconds a failed request's Retry-After header asks for, if any.
+
+    Both retry-after-ms and Retry-After, in seconds or as an HTTP date, are understood.
+    """
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            when = email.utils.parsedate_to_datetime(value)
+            return max(0.0, when.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AIMDLimiter:
+    """
+    Concurrency limit that grows additively on success and shrinks multiplicatively on congestion.
+
+    Usable from threads (acquire) and from coroutines (acquire_async) at the same time.
+    """
+
+    def __init__(self, initial: int = 64, min_limit: int = 1, max_limit: int = 256,
+                 decrease: float = 0.5, cooldown: float = 1.0):
+        """
+        Initialise the limiter.
+
+        Args:
+            initial: Requests allowed in flight at first
+            min_limit: The limit never drops below this
+            max_limit: The limit never grows above this
+            decrease: Factor the limit is multiplied by on congestion
+            cooldown: Seconds after a decrease during which further congestion does not decrease it
+                again, so that one burst of failures counts once
+        """
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._waiters: deque = deque()
+
+    def _try_acquire(self, waker: Callable[[], None]) -> bool:
+        """Take a slot, or register waker to be called when one may be free."""
+        with self._lock:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            self._waiters.append(waker)
+            return False
+
+    def acquire(self) -> None:
+        """Block until a request may start."""
+        while True:
+            event = threading.Event()
+            if self._try_acquire(event.set):
+                return
+            event.wait()
+
+    async def acquire_async(self) -> None:
+        """Wait, without blocking the event loop, until a request may start."""
+        loop = asyncio.get_running_loop()
+        while True:
+            future = loop.create_future()
+
+            def wake(future=future):
+                loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+            if self._try_acquire(wake):
+                return
+            await future
+
+    def release(self, congested: bool = False) -> None:
+        """
+        Finish a request and adjust the limit.
+
+        Args:
+            congested: Whether the request was rate limited or failed transiently
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if congested:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(float(self.min_limit), self.limit * self.decrease)
+                    self._last_decrease = now
+                    logger.info(f"LLM concurrency limit reduced to {int(self.limit)}")
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            waiters, self._waiters = self._waiters, deque()
+        for wake in waiters:
+            wake()
+
+
+class LLMRequestController:
+    """
+    Runs LLM requests through the shared limiter, retrying the ones that fail transiently.
+    """
+
+    def __init__(self, limiter: Optional[AIMDLimiter] = None, max_attempts: int = 6,
+                 base_delay: float = 1.0, max_delay: float = 60.0, max_retry_after: float = 120.0):
+        """
+        Initialise the controller.
+
+        Args:
+            limiter: Concurrency limiter (default: a new AIMDLimiter)
+            max_attempts: Attempts per request, including the first
+            base_delay: Seconds of the first backoff before jitter
+            max_delay: Longest backoff before jitter
+            max_retry_after: Longest wait a Retry-After header is honoured for; longer requests are clamped
+        """
+        self.limiter = limiter or AIMDLimiter()
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "rate_limited": 0, "transient_errors": 0,
+                       "fatal_errors": 0, "gave_up": 0, "queue_wait_seconds": 0.0, "max_queue_wait_seconds": 0.0}
+
+    def backoff(self, attempt: int, exc: BaseException) -> float:
+        """
+        Return how long to wait before retrying.
+
+        Args:
+            attempt: The number of the attempt that failed, from 1
+            exc: The exception it raised
+
+        Returns:
+            The Retry-After delay if the server sent one, clamped to max_retry_after, otherwise a
+            full-jitter exponential backoff
+        """
+        requested = retry_after(exc)
+        if requested is not None:
+            if requested > self.max_retry_after:
+                logger.info(f"Retry-After of {requested:.0f}s clamped to {self.max_retry_after:.0f}s")
+            return min(requested, self.max_retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def _count(self, **increments: float) -> None:
+        with self._lock:
+            for name, value in increments.items():
+                self._stats[name] += value
+
+    def _waited(self, seconds: float) -> None:
+        with self._lock:
+            self._stats["queue_wait_seconds"] += seconds
+            self._stats["max_queue_wait_seconds"] = max(self._stats["max_queue_wait_seconds"], seconds)
+
+    def _failed(self, attempt: int, exc: BaseException, deadline: Optional[float] = None) -> Optional[float]:
+        """Record a failed attempt and return the delay before retrying, or None to give up."""
+        kind = classify_error(exc)
+        self.limiter.release(congested=kind != FATAL)
+        if kind == FATAL:
+            self._count(fatal_errors=1)
+            return None
+        self._count(**{"rate_limited" if kind == RATE_LIMIT else "transient_errors": 1})
+        if attempt == self.max_attempts:
+            self._count(gave_up=1)
+            logger.error(f"LLM request failed after {attempt} attempts: {exc}")
+            return None
+        delay = self.backoff(attempt, exc)
+        if deadline is not None and time.time() + delay >= deadline:
+            self._count(gave_up=1)
+            logger.error(f"LLM request failed and there is no time to retry before the deadline: {exc}")
+            return None
+        self._count(retries=1)
+        logger.warning(f"LLM request failed ({kind}: {exc}); retrying in {delay:.1f}s "
+                       f"(attempt {attempt + 1} of {self.max_attempts})")
+        return delay
+
+    def call(self, request: Callable[[], Any], deadline: Optional[float] = None) -> Any:
+        """
+        Make a request, retrying rate limits and transient errors.
+
+        Args:
+            request: Makes the request and returns the response
+            deadline: time.time() after which not to retry (optional)
+
+        Returns:
+            The response
+
+        Raises:
+            Exception: The request's last exception, when it is fatal or the attempts run out
+        """
+        self._count(requests=1)
+        for attempt in range(1, self.max_attempts + 1):
+            start = time.monotonic()
+            self.limiter.acquire()
+            self._waited(time.monotonic() - start)
+            try:
+                response = request()
+            except Exception as e:
+                delay = self._failed(attempt, e, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled or interrupted: free the slot before propagating
+                self.limiter.release()
+                raise
+            self.limiter.release()
+            return response
+
+    async def call_async(self, request: Callable[[], Awaitable[Any]], deadline: Optional[float] = None) -> Any:
+        """Asyncio version of call: request returns an awaitable, and waits do not block the event loop."""
+        self._count(requests=1)
+        for attempt in range(1, self.max_attempts + 1):
+            start = time.monotonic()
+            await self.limiter.acquire_async()
+            self._waited(time.monotonic() - start)
+            try:
+                response = await request()
+            except Exception as e:
+                delay = self._failed(attempt, e, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled or interrupted: free the slot before propagating
+                self.limiter.release()
+                raise
+            self.limiter.release()
+            return response
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the request, retry and queue wait counts, and the limiter's current state."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_wait_seconds"] = round(stats["queue_wait_seconds"], 3)
+        stats["max_queue_wait_seconds"] = round(stats["max_queue_wait_seconds"], 3)
+        stats["concurrency_limit"] = int(self.limiter.limit)
+        stats["in_flight"] = self.limiter.in_flight
+        return stats
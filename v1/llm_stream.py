@@ -0,0 +1,165 @@
+"""
+Streaming chat completions with early tool dispatch.
+
+Without streaming, an agent waits for the whole completion before it can
+start on any of the tool calls in it. StreamedCompletion assembles a
+streamed completion chunk by chunk instead:
+
+- tool call deltas are accumulated per call index, and each call is handed
+  to on_tool_call as soon as its arguments are a complete JSON object (or a
+  later call starts), while the model is still generating the rest;
+- content deltas are handed to on_text as they arrive, e.g. an AnswerWriter
+  that writes the final answer to disk incrementally;
+- the time from the request to the first tool dispatch or answer text is
+  kept as first_action_seconds.
+
+Chunks are read by attribute in the shape of the OpenAI SDK's
+ChatCompletionChunk, so any OpenAI-compatible client works.
+"""
+
+import json
+import logging
+import os
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _complete_json(arguments: str) -> bool:
+    """Return whether tool call arguments are a complete JSON object."""
+    if not arguments.rstrip().endswith("}"):
+        return False
+    try:
+        return isinstance(json.loads(arguments), dict)
+    except ValueError:
+        return False
+
+
+class StreamedCompletion:
+    """
+    Assembles one streamed completion, dispatching each tool call as soon as it is complete.
+    """
+
+    def __init__(self, on_tool_call: Optional[Callable[[Any], None]] = None,
+                 on_text: Optional[Callable[[str], None]] = None, started: Optional[float] = None):
+        """
+        Initialise the assembler.
+
+        Args:
+            on_tool_call: Called with each complete tool call, an object with id, type and
+                function.name and function.arguments, in call order
+            on_text: Called with each piece of content as it arrives
+            started: time.perf_counter() when the request was sent (default: now)
+        """
+        self.on_tool_call = on_tool_call
+        self.on_text = on_text
+        self.started = time.perf_counter() if started is None else started
+        self.first_action_seconds: Optional[float] = None
+        self.content = []
+        self.calls: Dict[int, Dict[str, str]] = {}
+        self.dispatched = []
+        self.usage = None
+
+    def _acted(self) -> None:
+        if self.first_action_seconds is None:
+            self.first_action_seconds = time.perf_counter() - self.started
+
+    def _complete(self, index: int) -> None:
+        call = self.calls[index]
+        if call.get("dispatched") or not call["name"]:
+            return
+        call["dispatched"] = True
+        tool_call = SimpleNamespace(id=call["id"], type="function",
+                                    function=SimpleNamespace(name=call["name"], arguments=call["arguments"]))
+        self.dispatched.append(tool_call)
+        self._acted()
+        logger.debug(f"Tool call {call['name']} complete after {time.perf_counter() - self.started:.2f}s")
+        if self.on_tool_call is not None:
+            self.on_tool_call(tool_call)
+
+    def feed(self, chunk: Any) -> None:
+        """Add one chunk of the stream."""
+        if getattr(chunk, "usage", None):
+            self.usage = chunk.usage
+        for choice in getattr(chunk, "choices", None) or []:
+            delta = choice.delta
+            if getattr(delta, "content", None):
+                self.content.append(delta.content)
+                self._acted()
+                if self.on_text is not None:
+                    self.on_text(delta.content)
+            for position, tool_delta in enumerate(getattr(delta, "tool_calls", None) or []):
+                index = tool_delta.index if getattr(tool_delta, "index", None) is not None else position
+                call = self.calls.setdefault(index, {"id": "", "name": "", "arguments": ""})
+                if tool_delta.id:
+                    call["id"] = tool_delta.id
+                function = getattr(tool_delta, "function", None)
+                if function is not None:
+                    call["name"] += function.name or ""
+                    call["arguments"] += function.arguments or ""
+                # Calls are generated in order, so a delta for one call means the earlier ones are done
+                for earlier in sorted(i for i in self.calls if i < index):
+                    self._complete(earlier)
+                if _complete_json(call["arguments"]):
+                    self._complete(index)
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Dispatch any calls not yet dispatched and return the assembled assistant message.
+
+        Returns:
+            The message as a dictionary in the shape of a ChatCompletionMessage
+        """
+        for index in sorted(self.calls):
+            self._complete(index)
+        message = {"role": "assistant", "content": "".join(self.content) or None}
+        if self.calls:
+            message["tool_calls"] = [
+                {"id": call["id"], "type": "function",
+                 "function": {"name": call["name"], "arguments": call["arguments"]}}
+                for _, call in sorted(self.calls.items())
+            ]
+        return message
+
+
+class AnswerWriter:
+    """
+    Writes streamed answer text to a file as it arrives.
+
+    Text streamed on a step that turns out to call tools is not the answer,
+    so it is discarded when the next step starts.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialise the writer.
+
+        Args:
+            path: File to write, created on the first text
+        """
+        self.path = path
+        self._file = None
+
+    def write(self, text: str) -> None:
+        """Append text and flush it to disk."""
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "w", encoding="utf-8")
+        self._file.write(text)
+        self._file.flush()
+
+    def discard(self) -> None:
+        """Throw away the text written so far."""
+        if self._file is not None:
+            self._file.seek(0)
+            self._file.truncate()
+
+    def close(self) -> None:
+        """Close the file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
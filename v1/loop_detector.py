@@ -0,0 +1,185 @@
+"""
+Loop and redundancy detection for the tech writer agents.
+
+Models sometimes re-issue the same find_all_matching_files or read_file
+call step after step, or alternate between a few calls, until the run hits
+its step limit with no answer. LoopDetector fingerprints each step's tool
+calls together with the observations they returned, and recognises:
+
+- repeats: a call with the same tool and arguments that returned the same
+  result as an earlier one;
+- cycles: the last few steps repeating the steps just before them, e.g.
+  A B A B.
+
+A step made only of repeats, or that completes a cycle, has taught the
+model nothing. The detector's responses escalate:
+
+1. the repeated observation itself is replaced by a pointer to the earlier
+   call (done by the agent, which records the tokens saved here);
+2. after a stalled step, a corrective hint is sent with the next LLM call;
+3. after max_hints stalled steps in a row, the next call forbids tool use
+   and asks for the final answer.
+
+A forced final answer saves at most the steps left up to the run's limit,
+and at most the context it would have re-sent on each of them. Nobody
+knows how many of those steps the run would really have taken, so both
+figures are reported as upper bounds (max_steps_saved, max_tokens_saved),
+not as measurements; the pointer savings are measured and kept apart.
+"""
+
+import hashlib
+import json
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+HINT = "hint"
+FINALISE = "finalise"
+
+FINALISE_INSTRUCTION = (
+    "You are repeating tool calls that return nothing new. Do not call any more tools: "
+    "write the final answer now from the information you already have."
+)
+
+
+def call_fingerprint(tool_call: Any) -> str:
+    """
+    Identify a tool call by its tool and arguments, ignoring argument order and formatting.
+
+    Args:
+        tool_call: A tool call with function.name and function.arguments
+
+    Returns:
+        A short hash
+    """
+    arguments = tool_call.function.arguments or ""
+    try:
+        arguments = json.dumps(json.loads(arguments), sort_keys=True)
+    except ValueError:
+        pass
+    return hashlib.sha1(f"{tool_call.function.name}\0{arguments}".encode("utf-8")).hexdigest()[:16]
+
+
+def _digest(observation: Optional[str]) -> str:
+    return hashlib.sha1((observation or "").encode("utf-8", "replace")).hexdigest()[:16]
+
+
+class LoopDetector:
+    """
+    Tracks the tool calls of one run and decides when to intervene.
+    """
+
+    def __init__(self, max_hints: int = 2, max_period: int = 3):
+        """
+        Initialise the detector.
+
+        Args:
+            max_hints: Stalled steps in a row answered with a hint before the final answer is forced
+            max_period: Longest cycle, in steps, that is recognised
+        """
+        self.max_hints = max_hints
+        self.max_period = max_period
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the run so far, for a new run."""
+        # (call fingerprint, observation digest) -> number of the step that first made the call
+        self.seen: Dict[Tuple[str, str], int] = {}
+        self.history: List[Tuple[Tuple[str, str], ...]] = []
+        self.stalled = 0
+        self.pending: Optional[Tuple[str, str]] = None
+        self.forced = False
+        self.counts = {"repeated_calls": 0, "cycles": 0, "hints": 0, "forced_finalisations": 0,
+                       "pointers": 0, "pointer_tokens_saved": 0, "max_steps_saved": 0, "max_tokens_saved": 0}
+
+    def _cycle_period(self) -> int:
+        """Return the period of a cycle ending at the latest step, or 0."""
+        for period in range(2, self.max_period + 1):
+            if len(self.history) >= 2 * period and self.history[-period:] == self.history[-2 * period:-period]:
+                return period
+        return 0
+
+    def record_step(self, tool_calls: Sequence[Any], observations: Sequence[Optional[str]]) -> Optional[str]:
+        """
+        Record the tool calls of a step and their observations.
+
+        Args:
+            tool_calls: The step's tool calls
+            observations: Their observations, before any pointer replaced them
+
+        Returns:
+            HINT or FINALISE if the step stalled and the next LLM call should be steered, otherwise None
+        """
+        step_number = len(self.history) + 1
+        keys = [(call_fingerprint(call), _digest(observation)) for call, observation in zip(tool_calls, observations)]
+        repeated = [(call, self.seen[key]) for call, key in zip(tool_calls, keys) if key in self.seen]
+        for key in keys:
+            self.seen.setdefault(key, step_number)
+        self.history.append(tuple(sorted(keys)))
+        self.counts["repeated_calls"] += len(repeated)
+
+        period = self._cycle_period()
+        if period:
+            self.counts["cycles"] += 1
+        if not keys or (len(repeated) < len(keys) and not period):
+            self.stalled = 0
+            return None
+
+        self.stalled += 1
+        if self.stalled > self.max_hints:
+            self.counts["forced_finalisations"] += 1
+            self.pending = (FINALISE, FINALISE_INSTRUCTION)
+            logger.warning(f"Tool calls stalled for {self.stalled} steps; asking for the final answer")
+            return FINALISE
+
+        self.counts["hints"] += 1
+        if repeated:
+            described = "; ".join(f"{call.function.name}({call.function.arguments}) as in step {step}"
+                                  for call, step in repeated[:3])
+            hint = (f"You repeated tool calls that return the same results as before: {described}. "
+                    "Their results are already above.")
+        else:
+            hint = f"Your last {period} steps repeat the {period} steps before them."
+        hint += " Do not repeat calls: use what you have, try something different, or write the final answer."
+        self.pending = (HINT, hint)
+        logger.info(f"Loop detected after step {step_number}; sending a corrective hint")
+        return HINT
+
+    def next_action(self) -> Optional[Tuple[str, str]]:
+        """
+        Return the intervention for the next LLM call, once.
+
+        Returns:
+            (HINT or FINALISE, instruction text), or None
+        """
+        action, self.pending = self.pending, None
+        if action and action[0] == FINALISE:
+            self.forced = True
+        return action
+
+    def record_pointer(self, tokens_saved: int) -> None:
+        """Record a repeated observation replaced by a pointer to the earlier call."""
+        self.counts["pointers"] += 1
+        self.counts["pointer_tokens_saved"] += max(0, tokens_saved)
+
+    def record_answer(self, llm_calls: int, max_steps: int, context_tokens: int) -> None:
+        """
+        Record the run's final answer; if the detector forced it, bound the steps and tokens it saved.
+
+        The bound assumes the run would otherwise have used every remaining step, each re-sending
+        the full context, so it overstates the saving of a run that would have answered sooner.
+
+        Args:
+            llm_calls: LLM calls made in the run, including the one that answered
+            max_steps: The run's step limit
+            context_tokens: Estimated tokens of the memory, re-sent by every further step
+        """
+        if self.forced:
+            max_steps_saved = max(0, max_steps - llm_calls)
+            self.counts["max_steps_saved"] += max_steps_saved
+            self.counts["max_tokens_saved"] += max_steps_saved * context_tokens
+
+    def stats(self) -> Dict[str, int]:
+        """Return the redundancy counts of the run, the measured pointer savings and the forced-answer bounds."""
+        return dict(self.counts)
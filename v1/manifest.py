@@ -0,0 +1,895 @@
+"""
+Repository manifest for the tech writer agent.
+
+This module walks a codebase once and stores what it finds in a columnar,
+array-backed manifest (one array per attribute rather than one object per
+file), together with a symbol index over the source files. The query tools
+answer quantitative questions directly from these columns.
+"""
+
+import ast
+import bisect
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import re
+import struct
+import sys
+import time
+import zlib
+from array import array
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pathspec
+from pathspec.patterns import GitWildMatchPattern
+
+logger = logging.getLogger(__name__)
+
+# Map file extensions to the language reported by the query tools
+EXTENSION_LANGUAGES = {
+    ".py": "Python",
+    ".pyi": "Python",
+    ".js": "JavaScript",
+    ".jsx": "JavaScript",
+    ".mjs": "JavaScript",
+    ".ts": "TypeScript",
+    ".tsx": "TypeScript",
+    ".go": "Go",
+    ".rs": "Rust",
+    ".java": "Java",
+    ".kt": "Kotlin",
+    ".c": "C",
+    ".h": "C",
+    ".cpp": "C++",
+    ".hpp": "C++",
+    ".cc": "C++",
+    ".cs": "C#",
+    ".rb": "Ruby",
+    ".php": "PHP",
+    ".swift": "Swift",
+    ".sh": "Shell",
+    ".html": "HTML",
+    ".css": "CSS",
+    ".md": "Markdown",
+    ".json": "JSON",
+    ".yml": "YAML",
+    ".yaml": "YAML",
+    ".toml": "TOML",
+    ".sql": "SQL",
+    ".txt": "Text",
+}
+
+# Bytes sniffed from the start of each file to decide whether it is binary
+BINARY_SNIFF_BYTES = 8192
+
+# Files larger than this are recorded but their lines are not counted
+MAX_LINE_COUNT_BYTES = 20 * 1024 * 1024
+
+SYMBOL_KINDS = ["function", "class", "method"]
+
+# Regular expressions used to find symbols in non-Python sources
+_SYMBOL_PATTERNS = {
+    "JavaScript": [
+        ("function", re.compile(r"^\s*(?:export\s+)?(?:async\s+)?function\s+([A-Za-z_$][\w$]*)", re.M)),
+        ("class", re.compile(r"^\s*(?:export\s+)?(?:default\s+)?class\s+([A-Za-z_$][\w$]*)", re.M)),
+    ],
+    "TypeScript": [
+        ("function", re.compile(r"^\s*(?:export\s+)?(?:async\s+)?function\s+([A-Za-z_$][\w$]*)", re.M)),
+        ("class", re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+([A-Za-z_$][\w$]*)", re.M)),
+    ],
+    "Go": [
+        ("function", re.compile(r"^func\s+(?:\([^)]*\)\s*)?([A-Za-z_]\w*)", re.M)),
+        ("class", re.compile(r"^type\s+([A-Za-z_]\w*)\s+struct\b", re.M)),
+    ],
+    "Rust": [
+        ("function", re.compile(r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?fn\s+([A-Za-z_]\w*)", re.M)),
+        ("class", re.compile(r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:struct|enum|trait)\s+([A-Za-z_]\w*)", re.M)),
+    ],
+}
+
+
+# Identifier-like tokens recorded by the search index
+_TOKEN_PATTERN = re.compile(r"[a-z_][a-z0-9_]{2,63}")
+
+# Files larger than this are not tokenised for the search index
+MAX_SEARCH_INDEX_BYTES = 1024 * 1024
+
+
+def shard_for_directory(rel_dir: str, num_shards: int) -> int:
+    """Return the shard that the files of a directory belong to."""
+    return zlib.crc32(rel_dir.encode("utf-8")) % num_shards
+
+
+def language_for_extension(extension: str) -> str:
+    """Return the language name for a file extension, or "Other"."""
+    return EXTENSION_LANGUAGES.get(extension.lower(), "Other")
+
+
+def _load_gitignore_spec(directory: Path) -> pathspec.PathSpec:
+    """Read the .gitignore at the root of a directory into a PathSpec."""
+    patterns = []
+    gitignore_path = directory / ".gitignore"
+    if gitignore_path.exists():
+        try:
+            with open(gitignore_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        patterns.append(line)
+        except (IOError, UnicodeDecodeError) as e:
+            logger.error(f"Error reading .gitignore: {e}")
+    return pathspec.PathSpec.from_lines(GitWildMatchPattern, patterns)
+
+
+def _sniff_file(path: str, size: int):
+    """
+    Read a file once to decide whether it is binary and count its lines.
+
+    Returns:
+        tuple: (is_binary, line_count)
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(BINARY_SNIFF_BYTES)
+            if b"\0" in head:
+                return True, 0
+            if size > MAX_LINE_COUNT_BYTES:
+                return False, 0
+            lines = head.count(b"\n")
+            last = head[-1:]
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                lines += chunk.count(b"\n")
+                last = chunk[-1:]
+        if last and last != b"\n":
+            lines += 1
+        return False, lines
+    except OSError:
+        return False, 0
+
+
+# Bits stored in the manifest flags column
+FLAG_BINARY = 1
+FLAG_HIDDEN = 2
+
+
+class Manifest:
+    """
+    Columnar manifest of the files in a codebase.
+
+    Rows are files. Directory paths and extensions are interned into small
+    tables and each row stores only their integer ids; sizes, modification
+    times, line counts and flags live in parallel typed arrays. File names are
+    the only per-row Python objects. A manifest is read-only once built, which
+    lets slice() hand out zero-copy views of its columns for pagination.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.directories: List[str] = []
+        self.extensions: List[str] = []
+        self.names: List[str] = []
+        self.dir_ids = array("I")
+        self.ext_ids = array("I")
+        self.sizes = array("q")
+        self.mtimes = array("d")
+        self.lines = array("I")
+        self.flags = array("B")
+        self._dir_lookup: Dict[str, int] = {}
+        self._ext_lookup: Dict[str, int] = {}
+        self._symbols: Optional["SymbolIndex"] = None
+        self._search: Optional["SearchIndex"] = None
+        # Shared memory segment or mmap that the columns view, if attached from a buffer
+        self._buffer_owner: Any = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, row: int) -> "ManifestRow":
+        if not -len(self) <= row < len(self):
+            raise IndexError("manifest row out of range")
+        return ManifestRow(self, row % len(self))
+
+    def __iter__(self) -> Iterator["ManifestRow"]:
+        return map(partial(ManifestRow, self), range(len(self)))
+
+    def add_directory(self, rel_dir: str) -> int:
+        """
+        Intern a directory path and return its id.
+
+        Args:
+            rel_dir: Directory relative to the root, "" for the root itself or ending in "/"
+
+        Returns:
+            The directory id stored in the dir_ids column
+        """
+        dir_id = self._dir_lookup.get(rel_dir)
+        if dir_id is None:
+            dir_id = len(self.directories)
+            self.directories.append(rel_dir)
+            self._dir_lookup[rel_dir] = dir_id
+        return dir_id
+
+    def _intern_extension(self, extension: str) -> int:
+        ext_id = self._ext_lookup.get(extension)
+        if ext_id is None:
+            ext_id = len(self.extensions)
+            self.extensions.append(extension)
+            self._ext_lookup[extension] = ext_id
+        return ext_id
+
+    def append(self, dir_id: int, name: str, size: int, mtime: float, line_count: int, flags: int) -> None:
+        """Add one file to the manifest."""
+        self.names.append(name)
+        self.dir_ids.append(dir_id)
+        self.ext_ids.append(self._intern_extension(os.path.splitext(name)[1].lower()))
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+        self.lines.append(line_count)
+        self.flags.append(flags)
+
+    def path(self, row: int) -> str:
+        """Return the path of a row relative to the root."""
+        return self.directories[self.dir_ids[row]] + self.names[row]
+
+    def iter_paths(self) -> Iterator[str]:
+        """Yield the relative path of every row in order."""
+        return map(str.__add__, map(self.directories.__getitem__, self.dir_ids), self.names)
+
+    def slice(self, start: int, stop: int) -> "ManifestSlice":
+        """Return a zero-copy view of rows start to stop, e.g. for one page of results."""
+        rows = range(len(self))[start:stop]
+        return ManifestSlice(self, rows.start, max(rows.start, rows.stop))
+
+    def languages(self) -> List[str]:
+        """Return the language for each interned extension id."""
+        return [language_for_extension(ext) for ext in self.extensions]
+
+    def name_mask(self, pattern: str) -> bytearray:
+        """Return a row mask selecting files whose name matches a glob pattern."""
+        if pattern in ("", "*"):
+            return bytearray(b"\x01") * len(self)
+        match = re.compile(fnmatch.translate(pattern)).match
+        return bytearray(map(bool, map(match, self.names)))
+
+    def directory_mask(self, prefix: str) -> bytearray:
+        """Return a row mask selecting files at any depth under a relative directory."""
+        prefix = prefix.strip("/") + "/"
+        allowed = {i for i, d in enumerate(self.directories) if d.startswith(prefix)}
+        return bytearray(map(allowed.__contains__, self.dir_ids))
+
+    def flag_mask(self, flag: int) -> bytearray:
+        """Return a row mask selecting files that have a flag set."""
+        return bytearray(map(bool, map(flag.__and__, self.flags)))
+
+    def symbols(self) -> "SymbolIndex":
+        """Return the symbol index for this manifest, building it on first use."""
+        if self._symbols is None:
+            self._symbols = SymbolIndex.build(self)
+        return self._symbols
+
+    def search_index(self) -> "SearchIndex":
+        """Return the search index for this manifest, building it on first use."""
+        if self._search is None:
+            self._search = SearchIndex.build(self)
+        return self._search
+
+
+class ManifestSlice:
+    """
+    Zero-copy view of a contiguous range of manifest rows.
+
+    The numeric columns are memoryviews into the manifest arrays, so column
+    operations such as sum(page.sizes) touch only the rows in the slice and
+    nothing is copied when the slice is created.
+    """
+
+    def __init__(self, manifest: Manifest, start: int, stop: int):
+        self.manifest = manifest
+        self.start = start
+        self.stop = stop
+        self.dir_ids = memoryview(manifest.dir_ids)[start:stop]
+        self.ext_ids = memoryview(manifest.ext_ids)[start:stop]
+        self.sizes = memoryview(manifest.sizes)[start:stop]
+        self.mtimes = memoryview(manifest.mtimes)[start:stop]
+        self.lines = memoryview(manifest.lines)[start:stop]
+        self.flags = memoryview(manifest.flags)[start:stop]
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __getitem__(self, index: int) -> "ManifestRow":
+        if not -len(self) <= index < len(self):
+            raise IndexError("manifest slice index out of range")
+        return ManifestRow(self.manifest, self.start + index % len(self))
+
+    def __iter__(self) -> Iterator["ManifestRow"]:
+        return map(partial(ManifestRow, self.manifest), range(self.start, self.stop))
+
+    def release(self) -> None:
+        """Release the memoryviews so that the manifest arrays can be resized again."""
+        for column in (self.dir_ids, self.ext_ids, self.sizes, self.mtimes, self.lines, self.flags):
+            column.release()
+
+
+class ManifestRow:
+    """Lightweight view of one manifest row; attributes are read from the columns on access."""
+
+    __slots__ = ("manifest", "row")
+
+    def __init__(self, manifest: Manifest, row: int):
+        self.manifest = manifest
+        self.row = row
+
+    @property
+    def name(self) -> str:
+        return self.manifest.names[self.row]
+
+    @property
+    def directory(self) -> str:
+        return self.manifest.directories[self.manifest.dir_ids[self.row]]
+
+    @property
+    def path(self) -> str:
+        return self.manifest.path(self.row)
+
+    @property
+    def extension(self) -> str:
+        return self.manifest.extensions[self.manifest.ext_ids[self.row]]
+
+    @property
+    def language(self) -> str:
+        return language_for_extension(self.extension)
+
+    @property
+    def size(self) -> int:
+        return self.manifest.sizes[self.row]
+
+    @property
+    def mtime(self) -> float:
+        return self.manifest.mtimes[self.row]
+
+    @property
+    def lines(self) -> int:
+        return self.manifest.lines[self.row]
+
+    @property
+    def is_binary(self) -> bool:
+        return bool(self.manifest.flags[self.row] & FLAG_BINARY)
+
+    @property
+    def is_hidden(self) -> bool:
+        return bool(self.manifest.flags[self.row] & FLAG_HIDDEN)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the row as a dictionary, e.g. for a tool result."""
+        return {
+            "path": self.path,
+            "size": self.size,
+            "lines": self.lines,
+            "language": self.language,
+            "is_binary": self.is_binary,
+        }
+
+    def __repr__(self) -> str:
+        return f"ManifestRow({self.path!r})"
+
+
+class SymbolIndex:
+    """
+    Columnar index of the functions and classes defined in a codebase.
+
+    Rows hold the symbol name, its kind (an index into SYMBOL_KINDS), the
+    manifest row of the file that defines it and its line number.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.kinds = array("B")
+        self.file_rows = array("I")
+        self.line_numbers = array("I")
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def append(self, name: str, kind: str, file_row: int, line_number: int) -> None:
+        """Add one symbol to the index."""
+        self.names.append(name)
+        self.kinds.append(SYMBOL_KINDS.index(kind))
+        self.file_rows.append(file_row)
+        self.line_numbers.append(line_number)
+
+    @classmethod
+    def build(cls, manifest: Manifest) -> "SymbolIndex":
+        """Parse every source file in a manifest and index its symbols."""
+        index = cls()
+        languages = manifest.languages()
+        root = Path(manifest.root)
+        for row, rel_path in enumerate(manifest.iter_paths()):
+            if manifest.flags[row] & FLAG_BINARY:
+                continue
+            language = languages[manifest.ext_ids[row]]
+            if language != "Python" and language not in _SYMBOL_PATTERNS:
+                continue
+            try:
+                source = (root / rel_path).read_text(encoding="utf-8", errors="replace")
+            except OSError:
+                continue
+            if language == "Python":
+                index._add_python_symbols(source, row)
+            else:
+                for kind, regex in _SYMBOL_PATTERNS[language]:
+                    for match in regex.finditer(source):
+                        index.append(match.group(1), kind, row, source.count("\n", 0, match.start()) + 1)
+        return index
+
+    def _add_python_symbols(self, source: str, row: int) -> None:
+        try:
+            tree = ast.parse(source)
+        except (SyntaxError, ValueError):
+            return
+        # Walk the tree keeping track of whether we are directly inside a class
+        stack = [(node, False) for node in tree.body]
+        while stack:
+            node, in_class = stack.pop()
+            if isinstance(node, ast.ClassDef):
+                self.append(node.name, "class", row, node.lineno)
+                stack.extend((child, True) for child in node.body)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                self.append(node.name, "method" if in_class else "function", row, node.lineno)
+                stack.extend((child, False) for child in node.body)
+            else:
+                # Definitions nested in if/try/with blocks
+                stack.extend(
+                    (child, in_class) for child in ast.iter_child_nodes(node)
+                    if isinstance(child, (ast.stmt, ast.excepthandler))
+                )
+
+
+class SearchIndex:
+    """
+    Inverted index from identifier-like tokens to the files that contain them.
+
+    Terms are kept sorted, and each term's postings (manifest rows, ascending)
+    are a contiguous run of the rows array delimited by the offsets array.
+    """
+
+    def __init__(self):
+        self.terms: List[str] = []
+        self.offsets = array("Q", [0])
+        self.rows = array("I")
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    @classmethod
+    def from_postings(cls, postings: Dict[str, List[int]]) -> "SearchIndex":
+        """Build an index from a mapping of term to ascending manifest rows."""
+        index = cls()
+        for term in sorted(postings):
+            index.terms.append(term)
+            index.rows.extend(postings[term])
+            index.offsets.append(len(index.rows))
+        return index
+
+    @classmethod
+    def build(cls, manifest: Manifest) -> "SearchIndex":
+        """Tokenise every text file in a manifest and index its terms."""
+        postings: Dict[str, List[int]] = {}
+        root = Path(manifest.root)
+        for row, rel_path in enumerate(manifest.iter_paths()):
+            if manifest.flags[row] & FLAG_BINARY or manifest.sizes[row] > MAX_SEARCH_INDEX_BYTES:
+                continue
+            try:
+                text = (root / rel_path).read_text(encoding="utf-8", errors="replace")
+            except OSError:
+                continue
+            for term in set(_TOKEN_PATTERN.findall(text.lower())):
+                postings.setdefault(term, []).append(row)
+        return cls.from_postings(postings)
+
+    def postings(self, term: str) -> Sequence[int]:
+        """Return the manifest rows of the files containing a term."""
+        term = term.lower()
+        i = bisect.bisect_left(self.terms, term)
+        if i == len(self.terms) or self.terms[i] != term:
+            return ()
+        return self.rows[self.offsets[i]:self.offsets[i + 1]]
+
+    def search(self, terms: List[str]) -> List[int]:
+        """Return the manifest rows of the files containing every one of the terms."""
+        result = None
+        for term in terms:
+            rows = set(self.postings(term))
+            result = rows if result is None else result & rows
+            if not result:
+                return []
+        return sorted(result or ())
+
+
+def build_manifest(
+    directory: str,
+    respect_gitignore: bool = True,
+    include_hidden: bool = False,
+    shard: int = 0,
+    num_shards: int = 1
+) -> Manifest:
+    """
+    Walk a directory once and build its manifest.
+
+    Args:
+        directory: Root of the codebase
+        respect_gitignore: Whether to skip files matched by the root .gitignore
+        include_hidden: Whether to include hidden files and directories
+        shard: Which shard of the codebase to include, from 0 to num_shards - 1
+        num_shards: Number of shards the codebase is split into; files are assigned
+            to shards by a stable hash of their directory
+
+    Returns:
+        A Manifest with one row per file
+    """
+    root = Path(directory).resolve()
+    if not root.is_dir():
+        raise FileNotFoundError(directory)
+    manifest = Manifest(str(root))
+    spec = _load_gitignore_spec(root) if respect_gitignore else None
+
+    stack = [("", str(root), False)]
+    while stack:
+        rel_dir, abs_dir, in_hidden = stack.pop()
+        try:
+            with os.scandir(abs_dir) as entries:
+                entries = sorted(entries, key=lambda e: e.name)
+        except OSError as e:
+            logger.error(f"Error scanning {abs_dir}: {e}")
+            continue
+
+        dir_id = None
+        in_shard = num_shards == 1 or shard_for_directory(rel_dir, num_shards) == shard
+        subdirs = []
+        for entry in entries:
+            hidden = in_hidden or entry.name.startswith(".")
+            if hidden and not include_hidden:
+                continue
+            rel_path = f"{rel_dir}{entry.name}"
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if spec and spec.match_file(rel_path + "/"):
+                        continue
+                    subdirs.append((rel_path + "/", entry.path, hidden))
+                elif entry.is_file() and in_shard:
+                    if spec and spec.match_file(rel_path):
+                        continue
+                    stat = entry.stat()
+                    is_binary, line_count = _sniff_file(entry.path, stat.st_size)
+                    flags = (FLAG_BINARY if is_binary else 0) | (FLAG_HIDDEN if hidden else 0)
+                    if dir_id is None:
+                        dir_id = manifest.add_directory(rel_dir)
+                    manifest.append(dir_id, entry.name, stat.st_size, stat.st_mtime, line_count, flags)
+            except OSError as e:
+                logger.error(f"Error reading {entry.path}: {e}")
+        # Reverse so that directories are visited in sorted order
+        stack.extend(reversed(subdirs))
+
+    if num_shards > 1:
+        logger.info(f"Built manifest shard {shard}/{num_shards} for {root}: {len(manifest)} files")
+    else:
+        logger.info(f"Built manifest for {root}: {len(manifest)} files")
+    return manifest
+
+
+def tree_fingerprint(directory: str, respect_gitignore: bool = True, include_hidden: bool = False) -> str:
+    """
+    Digest the state of a directory tree from stat data alone.
+
+    Covers the files build_manifest would include, with the same ignore
+    rules: each file's path, size and modification time, and each
+    directory's modification time. Adding, removing, renaming or rewriting a
+    file changes the digest, without reading any file.
+
+    Args:
+        directory: Root of the codebase
+        respect_gitignore: Whether to skip files matched by the root .gitignore
+        include_hidden: Whether to include hidden files and directories
+
+    Returns:
+        A hex digest, or "missing" if the directory cannot be read
+    """
+    root = Path(directory).resolve()
+    if not root.is_dir():
+        return "missing"
+    spec = _load_gitignore_spec(root) if respect_gitignore else None
+    digest = hashlib.sha1()
+    stack = [("", str(root))]
+    while stack:
+        rel_dir, abs_dir = stack.pop()
+        try:
+            digest.update(f"{rel_dir}\0{os.stat(abs_dir).st_mtime_ns}\n".encode("utf-8", "replace"))
+            with os.scandir(abs_dir) as entries:
+                entries = sorted(entries, key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            if entry.name.startswith(".") and not include_hidden:
+                continue
+            rel_path = f"{rel_dir}{entry.name}"
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if not (spec and spec.match_file(rel_path + "/")):
+                        subdirs.append((rel_path + "/", entry.path))
+                elif entry.is_file() and not (spec and spec.match_file(rel_path)):
+                    stat = entry.stat()
+                    digest.update(f"{rel_path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8", "replace"))
+            except OSError:
+                continue
+        stack.extend(reversed(subdirs))
+    return digest.hexdigest()
+
+
+# Seconds a tree_version is trusted before the tree is walked again
+TREE_CHECK_INTERVAL = 30.0
+
+# tree_fingerprint results by (root, respect_gitignore, include_hidden), with the time.monotonic() they were taken
+_TREE_VERSIONS: Dict[Tuple[str, bool, bool], Tuple[float, str]] = {}
+
+
+def tree_version(directory: str, respect_gitignore: bool = True, include_hidden: bool = False) -> str:
+    """
+    Return a directory's tree_fingerprint, walking the tree at most once per TREE_CHECK_INTERVAL.
+
+    The manifest cache and ToolCache check their entries against this, so a
+    lookup costs a dictionary access however large the repository is. A
+    change to the tree is seen once the interval has passed, or as soon as
+    invalidate_tree_versions is called, which the agent does at the start of
+    each run.
+
+    Args:
+        directory: Root of the codebase
+        respect_gitignore: Whether to skip files matched by the root .gitignore
+        include_hidden: Whether to include hidden files and directories
+
+    Returns:
+        A hex digest, or "missing" if the directory cannot be read
+    """
+    key = (str(Path(directory).resolve()), respect_gitignore, include_hidden)
+    now = time.monotonic()
+    cached = _TREE_VERSIONS.get(key)
+    if cached is not None and now - cached[0] < TREE_CHECK_INTERVAL:
+        return cached[1]
+    version = tree_fingerprint(key[0], respect_gitignore, include_hidden)
+    _TREE_VERSIONS[key] = (now, version)
+    return version
+
+
+def invalidate_tree_versions(directory: Optional[str] = None) -> None:
+    """
+    Make tree_version walk a tree again on its next call.
+
+    Args:
+        directory: The tree to forget, with every directory beneath it (default: all trees)
+    """
+    if directory is None:
+        _TREE_VERSIONS.clear()
+        return
+    root = str(Path(directory).resolve())
+    for key in list(_TREE_VERSIONS):
+        if key[0] == root or key[0].startswith(root.rstrip(os.sep) + os.sep):
+            _TREE_VERSIONS.pop(key, None)
+
+
+# Binary layout shared by shared-memory segments and memory-mapped manifest files
+MANIFEST_MAGIC = b"TWMANIF1"
+_COLUMN_ALIGNMENT = 8
+
+
+class StringColumn:
+    """
+    Read-only sequence of strings stored as one UTF-8 blob plus an offsets array.
+
+    Used for the string columns of manifests attached from a buffer, so that a
+    worker holds one buffer rather than one str object per file, symbol or term.
+    """
+
+    __slots__ = ("data", "offsets")
+
+    def __init__(self, data: memoryview, offsets: memoryview):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("string column index out of range")
+        return str(self.data[self.offsets[index]:self.offsets[index + 1]], "utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        data, offsets = self.data, self.offsets
+        for i in range(len(self)):
+            yield str(data[offsets[i]:offsets[i + 1]], "utf-8")
+
+
+def _string_columns(name: str, values) -> Dict[str, Any]:
+    """Encode a sequence of strings as a blob column and an offsets column."""
+    offsets = array("Q", [0])
+    data = bytearray()
+    for value in values:
+        data += value.encode("utf-8")
+        offsets.append(len(data))
+    return {f"{name}.data": data, f"{name}.offsets": offsets}
+
+
+def pack_columns(header: Dict[str, Any], columns: Dict[str, Any]) -> bytes:
+    """
+    Lay out named columns in one contiguous buffer.
+
+    The buffer starts with MANIFEST_MAGIC and a length-prefixed JSON header that
+    records the offset, length and type code of every column; the columns follow,
+    each aligned to 8 bytes so that they can be cast in place by unpack_columns.
+
+    Args:
+        header: JSON-serialisable fields stored alongside the column layout
+        columns: Mapping of column name to an array or bytes-like object
+
+    Returns:
+        The packed buffer
+    """
+    layout = {}
+    body = bytearray()
+    for name, column in columns.items():
+        body += b"\0" * (-len(body) % _COLUMN_ALIGNMENT)
+        raw = column.tobytes() if isinstance(column, array) else bytes(column)
+        if isinstance(column, array):
+            typecode = column.typecode
+        else:
+            # Memoryviews of an attached manifest keep the format they were cast to
+            typecode = column.format if isinstance(column, memoryview) else "B"
+        layout[name] = [len(body), len(raw), typecode]
+        body += raw
+
+    header = json.dumps({**header, "byteorder": sys.byteorder, "columns": layout}).encode("utf-8")
+    prefix = MANIFEST_MAGIC + struct.pack("<Q", len(header)) + header
+    prefix += b"\0" * (-len(prefix) % _COLUMN_ALIGNMENT)
+    return bytes(prefix) + bytes(body)
+
+
+def unpack_columns(buffer) -> Tuple[Dict[str, Any], Callable[[str], memoryview]]:
+    """
+    Read the header of a buffer written by pack_columns.
+
+    Returns:
+        tuple: (header, column) where column(name) returns a read-only memoryview
+            of that column cast to its type code, without copying
+    """
+    view = memoryview(buffer).toreadonly()
+    if bytes(view[:len(MANIFEST_MAGIC)]) != MANIFEST_MAGIC:
+        raise ValueError("Buffer does not contain a serialised manifest")
+    header_length = struct.unpack_from("<Q", view, len(MANIFEST_MAGIC))[0]
+    header_start = len(MANIFEST_MAGIC) + 8
+    header = json.loads(bytes(view[header_start:header_start + header_length]))
+    body_start = header_start + header_length
+    body_start += -body_start % _COLUMN_ALIGNMENT
+    if header["byteorder"] != sys.byteorder:
+        raise ValueError("Manifest was written on a machine with a different byte order")
+
+    def column(name: str) -> memoryview:
+        offset, length, typecode = header["columns"][name]
+        raw = view[body_start + offset:body_start + offset + length]
+        return raw if typecode == "B" else raw.cast(typecode)
+
+    return header, column
+
+
+def manifest_to_bytes(manifest: Manifest, include_symbols: bool = True, include_search: bool = False,
+                      metadata: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Serialise a manifest, and optionally its symbol and search indexes, into one buffer.
+
+    Args:
+        manifest: The manifest to serialise
+        include_symbols: Whether to build (if needed) and include the symbol index
+        include_search: Whether to build (if needed) and include the search index
+        metadata: Extra JSON-serialisable fields to record in the header
+
+    Returns:
+        The serialised manifest, readable with manifest_from_buffer
+    """
+    columns: Dict[str, Any] = {}
+    columns.update(_string_columns("directories", manifest.directories))
+    columns.update(_string_columns("extensions", manifest.extensions))
+    columns.update(_string_columns("names", manifest.names))
+    for name in ("dir_ids", "ext_ids", "sizes", "mtimes", "lines", "flags"):
+        columns[name] = getattr(manifest, name)
+    if include_symbols:
+        symbols = manifest.symbols()
+        columns.update(_string_columns("symbols.names", symbols.names))
+        columns["symbols.kinds"] = symbols.kinds
+        columns["symbols.file_rows"] = symbols.file_rows
+        columns["symbols.line_numbers"] = symbols.line_numbers
+    if include_search:
+        search = manifest.search_index()
+        columns.update(_string_columns("search.terms", search.terms))
+        columns["search.offsets"] = search.offsets
+        columns["search.rows"] = search.rows
+    return pack_columns({**(metadata or {}), "root": manifest.root, "rows": len(manifest)}, columns)
+
+
+def manifest_from_buffer(buffer) -> Manifest:
+    """
+    Attach a read-only Manifest to a buffer written by manifest_to_bytes, without copying.
+
+    The numeric columns become memoryviews cast into the buffer and the string
+    columns become StringColumns over it, so the caller must keep the buffer
+    alive (and unchanged) for as long as the manifest is used.
+
+    Args:
+        buffer: Any object supporting the buffer protocol, e.g. SharedMemory.buf or an mmap
+
+    Returns:
+        A Manifest whose columns are views into the buffer
+    """
+    header, column = unpack_columns(buffer)
+
+    def strings(name: str) -> StringColumn:
+        return StringColumn(column(f"{name}.data"), column(f"{name}.offsets"))
+
+    manifest = Manifest(header["root"])
+    manifest.directories = list(strings("directories"))
+    manifest.extensions = list(strings("extensions"))
+    manifest._dir_lookup = {d: i for i, d in enumerate(manifest.directories)}
+    manifest._ext_lookup = {e: i for i, e in enumerate(manifest.extensions)}
+    manifest.names = strings("names")
+    for name in ("dir_ids", "ext_ids", "sizes", "mtimes", "lines", "flags"):
+        setattr(manifest, name, column(name))
+
+    if "symbols.kinds" in header["columns"]:
+        symbols = SymbolIndex()
+        symbols.names = strings("symbols.names")
+        symbols.kinds = column("symbols.kinds")
+        symbols.file_rows = column("symbols.file_rows")
+        symbols.line_numbers = column("symbols.line_numbers")
+        manifest._symbols = symbols
+    if "search.rows" in header["columns"]:
+        search = SearchIndex()
+        search.terms = strings("search.terms")
+        search.offsets = column("search.offsets")
+        search.rows = column("search.rows")
+        manifest._search = search
+    return manifest
+
+
+# Manifests by root, with the tree_version of the tree they were built from
+_MANIFEST_CACHE: Dict[str, Tuple[str, Manifest]] = {}
+
+
+def get_manifest(directory: str, refresh: bool = False) -> Manifest:
+    """
+    Return the manifest for a directory, building it on first use.
+
+    The cached manifest is reused only while the tree's version (see
+    tree_version) is unchanged, so a file added, removed or rewritten since
+    it was built makes it be rebuilt. The version is itself cached, so a
+    query over the cached manifest does not walk the tree.
+
+    Args:
+        directory: Root of the codebase
+        refresh: Whether to rebuild the manifest even if one is cached
+
+    Returns:
+        The cached or newly built Manifest
+    """
+    key = str(Path(directory).resolve())
+    if refresh:
+        invalidate_tree_versions(key)
+    tree = tree_version(key)
+    cached = _MANIFEST_CACHE.get(key)
+    if refresh or cached is None or cached[0] != tree:
+        _MANIFEST_CACHE[key] = (tree, build_manifest(key))
+    return _MANIFEST_CACHE[key][1]
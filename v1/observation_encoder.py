@@ -0,0 +1,241 @@
+"""
+Compact encodings of tool results for the tech writer agents.
+
+Tool results used to be sent to the LLM as JSON indented by two spaces,
+with every path absolute. In listings, the indentation and the repeated
+base directory make up a large share of the tokens. An observation can be
+encoded as:
+
+- "pretty": indented JSON, as before, with absolute paths;
+- "json": JSON without whitespace, with paths under the base directory
+  made relative to it;
+- "paths": as "json", but lists of paths are grouped by directory, e.g.
+  {"src/api/": ["app.py", "routes.py"]}, when that is shorter;
+- "lines": one "key: value" line per field, lists one item per line,
+  lists of records as tab-separated tables under a header line, and
+  multi-line text (e.g. file contents) raw rather than escaped.
+
+Each tool has an encoding in the tool registry, and it can be changed per
+tool. ObservationEncoder encodes each result and also estimates the tokens
+"pretty" would have taken, so the saving is measured on every run. Tools
+are given relative paths back: resolve_path joins them to the base directory.
+"""
+
+import json
+import logging
+import os
+from collections import defaultdict
+from pathlib import PurePath
+from typing import Any, Dict, List, Optional
+
+from token_estimator import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+ENCODINGS = ["pretty", "json", "paths", "lines"]
+DEFAULT_ENCODING = "json"
+
+# Shortest list of paths worth grouping by directory
+MIN_FACTORED_PATHS = 3
+
+
+def compact_json(value: Any) -> str:
+    """Serialise a value as JSON without whitespace; paths and other objects json cannot serialise become strings."""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def resolve_path(value: Any, base: Optional[str]) -> Any:
+    """
+    Resolve a relative path argument against the base directory.
+
+    Every relative path is joined to the base directory, whether or not it
+    exists there, so paths from encoded results can be passed back to tools
+    as they are and never open a file in the agent's own working directory.
+
+    Args:
+        value: A tool argument that holds a path
+        base: The base directory of the codebase
+
+    Returns:
+        The path to use
+    """
+    if not base or not isinstance(value, str) or not value or os.path.isabs(value):
+        return value
+    return os.path.normpath(os.path.join(base, value))
+
+
+class ObservationEncoder:
+    """
+    Encodes the tool results of one run and measures the tokens it saves.
+    """
+
+    def __init__(self, encodings: Optional[Dict[str, str]] = None):
+        """
+        Initialise the encoder.
+
+        Args:
+            encodings: Encodings by tool name, overriding the tools' own; "*" overrides every tool's
+
+        Raises:
+            ValueError: If an encoding is unknown
+        """
+        self.encodings = dict(encodings or {})
+        for tool_name, encoding in self.encodings.items():
+            if encoding not in ENCODINGS:
+                raise ValueError(f"Unknown encoding {encoding!r} for {tool_name}. Use one of {ENCODINGS}.")
+        self.reset()
+
+    def reset(self, base: Optional[str] = None) -> None:
+        """
+        Start a run on a codebase.
+
+        Args:
+            base: The base directory, which paths in results are made relative to
+        """
+        self.prefixes: List[str] = []
+        if base:
+            for prefix in (os.path.realpath(base), os.path.abspath(base), os.path.normpath(base)):
+                prefix = prefix.rstrip(os.sep) + os.sep
+                if prefix != "." + os.sep and prefix not in self.prefixes:
+                    self.prefixes.append(prefix)
+        self.counts: Dict[str, Dict[str, Any]] = defaultdict(lambda: {"observations": 0, "tokens": 0,
+                                                                      "baseline_tokens": 0})
+
+    def relativise(self, value: Any) -> Any:
+        """Return a result with paths under the base directory made relative to it; the base itself is kept."""
+        if isinstance(value, PurePath):
+            value = str(value)
+        if isinstance(value, str):
+            if "\n" not in value:
+                for prefix in self.prefixes:
+                    if value.startswith(prefix):
+                        return value[len(prefix):].replace(os.sep, "/")
+            return value
+        if isinstance(value, dict):
+            return {key: self.relativise(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.relativise(item) for item in value]
+        return value
+
+    def encoding(self, tool_name: str, default: str = DEFAULT_ENCODING) -> str:
+        """Return the encoding used for a tool: its override, the override for all tools, or the tool's own."""
+        return self.encodings.get(tool_name, self.encodings.get("*", default))
+
+    def encode(self, tool_name: str, result: Any, default: str = DEFAULT_ENCODING) -> str:
+        """
+        Encode a tool result and record its estimated tokens against those of "pretty".
+
+        Args:
+            tool_name: The tool that returned the result
+            result: The result
+            default: The tool's own encoding, used unless it is overridden
+
+        Returns:
+            The observation for the LLM
+        """
+        encoding = self.encoding(tool_name, default)
+        baseline = json.dumps(result, indent=2, default=str)
+        if encoding == "pretty":
+            observation = baseline
+        else:
+            value = self.relativise(result)
+            if encoding == "paths":
+                observation = compact_json(factor_paths(value))
+            elif encoding == "lines":
+                observation = encode_lines(value)
+            else:
+                observation = compact_json(value)
+        counts = self.counts[tool_name]
+        counts["encoding"] = encoding
+        counts["observations"] += 1
+        counts["tokens"] += estimate_tokens(observation)
+        counts["baseline_tokens"] += estimate_tokens(baseline)
+        return observation
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the observations, estimated tokens and tokens saved against "pretty", in total and per tool."""
+        tools = {}
+        for tool_name, counts in self.counts.items():
+            tools[tool_name] = {**counts, "tokens_saved": counts["baseline_tokens"] - counts["tokens"]}
+        tokens = sum(counts["tokens"] for counts in tools.values())
+        baseline = sum(counts["baseline_tokens"] for counts in tools.values())
+        return {
+            "tokens": tokens,
+            "baseline_tokens": baseline,
+            "tokens_saved": baseline - tokens,
+            "saving": round((baseline - tokens) / baseline, 3) if baseline else 0.0,
+            "tools": tools,
+        }
+
+
+def factor_paths(value: Any) -> Any:
+    """
+    Group lists of paths in a result by directory, where that makes them shorter.
+
+    ["src/a.py", "src/b.py", "README.md"] becomes {"src/": ["a.py", "b.py"], "./": ["README.md"]}.
+    """
+    if isinstance(value, dict):
+        return {key: factor_paths(item) for key, item in value.items()}
+    if not isinstance(value, list):
+        return value
+    if len(value) < MIN_FACTORED_PATHS or not all(isinstance(item, str) and "\n" not in item for item in value):
+        return [factor_paths(item) for item in value]
+    groups: Dict[str, List[str]] = {}
+    for path in value:
+        directory, _, name = path.rpartition("/")
+        groups.setdefault(f"{directory}/" if directory else "./", []).append(name)
+    if len(groups) == len(value) or len(compact_json(groups)) >= len(compact_json(value)):
+        return value
+    return groups
+
+
+def _scalar(value: Any) -> bool:
+    return value is None or isinstance(value, (bool, int, float)) or (isinstance(value, str) and "\n" not in value)
+
+
+def _text(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    return compact_json(value)
+
+
+def _table(rows: List[Dict[str, Any]]) -> Optional[List[str]]:
+    """Render records with the same scalar fields as a header line and tab-separated rows, or None."""
+    columns = list(rows[0])
+    if not all(isinstance(row, dict) and list(row) == columns and all(map(_scalar, row.values())) for row in rows):
+        return None
+    return ["\t".join(columns)] + ["\t".join(_text(row[column]) for column in columns) for row in rows]
+
+
+def _lines(key: str, value: Any) -> List[str]:
+    label = f"{key}: " if key else ""
+    if _scalar(value):
+        return [f"{label}{_text(value)}"]
+    if isinstance(value, str):
+        return [f"{key}:", value] if key else [value]
+    if isinstance(value, list):
+        header = [f"{key} ({len(value)}):"] if key else []
+        if not value:
+            return [f"{label}[]"]
+        if all(map(_scalar, value)):
+            return header + [_text(item) for item in value]
+        if isinstance(value[0], dict):
+            table = _table(value)
+            if table is not None:
+                return header + table
+    if isinstance(value, dict) and value and all(map(_scalar, value.values())):
+        return [label + ", ".join(f"{k}={_text(v)}" for k, v in value.items())]
+    return [f"{label}{compact_json(value)}"]
+
+
+def encode_lines(value: Any) -> str:
+    """
+    Encode a result in the line-oriented format.
+
+    Fields of an object come one per line, those with multi-line text last,
+    since the text follows its key's line raw.
+    """
+    if isinstance(value, dict):
+        items = sorted(value.items(), key=lambda item: isinstance(item[1], str) and "\n" in item[1])
+        return "\n".join(line for key, item in items for line in _lines(str(key), item))
+    return "\n".join(_lines("", value))
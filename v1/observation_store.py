@@ -0,0 +1,232 @@
+"""
+Out-of-band storage for large tool observations.
+
+A tool result goes into the agent's memory and is re-sent on every later LLM
+call, so one large file read costs its full size for the rest of the run.
+ObservationStore keeps large observations outside the conversation instead:
+the model receives a handle, the size of the result and a short preview,
+and pages through the full text with the fetch_observation tool when it
+needs it. Handles are derived from a hash of the content, so the same
+result stored twice (the same file read again, say) gets the same handle
+and is kept once.
+
+Given the run's TranscriptStore, the store spills each text to the
+transcript as it is stored and keeps only its byte offset, reading pages
+back from disk, so large observations are not held in memory at all; the
+texts of a store without a transcript (or whose transcript cannot be
+written) stay in memory, and are counted in its resident_chars.
+
+A store belongs to one agent run; TechWriterAgent resets it with the rest
+of its memory.
+"""
+
+import hashlib
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from context_budget import outline
+from observation_encoder import compact_json
+
+# Observations longer than this many characters are stored out of band
+DEFAULT_STORE_THRESHOLD = 6000
+DEFAULT_PREVIEW_CHARS = 600
+# Largest page fetch_observation returns
+MAX_FETCH_LENGTH = 6000
+
+HANDLE_PREFIX = "obs-"
+
+
+def fetch_observation(handle: str, offset: int = 0, length: int = 4000) -> Dict[str, Any]:
+    """
+    Fetch part of a large tool result that was stored out of band.
+
+    Large results are replaced in the conversation by a handle, their size
+    and a preview. Use this to read the stored text, a page at a time.
+
+    Args:
+        handle: The handle of the stored result, e.g. obs-1a2b3c4d5e6f
+        offset: Character offset to start reading from
+        length: Number of characters to read (at most 6000)
+
+    Returns:
+        The requested text and the offset of the next page
+    """
+    # The agent serves this tool from its own ObservationStore; this function
+    # only provides the schema when there is no store to read from
+    return {"error": "No observation store is available in this context"}
+
+
+class ObservationStore:
+    """
+    Per-run store of large tool observations, addressed by content hash.
+    """
+
+    def __init__(self, threshold: int = DEFAULT_STORE_THRESHOLD, preview_chars: int = DEFAULT_PREVIEW_CHARS,
+                 transcript: Any = None):
+        """
+        Initialise the store.
+
+        Args:
+            threshold: Observations longer than this many characters are stored (0 disables the store)
+            preview_chars: Characters of each stored observation shown in the conversation
+            transcript: The run's TranscriptStore, to spill texts to with append_observation and read
+                them back with read_observation (None: keep them in memory)
+        """
+        self.threshold = threshold
+        self.preview_chars = preview_chars
+        self.transcript = transcript
+        self._lock = threading.Lock()  # Tool calls of one step offload their results from worker threads
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop every stored observation and the statistics, for a new run."""
+        self._texts: Dict[str, str] = {}
+        self._spilled: Dict[str, int] = {}  # Handle -> byte offset in the transcript
+        self.stored = 0
+        self.deduplicated = 0
+        self.fetches = 0
+        self.chars_kept_out = 0
+        self.resident_chars = 0
+
+    def __len__(self) -> int:
+        return len(self._texts) + len(self._spilled)
+
+    def __contains__(self, handle: str) -> bool:
+        return handle in self._texts or handle in self._spilled
+
+    def put(self, text: str) -> str:
+        """
+        Store a text and return its handle; storing the same text again returns the same handle.
+
+        Args:
+            text: The text to store
+
+        Returns:
+            The handle of the text
+        """
+        handle = HANDLE_PREFIX + hashlib.sha1(text.encode("utf-8", "replace")).hexdigest()[:12]
+        with self._lock:
+            if handle in self:
+                self.deduplicated += 1
+                return handle
+            offset = self.transcript.append_observation(handle, text) if self.transcript is not None else None
+            if offset is None:
+                self._texts[handle] = text
+                self.resident_chars += len(text)
+            else:
+                self._spilled[handle] = offset
+            self.stored += 1
+        return handle
+
+    def restore(self, spilled: List[Tuple[str, int]]) -> None:
+        """
+        Register observations a resumed run had already spilled to its transcript.
+
+        Args:
+            spilled: The handle and byte offset of each observation (see transcript_store.load_checkpoint)
+        """
+        for handle, offset in spilled:
+            if handle not in self:
+                self._spilled[handle] = offset
+                self.stored += 1
+
+    def offload(self, observation: str, tool_name: str, result: Any = None) -> str:
+        """
+        Return what the conversation should hold for a tool observation.
+
+        Observations at or under the threshold are returned unchanged. Larger
+        ones are stored and replaced by a reference, as compact JSON: the
+        handle, the size, a preview and, for code, an outline of its
+        definitions. When the tool's result is a dict with a "content" string
+        (a read_file result), only that string is stored and the other fields
+        are shown in full, so fetched pages are plain text whatever encoding
+        the observation was given.
+
+        Args:
+            observation: The tool observation as sent to the LLM
+            tool_name: The tool that produced it
+            result: The result the observation was encoded from (default: the
+                observation parsed as JSON, if it is JSON)
+
+        Returns:
+            The observation or its reference
+        """
+        if not self.threshold or observation is None or len(observation) <= self.threshold:
+            return observation
+
+        text, fields, data = observation, {}, result
+        if data is None:
+            try:
+                data = json.loads(observation)
+            except ValueError:
+                data = None
+        if isinstance(data, dict) and isinstance(data.get("content"), str):
+            text = data["content"]
+            fields = {key: value for key, value in data.items() if key != "content"}
+
+        handle = self.put(text)
+        with self._lock:
+            self.chars_kept_out += len(observation)
+        reference = {
+            "stored_observation": handle,
+            "tool": tool_name,
+            "total_chars": len(text),
+            "total_lines": text.count("\n") + 1,
+            **fields,
+            "preview": text[:self.preview_chars],
+        }
+        code_outline = outline(text)
+        if code_outline:
+            reference["outline"] = code_outline
+        reference["note"] = (f"The full result is stored out of band. "
+                             f"Call fetch_observation with handle {handle} to read it.")
+        return compact_json(reference)
+
+    def fetch(self, handle: str, offset: int = 0, length: int = 4000) -> Dict[str, Any]:
+        """
+        Return a page of a stored observation.
+
+        Args:
+            handle: The handle returned when the observation was stored
+            offset: Character offset to start reading from
+            length: Number of characters to read, capped at MAX_FETCH_LENGTH
+
+        Returns:
+            The page with its offsets, or an error dictionary
+        """
+        if handle not in self:
+            return {"error": f"Unknown observation handle: {handle}"}
+        if offset < 0 or length <= 0:
+            return {"error": "offset must be non-negative and length positive"}
+        text: Optional[str] = self._texts.get(handle)
+        if text is None:
+            text = self.transcript.read_observation(self._spilled[handle]) if self.transcript is not None else None
+            if text is None:
+                return {"error": f"Could not read observation {handle} back from the transcript"}
+        self.fetches += 1
+        end = min(offset + min(length, MAX_FETCH_LENGTH), len(text))
+        return {
+            "handle": handle,
+            "offset": offset,
+            "end": end,
+            "total_chars": len(text),
+            "content": text[offset:end],
+            "next_offset": end if end < len(text) else None,
+        }
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the store statistics for the current run.
+
+        resident_chars is the text of the stored observations held in memory,
+        that is, of those that were not spilled to the transcript.
+        """
+        return {
+            "observations_stored": self.stored,
+            "observations_deduplicated": self.deduplicated,
+            "observations_spilled": len(self._spilled),
+            "fetches": self.fetches,
+            "chars_kept_out": self.chars_kept_out,
+            "resident_chars": self.resident_chars,
+        }
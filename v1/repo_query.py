@@ -0,0 +1,322 @@
+"""
+Repository query tool for the tech writer agent.
+
+This module answers quantitative questions about a codebase (how many files,
+how many bytes or lines, which files are largest, how many classes) in a
+single tool call. Queries run column by column over the array-backed
+manifest and symbol index from manifest.py, so no per-file objects are
+created while filtering, grouping or aggregating.
+
+A query can also fan out over several manifests, such as the unmerged
+segments of segments.py; per-manifest results are combined so that the
+answer is the same as querying one merged manifest.
+"""
+
+import fnmatch
+import heapq
+import operator
+import re
+from collections import Counter
+from itertools import compress
+from typing import Any, Callable, Dict, List, Sequence
+
+from manifest import FLAG_BINARY, SYMBOL_KINDS, Manifest, get_manifest
+
+FILE_AGGREGATES = ["count", "bytes", "loc"]
+FILE_GROUPS = ["extension", "language", "directory", "top_directory"]
+SYMBOL_GROUPS = ["kind", "language", "file", "directory", "top_directory"]
+
+
+def _and(mask: bytearray, other) -> bytearray:
+    """Combine a row mask with another iterable of truth values."""
+    return bytearray(map(operator.and_, mask, map(bool, other)))
+
+
+def _split_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _directory_labels(manifest: Manifest) -> List[str]:
+    """Return a display label for each interned directory id."""
+    return [d[:-1] or "." for d in manifest.directories]
+
+
+def _top_directory_labels(manifest: Manifest) -> List[str]:
+    """Return the top-level directory label for each interned directory id."""
+    return [d.split("/", 1)[0] if d else "." for d in manifest.directories]
+
+
+def _file_mask(manifest: Manifest, pattern: str, language: str, path_prefix: str,
+               min_bytes: int, include_binary: bool) -> bytearray:
+    """Build the row mask for the file filters."""
+    mask = manifest.name_mask(pattern)
+    if language:
+        wanted = language.lower()
+        allowed = {i for i, lang in enumerate(manifest.languages()) if lang.lower() == wanted}
+        mask = _and(mask, map(allowed.__contains__, manifest.ext_ids))
+    if path_prefix:
+        mask = _and(mask, manifest.directory_mask(path_prefix))
+    if min_bytes:
+        mask = _and(mask, map(min_bytes.__le__, manifest.sizes))
+    if not include_binary:
+        mask = _and(mask, map(operator.not_, manifest.flag_mask(FLAG_BINARY)))
+    return mask
+
+
+def _group_rows(keys: Sequence, mask: bytearray, columns: Dict[str, Sequence],
+                label: Callable[[Any], str]) -> List[Dict[str, Any]]:
+    """Aggregate the masked rows of each column by key, returning every group."""
+    selected_keys = list(compress(keys, mask))
+    counts = Counter(selected_keys)
+    totals = {name: dict.fromkeys(counts, 0) for name in columns}
+    for name, column in columns.items():
+        column_totals = totals[name]
+        for key, value in zip(selected_keys, compress(column, mask)):
+            column_totals[key] += value
+
+    groups = []
+    for key, count in counts.items():
+        group = {"key": label(key), "count": count}
+        for name in columns:
+            group[name] = totals[name][key]
+        groups.append(group)
+    return groups
+
+
+def _merge_groups(group_lists: List[List[Dict[str, Any]]], max_groups: int) -> List[Dict[str, Any]]:
+    """Combine the groups of several manifests by label, largest first."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for groups in group_lists:
+        for group in groups:
+            existing = merged.get(group["key"])
+            if existing is None:
+                merged[group["key"]] = dict(group)
+            else:
+                for name, value in group.items():
+                    if name != "key":
+                        existing[name] += value
+    ordered = sorted(merged.values(), key=lambda g: (-g["count"], g["key"]))
+    return ordered[:max_groups] if max_groups else ordered
+
+
+def _query_files(manifest: Manifest, pattern: str, language: str, path_prefix: str,
+                 min_bytes: int, include_binary: bool, group_by: str, aggregates: List[str],
+                 largest: int, largest_by: str) -> Dict[str, Any]:
+    mask = _file_mask(manifest, pattern, language, path_prefix, min_bytes, include_binary)
+    sum_columns = {"bytes": manifest.sizes, "loc": manifest.lines}
+    columns = {name: sum_columns[name] for name in aggregates if name in sum_columns}
+
+    result: Dict[str, Any] = {"totals": {}}
+    if "count" in aggregates:
+        result["totals"]["count"] = sum(mask)
+    for name, column in columns.items():
+        result["totals"][name] = sum(compress(column, mask))
+
+    if group_by:
+        languages = manifest.languages()
+        if group_by == "extension":
+            keys, label = manifest.ext_ids, lambda k: manifest.extensions[k] or "(none)"
+        elif group_by == "language":
+            keys, label = [languages[e] for e in manifest.ext_ids], str
+        elif group_by == "directory":
+            keys, label = manifest.dir_ids, _directory_labels(manifest).__getitem__
+        else:
+            top_labels = _top_directory_labels(manifest)
+            keys, label = list(map(top_labels.__getitem__, manifest.dir_ids)), str
+        result["groups"] = _group_rows(keys, mask, columns, label)
+
+    if largest:
+        rank_column = manifest.lines if largest_by == "loc" else manifest.sizes
+        rows = heapq.nlargest(largest, compress(range(len(manifest)), mask), key=rank_column.__getitem__)
+        result["largest"] = [
+            {"path": manifest.path(row), "bytes": manifest.sizes[row], "loc": manifest.lines[row]}
+            for row in rows
+        ]
+    return result
+
+
+def _query_symbols(manifest: Manifest, pattern: str, language: str, path_prefix: str,
+                   symbol_kind: str, group_by: str) -> Dict[str, Any]:
+    index = manifest.symbols()
+    if pattern in ("", "*"):
+        mask = bytearray(b"\x01") * len(index)
+    else:
+        match = re.compile(fnmatch.translate(pattern)).match
+        mask = bytearray(map(bool, map(match, index.names)))
+
+    file_mask = _file_mask(manifest, "*", language, path_prefix, 0, True)
+    if language or path_prefix:
+        mask = _and(mask, map(file_mask.__getitem__, index.file_rows))
+    if symbol_kind:
+        kind_id = SYMBOL_KINDS.index(symbol_kind)
+        mask = _and(mask, map(kind_id.__eq__, index.kinds))
+
+    result: Dict[str, Any] = {
+        "totals": {
+            "count": sum(mask),
+            "files": len(set(compress(index.file_rows, mask))),
+        }
+    }
+
+    if group_by:
+        file_dirs = list(map(manifest.dir_ids.__getitem__, index.file_rows))
+        if group_by == "kind":
+            keys, label = index.kinds, SYMBOL_KINDS.__getitem__
+        elif group_by == "language":
+            languages = manifest.languages()
+            keys, label = [languages[manifest.ext_ids[r]] for r in index.file_rows], str
+        elif group_by == "file":
+            keys, label = index.file_rows, manifest.path
+        elif group_by == "directory":
+            keys, label = file_dirs, _directory_labels(manifest).__getitem__
+        else:
+            top_labels = _top_directory_labels(manifest)
+            keys, label = list(map(top_labels.__getitem__, file_dirs)), str
+        result["groups"] = _group_rows(keys, mask, {}, label)
+    return result
+
+
+def query_manifests(
+    manifests: List[Manifest],
+    target: str = "files",
+    pattern: str = "*",
+    language: str = "",
+    path_prefix: str = "",
+    min_bytes: int = 0,
+    include_binary: bool = True,
+    symbol_kind: str = "",
+    group_by: str = "",
+    aggregates: List[str] = FILE_AGGREGATES,
+    largest: int = 0,
+    largest_by: str = "bytes",
+    max_groups: int = 50
+) -> Dict[str, Any]:
+    """
+    Run one query over each of several manifests of disjoint files and combine the results.
+
+    Totals are summed, groups are combined by label and ranked again, and the
+    largest files are merged, so the result matches a query of the merged manifest.
+    Arguments are as for query_repo, except that aggregates is a list and is not validated.
+    """
+    results = []
+    for manifest in manifests:
+        if target == "files":
+            results.append(_query_files(manifest, pattern, language, path_prefix, min_bytes, include_binary,
+                                        group_by, aggregates, largest, largest_by))
+        else:
+            results.append(_query_symbols(manifest, pattern, language, path_prefix, symbol_kind, group_by))
+
+    combined: Dict[str, Any] = {"totals": Counter()}
+    for result in results:
+        combined["totals"].update(result["totals"])
+    combined["totals"] = dict(combined["totals"])
+    if group_by:
+        combined["groups"] = _merge_groups([result["groups"] for result in results], max_groups)
+    if target == "files" and largest:
+        rank = "loc" if largest_by == "loc" else "bytes"
+        candidates = [f for result in results for f in result["largest"]]
+        combined["largest"] = heapq.nlargest(largest, candidates, key=lambda f: f[rank])
+    return combined
+
+
+def query_repo(
+    directory: str,
+    target: str = "files",
+    pattern: str = "*",
+    language: str = "",
+    path_prefix: str = "",
+    min_bytes: int = 0,
+    include_binary: bool = True,
+    symbol_kind: str = "",
+    group_by: str = "",
+    aggregates: str = "count,bytes,loc",
+    largest: int = 0,
+    largest_by: str = "bytes",
+    max_groups: int = 50
+) -> Dict[str, Any]:
+    """
+    Answer counting and sizing questions about a codebase exactly, in one call.
+
+    Use this instead of listing files and counting them yourself. Files that are
+    hidden or matched by .gitignore are excluded, as with find_all_matching_files.
+
+    Args:
+        directory: Root directory of the codebase
+        target: What to query, either "files" or "symbols" (functions, classes and methods)
+        pattern: Glob matched against file names (or symbol names when target is "symbols"), e.g. "*.py"
+        language: Only include files in this language, e.g. "Python" or "TypeScript"
+        path_prefix: Only include files under this relative directory, e.g. "src/api"
+        min_bytes: Only include files at least this many bytes long
+        include_binary: Whether to include binary files when target is "files"
+        symbol_kind: Only include symbols of this kind: "function", "class" or "method"
+        group_by: Group results by "extension", "language", "directory" or "top_directory" (files), or by "kind", "language", "file", "directory" or "top_directory" (symbols)
+        aggregates: Comma-separated aggregates to compute for files: any of "count", "bytes" and "loc"
+        largest: Also return this many of the largest matching files
+        largest_by: Rank the largest files by "bytes" or "loc"
+        max_groups: Maximum number of groups to return, largest first
+
+    Returns:
+        Dictionary with totals, and groups and largest files when requested
+    """
+    try:
+        if target not in ("files", "symbols"):
+            return {"error": f"Unknown target: {target}. Use 'files' or 'symbols'."}
+        valid_groups = FILE_GROUPS if target == "files" else SYMBOL_GROUPS
+        if group_by and group_by not in valid_groups:
+            return {"error": f"Unknown group_by for {target}: {group_by}. Use one of {valid_groups}."}
+        if symbol_kind and symbol_kind not in SYMBOL_KINDS:
+            return {"error": f"Unknown symbol_kind: {symbol_kind}. Use one of {SYMBOL_KINDS}."}
+        aggregate_list = _split_list(aggregates) or ["count"]
+        unknown = [name for name in aggregate_list if name not in FILE_AGGREGATES]
+        if unknown:
+            return {"error": f"Unknown aggregates: {unknown}. Use any of {FILE_AGGREGATES}."}
+        if largest_by not in ("bytes", "loc"):
+            return {"error": f"Unknown largest_by: {largest_by}. Use 'bytes' or 'loc'."}
+
+        manifest = get_manifest(directory)
+        result = query_manifests([manifest], target, pattern, language, path_prefix, min_bytes, include_binary,
+                                 symbol_kind, group_by, aggregate_list, largest, largest_by, max_groups)
+        return {"directory": manifest.root, "target": target, **result}
+    except FileNotFoundError as e:
+        return {"error": f"Directory not found: {str(e)}"}
+    except Exception as e:
+        return {"error": f"Unexpected error querying repository: {str(e)}"}
+
+
+def search_code(directory: str, terms: str, path_prefix: str = "", max_results: int = 50) -> Dict[str, Any]:
+    """
+    Find the files that mention every one of a set of identifiers.
+
+    Looks the identifiers up in a prebuilt index of the codebase instead of
+    reading files, so use it to locate where something is defined or used
+    before reading those files.
+
+    Args:
+        directory: Root directory of the codebase
+        terms: Comma- or space-separated identifiers to look for, e.g. "parse_args, config"; matching ignores case and needs whole identifiers of at least 3 characters
+        path_prefix: Only include files under this relative directory, e.g. "src/api"
+        max_results: Maximum number of file paths to return
+
+    Returns:
+        Dictionary with the total number of matching files and their paths
+    """
+    try:
+        term_list = [t.lower() for t in re.split(r"[\s,]+", terms) if t]
+        if not term_list:
+            return {"error": "No search terms given"}
+        manifest = get_manifest(directory)
+        rows = manifest.search_index().search(term_list)
+        if path_prefix:
+            in_prefix = manifest.directory_mask(path_prefix)
+            rows = [row for row in rows if in_prefix[row]]
+        paths = sorted(map(manifest.path, rows))
+        return {
+            "directory": manifest.root,
+            "terms": term_list,
+            "total": len(paths),
+            "files": paths[:max_results] if max_results else paths,
+        }
+    except FileNotFoundError as e:
+        return {"error": f"Directory not found: {str(e)}"}
+    except Exception as e:
+        return {"error": f"Unexpected error searching code: {str(e)}"}
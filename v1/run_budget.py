@@ -0,0 +1,269 @@
+"""
+Adaptive step, token and time budgets for the tech writer agents.
+
+A three-file repository and a monorepo used to get the same 15 steps, and a
+run that used them all up returned nothing. Before a run, profile_repo
+reads the repository's size and language mix from its manifest, and
+plan_budget derives from it:
+
+- a step budget that grows with the logarithm of the number of source
+  files and with the number of languages, and is never below the former
+  15 steps (MIN_STEPS), so small repositories lose nothing;
+- a token budget for the whole run, of the step budget times the context
+  budget, since each step re-sends at most that much.
+
+The manifest is the one the query tools use, so profiling adds nothing
+once it is cached; the first profile of a repository pays for building it,
+which reads every file, and records the seconds it took. There is no
+wall-clock budget unless one is given: a limit on time is a property of
+the job rather than the repository, and a deadline (below) serves jobs
+with a hard time limit better.
+
+Any of them can be overridden. RunBudget then tracks the run against its
+budgets, and when the next step is the last one, or the tokens or time
+spent reach FINALISE_FRACTION of their budgets, the agent's next LLM call
+forbids tool calls and asks for the best answer it can give from what it
+has found, rather than failing with nothing.
+
+A run can also have a deadline, a wall-clock time (time.time()) by which
+it must have finished, e.g. a job's hard time limit. Before each step the
+next step is estimated to take as long as the slowest of the last few,
+and the final answer as long as the slowest recent LLM call; if both will
+not fit in the time left, with DEADLINE_MARGIN to spare for saving the
+result, the agent asks for the final answer now.
+"""
+
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from context_budget import DEFAULT_CONTEXT_BUDGET
+from manifest import FLAG_BINARY, FLAG_HIDDEN, get_manifest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_STEPS = 15
+# Steps planned before the growth with size and languages, and the bounds of the result
+BASE_STEPS = 8
+MIN_STEPS = 15
+MAX_STEPS = 40
+
+# Share of the token or time budget spent at which the agent is asked to finish
+FINALISE_FRACTION = 0.9
+
+# Seconds before a deadline kept free for saving the result
+DEADLINE_MARGIN = 5.0
+# Recent steps and LLM calls the time of the next ones is estimated from
+RECENT_STEPS = 3
+
+# Languages that are documentation or data rather than source code
+NON_SOURCE_LANGUAGES = {"Markdown", "JSON", "YAML", "TOML", "Text", "Other"}
+
+FINALISE_REASONS = {
+    "steps": "this is your last step",
+    "tokens": "the token budget for this analysis is nearly used up",
+    "time": "the time allowed for this analysis is nearly used up",
+    "deadline": "the deadline for this analysis is close",
+}
+
+
+def finalise_instruction(reason: str) -> str:
+    """Return the instruction for the final turn of a run whose budget has run out for a reason."""
+    return (f"Budget: {FINALISE_REASONS[reason]}. Do not call any more tools. Write the final answer now from "
+            "what you have found so far, and say briefly which parts of the analysis are incomplete.")
+
+
+def profile_repo(directory: str) -> Optional[Dict[str, Any]]:
+    """
+    Profile a repository from its manifest.
+
+    Args:
+        directory: Root of the codebase
+
+    Returns:
+        Counts of files, source files, lines, source lines and bytes, the lines and
+        files per language (largest first) and the seconds the profile took, or
+        None if the directory cannot be read
+    """
+    start = time.perf_counter()
+    try:
+        manifest = get_manifest(directory)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not profile {directory}: {e}")
+        return None
+    languages = manifest.languages()
+    per_language: Dict[str, Dict[str, int]] = {}
+    files = lines = 0
+    for ext_id, line_count, flags in zip(manifest.ext_ids, manifest.lines, manifest.flags):
+        if flags & (FLAG_BINARY | FLAG_HIDDEN):
+            continue
+        counts = per_language.setdefault(languages[ext_id], {"files": 0, "lines": 0})
+        counts["files"] += 1
+        counts["lines"] += line_count
+        files += 1
+        lines += line_count
+    source = {name: counts for name, counts in per_language.items() if name not in NON_SOURCE_LANGUAGES}
+    return {
+        "files": files,
+        "source_files": sum(counts["files"] for counts in source.values()),
+        "lines": lines,
+        "source_lines": sum(counts["lines"] for counts in source.values()),
+        "bytes": sum(manifest.sizes),
+        "languages": dict(sorted(per_language.items(), key=lambda item: -item[1]["lines"])),
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+
+
+class RunBudget:
+    """
+    Step, token and time budgets of one run, and what the run has spent of them.
+    """
+
+    def __init__(self, max_steps: int = DEFAULT_MAX_STEPS, max_tokens: Optional[int] = None,
+                 max_seconds: Optional[float] = None, deadline: Optional[float] = None):
+        """
+        Initialise the budget.
+
+        Args:
+            max_steps: LLM calls allowed
+            max_tokens: Prompt and completion tokens allowed over the run (None: no limit)
+            max_seconds: Wall-clock seconds allowed (None: no limit)
+            deadline: time.time() by which the run must have finished (None: no deadline)
+        """
+        self.max_steps = max_steps
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.deadline = deadline
+        self.start()
+
+    def start(self) -> None:
+        """Start spending, at the beginning of a run."""
+        self.started = time.monotonic()
+        self.steps = 0
+        self.tokens = 0
+        self.finalised: Optional[str] = None
+        self.step_seconds = deque(maxlen=RECENT_STEPS)
+        self.llm_seconds = deque(maxlen=RECENT_STEPS)
+        self._step_started: Optional[float] = None
+        self.deadline_missed = False
+
+    def spent(self) -> Dict[str, Any]:
+        """Return what the run has spent so far, for a checkpoint."""
+        return {"steps": self.steps, "tokens": self.tokens, "seconds": round(time.monotonic() - self.started, 3)}
+
+    def resume(self, spent: Dict[str, Any]) -> None:
+        """Carry on from what a run spent before it was interrupted (see spent)."""
+        self.steps = spent.get("steps", 0)
+        self.tokens = spent.get("tokens", 0)
+        self.started = time.monotonic() - spent.get("seconds", 0.0)
+
+    def start_step(self) -> None:
+        """Mark the start of a step (an LLM call and its tool calls), timing the step before it."""
+        now = time.monotonic()
+        if self._step_started is not None:
+            self.step_seconds.append(now - self._step_started)
+        self._step_started = now
+
+    def record_call(self, tokens: int, seconds: float = 0.0) -> None:
+        """Record an LLM call, the tokens it used and the seconds it took (0 if it was replayed)."""
+        self.steps += 1
+        self.tokens += tokens
+        if seconds:
+            self.llm_seconds.append(seconds)
+
+    def seconds_left(self) -> Optional[float]:
+        """Return the seconds until the deadline, or None if there is none."""
+        return None if self.deadline is None else self.deadline - time.time()
+
+    def deadline_passed(self) -> bool:
+        """Return whether the deadline, less DEADLINE_MARGIN, has passed, so that not even a final answer fits."""
+        left = self.seconds_left()
+        if left is not None and left <= DEADLINE_MARGIN:
+            if not self.deadline_missed:
+                logger.warning("The deadline has passed before the analysis finished")
+            self.deadline_missed = True
+        return self.deadline_missed
+
+    def next_step_estimate(self) -> float:
+        """Estimate the seconds a further step and then the final answer would take, from recent ones."""
+        return max(self.step_seconds, default=0.0) + max(self.llm_seconds, default=0.0)
+
+    def request_timeout(self) -> Optional[float]:
+        """Return the seconds an LLM request may take without running past the deadline, or None."""
+        left = self.seconds_left()
+        return None if left is None else max(1.0, left - DEADLINE_MARGIN)
+
+    def exhaustion_reason(self) -> Optional[str]:
+        """
+        Return why the next LLM call should be the run's last, or None.
+
+        Returns:
+            "steps" if it is the last step allowed, "tokens" or "time" if that
+            budget is nearly spent; the reason is remembered for stats()
+        """
+        reason = None
+        if self.steps >= self.max_steps - 1:
+            reason = "steps"
+        elif self.max_tokens and self.tokens >= FINALISE_FRACTION * self.max_tokens:
+            reason = "tokens"
+        elif self.max_seconds and time.monotonic() - self.started >= FINALISE_FRACTION * self.max_seconds:
+            reason = "time"
+        elif self.deadline is not None and self.seconds_left() - DEADLINE_MARGIN < self.next_step_estimate():
+            reason = "deadline"
+        if reason and not self.finalised:
+            self.finalised = reason
+            logger.info(f"Budget: {FINALISE_REASONS[reason]}; asking for the final answer")
+        return reason
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the budgets, what was spent and why the run was asked to finish, if it was.
+
+        deadline_hit is whether the deadline made the run finish early, and
+        deadline_missed whether it passed before there was a final answer.
+        """
+        return {
+            "max_steps": self.max_steps,
+            "max_tokens": self.max_tokens,
+            "max_seconds": self.max_seconds,
+            "steps": self.steps,
+            "tokens": self.tokens,
+            "seconds": round(time.monotonic() - self.started, 3),
+            "finalised": self.finalised,
+            "deadline": self.deadline,
+            "deadline_hit": self.finalised == "deadline" or self.deadline_missed,
+            "deadline_missed": self.deadline_missed,
+            "seconds_left": None if self.deadline is None else round(self.seconds_left(), 3),
+            "next_step_estimate_seconds": round(self.next_step_estimate(), 3),
+        }
+
+
+def plan_budget(profile: Optional[Dict[str, Any]], max_steps: Optional[int] = None, max_tokens: Optional[int] = None,
+                max_seconds: Optional[float] = None, context_budget: int = DEFAULT_CONTEXT_BUDGET,
+                deadline: Optional[float] = None) -> RunBudget:
+    """
+    Derive a run's budgets from a repository profile.
+
+    Args:
+        profile: From profile_repo; None gives the default step budget
+        max_steps: Step budget, overriding the derived one
+        max_tokens: Token budget, overriding the derived one
+        max_seconds: Time budget in seconds (None: no time budget)
+        context_budget: Tokens of memory each step is kept to (0: not limited)
+        deadline: time.time() by which the run must have finished (optional)
+
+    Returns:
+        A RunBudget
+    """
+    if max_steps is None:
+        if profile is None:
+            max_steps = DEFAULT_MAX_STEPS
+        else:
+            languages = sum(1 for name in profile["languages"] if name not in NON_SOURCE_LANGUAGES)
+            steps = BASE_STEPS + 3 * math.log2(1 + profile["source_files"] / 10) + min(4, max(0, languages - 1))
+            max_steps = int(min(MAX_STEPS, max(MIN_STEPS, round(steps))))
+    if max_tokens is None and context_budget:
+        max_tokens = max_steps * context_budget
+    return RunBudget(max_steps, max_tokens, max_seconds, deadline)
@@ -0,0 +1,160 @@
+"""
+Whole-run result cache for the tech writer agents.
+
+Nightly documentation jobs re-analyse repositories that often have not
+changed since the night before. RunCache stores the Markdown and metrics of
+each successful analysis under a key made of:
+
+- the repository's content: its git tree hash when the directory is inside
+  a clean git checkout, otherwise a hash of its manifest (every file's path,
+  size and modification time, with .gitignore respected);
+- a hash of the analysis prompt;
+- a hash of the agent itself, its system prompt and tool definitions, so
+  that changing the agent's code does not replay results it would no longer
+  produce;
+- the model name and agent type.
+
+A run whose key is in the cache returns the stored result immediately. Each
+entry is one JSON file in the cache directory, written atomically, so
+several jobs can share a directory.
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import subprocess
+from typing import Any, Dict, Optional
+
+from manifest import get_manifest, manifest_to_bytes
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RUN_CACHE_DIR = os.path.join("output", "run-cache")
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def git_tree_hash(directory: str) -> Optional[str]:
+    """
+    Return the git tree hash of a directory, if it is in a git checkout with no uncommitted changes.
+
+    Args:
+        directory: A directory inside a git working tree (not necessarily its root)
+
+    Returns:
+        The hash of the directory's tree at HEAD, or None if the directory is not
+        in a git checkout, has modified or untracked files, or git is unavailable
+    """
+    try:
+        status = subprocess.run(["git", "-C", directory, "status", "--porcelain", "--", "."],
+                                capture_output=True, text=True, timeout=60)
+        if status.returncode != 0 or status.stdout.strip():
+            return None
+        tree = subprocess.run(["git", "-C", directory, "rev-parse", "HEAD:./"],
+                              capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return tree.stdout.strip() if tree.returncode == 0 else None
+
+
+def repo_fingerprint(directory: str) -> str:
+    """
+    Identify the content of a codebase for the run cache.
+
+    Args:
+        directory: Root of the codebase
+
+    Returns:
+        "git:<tree hash>" for a clean git checkout, otherwise "manifest:<sha256 of the manifest>"
+    """
+    tree = git_tree_hash(directory)
+    if tree:
+        return f"git:{tree}"
+    # Rebuild rather than reuse a cached manifest, which may predate changes to the directory
+    manifest = get_manifest(directory, refresh=True)
+    return f"manifest:{hashlib.sha256(manifest_to_bytes(manifest, include_symbols=False)).hexdigest()}"
+
+
+def run_key(repo: str, prompt: str, agent: str, model_name: str, agent_type: str) -> Dict[str, str]:
+    """
+    Build the fields that identify a run.
+
+    Args:
+        repo: The repository fingerprint from repo_fingerprint
+        prompt: The analysis prompt
+        agent: The agent's system prompt and tool definitions
+        model_name: The model used
+        agent_type: The agent type (react or reflexion)
+
+    Returns:
+        The key fields, including "key", the hash of all of them
+    """
+    fields = {
+        "repo": repo,
+        "prompt_sha256": _sha256(prompt),
+        "agent_sha256": _sha256(agent),
+        "model": model_name,
+        "agent_type": agent_type,
+    }
+    fields["key"] = _sha256(json.dumps(fields, sort_keys=True))
+    return fields
+
+
+class RunCache:
+    """
+    Directory of completed analyses, one JSON file per run key.
+    """
+
+    def __init__(self, directory: str = DEFAULT_RUN_CACHE_DIR):
+        """
+        Initialise the cache.
+
+        Args:
+            directory: Directory holding the cached runs, created on first write
+        """
+        self.directory = directory
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a cached run.
+
+        Args:
+            key: The "key" field from run_key
+
+        Returns:
+            The entry with "result", "metrics", "created" and the key fields, or None
+        """
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("key") == key else None
+
+    def put(self, fields: Dict[str, str], result: str, metrics: Dict[str, Any]) -> None:
+        """
+        Store a completed run.
+
+        Args:
+            fields: The key fields from run_key
+            result: The analysis Markdown
+            metrics: Metrics of the run, returned again on every hit
+        """
+        entry = {**fields, "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                 "result": result, "metrics": metrics}
+        path = self._path(fields["key"])
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, indent=2)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not store run in the run cache: {e}")
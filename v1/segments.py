@@ -0,0 +1,307 @@
+"""
+Segment-based index storage for distributed indexing.
+
+A segment is an immutable file holding the manifest, symbol index and search
+index for one shard of a codebase, in the column layout of manifest.py.
+Shards split files by a stable hash of their directory, so separate processes
+or machines can each build one segment of the same tree and drop it into a
+shared store directory.
+
+Queries fan out over the live segments of a store without merging them.
+Compaction merges them LSM-style into one segment of the next generation,
+with the same rows, symbols and postings as a single-process build. A merged
+segment records the segments it replaces, and those become dead as soon as
+the merged segment exists, so a crash part-way through compaction never
+leaves a store that double-counts files.
+
+Usage:
+    python segments.py build ~/src/monorepo /tmp/index --workers 8
+    python segments.py build ~/src/monorepo /tmp/index --shard 3 --num-shards 16
+    python segments.py compact /tmp/index
+"""
+
+import argparse
+import glob
+import heapq
+import json
+import logging
+import os
+import re
+import struct
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from manifest import (MANIFEST_MAGIC, SYMBOL_KINDS, Manifest, SearchIndex, SymbolIndex, build_manifest,
+                      manifest_to_bytes)
+from shared_manifest import open_manifest_file
+
+logger = logging.getLogger(__name__)
+
+_SEGMENT_PATTERN = re.compile(r"seg-(\d{6})-(\d{4})\.seg$")
+
+
+def segment_name(generation: int, shard: int) -> str:
+    """Return the file name of a segment."""
+    return f"seg-{generation:06d}-{shard:04d}.seg"
+
+
+def write_segment(manifest: Manifest, path: str, **metadata) -> str:
+    """
+    Write a manifest and its indexes to an immutable segment file.
+
+    The file is written to a temporary name and renamed into place, so a store
+    never contains a partial segment.
+
+    Args:
+        manifest: The manifest to write; its symbol and search indexes are built if needed
+        path: Destination file path
+        **metadata: JSON-serialisable fields recorded in the segment header
+
+    Returns:
+        The path written
+    """
+    payload = manifest_to_bytes(manifest, include_symbols=True, include_search=True, metadata=metadata)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return path
+
+
+def build_segment(directory: str, store_dir: str, shard: int = 0, num_shards: int = 1,
+                  generation: int = 0) -> str:
+    """
+    Index one shard of a codebase into a segment in a store directory.
+
+    Args:
+        directory: Root of the codebase
+        store_dir: Directory holding the segments
+        shard: Which shard to index, from 0 to num_shards - 1
+        num_shards: Number of shards the codebase is split into
+        generation: Segment generation; freshly built segments are generation 0
+
+    Returns:
+        The path of the segment written
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = build_manifest(directory, shard=shard, num_shards=num_shards)
+    path = os.path.join(store_dir, segment_name(generation, shard))
+    return write_segment(manifest, path, shard=shard, num_shards=num_shards, generation=generation, sources=[])
+
+
+def _build_segment_args(args) -> str:
+    return build_segment(*args)
+
+
+def build_segments(directory: str, store_dir: str, workers: int = 0, num_shards: int = 0) -> List[str]:
+    """
+    Index a whole codebase into segments using a pool of local processes.
+
+    Args:
+        directory: Root of the codebase
+        store_dir: Directory holding the segments
+        workers: Number of worker processes (default: the number of CPUs)
+        num_shards: Number of shards (default: one per worker)
+
+    Returns:
+        The paths of the segments written, in shard order
+    """
+    workers = workers or os.cpu_count() or 1
+    num_shards = num_shards or workers
+    tasks = [(directory, store_dir, shard, num_shards) for shard in range(num_shards)]
+    if workers == 1:
+        return list(map(_build_segment_args, tasks))
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(_build_segment_args, tasks))
+
+
+def merge_manifests(manifests: List[Manifest]) -> Manifest:
+    """
+    Merge manifests of disjoint shards into one manifest.
+
+    Rows are put in the order a single build_manifest walk produces (each
+    directory's files by name, then its subdirectories by name), and the symbol
+    and search indexes are remapped onto the merged rows, so the result
+    serialises to the same bytes as a single-process build of the whole tree.
+
+    Args:
+        manifests: Manifests of disjoint parts of the same codebase
+
+    Returns:
+        The merged Manifest, with its symbol and search indexes
+
+    Raises:
+        ValueError: If no manifests are given or two of them contain the same file
+    """
+    if not manifests:
+        raise ValueError("No manifests to merge")
+
+    order = []
+    for seg, manifest in enumerate(manifests):
+        dir_keys = [tuple(d.split("/")[:-1]) for d in manifest.directories]
+        names = manifest.names
+        order.extend(((dir_keys[d], names[row]), seg, row) for row, d in enumerate(manifest.dir_ids))
+    order.sort()
+
+    merged = Manifest(manifests[0].root)
+    row_maps = [array("I", bytes(4 * len(m))) for m in manifests]
+    previous_key = None
+    for new_row, (key, seg, row) in enumerate(order):
+        if key == previous_key:
+            raise ValueError(f"File appears in more than one segment: {'/'.join(key[0] + (key[1],))}")
+        previous_key = key
+        m = manifests[seg]
+        merged.append(merged.add_directory(m.directories[m.dir_ids[row]]), m.names[row],
+                      m.sizes[row], m.mtimes[row], m.lines[row], m.flags[row])
+        row_maps[seg][row] = new_row
+
+    symbol_order = []
+    for seg, manifest in enumerate(manifests):
+        row_map = row_maps[seg]
+        symbol_order.extend((row_map[file_row], seg, i) for i, file_row in enumerate(manifest.symbols().file_rows))
+    symbol_order.sort()
+    symbols = SymbolIndex()
+    for new_row, seg, i in symbol_order:
+        index = manifests[seg].symbols()
+        symbols.append(index.names[i], SYMBOL_KINDS[index.kinds[i]], new_row, index.line_numbers[i])
+    merged._symbols = symbols
+
+    postings: Dict[str, List[int]] = {}
+    for seg, manifest in enumerate(manifests):
+        row_map = row_maps[seg]
+        search = manifest.search_index()
+        for i, term in enumerate(search.terms):
+            rows = search.rows[search.offsets[i]:search.offsets[i + 1]]
+            postings.setdefault(term, []).extend(map(row_map.__getitem__, rows))
+    for rows in postings.values():
+        rows.sort()
+    merged._search = SearchIndex.from_postings(postings)
+    return merged
+
+
+class SegmentSet:
+    """
+    The live segments of a store, memory-mapped and queried without merging.
+
+    A segment is dead if a newer segment lists it in its sources, i.e. it has
+    already been compacted into that segment.
+    """
+
+    def __init__(self, store_dir: str, paths: List[str], headers: List[Dict[str, Any]]):
+        self.store_dir = store_dir
+        self.paths = paths
+        self.headers = headers
+        self.manifests = [open_manifest_file(path) for path in paths]
+
+    @classmethod
+    def open(cls, store_dir: str) -> "SegmentSet":
+        """
+        Open the live segments of a store directory.
+
+        Args:
+            store_dir: Directory holding the segments
+
+        Returns:
+            A SegmentSet over the live segments, in file name order
+        """
+        if not os.path.isdir(store_dir):
+            raise FileNotFoundError(store_dir)
+        headers = {}
+        for path in sorted(glob.glob(os.path.join(store_dir, "seg-*.seg"))):
+            if _SEGMENT_PATTERN.search(path):
+                with open(path, "rb") as f:
+                    headers[os.path.basename(path)] = _read_header(f)
+        dead = {source for header in headers.values() for source in header.get("sources", [])}
+        live = [name for name in headers if name not in dead]
+        return cls(store_dir, [os.path.join(store_dir, name) for name in live], [headers[name] for name in live])
+
+    def __len__(self) -> int:
+        return len(self.manifests)
+
+    @property
+    def file_count(self) -> int:
+        return sum(map(len, self.manifests))
+
+    def query(self, **kwargs) -> Dict[str, Any]:
+        """Run a query_repo query over every live segment and combine the results."""
+        from repo_query import query_manifests
+        return query_manifests(self.manifests, **kwargs)
+
+    def search(self, terms: List[str], max_results: int = 50) -> List[str]:
+        """Return the paths of files containing every term, across all live segments."""
+        paths = []
+        for manifest in self.manifests:
+            paths.extend(map(manifest.path, manifest.search_index().search(terms)))
+        return heapq.nsmallest(max_results, paths) if max_results else sorted(paths)
+
+    def compact(self) -> Optional[str]:
+        """
+        Merge the live segments into one segment of the next generation.
+
+        The merged segment is written before the segments it replaces are
+        deleted, and it lists them as its sources, so readers see either the
+        old segments or the new one but never both.
+
+        Returns:
+            The path of the merged segment, or None if there was nothing to merge
+        """
+        if len(self.manifests) < 2:
+            return None
+        generation = max(header.get("generation", 0) for header in self.headers) + 1
+        merged = merge_manifests(self.manifests)
+        sources = [os.path.basename(path) for path in self.paths]
+        path = os.path.join(self.store_dir, segment_name(generation, 0))
+        write_segment(merged, path, shard=0, num_shards=1, generation=generation, sources=sources)
+        logger.info(f"Compacted {len(sources)} segments ({len(merged)} files) into {path}")
+
+        old_paths = self.paths
+        self.paths = [path]
+        self.headers = [{"generation": generation, "sources": sources}]
+        self.manifests = [open_manifest_file(path)]
+        for old_path in old_paths:
+            try:
+                os.remove(old_path)
+            except OSError as e:
+                logger.error(f"Error removing compacted segment {old_path}: {e}")
+        return path
+
+
+def _read_header(f) -> Dict[str, Any]:
+    """Read the JSON header of a segment file without reading its columns."""
+    prefix = f.read(len(MANIFEST_MAGIC) + 8)
+    if prefix[:len(MANIFEST_MAGIC)] != MANIFEST_MAGIC:
+        raise ValueError(f"Not a segment file: {f.name}")
+    header_length = struct.unpack_from("<Q", prefix, len(MANIFEST_MAGIC))[0]
+    return json.loads(f.read(header_length))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and compact segment indexes of a codebase")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Index a codebase, or one shard of it, into segments")
+    build.add_argument("directory", help="Root of the codebase")
+    build.add_argument("store", help="Directory holding the segments")
+    build.add_argument("--workers", type=int, default=0, help="Local worker processes (default: CPU count)")
+    build.add_argument("--shard", type=int, help="Build only this shard, e.g. on one machine of many")
+    build.add_argument("--num-shards", type=int, default=0, help="Number of shards (default: one per worker)")
+    compact = subparsers.add_parser("compact", help="Merge the live segments of a store into one")
+    compact.add_argument("store", help="Directory holding the segments")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if args.command == "build":
+        if args.shard is not None:
+            if not 0 <= args.shard < max(args.num_shards, 1):
+                parser.error("--shard must be between 0 and --num-shards - 1")
+            paths = [build_segment(args.directory, args.store, args.shard, args.num_shards)]
+        else:
+            paths = build_segments(args.directory, args.store, args.workers, args.num_shards)
+        print(f"Wrote {len(paths)} segments to {args.store}")
+    else:
+        path = SegmentSet.open(args.store).compact()
+        print(f"Compacted into {path}" if path else "Nothing to compact")
+
+
+if __name__ == "__main__":
+    main()
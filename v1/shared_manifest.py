@@ -0,0 +1,165 @@
+"""
+Shared manifests for multi-process analysis.
+
+This module publishes a manifest and its symbol index once, either into a
+multiprocessing.shared_memory segment or into a memory-mapped file, so that
+worker processes attach to the same read-only bytes instead of each receiving
+a pickled copy or re-walking the codebase.
+
+Typical use:
+
+    with SharedManifest(get_manifest(directory)) as shared:
+        with shared.pool(8) as pool:
+            results = pool.map(analyse_prefix, prefixes)
+
+where analyse_prefix calls worker_manifest() to get the attached manifest.
+"""
+
+import logging
+import mmap
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+from typing import Optional
+
+from manifest import Manifest, manifest_from_buffer, manifest_to_bytes
+
+logger = logging.getLogger(__name__)
+
+# Manifest attached by _init_worker in each pool process
+_WORKER_MANIFEST: Optional[Manifest] = None
+
+
+def _open_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing segment without handing it to this process's resource tracker."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 registers attached segments with the resource tracker,
+        # which then unlinks them when this process exits, so skip the registration
+        register = shared_memory.resource_tracker.register
+        shared_memory.resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            shared_memory.resource_tracker.register = register
+
+
+def attach_manifest(name: str) -> Manifest:
+    """
+    Attach to a manifest published by SharedManifest.
+
+    Args:
+        name: The shared memory segment name (SharedManifest.name)
+
+    Returns:
+        A read-only Manifest whose columns are views into the segment
+    """
+    segment = _open_shared_memory(name)
+    manifest = manifest_from_buffer(segment.buf)
+    # Keep the segment mapped for as long as the manifest is alive
+    manifest._buffer_owner = segment
+    return manifest
+
+
+class SharedManifest:
+    """
+    A manifest published into a shared memory segment.
+
+    The publishing process owns the segment: close() (or leaving the with
+    block) unmaps and unlinks it, after which workers must not use it.
+    """
+
+    def __init__(self, manifest: Manifest, include_symbols: bool = True):
+        payload = manifest_to_bytes(manifest, include_symbols=include_symbols)
+        self.size = len(payload)
+        self._segment = shared_memory.SharedMemory(create=True, size=max(1, self.size))
+        self._segment.buf[:self.size] = payload
+        self.name = self._segment.name
+        logger.info(f"Published manifest of {len(manifest)} files to shared memory {self.name} ({self.size} bytes)")
+
+    def attach(self) -> Manifest:
+        """Attach to the published manifest from this process."""
+        return attach_manifest(self.name)
+
+    def pool(self, processes: int, context: Optional[multiprocessing.context.BaseContext] = None):
+        """
+        Create a process pool whose workers attach to this manifest on start-up.
+
+        Args:
+            processes: Number of worker processes
+            context: Multiprocessing context to use (default: the platform default)
+
+        Returns:
+            A multiprocessing Pool; tasks call worker_manifest() to read the manifest
+        """
+        context = context or multiprocessing.get_context()
+        return context.Pool(processes, initializer=_init_worker, initargs=(self.name,))
+
+    def close(self) -> None:
+        """Unmap and unlink the segment."""
+        if self._segment is not None:
+            self._segment.close()
+            self._segment.unlink()
+            self._segment = None
+
+    def __enter__(self) -> "SharedManifest":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def _init_worker(name: str) -> None:
+    global _WORKER_MANIFEST
+    _WORKER_MANIFEST = attach_manifest(name)
+
+
+def worker_manifest() -> Manifest:
+    """Return the manifest attached in this pool worker."""
+    if _WORKER_MANIFEST is None:
+        raise RuntimeError("No shared manifest attached; create the pool with SharedManifest.pool()")
+    return _WORKER_MANIFEST
+
+
+def write_manifest_file(manifest: Manifest, path: str, include_symbols: bool = True) -> str:
+    """
+    Write a manifest to a file that other processes can memory-map.
+
+    The file is written to a temporary name and renamed into place, so readers
+    never see a partial manifest.
+
+    Args:
+        manifest: The manifest to write
+        path: Destination file path
+        include_symbols: Whether to include the symbol index
+
+    Returns:
+        The path written
+    """
+    payload = manifest_to_bytes(manifest, include_symbols=include_symbols)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return path
+
+
+def open_manifest_file(path: str) -> Manifest:
+    """
+    Memory-map a manifest file written by write_manifest_file.
+
+    Pages are shared with every other process mapping the same file through the
+    operating system's page cache.
+
+    Args:
+        path: Path of the manifest file
+
+    Returns:
+        A read-only Manifest whose columns are views into the mapping
+    """
+    with open(path, "rb") as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    manifest = manifest_from_buffer(mapping)
+    manifest._buffer_owner = mapping
+    return manifest
@@ -5,9 +5,20 @@ import os
 import re
 import traceback
 import datetime
+import functools
 from pathlib import Path
 from google.generativeai import configure, GenerativeModel, GenerationConfig
 
+from llm_cache import open_llm_cache, request_key
+
+EVAL_MODEL = 'gemini-2.5-pro-exp-03-25'
+
+@functools.lru_cache(maxsize=None)
+def get_eval_model():
+    """Configure the Gemini client once per process and return the judge model, so both judge calls share its connections."""
+    configure(api_key=os.getenv('GEMINI_API_KEY'))
+    return GenerativeModel(EVAL_MODEL, generation_config=GenerationConfig(temperature=0.0))
+
 def load_file_content(file_path):
     """Load content from a file."""
     try:
@@ -83,10 +94,22 @@ def generate_readable_agent_name(filename):
         traceback.print_exc()
         return Path(filename).stem  # Fallback to filename stem
 
-def evaluate_outputs(eval_prompt, original_prompt, output_files, original_prompt_file=None):
+def generate_text(model, prompt, llm_cache=None):
+    """Generate a response to a prompt, replaying it from the LLM cache if one is given and has it."""
+    if llm_cache is None:
+        return model.generate_content(prompt).text
+    key = request_key(model=EVAL_MODEL, prompt=prompt, temperature=0.0)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        print("Replaying cached LLM response")
+        return cached["text"]
+    text = model.generate_content(prompt).text
+    llm_cache.put(key, {"text": text}, EVAL_MODEL)
+    return text
+
+def evaluate_outputs(eval_prompt, original_prompt, output_files, original_prompt_file=None, llm_cache=None):
     """Evaluate multiple output files against the original prompt using the LLM-as-judge."""
-    configure(api_key=os.getenv('GEMINI_API_KEY'))
-    model = GenerativeModel('gemini-2.5-pro-exp-03-25', generation_config=GenerationConfig(temperature=0.0))
+    model = get_eval_model()
     
     # Prepare agent outputs for the prompt
     agent_outputs = {}
@@ -123,11 +146,10 @@ def evaluate_outputs(eval_prompt, original_prompt, output_files, original_prompt
         .replace('{agent_outputs}', json.dumps(agent_outputs, indent=2))
     
     try:
-        response = model.generate_content(formatted_prompt)
-        print(f"Raw LLM response: {response.text[:500]}...")  # Debug logging
+        response_text = generate_text(model, formatted_prompt, llm_cache)
+        print(f"Raw LLM response: {response_text[:500]}...")  # Debug logging
         
         # Parse the structured evaluation response
-        response_text = response.text if hasattr(response, 'text') else str(response)
         try:
             # Extract JSON from response text
             json_match = re.search(r'```(?:json)?\s*({.*?})\s*```', response_text, re.DOTALL)
@@ -160,19 +182,19 @@ def evaluate_outputs(eval_prompt, original_prompt, output_files, original_prompt
         print(f"{'='*40}")
         return None, file_info, None, original_prompt
 
-def generate_comparative_assessment(original_prompt, outputs):
+def generate_comparative_assessment(original_prompt, outputs, llm_cache=None):
     """Generate a qualitative comparative assessment of multiple outputs.
     
     Args:
         original_prompt: The original prompt used for all agents
         outputs: List of dicts with 'file', 'model', 'agent', 'readable_name', and 'content' keys
+        llm_cache: LLMCache to replay and record the response with (optional)
     
     Returns:
         String containing the comparative assessment
     """
-    configure(api_key=os.getenv('GEMINI_API_KEY'))
     #model = GenerativeModel('gemini-2.0-flash', generation_config=GenerationConfig(temperature=0.0))
-    model = GenerativeModel('gemini-2.5-pro-exp-03-25', generation_config=GenerationConfig(temperature=0.0))
+    model = get_eval_model()
     
     # Get a list of agent names for reference
     agent_names = [output.get('readable_name', f"{output['model']} ({output['agent']})") for output in outputs]
@@ -195,8 +217,7 @@ FORMAT YOUR RESPONSE IN MARKDOWN with proper headings and subheadings.
         comparison_prompt += f"\n\n{'='*80}\n{agent_label}\n{'='*80}\n\n{output['content']}\n\n"
     
     try:
-        response = model.generate_content(comparison_prompt)
-        return response.text
+        return generate_text(model, comparison_prompt, llm_cache)
     except Exception as e:
         print(f"Error generating comparative assessment: {e}")
         traceback.print_exc()
@@ -341,6 +362,8 @@ def main():
     parser.add_argument('--prompt', type=str, help='Path to evaluation prompt', required=True)
     parser.add_argument('--task-prompt', type=str, help='Path to the original task prompt', required=False)
     parser.add_argument('output_files', type=str, nargs='+', help='Paths to output files to evaluate')
+    parser.add_argument('--llm-cache', type=str, default=None,
+                        help='SQLite file to replay and record LLM responses in (default: $TECH_WRITER_LLM_CACHE, or no cache)')
     args = parser.parse_args()
     
     # Load the evaluation prompt
@@ -411,7 +434,8 @@ def main():
         eval_prompt=eval_prompt,
         original_prompt=original_prompt,
         output_files=args.output_files,
-        original_prompt_file=args.task_prompt
+        original_prompt_file=args.task_prompt,
+        llm_cache=open_llm_cache(args.llm_cache)
     )
     
     # Generate comparison and save to file
@@ -14,12 +14,17 @@ import math
 import time
 import argparse
 import logging
-import requests
 import textwrap
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Union
 import abc
 
+from http_clients import configure_http_pools, get_requests_session
+from llm_cache import open_llm_cache, request_key
+from llm_retry import LLMRequestController
+from telemetry import RunTelemetry
+from tool_registry import ToolRegistry
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -154,6 +159,16 @@ def calculate(expression: str) -> Dict[str, Any]:
     except Exception as e:
         return {"expression": expression, "error": str(e)}
 
+# Registry mapping tool names to their functions; schemas are built once here
+TOOLS = ToolRegistry({
+    "find_all_matching_files": find_all_matching_files,
+    "read_file": read_file,
+    "calculate": calculate
+})
+
+# Retries and concurrency limit for LLM requests, shared by every agent in the process
+LLM_REQUESTS = LLMRequestController()
+
 # Abstract base class (same pattern as original)
 class Agent(abc.ABC):
     def __init__(self, model_name: str = "gpt-4o-mini"):
@@ -167,25 +182,15 @@ class Agent(abc.ABC):
         self.memory = []
         self.final_answer = None
         self.system_prompt = None
-        self.tools = {
-            "find_all_matching_files": find_all_matching_files,
-            "read_file": read_file,
-            "calculate": calculate
-        }
+        self.tools = TOOLS
         self.token_usage = 0
         self.cost_usd = 0.0
+        self.llm_cache = None  # Optional LLMCache to replay and record responses with
+        self.llm_requests = LLM_REQUESTS
+        self.telemetry = RunTelemetry(model_name)
 
     def create_tool_definitions(self) -> List[Dict[str, Any]]:
-        return [
-            {
-                "type": "function",
-                "function": {
-                    "name": name,
-                    "description": func.__doc__ or name,
-                    "parameters": {"type": "object", "properties": {}}
-                }
-            } for name, func in self.tools.items()
-        ]
+        return self.tools.definitions()
 
     def call_llm(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
         headers = {
@@ -201,14 +206,29 @@ class Agent(abc.ABC):
             "tool_choice": "auto",
             "usage": {"include": True}
         }
-        response = requests.post(
-            OPENROUTER_CHAT_ENDPOINT,
-            headers=headers,
-            json=payload,
-            timeout=120
-        )
-        response.raise_for_status()
-        return response.json()
+        key = request_key(**payload) if self.llm_cache is not None else None
+        if key is not None:
+            cached = self.llm_cache.get(key)
+            if cached is not None:
+                # A replayed response costs nothing, so do not report the original usage again
+                return {**cached, "usage": {}}
+        
+        def post():
+            # One keep-alive session per host, shared by every agent in the process
+            response = get_requests_session(OPENROUTER_CHAT_ENDPOINT).post(
+                OPENROUTER_CHAT_ENDPOINT,
+                headers=headers,
+                json=payload,
+                timeout=120
+            )
+            response.raise_for_status()
+            return response.json()
+        
+        # Rate limits and transient errors are retried with backoff before giving up
+        result = self.llm_requests.call(post)
+        if key is not None:
+            self.llm_cache.put(key, result, self.openrouter_model_id)
+        return result
 
     def check_llm_result(self, assistant_message: Dict[str, Any]) -> tuple:
         if "content" in assistant_message and assistant_message["content"]:
@@ -218,6 +238,23 @@ class Agent(abc.ABC):
         else:
             raise ValueError("LLM response contains neither content nor tool calls")
 
+    def reset_usage(self):
+        """Zero the run's token and cost totals and its telemetry, for a new run."""
+        self.token_usage = 0
+        self.cost_usd = 0.0
+        self.telemetry.reset()
+
+    def record_usage(self, result: Dict[str, Any], seconds: float):
+        """Add an LLM call's tokens and cost to the run's totals and record it in the telemetry."""
+        usage = result.get("usage") or {}
+        if usage:
+            self.telemetry.record_llm_call(usage, seconds)
+        else:
+            # Replayed from the LLM cache
+            self.telemetry.record_replayed_call()
+        self.token_usage += usage.get("total_tokens", 0)
+        self.cost_usd += float(usage.get("cost", 0.0) or 0.0)
+
     def execute_tool(self, tool_call: Dict[str, Any]) -> str:
         tool_name = tool_call["function"]["name"]
         tool_args = json.loads(tool_call["function"]["arguments"] or "{}")
@@ -225,11 +262,13 @@ class Agent(abc.ABC):
         if tool_name not in self.tools:
             raise ValueError(f"Unknown tool: {tool_name}")
         
+        start = time.perf_counter()
         try:
-            result = self.tools[tool_name](**tool_args)
-            return json.dumps(result)
+            result = json.dumps(self.tools[tool_name](**tool_args))
         except Exception as e:
-            return json.dumps({"error": str(e)})
+            result = json.dumps({"error": str(e)})
+        self.telemetry.record_tool_call(tool_name, time.perf_counter() - start, result)
+        return result
 
     @abc.abstractmethod
     def run(self, prompt: str, directory: str) -> str:
@@ -248,22 +287,21 @@ class ReActAgent(Agent):
             {"role": "system", "content": self.system_prompt},
             {"role": "user", "content": f"Base directory: {directory}\n\n{prompt}"}
         ]
+        self.reset_usage()
         
         while True:
             start_time = time.time()
             result = self.call_llm(self.memory)
             end_time = time.time()
             
-            usage = result.get("usage", {})
-            self.token_usage = usage.get("total_tokens", 0)
-            self.cost_usd = float(usage.get("cost", 0.0) or 0.0)
+            self.record_usage(result, end_time - start_time)
             
             message = result["choices"][0]["message"]
             result_type, result_data = self.check_llm_result(message)
             
             if result_type == "final_answer":
                 self.final_answer = result_data
-                logger.info(f"Model: {self.model_name} | Tokens: {self.token_usage} | Cost: ${self.cost_usd:.6f} | Time: {end_time - start_time:.2f}s")
+                logger.info(f"Model: {self.model_name} | Tokens: {self.token_usage} | Cost: ${self.cost_usd:.6f} | LLM time: {self.telemetry.summary()['llm_seconds']:.2f}s")
                 return result_data
             
             # Handle tool calls
@@ -293,22 +331,21 @@ class ReflexionAgent(Agent):
             {"role": "system", "content": self.system_prompt},
             {"role": "user", "content": f"Base directory: {directory}\n\n{prompt}"}
         ]
+        self.reset_usage()
         
         while True:
             start_time = time.time()
             result = self.call_llm(self.memory)
             end_time = time.time()
             
-            usage = result.get("usage", {})
-            self.token_usage = usage.get("total_tokens", 0)
-            self.cost_usd = float(usage.get("cost", 0.0) or 0.0)
+            self.record_usage(result, end_time - start_time)
             
             message = result["choices"][0]["message"]
             result_type, result_data = self.check_llm_result(message)
             
             if result_type == "final_answer":
                 self.final_answer = result_data
-                logger.info(f"Model: {self.model_name} | Tokens: {self.token_usage} | Cost: ${self.cost_usd:.6f} | Time: {end_time - start_time:.2f}s")
+                logger.info(f"Model: {self.model_name} | Tokens: {self.token_usage} | Cost: ${self.cost_usd:.6f} | LLM time: {self.telemetry.summary()['llm_seconds']:.2f}s")
                 return result_data
             
             # Handle tool calls
@@ -338,7 +375,12 @@ def main():
     parser.add_argument("--agent-type", type=str, default="react", choices=["react", "reflexion"], 
                        help="Agent type (react or reflexion)")
     parser.add_argument("--json", action="store_true", help="Output result as JSON")
+    parser.add_argument("--llm-cache", default=None,
+                       help="SQLite file to replay and record LLM responses in (default: $TECH_WRITER_LLM_CACHE, or no cache)")
+    parser.add_argument("--http-pool-size", type=int, default=None,
+                       help="Maximum connections kept open to OpenRouter (default: $TECH_WRITER_HTTP_MAX_CONNECTIONS or 100)")
     args = parser.parse_args()
+    configure_http_pools(max_connections=args.http_pool_size)
 
     prompt = read_prompt_file(args.prompt_file)
     try:
@@ -346,6 +388,7 @@ def main():
             agent = ReActAgent(model_name=args.model)
         else:
             agent = ReflexionAgent(model_name=args.model)
+        agent.llm_cache = open_llm_cache(args.llm_cache)
             
         start = time.time()
         result = agent.run(prompt, args.directory)
@@ -368,8 +411,10 @@ def main():
                     "agent_type": args.agent_type,
                     "tokens": agent.token_usage,
                     "cost_usd": agent.cost_usd,
-                    "runtime_seconds": runtime
-                }
+                    "runtime_seconds": runtime,
+                    "telemetry": agent.telemetry.summary()
+                },
+                "steps": agent.telemetry.steps
             }
         else:
             output = {
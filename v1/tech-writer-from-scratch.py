@@ -2,7 +2,6 @@ from pathlib import Path
 from typing import List, Dict, Any, Optional, Union
 import json
 import re
-import ast
 import datetime
 import pathspec
 from pathspec.patterns import GitWildMatchPattern
@@ -10,14 +9,35 @@ import os
 import argparse
 import subprocess
 from binaryornot.check import is_binary
-from openai import OpenAI
-import math
-import inspect
-import typing
+from openai.types.chat import ChatCompletionMessage
 import logging
 import textwrap
 import abc  # Import the abc module for abstract base classes
 import sys
+import asyncio
+import time
+import hashlib
+
+from calculator import calculate
+from context_budget import DEFAULT_CONTEXT_BUDGET, STUB_PREFIX, ContextBudget
+from dir_tree import browse_directory
+from http_clients import configure_http_pools, get_async_openai_client, get_openai_client
+from llm_cache import open_llm_cache, request_key
+from llm_retry import LLMRequestController
+from llm_stream import AnswerWriter, StreamedCompletion
+from loop_detector import FINALISE, LoopDetector
+from manifest import invalidate_tree_versions
+from observation_encoder import ENCODINGS, ObservationEncoder, resolve_path
+from observation_store import ObservationStore, fetch_observation
+from repo_query import query_repo, search_code
+from run_budget import RunBudget, finalise_instruction, plan_budget, profile_repo
+from run_cache import DEFAULT_RUN_CACHE_DIR, RunCache, repo_fingerprint, run_key
+from telemetry import RunTelemetry, write_telemetry
+from tool_cache import ToolCache
+from tool_executor import ToolExecutor
+from token_estimator import get_estimator
+from tool_registry import ToolRegistry
+from transcript_store import HANDLE_PREFIX as TRANSCRIPT_HANDLE_PREFIX, TranscriptStore, load_checkpoint, transcript_path
 
 # Configure logging
 log_dir = Path(__file__).parent / "logs"
@@ -35,6 +55,9 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logger.info(f"Logging to file: {log_file}")
 
+# Each run's messages are written to <run id>.jsonl here (see transcript_store)
+TRANSCRIPT_DIR = log_dir / "transcripts"
+
 # Check for API keys
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
@@ -121,6 +144,7 @@ INPUT_PROCESSING_GUIDELINES = textwrap.dedent("""
     Important guidelines:
     - The user's analysis prompt will be provided in the initial message, prefixed with the base directory of the codebase (e.g., "Base directory: /path/to/codebase").
     - Analyse the codebase based on the instructions in the prompt, using the base directory as the root for all relative paths.
+    - Paths in tool results are relative to the base directory, and can be passed back to the tools as they are.
     - Make no assumptions about file types or formats - analyse each file based on its content and extension.
     - Adapt your analysis approach based on the codebase and the prompt's requirements.
     - Be thorough but focus on the most important aspects as specified in the prompt.
@@ -130,11 +154,14 @@ INPUT_PROCESSING_GUIDELINES = textwrap.dedent("""
 
 CODE_ANALYSIS_STRATEGIES = textwrap.dedent("""
     When analysing code:
-    - Start by exploring the directory structure to understand the project organisation.
+    - Start by exploring the directory structure to understand the project organisation, using browse_directory and then browsing into the largest directories.
     - Identify key files like README, configuration files, or main entry points.
     - Ignore temporary files and directories like node_modules, .git, etc.
     - Analyse relationships between components (e.g., imports, function calls).
     - Look for patterns in the code organisation (e.g., line counts, TODOs).
+    - For quantitative questions (counting files, sizes, lines of code, largest files), use query_repo to get exact figures in one call.
+    - To find where an identifier is defined or used, use search_code before reading files.
+    - Large tool results are stored out of band and shown as a handle with a preview; use fetch_observation to page through the full text only when the preview and outline are not enough.
     - Summarise your findings to help someone understand the codebase quickly, tailored to the prompt.
 """)
 
@@ -146,6 +173,9 @@ REACT_PLANNING_STRATEGY = textwrap.dedent("""
     4. Repeat until you have enough information to provide a final answer
 """)
 
+# Sent after the memory on the LLM call that follows a round of tool calls
+REFLECTION_INSTRUCTION = "Before responding, reflect on your previous actions. Were they effective? How can you improve your approach? Incorporate these reflections into your response."
+
 REFLEXION_PLANNING_STRATEGY = textwrap.dedent("""
     You should follow the Reflexion pattern (an extension of ReAct):
     1. Thought: Reason about what you need to do next
@@ -253,231 +283,426 @@ def read_file(file_path: str) -> Dict[str, Any]:
     except Exception as e:
         return {"error": f"Unexpected error reading file: {str(e)}"}
 
-def calculate(expression: str) -> Dict[str, Any]:
-    """
-    Evaluate a mathematical expression and return the result.
-    
-    Args:
-        expression: Mathematical expression to evaluate (e.g., "2 + 2 * 3")
-        
-    Returns:
-        Dictionary containing the expression and its result
-    """
-    try:
-        # Create a safe environment for evaluating expressions
-        # This uses Python's ast.literal_eval for safety instead of eval()
-        def safe_eval(expr):
-            # Replace common mathematical functions with their math module equivalents
-            expr = expr.replace("^", "**")  # Support for exponentiation
-            
-            # Parse the expression into an AST
-            parsed_expr = ast.parse(expr, mode='eval')
-            
-            # Check that the expression only contains safe operations
-            for node in ast.walk(parsed_expr):
-                # Allow names that are defined in the math module
-                if isinstance(node, ast.Name) and node.id not in math.__dict__:
-                    if node.id not in ['True', 'False', 'None']:
-                        raise ValueError(f"Invalid name in expression: {node.id}")
-                
-                # Only allow safe operations
-                elif isinstance(node, ast.Call):
-                    if not (isinstance(node.func, ast.Name) and node.func.id in math.__dict__):
-                        raise ValueError(f"Invalid function call in expression")
-            
-            # Evaluate the expression with the math module available
-            return eval(compile(parsed_expr, '<string>', 'eval'), {"__builtins__": {}}, math.__dict__)
-        
-        # Evaluate the expression
-        result = safe_eval(expression)
-        
-        return {
-            "expression": expression,
-            "result": result
-        }
-    except SyntaxError as e:
-        return {
-            "error": f"Syntax error in expression: {str(e)}",
-            "expression": expression
-        }
-    except ValueError as e:
-        return {
-            "error": f"Value error in expression: {str(e)}",
-            "expression": expression
-        }
-    except TypeError as e:
-        return {
-            "error": f"Type error in expression: {str(e)}",
-            "expression": expression
-        }
-    except Exception as e:
-        return {
-            "error": f"Unexpected error evaluating expression: {str(e)}",
-            "expression": expression
-        }
+# Registry mapping tool names to their functions; schemas are built once here.
+# Pure tools are memoized by TOOL_CACHE until the paths named by depends_on change.
+# Listings are sent with their paths grouped by directory, tables and file contents as lines
+TOOLS = ToolRegistry()
+TOOLS.register("find_all_matching_files", find_all_matching_files, pure=True, depends_on=["directory"], encoding="paths")
+TOOLS.register("read_file", read_file, pure=True, depends_on=["file_path"], encoding="lines")
+TOOLS.register("query_repo", query_repo, pure=True, depends_on=["directory"], encoding="lines")
+TOOLS.register("search_code", search_code, pure=True, depends_on=["directory"], encoding="paths")
+TOOLS.register("browse_directory", browse_directory, pure=True, depends_on=["directory"])
+# Served by each agent's ObservationStore; see TechWriterAgent.execute_tool
+TOOLS.register("fetch_observation", fetch_observation)
+# calculate evaluates arbitrary expressions, so run it in a worker process that can be killed;
+# it lives in calculator.py so that a "spawn" worker can import it
+TOOLS.register("calculate", calculate, kind="cpu", timeout=10, pure=True)
 
-# Dictionary mapping tool names to their functions
-TOOLS = {
-    "find_all_matching_files": find_all_matching_files,
-    "read_file": read_file,
-    "calculate": calculate
-}
+# Shared by every agent in the process; set its directory to keep results across runs
+TOOL_CACHE = ToolCache(TOOLS)
 
-class CustomEncoder(json.JSONEncoder):
-    """
-    Custom JSON encoder that handles Path objects from pathlib.
-    
-    This encoder is necessary for serializing results from tool functions
-    that return Path objects, which are not JSON-serializable by default.
-    Used primarily in the execute_tool method when converting tool results
-    to JSON strings for the LLM.
-    """
-    def default(self, obj):
-        if isinstance(obj, Path):
-            return str(obj)
-        return super().default(obj)
+# Retries and concurrency limit for LLM requests, shared by every agent in the process
+LLM_REQUESTS = LLMRequestController()
 
 class TechWriterAgent(abc.ABC):
     """Abstract base class for codebase analysis agents."""
     
-    def __init__(self, model_name="gpt-4o-mini", base_url=None):
-        """Initialise the agent with the specified model."""
+    agent_type = None  # "react" or "reflexion", as on the command line
+    
+    def __init__(self, model_name="gpt-4o-mini", base_url=None, transcript_dir=str(TRANSCRIPT_DIR)):
+        """
+        Initialise the agent with the specified model.
+        
+        Args:
+            model_name: The model to use
+            base_url: Base URL of an OpenAI-compatible API (optional)
+            transcript_dir: Directory to write each run's transcript to (None: no transcripts)
+        """
         self.model_name = model_name
         self.memory = []
         self.final_answer = None
         self.system_prompt = None  # To be defined by subclasses
+        self.tool_executor = ToolExecutor(TOOLS)
+        self.tool_cache = TOOL_CACHE
+        self.reset_tool_call_log()
+        self.context_budget = ContextBudget(DEFAULT_CONTEXT_BUDGET, estimator=get_estimator(model_name))
+        self.tool_definition_tokens = None  # Estimated tokens of the tool definitions sent with every request
+        # Set its keep_observations to evict older observations
+        self.transcript = TranscriptStore(transcript_dir, token_counter=self.context_budget.messages)
+        self.resume_from = None  # Checkpoint (see transcript_store.load_checkpoint) the next run continues from
+        self.first_step = 0  # Steps already completed when the run started, if it was resumed
+        self.observations = ObservationStore(transcript=self.transcript)  # Spills large observations to it
+        self.encoder = ObservationEncoder()  # Set its encodings to override the tools' own
+        self.directory = None  # Base directory of the codebase being analysed
+        self.llm_cache = None  # Optional LLMCache shared with other agents and runs
+        self.llm_requests = LLM_REQUESTS
+        self.telemetry = RunTelemetry(model_name)
+        self.loop_detector = LoopDetector()
+        self.budget = RunBudget()
+        self.budget_overrides = {}  # max_steps, max_tokens and max_seconds to use instead of the planned ones
+        self.profile = None  # Profile of the repository being analysed (see run_budget.profile_repo)
+        self.deadline = None  # Optional time.time() by which runs must have finished
+        self.stream = False  # Whether to stream completions and start tool calls as they are generated
+        self.answer_writer = None  # Optional AnswerWriter the streamed final answer is written to
         
         # Determine which API to use based on the model name
         if model_name in GEMINI_MODELS:
             if not GEMINI_API_KEY:
                 raise ValueError("GEMINI_API_KEY environment variable is not set but a Gemini model was specified.")
-            self.client = OpenAI(
-                api_key=GEMINI_API_KEY,
-                base_url=base_url or "https://generativelanguage.googleapis.com/v1beta/openai/"
-            )
+            self.api_key = GEMINI_API_KEY
+            self.base_url = base_url or "https://generativelanguage.googleapis.com/v1beta/openai/"
         else:
             if not OPENAI_API_KEY:
                 raise ValueError("OPENAI_API_KEY environment variable is not set but an OpenAI model was specified.")
-            self.client = OpenAI(api_key=OPENAI_API_KEY, base_url=base_url)
+            self.api_key = OPENAI_API_KEY
+            self.base_url = base_url
+        self._client = None
+    
+    @property
+    def client(self):
+        """The process-wide pooled OpenAI client for this base URL; retries are left to self.llm_requests."""
+        if self._client is None:
+            self._client = get_openai_client(self.api_key, self.base_url)
+        return self._client
+    
+    @client.setter
+    def client(self, client):
+        self._client = client
     
     def create_openai_tool_definitions(self, tools_dict):
         """
         Create tool definitions from a dictionary of Python functions.
         
         Args:
-            tools_dict: Dictionary mapping tool names to Python functions
+            tools_dict: Dictionary mapping tool names to Python functions, or a ToolRegistry
             
         Returns:
             List of tool definitions formatted for the OpenAI API
         """
-        tools = []
-        
-        for name, func in tools_dict.items():
-            # Extract function signature
-            sig = inspect.signature(func)
-            
-            # Get docstring and parse it
-            docstring = inspect.getdoc(func) or ""
-            description = docstring.split("\n\n")[0] if docstring else ""
-            
-            # Build parameters
-            parameters = {
-                "type": "object",
-                "properties": {},
-                "required": []
-            }
-            
-            for param_name, param in sig.parameters.items():
-                # Skip self parameter for methods
-                if param_name == "self":
-                    continue
-                
-                # Get parameter type annotation
-                param_type = param.annotation
-                if param_type is inspect.Parameter.empty:
-                    param_type = str
-                
-                # Get origin and args for generic types
-                origin = typing.get_origin(param_type)
-                args = typing.get_args(param_type)
-                
-                # Convert Python types to JSON Schema types
-                if param_type == str:
-                    json_type = "string"
-                elif param_type == int:
-                    json_type = "integer"
-                elif param_type == float or param_type == "number":
-                    json_type = "number"
-                elif param_type == bool:
-                    json_type = "boolean"
-                elif origin is list or param_type == list:
-                    json_type = "array"
-                elif origin is dict or param_type == dict:
-                    json_type = "object"
-                else:
-                    # For complex types, default to string
-                    json_type = "string"
-                
-                # Extract parameter description from docstring
-                param_desc = ""
-                if docstring:
-                    # Look for parameter in docstring (format: param_name: description)
-                    param_pattern = rf"{param_name}:\s*(.*?)(?:\n\s*\w+:|$)"
-                    param_match = re.search(param_pattern, docstring, re.DOTALL)
-                    if param_match:
-                        param_desc = param_match.group(1).strip()
-                
-                # Add parameter to schema
-                parameters["properties"][param_name] = {
-                    "type": json_type,
-                    "description": param_desc
-                }
-                
-                # Mark required parameters
-                if param.default is inspect.Parameter.empty:
-                    parameters["required"].append(param_name)
-            
-            # Create tool definition
-            tool_def = {
-                "type": "function",
-                "function": {
-                    "name": name,
-                    "description": description,
-                    "parameters": parameters
-                }
-            }
-            
-            tools.append(tool_def)
-        
-        return tools
+        if not isinstance(tools_dict, ToolRegistry):
+            tools_dict = ToolRegistry(tools_dict)
+        return tools_dict.definitions()
     
     def initialise_memory(self, prompt, directory):
-        """Initialise the agent's memory with the prompt and directory."""
+        """
+        Initialise the agent's memory with the prompt and directory.
+        
+        If self.resume_from holds a checkpoint, the memory and state of the
+        interrupted run are restored from it instead, and so is the directory
+        (see resume_checkpoint).
+        """
         if not self.system_prompt:
             raise ValueError("System prompt must be defined by subclasses")
             
-        self.memory = [{"role": "system", "content": self.system_prompt}]
-        self.memory.append({"role": "user", "content": f"Base directory: {directory}\n\n{prompt}"})
+        self.memory = []
         self.final_answer = None
+        self.directory = directory
+        self.context_budget.reset()
+        self.observations.reset()
+        self.encoder.reset(directory)
+        self.telemetry.reset()
+        self.loop_detector.reset()
+        self.reset_tool_call_log()
+        self.first_step = 0
+        self.checkpointed = 0  # Telemetry steps recorded by the last checkpoint
+        checkpoint, self.resume_from = self.resume_from, None
+        if checkpoint is not None:
+            self.resume_checkpoint(checkpoint)
+            return
+        transcript = self.transcript.start(self.model_name, directory,
+                                           details={"agent_type": self.agent_type, "prompt": prompt})
+        if transcript:
+            logger.info(f"Writing the transcript to {transcript}")
+        self.remember({"role": "system", "content": self.system_prompt})
+        self.remember({"role": "user", "content": f"Base directory: {directory}\n\n{prompt}"})
+        self.plan_budget(directory)
     
-    def call_llm(self):
+    def resume_checkpoint(self, checkpoint):
+        """
+        Restore the memory and state of an interrupted run from its last checkpoint.
+        
+        The budgets are planned again and charged with what the run had spent,
+        and the observations stored out of band, the tool call log and the
+        telemetry are restored, so the run carries on where it left off. A run
+        that had used all its steps is given one more, for its final answer,
+        and a run that already had its final answer keeps it and takes no
+        more steps.
+        """
+        self.directory = checkpoint["header"]["directory"]
+        self.encoder.reset(self.directory)
+        self.memory = self.transcript.resume(checkpoint)
+        self.transcript.evict(self.memory)
+        state = checkpoint["state"]
+        self.first_step = checkpoint["step"]
+        self.tool_call_count = state.get("tool_call_count", 0)
+        self.unchanged_references = state.get("unchanged_references", 0)
+        self.seen_observations = {key: tuple(value) for key, value in state.get("seen_observations", {}).items()}
+        self.observations.restore(checkpoint["observations"])
+        self.telemetry.steps.extend(checkpoint["telemetry"])
+        self.checkpointed = len(self.telemetry.steps)
+        self.final_answer = state.get("final_answer")
+        if checkpoint["finished"] and not analysis_failed(checkpoint["result"]):
+            self.final_answer = checkpoint["result"]
+        self.plan_budget(self.directory)
+        self.budget.resume(state.get("budget", {}))
+        if self.final_answer is None and self.first_step >= self.budget.max_steps:
+            logger.warning(f"Run {self.transcript.run_id} had used all {self.budget.max_steps} steps; allowing one "
+                           f"more for its final answer (pass --max-steps to allow more)")
+            self.budget.max_steps = self.first_step + 1
+        logger.info(f"Resuming run {self.transcript.run_id} after step {self.first_step}, "
+                    f"with {len(self.memory)} messages, from {self.transcript.path}")
+    
+    def checkpoint(self, step):
+        """Record a checkpoint of the run in its transcript after a step, writing only what is new since the last."""
+        state = {
+            "tool_call_count": self.tool_call_count,
+            "unchanged_references": self.unchanged_references,
+            "seen_observations": self.seen_observations,
+            "budget": self.budget.spent(),
+            "final_answer": self.final_answer,
+        }
+        self.transcript.checkpoint(step, state, self.telemetry.steps[self.checkpointed:])
+        self.checkpointed = len(self.telemetry.steps)
+    
+    def remaining_steps(self):
+        """Return the indexes of the steps left to run: none if a resumed run already had its final answer."""
+        return range(self.first_step, self.budget.max_steps if self.final_answer is None else self.first_step)
+    
+    def resident_chars(self):
+        """Return the characters of message content and stored observations the run holds in memory."""
+        return self.transcript.stats()["resident_chars"] + self.observations.resident_chars
+    
+    def remember(self, message):
+        """Add a message to memory and append it to the run's transcript."""
+        self.memory.append(message)
+        self.transcript.append(message)
+    
+    def plan_budget(self, directory):
+        """Profile the repository and set this run's step, token and time budgets from it and self.budget_overrides."""
+        # A new run looks at the tree as it is now; within the run, its version is checked only now and then
+        invalidate_tree_versions(directory)
+        self.profile = profile_repo(directory)
+        self.budget = plan_budget(self.profile, context_budget=self.context_budget.max_tokens, deadline=self.deadline,
+                                  **self.budget_overrides)
+        if self.profile is not None:
+            languages = ", ".join(f"{name} {counts['lines']}" for name, counts in list(self.profile["languages"].items())[:5])
+            logger.info(f"Profile: {self.profile['files']} files ({self.profile['source_files']} source), "
+                        f"{self.profile['lines']} lines ({languages}) in {self.profile['seconds'] * 1000:.0f}ms")
+        deadline = "" if self.deadline is None else f", deadline in {self.budget.seconds_left():.0f}s"
+        logger.info(f"Budget: {self.budget.max_steps} steps, {self.budget.max_tokens or 'unlimited'} tokens, "
+                    f"{self.budget.max_seconds or 'unlimited'} seconds{deadline}")
+    
+    def reset_tool_call_log(self):
+        """Forget the tool calls made so far, for a new run."""
+        # The last observation of each pure call: cache key -> (call number, tool call id, digest)
+        self.tool_call_count = 0
+        self.seen_observations = {}
+        self.unchanged_references = 0
+        # Tool calls started while their completion was still streaming: tool call id -> handle
+        self.started_tool_calls = {}
+    
+    def step_messages(self, instructions=()):
+        """
+        Return the messages for the next LLM call: the memory, then any per-step instructions.
+        
+        Instructions go in a final user turn that is not stored in memory. The
+        system prompt and first user turn are never edited, so together with the
+        tool schemas every request of a run starts with the same bytes, which
+        providers can serve from their prompt caches.
+        
+        Args:
+            instructions: Instructions for this call only
+        """
+        if not instructions:
+            return self.memory
+        return self.memory + [{"role": "user", "content": "\n\n".join(instructions)}]
+    
+    def next_step_instructions(self, reflect=False):
+        """
+        Return the arguments for the next LLM call: per-step instructions, and whether to forbid tool calls.
+        
+        Args:
+            reflect: Whether to add the Reflexion instruction
+            
+        Returns:
+            tuple: (instructions, finalise) where the instructions include any corrective hint from
+            the loop detector, and finalise is True once the run's budget is nearly spent or the
+            loop detector has decided to force the final answer
+        """
+        instructions = [REFLECTION_INSTRUCTION] if reflect else []
+        self.budget.start_step()
+        reason = self.budget.exhaustion_reason()
+        if reason is not None:
+            instructions.append(finalise_instruction(reason))
+            return instructions, True
+        action = self.loop_detector.next_action()
+        if action is not None:
+            instructions.append(action[1])
+        return instructions, action is not None and action[0] == FINALISE
+    
+    def partial_result(self):
+        """Return the last text the model wrote in a run that ended without a final answer, or None."""
+        for message in reversed(self.memory):
+            role = message.get("role") if isinstance(message, dict) else getattr(message, "role", None)
+            content = message.get("content") if isinstance(message, dict) else getattr(message, "content", None)
+            if role == "assistant" and content:
+                return content
+        return None
+    
+    def record_answer(self, llm_calls, max_steps):
+        """Tell the loop detector the run has its final answer, so it can count the steps it saved."""
+        self.loop_detector.record_answer(llm_calls, max_steps, self.context_budget.total_tokens(self.memory))
+    
+    def call_llm(self, instructions=(), finalise=False):
         """
         Call the LLM with the current memory and tools.
         
-        Uses the OpenAI client with appropriate base_url for all models.
+        Uses the OpenAI client with appropriate base_url for all models. Old tool
+        observations are compacted first if the memory is over the context budget.
+        Rate limits and transient errors are retried with backoff; the error is
+        only raised once the request fails fatally or runs out of attempts.
+        With self.stream set, the completion is streamed (see stream_llm).
+        
+        Args:
+            instructions: Instructions for this call only, sent after the memory (see step_messages)
+            finalise: Whether to forbid tool calls, so that the model has to answer
+            
+        Raises:
+            Exception: The API client's own exception, unchanged, if the request fails
         """
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=self.memory,
-                tools=self.create_openai_tool_definitions(TOOLS),
-                temperature=0
-            )
-            return response.choices[0].message
+            self.context_budget.apply(self.memory)
+            request = {"model": self.model_name, "messages": self.step_messages(instructions),
+                       "tools": TOOLS.definitions(), "temperature": 0}
+            if finalise:
+                request["tool_choice"] = "none"
+            key, message = self.cached_llm_response(request)
+            if message is None:
+                start = time.perf_counter()
+                self.telemetry.start_step()
+                if self.stream:
+                    message, usage, first_action = self.stream_llm(request, start)
+                else:
+                    response = self.llm_requests.call(
+                        lambda: self.client.chat.completions.create(**request, **self.request_options()),
+                        self.budget.deadline
+                    )
+                    message, usage, first_action = response.choices[0].message, getattr(response, "usage", None), None
+                step = self.telemetry.record_llm_call(usage, time.perf_counter() - start, first_action,
+                                                      self.estimate_prompt_tokens(request))
+                self.cache_llm_response(key, message)
+                self.record_budget_call(step, request)
+            else:
+                self.telemetry.record_replayed_call()
+                self.budget.record_call(0)
+            return message
         except Exception as e:
-            error_msg = f"Error calling API: {str(e)}"
-            logger.error(error_msg)
-            raise ValueError(error_msg)
+            # Re-raised as it is, so that the loop can tell what failed and still return the partial result
+            logger.error(f"Error calling API: {type(e).__name__}: {e}")
+            raise
+    
+    def estimate_prompt_tokens(self, request):
+        """Estimate the prompt tokens of an LLM request: its messages, counted incrementally, and the tool definitions."""
+        if self.tool_definition_tokens is None:
+            estimator = self.context_budget.messages.estimator
+            self.tool_definition_tokens = estimator.count(json.dumps(request["tools"]))
+        return self.context_budget.total_tokens(request["messages"]) + self.tool_definition_tokens
+    
+    def record_budget_call(self, step, request):
+        """Charge an LLM call to the run's budget, estimating its tokens if the API did not report them."""
+        tokens = step.get("prompt_tokens", 0) + step.get("completion_tokens", 0)
+        self.budget.record_call(tokens or step.get("estimated_prompt_tokens") or self.estimate_prompt_tokens(request),
+                                step["llm_seconds"])
+    
+    def request_options(self):
+        """Return extra arguments for an LLM request: with a deadline, a timeout that keeps the request within it."""
+        timeout = self.budget.request_timeout()
+        return {} if timeout is None else {"timeout": timeout}
+    
+    def stream_llm(self, request, start):
+        """
+        Stream a completion, starting each tool call as soon as the model has finished generating it.
+        
+        Started calls are kept in self.started_tool_calls for execute_tool_calls
+        to collect, so tool I/O overlaps with the generation of later calls.
+        Answer text is written to self.answer_writer as it arrives.
+        
+        Args:
+            request: Keyword arguments for chat.completions.create
+            start: time.perf_counter() when the step's request was made
+            
+        Returns:
+            tuple: (message, usage, first_action_seconds)
+        """
+        def attempt():
+            streamed = self.start_stream(self.start_tool_call, start)
+            for chunk in self.client.chat.completions.create(**request, stream=True, stream_options={"include_usage": True},
+                                                             **self.request_options()):
+                streamed.feed(chunk)
+            return streamed, streamed.finish()
+        
+        return self.finish_stream(*self.llm_requests.call(attempt, self.budget.deadline))
+    
+    def start_stream(self, start_tool_call, start):
+        """
+        Start an attempt at streaming a completion, for stream_llm and stream_llm_async.
+        
+        A retried request starts from nothing: the answer text a failed attempt
+        wrote is discarded, and so are the tool calls it started, which are
+        read-only and can simply be dropped.
+        
+        Args:
+            start_tool_call: Called with each tool call as soon as it is complete
+            start: time.perf_counter() when the step's request was made
+            
+        Returns:
+            StreamedCompletion: The completion to feed the chunks to
+        """
+        self.started_tool_calls = {}
+        if self.answer_writer is not None:
+            self.answer_writer.discard()
+        return StreamedCompletion(start_tool_call, self.answer_writer and self.answer_writer.write, start)
+    
+    def finish_stream(self, streamed, message):
+        """Return (message, usage, first_action_seconds) for a streamed completion, discarding text before tool calls."""
+        if message.get("tool_calls") and self.answer_writer is not None:
+            # Text before tool calls is not the answer
+            self.answer_writer.discard()
+        if streamed.first_action_seconds is not None:
+            logger.info(f"Time to first action: {streamed.first_action_seconds:.2f}s")
+        return ChatCompletionMessage.model_validate(message), streamed.usage, streamed.first_action_seconds
+    
+    def start_tool_call(self, tool_call):
+        """Start executing a tool call from a completion that is still streaming."""
+        logger.debug(f"Starting tool: {tool_call.function.name} with args: {tool_call.function.arguments}")
+        self.started_tool_calls[tool_call.id] = self.tool_executor.submit(
+            self.timed_execute_tool, tool_call, tool_call.function.name
+        )
+    
+    def cached_llm_response(self, request):
+        """
+        Look up the response to an LLM request in the response cache.
+        
+        Args:
+            request: Keyword arguments for chat.completions.create
+            
+        Returns:
+            tuple: (key, message) where key is the request's cache key (None without a
+            cache) and message is the cached assistant message, or None on a miss
+        """
+        if self.llm_cache is None:
+            return None, None
+        key = request_key(**request)
+        cached = self.llm_cache.get(key)
+        if cached is None:
+            return key, None
+        logger.debug("Replaying cached LLM response")
+        return key, ChatCompletionMessage.model_validate(cached)
+    
+    def cache_llm_response(self, key, message):
+        """Store an assistant message under the key from cached_llm_response."""
+        if key is not None:
+            self.llm_cache.put(key, message, self.model_name)
     
     def check_llm_result(self, assistant_message):
         """
@@ -491,7 +716,7 @@ class TechWriterAgent(abc.ABC):
                 result_type: "final_answer" or "tool_calls"
                 result_data: The final answer string or list of tool calls
         """
-        self.memory.append(assistant_message)
+        self.remember(assistant_message)
         
         if assistant_message.tool_calls:
             return "tool_calls", assistant_message.tool_calls
@@ -514,14 +739,30 @@ class TechWriterAgent(abc.ABC):
             return f"Error: Unknown tool {tool_name}"
         
         try:
-            # Parse the arguments
+            # Parse the arguments; relative paths, as in encoded results, are relative to the base directory
             args = json.loads(tool_call.function.arguments)
+            for name in TOOLS.options(tool_name)["depends_on"]:
+                if name in args:
+                    args[name] = resolve_path(args[name], self.directory)
             
-            # Call the tool function
-            result = TOOLS[tool_name](**args)
+            if tool_name == "fetch_observation":
+                # Stored observations belong to this run, so they are read from the agent's own store,
+                # or from its transcript if they were evicted from memory
+                if str(args.get("handle", "")).startswith(TRANSCRIPT_HANDLE_PREFIX):
+                    result = self.transcript.fetch(**args)
+                else:
+                    result = self.observations.fetch(**args)
+                # Pages fetched from the store are kept as they are
+                return self.encoder.encode(tool_name, result, TOOLS.options(tool_name)["encoding"])
+            
+            # Call the tool function (in a worker process for CPU-bound tools),
+            # or reuse its cached result if it is pure and its dependencies are unchanged
+            result = self.tool_cache.call(tool_name, args, self.tool_executor.call)
             
-            # Convert result to JSON string
-            return json.dumps(result, cls=CustomEncoder, indent=2)
+            # Encode the result as the tool, or an override, asks (see observation_encoder); a large
+            # result is moved to the observation store from the result itself, whatever its encoding
+            observation = self.encoder.encode(tool_name, result, TOOLS.options(tool_name)["encoding"])
+            return self.observations.offload(observation, tool_name, self.encoder.relativise(result))
         except json.JSONDecodeError as e:
             return f"Error: Invalid JSON in tool arguments: {str(e)}"
         except TypeError as e:
@@ -531,6 +772,131 @@ class TechWriterAgent(abc.ABC):
         except Exception as e:
             return f"Error executing tool {tool_name}: {str(e)}"
     
+    def timed_execute_tool(self, tool_call):
+        """Execute a tool call with execute_tool, recording its latency and observation size in the telemetry."""
+        start = time.perf_counter()
+        observation = self.execute_tool(tool_call)
+        self.telemetry.record_tool_call(tool_call.function.name, time.perf_counter() - start, observation)
+        return observation
+    
+    def log_context_stats(self):
+        """Log how much context compaction and the observation store saved over this run."""
+        stats = self.context_budget.stats()
+        logger.info(f"Context: peak about {stats['peak_tokens']} tokens, {stats['observations_compacted']} observations "
+                    f"compacted, about {stats['tokens_saved']} prompt tokens saved")
+        stats = self.observations.stats()
+        logger.info(f"Observation store: {stats['observations_stored']} stored, {stats['observations_deduplicated']} "
+                    f"deduplicated, {stats['observations_spilled']} spilled to the transcript, {stats['fetches']} "
+                    f"fetches, {stats['chars_kept_out']} characters kept out of the conversation")
+        hit_rates = ", ".join(f"{name} {counts['hit_rate']:.0%}" for name, counts in self.tool_cache.stats().items())
+        logger.info(f"Tool cache hit rates: {hit_rates or 'no cached calls'}; "
+                    f"{self.unchanged_references} repeated results sent as references")
+        stats = self.encoder.stats()
+        logger.info(f"Observation encoding: about {stats['tokens']} tokens, {stats['tokens_saved']} "
+                    f"({stats['saving']:.0%}) fewer than indented JSON")
+        stats = self.loop_detector.stats()
+        logger.info(f"Loop detector: {stats['repeated_calls']} repeated calls, {stats['cycles']} cycles, "
+                    f"{stats['hints']} hints, {stats['forced_finalisations']} forced final answers; "
+                    f"about {stats['pointer_tokens_saved']} tokens saved by pointers; forced answers saved "
+                    f"at most {stats['max_steps_saved']} steps and {stats['max_tokens_saved']} tokens (upper bound)")
+        stats = self.transcript.stats()
+        logger.info(f"Transcript: {stats['messages']} messages, about {stats['tokens']} tokens, {stats['bytes']} bytes "
+                    f"written; {stats['observations_evicted']} observations evicted ({stats['chars_evicted']} characters), "
+                    f"{stats['fetches']} fetched back; {self.resident_chars()} characters resident")
+        stats = self.budget.stats()
+        finalised = f"; asked to finish early ({stats['finalised']})" if stats["finalised"] else ""
+        logger.info(f"Budget: {stats['steps']} of {stats['max_steps']} steps, {stats['tokens']} of "
+                    f"{stats['max_tokens'] or 'unlimited'} tokens, {stats['seconds']:.1f} of "
+                    f"{stats['max_seconds'] or 'unlimited'} seconds{finalised}")
+        stats = self.telemetry.summary()
+        cost = "unknown" if stats["cost_usd"] is None else f"${stats['cost_usd']:.4f}"
+        logger.info(f"Usage: {stats['llm_calls']} LLM calls ({stats['replayed_calls']} replayed), "
+                    f"{stats['prompt_tokens']} prompt tokens ({stats['cached_tokens']} served from the provider's "
+                    f"prompt cache, {stats['prompt_cache_hit_rate']:.0%}), "
+                    f"{stats['completion_tokens']} completion tokens, {stats['llm_seconds']:.1f}s waiting on the LLM, "
+                    f"{stats['tool_calls']} tool calls taking {stats['tool_seconds']:.1f}s, cost {cost}")
+    
+    def execute_tool_calls(self, tool_calls):
+        """
+        Execute the tool calls of one step concurrently and add their observations to memory.
+        
+        Calls already started while the completion was streaming are waited for, not run again.
+        
+        Args:
+            tool_calls: The tool call objects from the LLM, in the order it made them
+        """
+        started, self.started_tool_calls = self.started_tool_calls, {}
+        submitted = []
+        for tool_call in tool_calls:
+            handle = started.get(tool_call.id)
+            if handle is None:
+                logger.debug(f"Executing tool: {tool_call.function.name} with args: {tool_call.function.arguments}")
+                handle = self.tool_executor.submit(self.timed_execute_tool, tool_call, tool_call.function.name)
+            submitted.append(handle)
+        self.record_observations(tool_calls, self.tool_executor.results(submitted))
+    
+    def record_observations(self, tool_calls, observations):
+        """
+        Add tool observations to memory in the original tool call order.
+        
+        Large observations have already been moved to the observation store by
+        execute_tool, so memory holds a reference to them. A repeated pure call
+        whose result is identical to an earlier one that is still in memory is
+        recorded as a short reference to that call. The step is then passed to
+        the loop detector, which may steer the next LLM call. Finally, with transcript.keep_observations set, the bodies of older
+        observations are evicted from memory to the transcript.
+        """
+        for tool_call, observation in zip(tool_calls, observations):
+            tool_name = tool_call.function.name
+            self.tool_call_count += 1
+            logger.debug(f"Tool result length: {len(observation) if observation else 0} chars")
+            observation = self.reference_repeated_observation(tool_call, observation)
+            self.remember({
+                "role": "tool",
+                "tool_call_id": tool_call.id,
+                "name": tool_name,
+                "content": observation
+            })
+        self.loop_detector.record_step(tool_calls, observations)
+        self.transcript.evict(self.memory)
+    
+    def reference_repeated_observation(self, tool_call, observation):
+        """
+        Replace the observation of a repeated pure tool call with a reference to the earlier call.
+        
+        Args:
+            tool_call: The tool call, numbered self.tool_call_count in this run
+            observation: Its observation
+            
+        Returns:
+            The observation, or a reference if the same call returned the same result earlier
+            in this run and that result has not since been compacted out of memory
+        """
+        try:
+            key = self.tool_cache.key(tool_call.function.name, json.loads(tool_call.function.arguments))
+        except (TypeError, ValueError):
+            key = None
+        if key is None or not observation:
+            return observation
+        
+        digest = hashlib.sha1(observation.encode("utf-8", "replace")).hexdigest()
+        earlier = self.seen_observations.get(key)
+        if earlier and earlier[2] == digest and any(
+            isinstance(m, dict) and m.get("tool_call_id") == earlier[1] and not m["content"].startswith(STUB_PREFIX)
+            for m in self.memory
+        ):
+            self.unchanged_references += 1
+            reference = json.dumps({
+                "unchanged_since_call": earlier[0],
+                "note": f"Same result as tool call #{earlier[0]} ({tool_call.function.name} with the same "
+                        f"arguments), which is still above; nothing has changed since."
+            })
+            count = self.context_budget.messages.estimator.count
+            self.loop_detector.record_pointer(count(observation) - count(reference))
+            return reference
+        self.seen_observations[key] = (self.tool_call_count, tool_call.id, digest)
+        return observation
+    
     @abc.abstractmethod
     def run(self, prompt, directory):
         """
@@ -551,25 +917,30 @@ class TechWriterAgent(abc.ABC):
 class ReActAgent(TechWriterAgent):
     """Agent that uses the ReAct pattern for codebase analysis."""
     
-    def __init__(self, model_name="gpt-4o-mini", base_url=None):
+    agent_type = "react"
+    
+    def __init__(self, model_name="gpt-4o-mini", base_url=None, transcript_dir=str(TRANSCRIPT_DIR)):
         REACT_SYSTEM_PROMPT = f"{ROLE_AND_TASK}\n\n{GENERAL_ANALYSIS_GUIDELINES}\n\n{INPUT_PROCESSING_GUIDELINES}\n\n{CODE_ANALYSIS_STRATEGIES}\n\n{REACT_PLANNING_STRATEGY}\n\n{QUALITY_REQUIREMENTS}"
 
         """Initialise the ReAct agent with the specified model."""
-        super().__init__(model_name, base_url)
+        super().__init__(model_name, base_url, transcript_dir)
         self.system_prompt = REACT_SYSTEM_PROMPT
     
     def run(self, prompt, directory):
         """Run the agent to analyse a codebase using the ReAct pattern."""
         self.initialise_memory(prompt, directory)
-        max_steps = 15
+        max_steps = self.budget.max_steps
         
-        for step in range(max_steps):
+        for step in self.remaining_steps():
+            if self.budget.deadline_passed():
+                self.final_answer = DEADLINE_MISSED
+                break
             logger.info(f"\n--- Step {step + 1} ---")
             logger.debug(f"Current memory size: {len(self.memory)} messages")
             
-            # Call the LLM
+            # Call the LLM, with a corrective hint if the loop detector has one
             try:
-                assistant_message = self.call_llm()
+                assistant_message = self.call_llm(*self.next_step_instructions())
                 
                 # Check the result
                 result_type, result_data = self.check_llm_result(assistant_message)
@@ -577,62 +948,67 @@ class ReActAgent(TechWriterAgent):
                 if result_type == "final_answer":
                     logger.info("Received final answer from LLM")
                     self.final_answer = result_data
+                    self.record_answer(step + 1, max_steps)
+                    self.checkpoint(step + 1)
                     break
                 elif result_type == "tool_calls":
                     logger.info(f"Processing {len(result_data)} tool calls")
-                    # Execute each tool call
-                    for tool_call in result_data:
-                        logger.debug(f"Executing tool: {tool_call.function.name} with args: {tool_call.function.arguments}")
-                        # Execute the tool
-                        observation = self.execute_tool(tool_call)
-                        logger.debug(f"Tool result length: {len(observation) if observation else 0} chars")
-                        
-                        # Add the observation to memory
-                        self.memory.append({
-                            "role": "tool",
-                            "tool_call_id": tool_call.id,
-                            "name": tool_call.function.name,
-                            "content": observation
-                        })
+                    # Execute the tool calls concurrently
+                    self.execute_tool_calls(result_data)
             except Exception as e:
                 logger.error(f"Unexpected error in step {step + 1}: {e}", exc_info=True)
                 self.final_answer = f"Error running code analysis: {e}"
                 break
             
             logger.info(f"Memory length: {len(self.memory)} messages")
-            logger.debug(f"Current memory content size: {sum(len(str(msg)) for msg in self.memory)} chars")
+            logger.debug(f"Transcript: about {self.transcript.tokens} tokens written, "
+                         f"{self.resident_chars()} characters in memory")
+            self.checkpoint(step + 1)
         
         if self.final_answer is None:
             logger.warning(f"Failed to complete analysis within {max_steps} steps")
             self.final_answer = "Failed to complete the analysis within the step limit."
         
+        self.transcript.finish(self.final_answer)
+        self.log_context_stats()
         return self.final_answer
 
 
 class ReflexionAgent(TechWriterAgent):
     """Agent that uses the Reflexion pattern for codebase analysis."""
     
-    def __init__(self, model_name="gpt-4o-mini", base_url=None):
+    agent_type = "reflexion"
+    
+    def __init__(self, model_name="gpt-4o-mini", base_url=None, transcript_dir=str(TRANSCRIPT_DIR)):
         """Initialise the Reflexion agent with the specified model."""
         REFLEXION_SYSTEM_PROMPT = f"{ROLE_AND_TASK}\n\n{GENERAL_ANALYSIS_GUIDELINES}\n\n{INPUT_PROCESSING_GUIDELINES}\n\n{CODE_ANALYSIS_STRATEGIES}\n\n{REFLEXION_PLANNING_STRATEGY}\n\n{QUALITY_REQUIREMENTS}"
 
-        super().__init__(model_name, base_url)
+        super().__init__(model_name, base_url, transcript_dir)
         self.system_prompt = REFLEXION_SYSTEM_PROMPT
     
     def run(self, prompt, directory):
         """Run the agent to analyse a codebase with reflection."""
         self.initialise_memory(prompt, directory)
-        max_steps = 15
-        step_count = 0
+        max_steps = self.budget.max_steps
+        step_count = self.first_step
+        # Whether the next LLM call follows a round of tool calls and should reflect on it;
+        # a resumed run was checkpointed after one
+        reflect = step_count > 0
         
-        while step_count < max_steps:
+        while self.final_answer is None and step_count < max_steps:
+            if self.budget.deadline_passed():
+                self.final_answer = DEADLINE_MISSED
+                break
             step_count += 1
             logger.info(f"\n--- Step {step_count} ---")
             logger.debug(f"Current memory size: {len(self.memory)} messages")
             
             # Call the LLM
             try:
-                assistant_message = self.call_llm()
+                # The reflection instruction is a key aspect of the Reflexion pattern. It is sent
+                # after the memory rather than added to the system prompt, so that the prompt
+                # prefix stays the same on every step and the provider's prompt cache can reuse it
+                assistant_message = self.call_llm(*self.next_step_instructions(reflect))
                 
                 # Check the result
                 result_type, result_data = self.check_llm_result(assistant_message)
@@ -640,76 +1016,343 @@ class ReflexionAgent(TechWriterAgent):
                 if result_type == "final_answer":
                     logger.info("Received final answer from LLM")
                     self.final_answer = result_data
+                    self.record_answer(step_count, max_steps)
+                    self.checkpoint(step_count)
                     break
                 elif result_type == "tool_calls":
                     logger.info(f"Processing {len(result_data)} tool calls")
-                    # Execute each tool call and add to memory
-                    for tool_call in result_data:
-                        logger.debug(f"Executing tool: {tool_call.function.name} with args: {tool_call.function.arguments}")
-                        # Execute the tool
-                        observation = self.execute_tool(tool_call)
-                        logger.debug(f"Tool result length: {len(observation) if observation else 0} chars")
-                        
-                        # Add the observation to memory
-                        self.memory.append({
-                            "role": "tool",
-                            "tool_call_id": tool_call.id,
-                            "name": tool_call.function.name,
-                            "content": observation
-                        })
-                    
-                    # After processing all tool calls, we need another LLM call to process them
-                    # This is where we'll add a special instruction for reflection in the system prompt
-                    
-                    # Temporarily modify the system prompt to include a reflection instruction
-                    # This is a key aspect of the Reflexion pattern
-                    original_system_prompt = self.system_prompt
-                    reflection_instruction = "\n\nBefore responding, reflect on your previous actions. Were they effective? How can you improve your approach? Incorporate these reflections into your response."
-                    
-                    # Find the system message in memory and update it
-                    for i, message in enumerate(self.memory):
-                        if message.get("role") == "system":
-                            # Store original system message
-                            original_system_message = self.memory[i].copy()
-                            # Update with reflection instruction
-                            self.memory[i]["content"] += reflection_instruction
-                            logger.debug("Added reflection instruction to system prompt")
-                            break
-                    
-                    # The next call_llm() will use the updated system prompt with reflection
-                    # We don't need to do anything special here, as the next iteration will handle it
-                    
-                    # Restore the original system message after the next iteration
-                    if step_count + 1 < max_steps:
-                        # Schedule restoration for next iteration
-                        self.memory_restoration_needed = True
-                        self.original_system_message = original_system_message
-                        logger.debug("Scheduled system prompt restoration for next step")
+                    # Execute the tool calls concurrently and add them to memory
+                    self.execute_tool_calls(result_data)
+                    reflect = True
                     
             except Exception as e:
                 logger.error(f"Unexpected error in step {step_count}: {e}", exc_info=True)
                 self.final_answer = f"Error running code analysis: {e}"
                 break
             
-            # Check if we need to restore the system message
-            if hasattr(self, 'memory_restoration_needed') and self.memory_restoration_needed:
-                # Restore original system message
-                for i, message in enumerate(self.memory):
-                    if message.get("role") == "system":
-                        self.memory[i] = self.original_system_message
-                        logger.debug("Restored original system prompt")
-                        break
-                self.memory_restoration_needed = False
-            
             logger.info(f"Memory length: {len(self.memory)} messages")
-            logger.debug(f"Current memory content size: {sum(len(str(msg)) for msg in self.memory)} chars")
+            logger.debug(f"Transcript: about {self.transcript.tokens} tokens written, "
+                         f"{self.resident_chars()} characters in memory")
+            self.checkpoint(step_count)
         
         if self.final_answer is None:
             logger.warning(f"Failed to complete analysis within {max_steps} steps")
             self.final_answer = "Failed to complete the analysis within the step limit."
         
+        self.transcript.finish(self.final_answer)
+        self.log_context_stats()
+        return self.final_answer
+
+class AsyncAgentMixin:
+    """
+    Asyncio version of the agent loop, for running many analyses in one process.
+    
+    Mixed into ReActAgent or ReflexionAgent. LLM calls go through AsyncOpenAI and
+    tool calls are awaited on the ToolExecutor's threads, so an analysis that is
+    waiting on the API or a tool holds no thread of its own.
+    """
+    
+    async_client = None
+    
+    def get_async_client(self):
+        """Return the pooled AsyncOpenAI client of the running event loop; retries are left to self.llm_requests."""
+        if self.async_client is None:
+            self.async_client = get_async_openai_client(self.api_key, self.base_url)
+        return self.async_client
+    
+    async def call_llm_async(self, instructions=(), finalise=False):
+        """
+        Call the LLM with the current memory, any per-step instructions (see step_messages) and tools.
+        
+        With finalise set, tool calls are forbidden so that the model has to answer.
+        """
+        try:
+            request = {
+                "model": self.model_name,
+                "messages": self.step_messages(instructions),
+                "tools": TOOLS.definitions(),
+                "temperature": 0
+            }
+            if finalise:
+                request["tool_choice"] = "none"
+            key, message = self.cached_llm_response(request)
+            if message is None:
+                start = time.perf_counter()
+                self.telemetry.start_step()
+                if self.stream:
+                    message, usage, first_action = await self.stream_llm_async(request, start)
+                else:
+                    response = await self.llm_requests.call_async(
+                        lambda: self.get_async_client().chat.completions.create(**request, **self.request_options()),
+                        self.budget.deadline
+                    )
+                    message, usage, first_action = response.choices[0].message, getattr(response, "usage", None), None
+                step = self.telemetry.record_llm_call(usage, time.perf_counter() - start, first_action,
+                                                      self.estimate_prompt_tokens(request))
+                self.cache_llm_response(key, message)
+                self.record_budget_call(step, request)
+            else:
+                self.telemetry.record_replayed_call()
+                self.budget.record_call(0)
+            return message
+        except Exception as e:
+            # Re-raised as it is, so that the loop can tell what failed and still return the partial result
+            logger.error(f"Error calling API: {type(e).__name__}: {e}")
+            raise
+    
+    async def stream_llm_async(self, request, start):
+        """Asyncio version of stream_llm; tool calls are started as tasks on the event loop."""
+        async def attempt():
+            streamed = self.start_stream(self.start_tool_call_async, start)
+            stream = await self.get_async_client().chat.completions.create(
+                **request, stream=True, stream_options={"include_usage": True}, **self.request_options()
+            )
+            async for chunk in stream:
+                streamed.feed(chunk)
+            return streamed, streamed.finish()
+        
+        return self.finish_stream(*await self.llm_requests.call_async(attempt, self.budget.deadline))
+    
+    def start_tool_call_async(self, tool_call):
+        """Start executing a tool call from a completion that is still streaming, as a task."""
+        self.started_tool_calls[tool_call.id] = asyncio.ensure_future(
+            self.tool_executor.call_async(self.timed_execute_tool, tool_call, tool_call.function.name)
+        )
+    
+    async def execute_tool_calls_async(self, tool_calls):
+        """Execute the tool calls of one step concurrently, or await those already started, and add their observations to memory."""
+        started, self.started_tool_calls = self.started_tool_calls, {}
+        observations = await asyncio.gather(*(
+            started.get(tool_call.id) or
+            self.tool_executor.call_async(self.timed_execute_tool, tool_call, tool_call.function.name)
+            for tool_call in tool_calls
+        ))
+        self.record_observations(tool_calls, list(observations))
+    
+    async def run_async(self, prompt, directory):
+        """Run the agent to analyse a codebase without blocking the event loop."""
+        self.initialise_memory(prompt, directory)
+        max_steps = self.budget.max_steps
+        reflect = self.first_step > 0 and isinstance(self, ReflexionAgent)
+        
+        for step in self.remaining_steps():
+            if self.budget.deadline_passed():
+                self.final_answer = DEADLINE_MISSED
+                break
+            logger.info(f"[{directory}] Step {step + 1}")
+            try:
+                self.context_budget.apply(self.memory)
+                # Reflexion: the call after a round of tool calls ends with the reflection instruction
+                assistant_message = await self.call_llm_async(*self.next_step_instructions(reflect))
+                result_type, result_data = self.check_llm_result(assistant_message)
+                
+                if result_type == "final_answer":
+                    self.final_answer = result_data
+                    self.record_answer(step + 1, max_steps)
+                    self.checkpoint(step + 1)
+                    break
+                await self.execute_tool_calls_async(result_data)
+                reflect = isinstance(self, ReflexionAgent)
+                self.checkpoint(step + 1)
+            except Exception as e:
+                logger.error(f"[{directory}] Unexpected error in step {step + 1}: {e}", exc_info=True)
+                self.final_answer = f"Error running code analysis: {e}"
+                break
+        
+        if self.final_answer is None:
+            logger.warning(f"[{directory}] Failed to complete analysis within {max_steps} steps")
+            self.final_answer = "Failed to complete the analysis within the step limit."
+        
+        self.transcript.finish(self.final_answer)
+        self.log_context_stats()
         return self.final_answer
 
+
+class AsyncReActAgent(AsyncAgentMixin, ReActAgent):
+    """ReAct agent with an asyncio loop (run_async)."""
+
+
+class AsyncReflexionAgent(AsyncAgentMixin, ReflexionAgent):
+    """Reflexion agent with an asyncio loop (run_async)."""
+
+
+def message_memory_bytes(messages) -> int:
+    """Approximate the bytes held by an agent's message memory."""
+    seen = set()
+    
+    def size(obj):
+        if id(obj) in seen:
+            return 0
+        seen.add(id(obj))
+        if hasattr(obj, "model_dump"):
+            obj = obj.model_dump()
+        total = sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            total += sum(size(k) + size(v) for k, v in obj.items())
+        elif isinstance(obj, (list, tuple)):
+            total += sum(size(item) for item in obj)
+        return total
+    
+    return sum(size(message) for message in messages)
+
+
+async def analyse_many_async(directories: List[str], prompt: str, model_name: str, agent_type: str = "react",
+                             concurrency: int = 8, base_url: str = None, client=None,
+                             context_budget: int = DEFAULT_CONTEXT_BUDGET, llm_cache=None,
+                             run_cache: Optional[RunCache] = None, refresh: bool = False,
+                             stream: bool = False, answer_paths: Optional[Dict[str, str]] = None,
+                             budget_overrides: Optional[Dict[str, Any]] = None,
+                             deadline: Optional[float] = None,
+                             observation_encodings: Optional[Dict[str, str]] = None,
+                             transcript_dir: Optional[str] = str(TRANSCRIPT_DIR),
+                             keep_observations: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Analyse many codebases concurrently in this process.
+    
+    At most `concurrency` analyses run at once. They share one API client (and
+    its connection pool) and one ToolExecutor, whose threads are bounded by the
+    concurrency limit.
+    
+    Args:
+        directories: Directories of the codebases to analyse
+        prompt: The analysis prompt
+        model_name: Name of model to use for analysis
+        agent_type: Type of agent (react or reflexion)
+        concurrency: Maximum number of analyses in flight at once
+        base_url: Base URL for API (optional)
+        client: AsyncOpenAI-compatible client to use instead of creating one (optional)
+        context_budget: Estimated tokens of memory before old observations are compacted (0 disables)
+        llm_cache: LLMCache to replay and record responses with (optional)
+        run_cache: RunCache to return unchanged analyses from and store new ones in (optional)
+        refresh: Whether to run every analysis even if the run cache has its result
+        stream: Whether to stream completions, starting tool calls while later ones are generated
+        answer_paths: Files to write the answers to as they stream in, by directory (optional; needs stream)
+        budget_overrides: max_steps, max_tokens and/or max_seconds to use instead of the budgets
+            planned from each repository's profile (optional)
+        deadline: time.time() by which every analysis must have finished; each one asks for
+            its final answer early enough to finish in time (optional)
+        observation_encodings: Encodings of tool results by tool name ("*" for all tools),
+            instead of the tools' own (optional; see observation_encoder)
+        transcript_dir: Directory to write each run's transcript to (None: no transcripts)
+        keep_observations: Latest tool observations kept in memory; older ones are evicted to the
+            transcript and read back with fetch_observation (optional; see transcript_store)
+        
+    Returns:
+        One dictionary per directory, in the same order, with the result, the
+        elapsed seconds, the approximate bytes held by the analysis's memory,
+        its context compaction, observation store, usage ("telemetry"), budget and
+        transcript statistics, the repository profile and its run cache status ("run"; see analyse_codebase)
+    """
+    agent_classes = {"react": AsyncReActAgent, "reflexion": AsyncReflexionAgent}
+    if agent_type not in agent_classes:
+        raise ValueError(f"Unknown agent type: {agent_type}")
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    tool_executor = ToolExecutor(TOOLS, max_workers=max(concurrency, 4))
+    
+    async def analyse_one(directory):
+        nonlocal client
+        async with semaphore:
+            agent = agent_classes[agent_type](model_name, base_url, transcript_dir)
+            # Close the agent's own executor, which the shared one replaces, so its pools are not leaked
+            agent.tool_executor.close()
+            agent.tool_executor = tool_executor
+            agent.context_budget.max_tokens = context_budget
+            agent.llm_cache = llm_cache
+            agent.stream = stream
+            agent.budget_overrides = budget_overrides or {}
+            agent.deadline = deadline
+            agent.encoder = ObservationEncoder(observation_encodings)
+            agent.transcript.keep_observations = keep_observations
+            if stream and answer_paths and answer_paths.get(directory):
+                agent.answer_writer = AnswerWriter(answer_paths[directory])
+            if client is None:
+                client = agent.get_async_client()
+            agent.async_client = client
+            start = time.perf_counter()
+            run_info, result = await asyncio.to_thread(
+                lookup_run, run_cache, refresh, directory, prompt, agent, model_name, agent_type
+            )
+            if result is None:
+                try:
+                    result = await agent.run_async(prompt, directory)
+                finally:
+                    if agent.answer_writer is not None:
+                        agent.answer_writer.close()
+                store_run(run_cache, run_info, result, agent, time.perf_counter() - start)
+            return {
+                "directory": directory,
+                "result": result,
+                "seconds": time.perf_counter() - start,
+                "memory_bytes": message_memory_bytes(agent.memory),
+                "context": agent.context_budget.stats(),
+                "observations": agent.observations.stats(),
+                "telemetry": agent.telemetry.summary(),
+                "loops": agent.loop_detector.stats(),
+                "encoding": agent.encoder.stats(),
+                "budget": agent.budget.stats(),
+                "profile": agent.profile,
+                "transcript": agent.transcript.stats(),
+                "run": run_info,
+            }
+    
+    start = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(analyse_one(directory) for directory in directories))
+    finally:
+        tool_executor.close()
+    elapsed = time.perf_counter() - start
+    if results:
+        mean_memory = sum(r["memory_bytes"] for r in results) / len(results)
+        logger.info(f"Analysed {len(results)} codebases in {elapsed:.1f}s with concurrency {concurrency} "
+                    f"({len(results) / elapsed:.2f} per second, {mean_memory / 1024:.0f} KiB of memory per analysis)")
+    return list(results)
+
+
+def analyse_many(directories: List[str], prompt_file_path: str, model_name: str, agent_type: str = "react",
+                 concurrency: int = 8, base_url: str = None,
+                 context_budget: int = DEFAULT_CONTEXT_BUDGET, llm_cache=None,
+                 run_cache: Optional[RunCache] = None, refresh: bool = False,
+                 stream: bool = False, budget_overrides: Optional[Dict[str, Any]] = None,
+                 deadline: Optional[float] = None,
+                 observation_encodings: Optional[Dict[str, str]] = None,
+                 transcript_dir: Optional[str] = str(TRANSCRIPT_DIR),
+                 keep_observations: Optional[int] = None,
+                 answer_paths: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+    """
+    Analyse many codebases concurrently with a prompt from an external file.
+    
+    Args:
+        directories: Directories of the codebases to analyse
+        prompt_file_path: Path to file containing analysis prompt
+        model_name: Name of model to use for analysis
+        agent_type: Type of agent (react or reflexion)
+        concurrency: Maximum number of analyses in flight at once
+        base_url: Base URL for API (optional)
+        context_budget: Estimated tokens of memory before old observations are compacted (0 disables)
+        llm_cache: LLMCache to replay and record responses with (optional)
+        run_cache: RunCache to return unchanged analyses from and store new ones in (optional)
+        refresh: Whether to run every analysis even if the run cache has its result
+        stream: Whether to stream completions, starting tool calls while later ones are generated
+        budget_overrides: max_steps, max_tokens and/or max_seconds to use instead of the planned budgets (optional)
+        deadline: time.time() by which every analysis must have finished (optional)
+        observation_encodings: Encodings of tool results by tool name, instead of the tools' own (optional)
+        transcript_dir: Directory to write each run's transcript to (None: no transcripts)
+        keep_observations: Latest tool observations kept in memory, the rest evicted to the transcript (optional)
+        answer_paths: Files to write the answers to as they stream in, by directory (optional; needs stream)
+        
+    Returns:
+        One dictionary per directory; see analyse_many_async
+    """
+    prompt = read_prompt_file(prompt_file_path)
+    return asyncio.run(analyse_many_async(directories, prompt, model_name, agent_type, concurrency, base_url,
+                                          context_budget=context_budget, llm_cache=llm_cache,
+                                          run_cache=run_cache, refresh=refresh, stream=stream,
+                                          answer_paths=answer_paths, budget_overrides=budget_overrides, deadline=deadline,
+                                          observation_encodings=observation_encodings,
+                                          transcript_dir=transcript_dir, keep_observations=keep_observations))
+
+
 def validate_github_url(url: str) -> bool:
     """Validate GitHub URL or owner/repo format."""
     # Standard GitHub URL
@@ -756,6 +1399,13 @@ def get_command_line_args():
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument("directory", nargs='?', help="Directory containing the codebase to analyse")
     group.add_argument("--repo", help="GitHub repository URL to clone (e.g. https://github.com/owner/repo)")
+    group.add_argument("--batch", help="File listing directories or GitHub repositories to analyse concurrently, one per line")
+    group.add_argument("--resume", metavar="RUN_ID",
+                       help="Continue an interrupted run from the last checkpoint in its transcript, "
+                            "<transcript dir>/RUN_ID.jsonl, with the run's codebase, model, agent type and "
+                            "prompt. A run that used all its steps gets one more for its final answer (or "
+                            "pass a larger --max-steps); the result is not taken from the run cache, but a "
+                            "complete one is stored in it")
     parser.add_argument("prompt_file", help="Path to a file containing the analysis prompt")
     
     # Add cache directory argument
@@ -775,6 +1425,45 @@ def get_command_line_args():
                       help="Base URL for the API (automatically set based on model if not provided)")
     parser.add_argument("--agent-type", choices=["react", "reflexion"], default="react",
                       help="Type of agent to use for analysis (react or reflexion)")
+    parser.add_argument("--context-budget", type=int, default=DEFAULT_CONTEXT_BUDGET,
+                      help=f"Estimated tokens of memory before old tool results are compacted, 0 to disable (default: {DEFAULT_CONTEXT_BUDGET})")
+    parser.add_argument("--llm-cache", default=None,
+                      help="SQLite file to replay and record LLM responses in (default: $TECH_WRITER_LLM_CACHE, or no cache)")
+    parser.add_argument("--run-cache-dir", default=DEFAULT_RUN_CACHE_DIR,
+                      help=f"Directory of completed analyses, returned again while the repository, prompt, model and agent are unchanged (default: {DEFAULT_RUN_CACHE_DIR})")
+    parser.add_argument("--no-run-cache", action="store_true",
+                      help="Neither use nor update the run cache")
+    parser.add_argument("--refresh", action="store_true",
+                      help="Run the analysis even if the run cache has its result, and update the cache")
+    parser.add_argument("--tool-cache-dir", default=None,
+                      help="Directory to keep the results of pure tool calls in across runs (default: memory only)")
+    parser.add_argument("--concurrency", type=int, default=8,
+                      help="Maximum number of analyses in flight at once with --batch (default: 8)")
+    parser.add_argument("--stream", action="store_true",
+                      help="Stream completions: start each tool call as soon as it is generated and write the "
+                           "answer to <output>.md.partial as it arrives")
+    parser.add_argument("--max-steps", type=int, default=None,
+                      help="LLM calls allowed per analysis (default: planned from the repository's size and languages)")
+    parser.add_argument("--max-tokens", type=int, default=None,
+                      help="Prompt and completion tokens allowed per analysis (default: the step budget times the context budget)")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                      help="Wall-clock seconds allowed per analysis (default: no limit; see also --deadline)")
+    parser.add_argument("--observation-format", action="append", metavar="[TOOL=]FORMAT",
+                      help=f"Encoding of tool results, one of {', '.join(ENCODINGS)}, for one tool or, without "
+                           "TOOL=, for all; may be repeated (default: each tool's own, e.g. paths for file listings)")
+    parser.add_argument("--deadline", type=float, default=None,
+                      help="Seconds from start-up by which to have finished, e.g. a job's time limit: the agent "
+                           "asks for the final answer early enough to save it in time (default: none)")
+    parser.add_argument("--transcript-dir", default=str(TRANSCRIPT_DIR),
+                      help=f"Directory to write each run's messages to, as <run id>.jsonl (default: {TRANSCRIPT_DIR})")
+    parser.add_argument("--no-transcript", action="store_true",
+                      help="Write no transcripts")
+    parser.add_argument("--keep-observations", type=int, default=None,
+                      help="Tool results kept in memory; older ones are evicted to the transcript and read back "
+                           "on demand (default: keep all; needs a transcript)")
+    parser.add_argument("--http-pool-size", type=int, default=None,
+                      help="Maximum connections kept open to each API host, shared by all agents "
+                           "(default: $TECH_WRITER_HTTP_MAX_CONNECTIONS or 100)")
     
     args = parser.parse_args()
     
@@ -784,7 +1473,15 @@ def get_command_line_args():
     
     return args
 
-def analyse_codebase(directory_path: str, prompt_file_path: str, model_name: str, agent_type: str = "react", base_url: str = None) -> str:
+def analyse_codebase(directory_path: str, prompt_file_path: str, model_name: str, agent_type: str = "react", base_url: str = None,
+                     context_budget: int = DEFAULT_CONTEXT_BUDGET, llm_cache=None,
+                     run_cache: Optional[RunCache] = None, refresh: bool = False,
+                     stream: bool = False, answer_path: Optional[str] = None,
+                     budget_overrides: Optional[Dict[str, Any]] = None, deadline: Optional[float] = None,
+                     observation_encodings: Optional[Dict[str, str]] = None,
+                     transcript_dir: Optional[str] = str(TRANSCRIPT_DIR),
+                     keep_observations: Optional[int] = None,
+                     checkpoint: Optional[Dict[str, Any]] = None) -> tuple:
     """
     Analyse a codebase using the specified agent type with a prompt from an external file.
     
@@ -794,47 +1491,146 @@ def analyse_codebase(directory_path: str, prompt_file_path: str, model_name: str
         model_name: Name of model to use for analysis
         agent_type: Type of agent (react or reflexion)
         base_url: Base URL for API (optional)
+        context_budget: Estimated tokens of memory before old observations are compacted (0 disables)
+        llm_cache: LLMCache to replay and record responses with (optional)
+        run_cache: RunCache to return an unchanged analysis from and store a new one in (optional)
+        refresh: Whether to run the analysis even if the run cache has its result
+        stream: Whether to stream completions, starting tool calls while later ones are generated
+        answer_path: File to write the answer to as it streams in (optional; needs stream)
+        budget_overrides: max_steps, max_tokens and/or max_seconds to use instead of the budgets
+            planned from the repository's profile (optional)
+        deadline: time.time() by which the analysis must have finished. The agent estimates
+            each next step from the latest ones and asks for the final answer early enough
+            to finish in time (optional)
+        observation_encodings: Encodings of tool results by tool name ("*" for all tools),
+            instead of the tools' own (optional; see observation_encoder)
+        transcript_dir: Directory to write the run's transcript to (None: no transcript)
+        keep_observations: Latest tool observations kept in memory; older ones are evicted to the
+            transcript and read back with fetch_observation (optional; see transcript_store)
+        checkpoint: Checkpoint of an interrupted run to continue instead of starting afresh, from
+            transcript_store.load_checkpoint (optional). Its result is never taken from the run
+            cache, but a complete one is stored in it under the run's original prompt.
         
     Returns:
-        tuple: (analysis_result, repo_name)
+        tuple: (analysis_result, repo_name, run_info) where run_info records the run
+        cache status ("hit", "miss", "refresh" or "off"), the run key and the metrics
+        of the run (of the original run, on a hit), and the run id a resumed run continued
     """
     # Read the prompt from file
     prompt = read_prompt_file(prompt_file_path)
     
     # Initialize the appropriate agent
     if agent_type == "react":
-        agent = ReActAgent(model_name, base_url)
+        agent = ReActAgent(model_name, base_url, transcript_dir)
     elif agent_type == "reflexion":
-        agent = ReflexionAgent(model_name, base_url)
+        agent = ReflexionAgent(model_name, base_url, transcript_dir)
     else:
         raise ValueError(f"Unknown agent type: {agent_type}")
-    
-    # Run the analysis
-    analysis_result = agent.run(prompt, directory_path)
+    agent.context_budget.max_tokens = context_budget
+    agent.llm_cache = llm_cache
+    agent.stream = stream
+    agent.budget_overrides = budget_overrides or {}
+    agent.deadline = deadline
+    agent.encoder = ObservationEncoder(observation_encodings)
+    agent.transcript.keep_observations = keep_observations
+    agent.resume_from = checkpoint
+    if stream and answer_path:
+        agent.answer_writer = AnswerWriter(answer_path)
     
     # Get repository name for output file
     repo_name = Path(directory_path).name
     
-    return analysis_result, repo_name
+    # Run the analysis, unless the run cache has the result of an identical one
+    start = time.perf_counter()
+    try:
+        if checkpoint is not None:
+            # A resumed run carries on rather than returning a cached result, but a complete result is
+            # stored in the run cache under the run's original prompt
+            run_info, _ = lookup_run(run_cache, True, directory_path, checkpoint["header"].get("prompt", prompt),
+                                     agent, model_name, agent_type)
+            run_info.update(cache="resumed" if run_cache is not None else "off",
+                            resumed=checkpoint["header"]["run_id"])
+            analysis_result = None
+        else:
+            run_info, analysis_result = lookup_run(run_cache, refresh, directory_path, prompt, agent, model_name,
+                                                   agent_type)
+        if analysis_result is None:
+            analysis_result = agent.run(prompt, directory_path)
+            store_run(run_cache, run_info, analysis_result, agent, time.perf_counter() - start)
+    finally:
+        agent.tool_executor.close()
+        if agent.answer_writer is not None:
+            agent.answer_writer.close()
+    
+    return analysis_result, repo_name, run_info
 
-def save_results(analysis_result: str, model_name: str, agent_type: str, repo_name: str = None) -> Path:
+# The result of a run whose deadline passed before it had a final answer
+DEADLINE_MISSED = "Failed to complete the analysis before the deadline."
+
+def analysis_failed(analysis_result) -> bool:
+    """Return whether an analysis result is an error, step limit or deadline message rather than a document."""
+    return not isinstance(analysis_result, str) or \
+        analysis_result.startswith("Error running code analysis:") or \
+        analysis_result in ("Failed to complete the analysis within the step limit.", DEADLINE_MISSED)
+
+def lookup_run(run_cache: Optional[RunCache], refresh: bool, directory: str, prompt: str,
+               agent: TechWriterAgent, model_name: str, agent_type: str) -> tuple:
     """
-    Save analysis results to a timestamped Markdown file in the output directory.
+    Look an analysis up in the run cache.
     
     Args:
-        analysis_result: The analysis text to save
-        model_name: The name of the model used for analysis
-        agent_type: The type of agent used (react or reflexion)
-        repo_name: The name of the repository being analysed
+        run_cache: The run cache, or None if it is disabled
+        refresh: Whether to ignore a cached result
+        directory: Directory of the codebase
+        prompt: The analysis prompt
+        agent: The agent that would run the analysis
+        model_name: Name of the model
+        agent_type: Type of agent (react or reflexion)
         
     Returns:
-        Path to the saved file
+        tuple: (run_info, analysis_result) where analysis_result is the cached
+        Markdown, or None if the analysis has to run
     """
-    # Create output directory if it doesn't exist
-    output_dir = Path("output")
-    output_dir.mkdir(exist_ok=True)
+    if run_cache is None:
+        return {"cache": "off"}, None
+    fields = run_key(repo_fingerprint(directory), prompt, agent.system_prompt + TOOLS.definitions_json(),
+                     model_name, agent_type)
+    cached = None if refresh else run_cache.get(fields["key"])
+    if cached is None:
+        return {"cache": "refresh" if refresh else "miss", "run_key": fields}, None
+    logger.info(f"{directory} is unchanged since the cached run of {cached['created']}; returning its result")
+    return {"cache": "hit", "run_key": fields, "cached_at": cached["created"], "metrics": cached["metrics"]}, cached["result"]
+
+def store_run(run_cache: Optional[RunCache], run_info: Dict[str, Any], analysis_result: str,
+              agent: TechWriterAgent, seconds: float) -> None:
+    """
+    Record the metrics of a completed analysis in run_info, and store it in the run cache if it succeeded.
     
-    # Generate timestamp for filename
+    A failed analysis keeps whatever the model had written in run_info["partial_result"], for
+    save_results. An answer forced by the deadline is not cached: with more time the run would
+    have gone further.
+    """
+    run_info["metrics"] = {
+        "seconds": round(seconds, 3),
+        "tool_calls": agent.tool_call_count,
+        "context": agent.context_budget.stats(),
+        "observations": agent.observations.stats(),
+        "telemetry": agent.telemetry.summary(),
+        "loops": agent.loop_detector.stats(),
+        "encoding": agent.encoder.stats(),
+        "budget": agent.budget.stats(),
+        "profile": agent.profile,
+        "transcript": agent.transcript.stats(),
+    }
+    # The per-step records go to the telemetry sidecar written by save_results
+    run_info["steps"] = agent.telemetry.steps
+    if analysis_failed(analysis_result):
+        run_info["partial_result"] = agent.partial_result()
+    elif run_cache is not None and not run_info["metrics"]["budget"]["deadline_hit"]:
+        run_cache.put(run_info["run_key"], analysis_result, run_info["metrics"])
+
+def result_path(model_name: str, agent_type: str, repo_name: str = None) -> Path:
+    """Return a timestamped path in the output directory for the results of an analysis."""
     timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
     
     # Include repository name in filename if available
@@ -842,21 +1638,169 @@ def save_results(analysis_result: str, model_name: str, agent_type: str, repo_na
         output_filename = f"{timestamp}-{repo_name}-{agent_type}-{model_name}.md"
     else:
         output_filename = f"{timestamp}-{agent_type}-{model_name}.md"
+    return Path("output") / output_filename
+
+def save_results(analysis_result: str, model_name: str, agent_type: str, repo_name: str = None,
+                 run_info: Optional[Dict[str, Any]] = None, output_path: Optional[Path] = None) -> Path:
+    """
+    Save analysis results to a timestamped Markdown file in the output directory.
+    
+    If run_info is given, it is saved next to the Markdown file with the
+    extension .run.json, recording whether the result came from the run cache.
+    The telemetry of a run that was not replayed from the cache is saved with
+    the extension .telemetry.jsonl: one line per LLM call with its tokens,
+    latency, cost and tool calls, then a line with the totals for the run.
+    
+    A failed analysis (see analysis_failed) is saved too, with the extension
+    .partial.md instead of .md: whatever the model had written before the run
+    ended (run_info["partial_result"]), or else the error, so that a run cut
+    short by its deadline or an error still leaves its result and metrics.
+    
+    Args:
+        analysis_result: The analysis text to save, or the error of a failed analysis
+        model_name: The name of the model used for analysis
+        agent_type: The type of agent used (react or reflexion)
+        repo_name: The name of the repository being analysed
+        run_info: Run cache status and metrics from analyse_codebase (optional)
+        output_path: Where to save the Markdown (default: a new path from result_path)
         
-    output_path = output_dir / output_filename
+    Returns:
+        Path to the saved file
+    """
+    output_path = output_path or result_path(model_name, agent_type, repo_name)
+    complete = not analysis_failed(analysis_result)
+    if not complete:
+        output_path = output_path.with_suffix(".partial.md")
+        analysis_result = (run_info or {}).get("partial_result") or str(analysis_result)
+    # Create output directory if it doesn't exist
+    output_path.parent.mkdir(parents=True, exist_ok=True)
     
     # Save results to markdown file
     try:
         with open(output_path, "w", encoding="utf-8") as f:
             f.write(analysis_result)
+        if run_info is not None:
+            steps = run_info.get("steps")
+            with open(output_path.with_suffix(".run.json"), "w", encoding="utf-8") as f:
+                json.dump({**{k: v for k, v in run_info.items() if k not in ("steps", "partial_result")},
+                           "complete": complete}, f, indent=2)
+            if steps is not None:
+                write_telemetry(output_path.with_suffix(".telemetry.jsonl"), steps,
+                                {**run_info["metrics"]["telemetry"], "cache": run_info["cache"]})
+            if run_info["cache"] == "hit":
+                logger.info(f"Saved the cached result of the run of {run_info['cached_at']}")
         return output_path
     except IOError as e:
         logger.error(f"Failed to save results: {str(e)}")
         raise
 
+def budget_overrides(args) -> Dict[str, Any]:
+    """Return the budgets set on the command line, which replace those planned from each repository's profile."""
+    overrides = {"max_steps": args.max_steps, "max_tokens": args.max_tokens, "max_seconds": args.max_seconds}
+    return {name: value for name, value in overrides.items() if value is not None}
+
+def observation_encodings(args) -> Dict[str, str]:
+    """Return the encodings of tool results set with --observation-format, by tool name ("*" for all tools)."""
+    encodings = {}
+    for setting in args.observation_format or []:
+        tool_name, _, encoding = setting.rpartition("=")
+        encodings[tool_name or "*"] = encoding
+    return encodings
+
+def resume_checkpoint(args) -> Optional[Dict[str, Any]]:
+    """
+    Load the checkpoint of the run to continue with --resume, and take its codebase, model and agent type.
+    
+    A run that already finished with a complete analysis is not run again:
+    its analysis is taken from the transcript and saved.
+    
+    Raises:
+        ValueError: If --resume is combined with --no-transcript, or the run has no checkpoint
+    """
+    if not args.resume:
+        return None
+    if args.no_transcript:
+        raise ValueError("--resume cannot be combined with --no-transcript")
+    checkpoint = load_checkpoint(transcript_path(args.transcript_dir, args.resume))
+    if checkpoint["finished"] and not analysis_failed(checkpoint["result"]):
+        logger.info(f"Run {args.resume} already finished with a complete analysis; saving it again")
+    header = checkpoint["header"]
+    args.directory, args.repo = header["directory"], None
+    args.model = header.get("model") or args.model
+    args.agent_type = header.get("agent_type") or args.agent_type
+    logger.info(f"Resuming run {args.resume} of {args.agent_type} with {args.model} on {args.directory} "
+                f"after step {checkpoint['step']}")
+    return checkpoint
+
+def transcript_directory(args) -> Optional[str]:
+    """Return the directory to write transcripts to, or None with --no-transcript."""
+    return None if args.no_transcript else args.transcript_dir
+
+def run_batch(args, llm_cache=None, run_cache=None, deadline=None):
+    """Analyse every directory or repository listed in the --batch file concurrently."""
+    with open(args.batch, "r", encoding="utf-8") as f:
+        entries = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    
+    directories = []
+    for entry in entries:
+        if not Path(entry).exists() and validate_github_url(entry):
+            entry = str(clone_repo(entry, args.cache_dir))
+        if not Path(entry).exists():
+            raise FileNotFoundError(f"Directory not found: {entry}")
+        directories.append(entry)
+    
+    # With --stream each answer is written next to its final location as it arrives, as for one analysis
+    output_paths = {directory: result_path(args.model, args.agent_type, Path(directory).name)
+                    for directory in directories}
+    answer_paths = {directory: f"{path}.partial" for directory, path in output_paths.items()} if args.stream else {}
+    results = analyse_many(directories, args.prompt_file, args.model, args.agent_type, args.concurrency, args.base_url,
+                           args.context_budget, llm_cache, run_cache, args.refresh, args.stream,
+                           budget_overrides(args), deadline, observation_encodings(args),
+                           transcript_directory(args), args.keep_observations, answer_paths)
+    
+    failures = 0
+    for result in results:
+        analysis_result = result["result"]
+        output_file = save_results(analysis_result, args.model, args.agent_type, Path(result["directory"]).name,
+                                   result["run"], output_paths[result["directory"]])
+        if analysis_failed(analysis_result):
+            logger.error(f"{result['directory']}: {analysis_result}; partial results saved to {output_file}")
+            failures += 1
+            continue
+        answer_path = answer_paths.get(result["directory"])
+        if answer_path and os.path.exists(answer_path):
+            os.remove(answer_path)
+        logger.info(f"{result['directory']}: results saved to {output_file}")
+    if failures:
+        sys.exit(1)
+
+def log_llm_stats(llm_cache):
+    """Log the LLM request retries and queueing, and how many responses were replayed from the cache."""
+    stats = LLM_REQUESTS.stats()
+    logger.info(f"LLM requests: {stats['requests']} made, {stats['retries']} retries ({stats['rate_limited']} rate limited, "
+                f"{stats['transient_errors']} transient errors), {stats['gave_up']} given up; "
+                f"{stats['queue_wait_seconds']:.1f}s queued in total (max {stats['max_queue_wait_seconds']:.1f}s), "
+                f"concurrency limit now {stats['concurrency_limit']}")
+    if llm_cache is not None:
+        stats = llm_cache.stats()
+        logger.info(f"LLM cache: {stats['hits']} responses replayed, {stats['misses']} requested from the API "
+                    f"({stats['entries']} cached, {stats['bytes'] / 1024 / 1024:.1f} MiB)")
+
 def main():
     try:
         args = get_command_line_args()
+        # The deadline counts from start-up, so that cloning is inside it too
+        deadline = time.time() + args.deadline if args.deadline is not None else None
+        TOOL_CACHE.directory = args.tool_cache_dir
+        configure_http_pools(max_connections=args.http_pool_size)
+        llm_cache = open_llm_cache(args.llm_cache)
+        run_cache = None if args.no_run_cache else RunCache(args.run_cache_dir)
+        checkpoint = resume_checkpoint(args)
+        
+        if args.batch:
+            run_batch(args, llm_cache, run_cache, deadline)
+            log_llm_stats(llm_cache)
+            return
         
         # Handle repo cloning if specified
         if args.repo:
@@ -874,17 +1818,24 @@ def main():
         if not Path(directory_path).exists():
             raise FileNotFoundError(f"Directory not found: {directory_path}")
             
-        analysis_result, repo_name = analyse_codebase(directory_path, args.prompt_file, args.model, args.agent_type, args.base_url)
+        # With --stream the answer is written next to its final location as it arrives
+        output_path = result_path(args.model, args.agent_type, Path(directory_path).name)
+        answer_path = f"{output_path}.partial" if args.stream else None
+        analysis_result, repo_name, run_info = analyse_codebase(
+            directory_path, args.prompt_file, args.model, args.agent_type, args.base_url,
+            args.context_budget, llm_cache, run_cache, args.refresh, args.stream, answer_path,
+            budget_overrides(args), deadline, observation_encodings(args),
+            transcript_directory(args), args.keep_observations, checkpoint
+        )
+        log_llm_stats(llm_cache)
         
-        # Check if the result is an error message or a step limit failure
-        if isinstance(analysis_result, str) and \
-           (analysis_result.startswith("Error running code analysis:") or \
-            analysis_result == "Failed to complete the analysis within the step limit."):
-            logger.error(analysis_result)
+        # Save the results, or whatever there is of them if the analysis failed or ran out of time
+        output_file = save_results(analysis_result, args.model, args.agent_type, repo_name, run_info, output_path)
+        if analysis_failed(analysis_result):
+            logger.error(f"{analysis_result} Partial results saved to: {output_file}")
             sys.exit(1)
-        
-        # Save the results
-        output_file = save_results(analysis_result, args.model, args.agent_type, repo_name)
+        if answer_path and os.path.exists(answer_path):
+            os.remove(answer_path)
         logger.info(f"Analysis complete. Results saved to: {output_file}")
         
     except Exception as e:
@@ -0,0 +1,241 @@
+"""
+Per-step token, latency and cost telemetry for the tech writer agents.
+
+Without per-step numbers there is no telling where a run's tokens, time and
+money went. RunTelemetry records, for each LLM call of a run:
+
+- its prompt, completion and cached prompt tokens, from the usage the API
+  returns, and the prompt tokens estimated locally before it was sent (see
+  token_estimator), so that the estimator's error can be tracked;
+- its latency, including retries and time queued for the concurrency limit,
+  and for streamed completions the time to the first action: the first tool
+  call started or the first answer text received;
+- its cost: the cost the provider reports (OpenRouter does), otherwise an
+  estimate from MODEL_PRICES;
+- the tool calls made in response, with their latency and the bytes of
+  their observations.
+
+Steps are aggregated per run by summary() and written, one JSON object per
+line followed by the summary, by write_telemetry. Responses replayed from the
+LLM cache are recorded as steps with no tokens, latency or cost.
+"""
+
+import json
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# List prices in USD per million tokens: (prompt, cached prompt, completion).
+# Used only when the provider does not report the cost of a call itself.
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "o3-mini": (1.10, 0.55, 4.40),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gemini-2.0-flash": (0.10, 0.025, 0.40),
+    "gemini-2.5-flash-preview-04-17": (0.15, 0.0375, 0.60),
+    "gemini-2.5-pro-preview-03-25": (1.25, 0.31, 10.00),
+}
+
+
+def _field(obj: Any, name: str) -> Any:
+    """Read a field from an API object or a dictionary."""
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def usage_counts(usage: Any) -> Dict[str, Any]:
+    """
+    Extract token counts and the reported cost from an API usage object.
+
+    Args:
+        usage: The usage of a chat completion, as an OpenAI SDK object or a dictionary; may be None
+
+    Returns:
+        Dictionary with prompt_tokens, completion_tokens, cached_tokens and
+        reported_cost (None if the provider did not report one)
+    """
+    cost = _field(usage, "cost")
+    return {
+        "prompt_tokens": _field(usage, "prompt_tokens") or 0,
+        "completion_tokens": _field(usage, "completion_tokens") or 0,
+        "cached_tokens": _field(_field(usage, "prompt_tokens_details"), "cached_tokens") or 0,
+        "reported_cost": float(cost) if cost is not None else None,
+    }
+
+
+def estimate_cost(model_name: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> Optional[float]:
+    """
+    Estimate the cost of an LLM call from MODEL_PRICES.
+
+    Returns:
+        The cost in USD, or None for a model without a known price
+    """
+    prices = MODEL_PRICES.get(model_name)
+    if prices is None:
+        return None
+    prompt_price, cached_price, completion_price = prices
+    uncached = max(0, prompt_tokens - cached_tokens)
+    return (uncached * prompt_price + cached_tokens * cached_price + completion_tokens * completion_price) / 1_000_000
+
+
+class RunTelemetry:
+    """
+    Step-by-step record of one agent run.
+
+    Tool calls are attributed to the most recent LLM call. Safe to record
+    into from the ToolExecutor's threads.
+    """
+
+    def __init__(self, model_name: str):
+        """
+        Initialise the telemetry.
+
+        Args:
+            model_name: The model whose prices estimate costs the provider does not report
+        """
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the steps recorded so far, for a new run."""
+        with self._lock:
+            self.steps: List[Dict[str, Any]] = []
+            self._open_step: Optional[Dict[str, Any]] = None
+
+    def _new_step(self) -> Dict[str, Any]:
+        step = {"type": "step", "step": len(self.steps) + 1, "replayed": False, "prompt_tokens": 0,
+                "completion_tokens": 0, "cached_tokens": 0, "estimated_prompt_tokens": None, "llm_seconds": 0.0,
+                "first_action_seconds": None, "cost_usd": 0.0, "cost_source": None, "tools": []}
+        self.steps.append(step)
+        return step
+
+    def start_step(self) -> None:
+        """
+        Start a step as its LLM request is sent.
+
+        Optional: for a streamed completion whose tool calls start before the
+        call is recorded, it attributes them to the right step.
+        """
+        with self._lock:
+            self._open_step = self._new_step()
+
+    def _call_step(self) -> Dict[str, Any]:
+        step, self._open_step = self._open_step, None
+        return step or self._new_step()
+
+    def record_llm_call(self, usage: Any, seconds: float, first_action_seconds: Optional[float] = None,
+                        estimated_prompt_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Record an LLM call that went to the API, in the step started for it or a new one.
+
+        Args:
+            usage: The usage the API returned (see usage_counts)
+            seconds: Time from sending the request to receiving the response
+            first_action_seconds: For a streamed completion, time from sending the request to
+                starting the first tool call or receiving the first answer text
+            estimated_prompt_tokens: The prompt tokens estimated locally for the request
+
+        Returns:
+            The step's record
+        """
+        counts = usage_counts(usage)
+        cost, source = counts.pop("reported_cost"), "reported"
+        if cost is None:
+            cost = estimate_cost(self.model_name, counts["prompt_tokens"], counts["completion_tokens"],
+                                 counts["cached_tokens"])
+            source = "estimated" if cost is not None else None
+        with self._lock:
+            step = self._call_step()
+            step.update(counts, llm_seconds=round(seconds, 4), cost_usd=cost or 0.0, cost_source=source)
+            if first_action_seconds is not None:
+                step["first_action_seconds"] = round(first_action_seconds, 4)
+            if estimated_prompt_tokens is not None:
+                step["estimated_prompt_tokens"] = estimated_prompt_tokens
+        return step
+
+    def record_replayed_call(self) -> Dict[str, Any]:
+        """Record an LLM call answered from the response cache, in the step started for it or a new one."""
+        with self._lock:
+            step = self._call_step()
+            step["replayed"] = True
+        return step
+
+    def record_tool_call(self, tool_name: str, seconds: float, observation: Optional[str]) -> None:
+        """
+        Record a tool call against the current step.
+
+        Args:
+            tool_name: Name of the tool
+            seconds: Time the call took, including any wait for a worker
+            observation: The observation it returned, before any offloading or compaction
+        """
+        observation_bytes = len(observation.encode("utf-8", "replace")) if observation else 0
+        with self._lock:
+            step = self.steps[-1] if self.steps else self._new_step()
+            step["tools"].append({"name": tool_name, "seconds": round(seconds, 4),
+                                  "observation_bytes": observation_bytes})
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Aggregate the steps of the run.
+
+        Returns:
+            Totals of tokens, latencies, observation bytes and cost. cost_usd is
+            None when no call's cost was reported or could be estimated.
+            prompt_estimate_error is the relative error of the estimated prompt
+            tokens against those reported, over the calls that have both.
+        """
+        with self._lock:
+            steps = [dict(step, tools=list(step["tools"])) for step in self.steps]
+        tools = [tool for step in steps for tool in step["tools"]]
+        priced = [step for step in steps if step["cost_source"]]
+        first_actions = [step["first_action_seconds"] for step in steps if step["first_action_seconds"] is not None]
+        estimated = [step for step in steps if step["estimated_prompt_tokens"] is not None and step["prompt_tokens"]]
+        reported_tokens = sum(step["prompt_tokens"] for step in estimated)
+        estimated_tokens = sum(step["estimated_prompt_tokens"] for step in estimated)
+        return {
+            "type": "run",
+            "model": self.model_name,
+            "llm_calls": len(steps),
+            "replayed_calls": sum(1 for step in steps if step["replayed"]),
+            "prompt_tokens": sum(step["prompt_tokens"] for step in steps),
+            "completion_tokens": sum(step["completion_tokens"] for step in steps),
+            "cached_tokens": sum(step["cached_tokens"] for step in steps),
+            "estimated_prompt_tokens": estimated_tokens,
+            "prompt_estimate_error": round((estimated_tokens - reported_tokens) / reported_tokens, 3)
+                                     if reported_tokens else None,
+            "prompt_cache_hit_rate": round(sum(step["cached_tokens"] for step in steps) /
+                                           max(1, sum(step["prompt_tokens"] for step in steps)), 3),
+            "total_tokens": sum(step["prompt_tokens"] + step["completion_tokens"] for step in steps),
+            "llm_seconds": round(sum(step["llm_seconds"] for step in steps), 3),
+            "mean_first_action_seconds": round(sum(first_actions) / len(first_actions), 3) if first_actions else None,
+            "tool_calls": len(tools),
+            "tool_seconds": round(sum(tool["seconds"] for tool in tools), 3),
+            "observation_bytes": sum(tool["observation_bytes"] for tool in tools),
+            "cost_usd": round(sum(step["cost_usd"] for step in priced), 6) if priced else None,
+            "unpriced_calls": sum(1 for step in steps if not step["cost_source"] and not step["replayed"]),
+        }
+
+
+def write_telemetry(path: str, steps: List[Dict[str, Any]], summary: Dict[str, Any]) -> None:
+    """
+    Write one line per step and a final summary line to a JSONL file.
+
+    Args:
+        path: File to write
+        steps: The steps of a run, from RunTelemetry.steps
+        summary: Its summary, from RunTelemetry.summary
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        for step in steps:
+            f.write(json.dumps(step) + "\n")
+        f.write(json.dumps(summary) + "\n")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Tests for the asyncio agent loop and analyse_many.
+"""
+
+import asyncio
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def agent_module():
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tech-writer-from-scratch.py")
+    spec = importlib.util.spec_from_file_location("tech_writer_from_scratch", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeAsyncClient:
+    """Asks for one calculate call, then answers with the base directory; records concurrency."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, tools, temperature):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.requests.append(list(messages))
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if not any(isinstance(m, dict) and m.get("role") == "tool" for m in messages):
+            call = SimpleNamespace(
+                id="call_1", type="function",
+                function=SimpleNamespace(name="calculate", arguments=json.dumps({"expression": "1 + 1"})),
+            )
+            message = SimpleNamespace(role="assistant", content=None, tool_calls=[call])
+        else:
+            message = SimpleNamespace(role="assistant", content=messages[1]["content"].splitlines()[0], tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class TestAnalyseMany:
+    """Tests for analyse_many_async."""
+
+    def test_results_in_order_under_concurrency_limit(self, agent_module):
+        client = FakeAsyncClient()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            directories = [os.path.join(temp_dir, f"repo{i}") for i in range(6)]
+            results = asyncio.run(agent_module.analyse_many_async(
+                directories, "Describe it.", "gpt-4o-mini", concurrency=2, client=client, transcript_dir=None
+            ))
+        assert [r["result"] for r in results] == [f"Base directory: {d}" for d in directories]
+        assert client.max_in_flight == 2
+        assert all(r["memory_bytes"] > 0 for r in results)
+
+    def test_reflexion_instruction_follows_tool_calls(self, agent_module):
+        client = FakeAsyncClient()
+        asyncio.run(agent_module.analyse_many_async(
+            ["/repo"], "Describe it.", "gpt-4o-mini", agent_type="reflexion", client=client, transcript_dir=None
+        ))
+        first, second = client.requests
+        assert second[0] == first[0]
+        assert first[-1]["content"] != agent_module.REFLECTION_INSTRUCTION
+        assert second[-1] == {"role": "user", "content": agent_module.REFLECTION_INSTRUCTION}
+
+    def test_final_answer_checkpointed(self, agent_module):
+        from transcript_store import load_checkpoint
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            transcripts = os.path.join(temp_dir, "transcripts")
+            results = asyncio.run(agent_module.analyse_many_async(
+                ["/repo"], "Describe it.", "gpt-4o-mini", client=FakeAsyncClient(), transcript_dir=transcripts
+            ))
+            checkpoint = load_checkpoint(results[0]["transcript"]["path"])
+        assert checkpoint["step"] == 2 and checkpoint["state"]["final_answer"] == "Base directory: /repo"
+
+    def test_every_tool_executor_is_closed(self, agent_module, monkeypatch):
+        executors = []
+
+        class RecordingExecutor(agent_module.ToolExecutor):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                executors.append(self)
+
+        monkeypatch.setattr(agent_module, "ToolExecutor", RecordingExecutor)
+        asyncio.run(agent_module.analyse_many_async(
+            ["/repo1", "/repo2", "/repo3"], "Describe it.", "gpt-4o-mini", client=FakeAsyncClient(), transcript_dir=None
+        ))
+        assert len(executors) == 4
+        assert all(executor._threads._shutdown for executor in executors)
+
+    def test_unknown_agent_type(self, agent_module):
+        with pytest.raises(ValueError):
+            asyncio.run(agent_module.analyse_many_async(["/repo"], "Describe it.", "gpt-4o-mini", agent_type="other"))
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
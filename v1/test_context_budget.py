@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests for the token-budgeted context manager.
+"""
+
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from context_budget import STUB_PREFIX, ContextBudget, make_stub, message_tokens
+
+
+def _memory(reads: int, size: int = 1500) -> list:
+    """Build a memory with one read_file call and observation per step."""
+    memory = [
+        {"role": "system", "content": "You are a technical writer."},
+        {"role": "user", "content": "Base directory: /repo\n\nDescribe it."},
+    ]
+    for i in range(reads):
+        call = SimpleNamespace(
+            id=f"call_{i}",
+            function=SimpleNamespace(name="read_file", arguments=json.dumps({"file_path": f"/repo/f{i}.py"})),
+        )
+        memory.append(SimpleNamespace(role="assistant", content=None, tool_calls=[call]))
+        code = "def handler_%d():\n    pass\n" % i + "x = 1\n" * (size // 6)
+        memory.append({"role": "tool", "tool_call_id": f"call_{i}", "content": json.dumps({"content": code})})
+    return memory
+
+
+class TestContextBudget:
+    """Tests for ContextBudget compaction."""
+
+    def test_under_budget_is_untouched(self):
+        memory = _memory(3)
+        before = list(memory)
+        budget = ContextBudget(100000)
+        budget.apply(memory)
+        assert memory == before
+        assert budget.stats()["observations_compacted"] == 0
+
+    def test_old_observations_stubbed_recent_kept(self):
+        memory = _memory(10)
+        budget = ContextBudget(4000, keep_recent=2)
+        total = budget.apply(memory)
+        assert total <= 4000 * budget.low_water
+        tools = [m for m in memory if isinstance(m, dict) and m.get("role") == "tool"]
+        assert [m["tool_call_id"] for m in tools] == [f"call_{i}" for i in range(10)]
+        assert tools[0]["content"].startswith(STUB_PREFIX)
+        assert "read_file" in tools[0]["content"] and "1: def handler_0():" in tools[0]["content"]
+        assert not any(m["content"].startswith(STUB_PREFIX) for m in tools[-2:])
+        assert memory[0]["content"] == "You are a technical writer."
+        assert memory[1]["content"].startswith("Base directory")
+
+    def test_tokens_saved_accumulate_across_calls(self):
+        memory = _memory(10)
+        budget = ContextBudget(4000, keep_recent=2)
+        budget.apply(memory)
+        removed = budget.stats()["tokens_removed"]
+        assert removed > 0
+        budget.apply(memory)
+        assert budget.stats()["tokens_saved"] == 2 * removed
+        assert budget.stats()["compactions"] == 1
+
+    def test_stubs_are_not_compacted_again(self):
+        memory = _memory(10)
+        budget = ContextBudget(4000, keep_recent=0)
+        budget.apply(memory)
+        stubs = [m["content"] for m in memory if isinstance(m, dict) and m.get("role") == "tool"]
+        budget.max_tokens = 10
+        budget.apply(memory)
+        assert [m["content"] for m in memory if isinstance(m, dict) and m.get("role") == "tool"][:3] == stubs[:3]
+
+    def test_disabled_budget(self):
+        memory = _memory(10)
+        budget = ContextBudget(0)
+        assert budget.apply(memory) == sum(map(message_tokens, memory))
+        assert budget.stats()["observations_compacted"] == 0
+
+    def test_stub_of_list_result(self):
+        stub = make_stub(json.dumps(["a.py", "b.py"]), "find_all_matching_files", '{"directory": "/repo"}')
+        assert "2 items, starting: a.py, b.py" in stub
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for the manifest-backed directory tree tool.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from dir_tree import DirectoryTree, browse_directory
+from manifest import build_manifest
+
+
+@pytest.fixture
+def codebase():
+    """Create a small codebase with a directory that holds no files of its own."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        (root / "src" / "api").mkdir(parents=True)
+        (root / "src" / "web").mkdir(parents=True)
+        (root / "README.md").write_text("# Readme\n")
+        (root / "src" / "api" / "routes.py").write_text("a = 1\nb = 2\nc = 3\n")
+        (root / "src" / "api" / "models.py").write_text("x = 1\n")
+        (root / "src" / "web" / "app.js").write_text("const a = 1;\n")
+        yield temp_dir
+
+
+class TestDirectoryTree:
+    """Tests for DirectoryTree aggregates and expansion."""
+
+    def test_aggregates_roll_up(self, codebase):
+        tree = DirectoryTree(build_manifest(codebase))
+        src = tree.find("src")
+        assert src > 0 and tree.find("src/") == src
+        assert tree.files[src] == 3
+        assert tree.loc[src] == 5
+        assert tree.languages[src] == "Python"
+        assert tree.files[0] == 4
+        assert tree.languages[tree.find("src/web")] == "JavaScript"
+        assert tree.find("missing") == -1
+
+    def test_expand_within_budget(self, codebase):
+        tree = DirectoryTree(build_manifest(codebase))
+        root = tree.expand(0, max_nodes=3)
+        assert [child["name"] for child in root["children"]] == ["src", "README.md"]
+        src = root["children"][0]
+        assert "children" not in src
+        assert src["more"] == 2
+
+    def test_expand_lazily_from_subdirectory(self, codebase):
+        tree = DirectoryTree(build_manifest(codebase))
+        api = tree.expand(tree.find("src/api"), max_nodes=10)
+        assert api["path"] == "src/api"
+        assert [child["name"] for child in api["children"]] == ["routes.py", "models.py"]
+        assert "more" not in api
+
+
+class TestBrowseDirectory:
+    """Tests for the browse_directory tool."""
+
+    def test_browse(self, codebase):
+        result = browse_directory(codebase, path="src", max_nodes=20, include_files=False)
+        assert result["tree"]["files"] == 3
+        assert [child["name"] for child in result["tree"]["children"]] == ["api", "web"]
+
+    def test_unknown_path(self, codebase):
+        assert "error" in browse_directory(codebase, path="nope")
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
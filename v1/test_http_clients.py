@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Tests for the process-wide pooled HTTP clients.
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import http_clients
+from http_clients import (DEFAULT_MAX_CONNECTIONS, close_http_clients, configure_http_pools,
+                          get_async_openai_client, get_openai_client, get_requests_session, pool_config)
+
+
+@pytest.fixture(autouse=True)
+def fresh_pools(monkeypatch):
+    monkeypatch.setattr(http_clients, "_config", {})
+    monkeypatch.delenv("TECH_WRITER_HTTP_MAX_CONNECTIONS", raising=False)
+    yield
+    close_http_clients()
+
+
+class TestPoolConfig:
+    """Tests for pool sizing."""
+
+    def test_defaults_environment_and_configuration(self, monkeypatch):
+        assert pool_config()["max_connections"] == DEFAULT_MAX_CONNECTIONS
+        monkeypatch.setenv("TECH_WRITER_HTTP_MAX_CONNECTIONS", "12")
+        assert pool_config()["max_connections"] == 12
+        configure_http_pools(max_connections=5)
+        configure_http_pools(max_keepalive=3)
+        config = pool_config()
+        assert config["max_connections"] == 5 and config["max_keepalive"] == 3
+
+
+class TestSharedClients:
+    """Tests that every caller gets the same pooled client."""
+
+    def test_openai_client_shared_per_base_url_and_key(self):
+        pytest.importorskip("httpx")
+        pytest.importorskip("openai")
+        client = get_openai_client("key", "http://127.0.0.1:9/v1")
+        assert get_openai_client("key", "http://127.0.0.1:9/v1") is client
+        assert get_openai_client("other", "http://127.0.0.1:9/v1") is not client
+        assert client.max_retries == 0
+
+    def test_async_client_per_event_loop(self):
+        pytest.importorskip("httpx")
+        pytest.importorskip("openai")
+
+        async def twice():
+            return get_async_openai_client("key"), get_async_openai_client("key")
+
+        first, again = asyncio.run(twice())
+        assert first is again
+        assert asyncio.run(twice())[0] is not first
+
+    def test_requests_session_shared_per_host(self):
+        pytest.importorskip("requests")
+        session = get_requests_session("https://openrouter.ai/api/v1/chat/completions")
+        assert get_requests_session("https://openrouter.ai/api/v1/models") is session
+        assert get_requests_session("https://example.com/") is not session
+        assert session.get_adapter("https://openrouter.ai/")._pool_maxsize == DEFAULT_MAX_CONNECTIONS
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
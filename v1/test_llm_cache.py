@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests for the on-disk LLM response cache.
+"""
+
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from llm_cache import LLMCache, request_key
+
+
+class FakeClient:
+    """Asks for one calculate call, then answers; counts the requests it receives."""
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, tools, temperature):
+        self.calls += 1
+        if not any(isinstance(m, dict) and m.get("role") == "tool" for m in messages):
+            call = SimpleNamespace(
+                id="call_1", type="function",
+                function=SimpleNamespace(name="calculate", arguments=json.dumps({"expression": "6 * 7"})),
+            )
+            message = SimpleNamespace(role="assistant", content=None, tool_calls=[call])
+        else:
+            message = SimpleNamespace(role="assistant", content="# Analysis\n\n42", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class TestLLMCache:
+    """Tests for request keys, storage and eviction."""
+
+    def test_key_is_canonical(self):
+        as_object = SimpleNamespace(role="assistant", content=None, tool_calls=[SimpleNamespace(id="c", type="function")])
+        as_dict = {"tool_calls": [{"type": "function", "id": "c"}], "role": "assistant"}
+        assert request_key(model="m", messages=[as_object]) == request_key(messages=[as_dict], model="m")
+        assert request_key(model="m", messages=[as_dict]) != request_key(model="n", messages=[as_dict])
+
+    def test_put_get_and_lru_eviction(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = LLMCache(os.path.join(temp_dir, "llm.sqlite"), max_bytes=250)
+            for key in ("a", "b"):
+                cache.put(key, {"content": key * 90})
+            assert cache.get("a") == {"content": "a" * 90}
+            cache.put("c", {"content": "c" * 90})
+            # b was least recently used
+            assert cache.get("b") is None
+            assert cache.get("a") is not None and cache.get("c") is not None
+            assert cache.stats()["entries"] == 2
+            cache.close()
+
+
+class TestAgentReplay:
+    """Tests for replaying a whole agent run from the cache."""
+
+    def test_second_run_makes_no_api_calls(self):
+        os.environ.setdefault("OPENAI_API_KEY", "test")
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tech-writer-from-scratch.py")
+        spec = importlib.util.spec_from_file_location("tech_writer_from_scratch", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = LLMCache(os.path.join(temp_dir, "llm.sqlite"))
+            results = []
+            for _ in range(2):
+                client = FakeClient()
+                agent = module.ReActAgent(transcript_dir=None)
+                agent.client = client
+                agent.llm_cache = cache
+                try:
+                    results.append((agent.run("Describe it.", temp_dir), client.calls))
+                finally:
+                    agent.tool_executor.close()
+            cache.close()
+        assert results == [("# Analysis\n\n42", 2), ("# Analysis\n\n42", 0)]
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Tests for LLM request retries and the adaptive concurrency limiter.
+"""
+
+import asyncio
+import email.utils
+import importlib.util
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import llm_retry
+from llm_retry import FATAL, RATE_LIMIT, TRANSIENT, AIMDLimiter, LLMRequestController, classify_error, retry_after
+
+
+class StatusError(Exception):
+    """An HTTP error in the shape of the OpenAI and requests exceptions."""
+
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+        self.response = SimpleNamespace(status_code=status, headers=headers or {})
+
+
+class Flaky:
+    """Fails with the given exceptions, then returns "ok"."""
+
+    def __init__(self, *failures):
+        self.failures = list(failures)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        return "ok"
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(llm_retry.time, "sleep", slept.append)
+    return slept
+
+
+class TestClassification:
+    """Tests for classify_error and retry_after."""
+
+    def test_classify(self):
+        assert classify_error(StatusError(429)) == RATE_LIMIT
+        assert classify_error(StatusError(503)) == TRANSIENT
+        assert classify_error(StatusError(400)) == FATAL
+        assert classify_error(TimeoutError()) == TRANSIENT
+        assert classify_error(type("APIConnectionError", (Exception,), {})()) == TRANSIENT
+        assert classify_error(ValueError("bad")) == FATAL
+
+    def test_retry_after(self):
+        assert retry_after(StatusError(429, {"retry-after": "7"})) == 7.0
+        assert retry_after(StatusError(429, {"retry-after-ms": "250"})) == 0.25
+        assert retry_after(StatusError(429)) is None
+
+
+class TestLLMRequestController:
+    """Tests for retries and backoff."""
+
+    def test_retries_transient_errors(self, sleeps):
+        controller = LLMRequestController(base_delay=0.5)
+        request = Flaky(StatusError(502), TimeoutError())
+        assert controller.call(request) == "ok"
+        assert request.calls == 3
+        assert len(sleeps) == 2 and sleeps[0] <= 0.5 and sleeps[1] <= 1.0
+        stats = controller.stats()
+        assert stats["retries"] == 2 and stats["transient_errors"] == 2 and stats["in_flight"] == 0
+
+    def test_honours_retry_after(self, sleeps):
+        controller = LLMRequestController()
+        assert controller.call(Flaky(StatusError(429, {"retry-after": "3"}))) == "ok"
+        assert sleeps == [3.0]
+        assert controller.stats()["rate_limited"] == 1
+
+    def test_long_retry_after_is_clamped(self, sleeps):
+        controller = LLMRequestController(max_retry_after=20.0)
+        far = email.utils.formatdate(time.time() + 86400, usegmt=True)
+        request = Flaky(StatusError(429, {"retry-after": "3600"}), StatusError(503, {"retry-after": far}))
+        assert controller.call(request) == "ok"
+        assert sleeps == [20.0, 20.0]
+        with pytest.raises(StatusError):
+            controller.call(Flaky(StatusError(429, {"retry-after": "3600"})), deadline=time.time() + 10)
+        assert sleeps == [20.0, 20.0] and controller.stats()["gave_up"] == 1
+
+    def test_fatal_and_exhausted_errors_raise(self, sleeps):
+        controller = LLMRequestController(max_attempts=2)
+        with pytest.raises(StatusError):
+            controller.call(Flaky(StatusError(401)))
+        assert sleeps == []
+        with pytest.raises(StatusError):
+            controller.call(Flaky(StatusError(500), StatusError(500), StatusError(500)))
+        stats = controller.stats()
+        assert stats["fatal_errors"] == 1 and stats["gave_up"] == 1 and stats["in_flight"] == 0
+
+    def test_no_retry_past_the_deadline(self, sleeps):
+        controller = LLMRequestController()
+        with pytest.raises(StatusError):
+            controller.call(Flaky(StatusError(429, {"retry-after": "30"})), deadline=time.time() + 10)
+        assert sleeps == [] and controller.stats()["gave_up"] == 1
+        assert controller.call(Flaky(StatusError(429, {"retry-after": "3"})), deadline=time.time() + 10) == "ok"
+
+    def test_async_call(self, monkeypatch):
+        async def no_sleep(seconds):
+            pass
+        monkeypatch.setattr(llm_retry.asyncio, "sleep", no_sleep)
+        controller = LLMRequestController()
+        flaky = Flaky(StatusError(503))
+
+        async def request():
+            return flaky()
+
+        assert asyncio.run(controller.call_async(request)) == "ok"
+        assert flaky.calls == 2
+
+
+class TestAIMDLimiter:
+    """Tests for the adaptive concurrency limit."""
+
+    def test_additive_increase_multiplicative_decrease(self):
+        limiter = AIMDLimiter(initial=8, cooldown=60)
+        limiter.acquire()
+        limiter.release(congested=True)
+        assert int(limiter.limit) == 4
+        # A second failure inside the cooldown counts as the same burst
+        limiter.acquire()
+        limiter.release(congested=True)
+        assert int(limiter.limit) == 4
+        # About one step up per window of successful requests
+        for _ in range(5):
+            limiter.acquire()
+            limiter.release()
+        assert int(limiter.limit) == 5
+
+    def test_bounds_requests_in_flight(self):
+        limiter = AIMDLimiter(initial=2, max_limit=2)
+        controller = LLMRequestController(limiter)
+        peak, lock = [0], threading.Lock()
+
+        def request():
+            with lock:
+                peak[0] = max(peak[0], limiter.in_flight)
+            time.sleep(0.02)
+            return "ok"
+
+        threads = [threading.Thread(target=controller.call, args=(request,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert peak[0] == 2
+        assert controller.stats()["queue_wait_seconds"] > 0
+
+
+class FailingClient:
+    """Asks for one calculate call, then fails with a fatal error."""
+
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **request):
+        self.calls += 1
+        if self.calls > 1:
+            raise self.error
+        call = SimpleNamespace(id="call_1", type="function",
+                               function=SimpleNamespace(name="calculate", arguments='{"expression": "1 + 1"}'))
+        message = SimpleNamespace(role="assistant", content="Checking the arithmetic first.", tool_calls=[call])
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class TestAgentErrors:
+    """Tests that the agents keep the API client's exception and still return what they have."""
+
+    def test_original_exception_reaches_the_loop(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tech-writer-from-scratch.py")
+        spec = importlib.util.spec_from_file_location("tech_writer_from_scratch", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        agent = module.ReActAgent("gpt-4o-mini", transcript_dir=None)
+        agent.client = FailingClient(StatusError(401))
+        result = agent.run("Describe it.", "/repo")
+        assert result == "Error running code analysis: HTTP 401" and module.analysis_failed(result)
+        assert agent.partial_result() == "Checking the arithmetic first."
+
+        with pytest.raises(StatusError):
+            agent.call_llm()
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Tests for streamed completions with early tool dispatch.
+"""
+
+import asyncio
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from llm_stream import AnswerWriter, StreamedCompletion
+
+
+def tool_delta(index, arguments, call_id=None, name=None):
+    function = SimpleNamespace(name=name, arguments=arguments)
+    return SimpleNamespace(index=index, id=call_id, function=function)
+
+
+def chunk(content=None, tool_calls=None, usage=None):
+    delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)] if content or tool_calls else [], usage=usage)
+
+
+def tool_call_chunks(file_path):
+    """Two read_file calls, each streamed in pieces."""
+    arguments = json.dumps({"file_path": file_path})
+    middle = len(arguments) // 2
+    return [
+        chunk(tool_calls=[tool_delta(0, arguments[:middle], "call_1", "read_file")]),
+        chunk(tool_calls=[tool_delta(0, arguments[middle:])]),
+        chunk(tool_calls=[tool_delta(1, "", "call_2", "read_file")]),
+        chunk(tool_calls=[tool_delta(1, arguments)]),
+        chunk(usage={"prompt_tokens": 100, "completion_tokens": 30}),
+    ]
+
+
+def answer_chunks():
+    return [chunk(content="# Analysis"), chunk(content="\n\nDone."),
+            chunk(usage={"prompt_tokens": 200, "completion_tokens": 5})]
+
+
+@pytest.fixture(scope="module")
+def agent_module():
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tech-writer-from-scratch.py")
+    spec = importlib.util.spec_from_file_location("tech_writer_from_scratch", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class StreamingClient:
+    """Streams two tool calls, pausing after the first is complete, then an answer."""
+
+    def __init__(self, file_path, pause=0.2):
+        self.file_path = file_path
+        self.pause = pause
+        self.streams = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def chunks(self):
+        self.streams += 1
+        if self.streams > 1:
+            yield from answer_chunks()
+            return
+        for i, piece in enumerate(tool_call_chunks(self.file_path)):
+            if i == 2:
+                time.sleep(self.pause)  # The model is still generating the second call
+            yield piece
+
+    def create(self, model, messages, tools, temperature, stream, stream_options):
+        assert stream and stream_options == {"include_usage": True}
+        return self.chunks()
+
+
+class AsyncStreamingClient(StreamingClient):
+    """Async version of StreamingClient."""
+
+    async def create(self, model, messages, tools, temperature, stream, stream_options):
+        async def chunks():
+            for i, piece in enumerate(self.chunks()):
+                yield piece
+                await asyncio.sleep(0)
+        return chunks()
+
+
+class TestStreamedCompletion:
+    """Tests for assembling streamed completions."""
+
+    def test_tool_call_dispatched_once_its_arguments_are_complete(self):
+        dispatched = []
+        streamed = StreamedCompletion(on_tool_call=dispatched.append)
+        pieces = tool_call_chunks("a.py")
+        streamed.feed(pieces[0])
+        assert dispatched == []
+        streamed.feed(pieces[1])
+        assert [call.id for call in dispatched] == ["call_1"]
+        assert json.loads(dispatched[0].function.arguments) == {"file_path": "a.py"}
+        for piece in pieces[2:]:
+            streamed.feed(piece)
+        message = streamed.finish()
+        assert [call.id for call in dispatched] == ["call_1", "call_2"]
+        assert [call["id"] for call in message["tool_calls"]] == ["call_1", "call_2"]
+        assert streamed.usage["prompt_tokens"] == 100 and streamed.first_action_seconds is not None
+
+    def test_content_streamed_to_answer_writer(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "out", "answer.md.partial")
+            writer = AnswerWriter(path)
+            streamed = StreamedCompletion(on_text=writer.write)
+            streamed.feed(answer_chunks()[0])
+            with open(path, encoding="utf-8") as f:
+                assert f.read() == "# Analysis"
+            streamed.feed(answer_chunks()[1])
+            assert streamed.finish() == {"role": "assistant", "content": "# Analysis\n\nDone."}
+            writer.discard()
+            writer.close()
+            assert os.path.getsize(path) == 0
+
+
+class TestStreamingAgent:
+    """Tests for the agents' streaming mode."""
+
+    def test_tools_start_while_the_completion_streams(self, agent_module):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "a.py")
+            with open(file_path, "w") as f:
+                f.write("x = 1\n")
+            agent = agent_module.ReActAgent("gpt-4o-mini", transcript_dir=None)
+            agent.client = StreamingClient(file_path)
+            agent.stream = True
+            agent.answer_writer = AnswerWriter(os.path.join(temp_dir, "answer.md.partial"))
+            assert agent.run("Describe it.", temp_dir) == "# Analysis\n\nDone."
+            agent.answer_writer.close()
+            with open(agent.answer_writer.path, encoding="utf-8") as f:
+                assert f.read() == "# Analysis\n\nDone."
+
+        tool_messages = [m for m in agent.memory if isinstance(m, dict) and m.get("role") == "tool"]
+        assert [m["tool_call_id"] for m in tool_messages] == ["call_1", "call_2"]
+        first_step = agent.telemetry.steps[0]
+        assert first_step["first_action_seconds"] < first_step["llm_seconds"] - 0.1
+        assert len(first_step["tools"]) == 2
+
+    def test_async_streaming(self, agent_module):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "a.py")
+            with open(file_path, "w") as f:
+                f.write("x = 1\n")
+            answer_path = os.path.join(temp_dir, "answer.md.partial")
+            results = asyncio.run(agent_module.analyse_many_async(
+                [temp_dir], "Describe it.", "gpt-4o-mini", client=AsyncStreamingClient(file_path, pause=0), stream=True,
+                answer_paths={temp_dir: answer_path}, transcript_dir=None
+            ))
+            with open(answer_path, encoding="utf-8") as f:
+                assert f.read() == "# Analysis\n\nDone."
+        assert results[0]["result"] == "# Analysis\n\nDone."
+        assert results[0]["telemetry"]["tool_calls"] == 2
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests for the loop and redundancy detector.
+"""
+
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from loop_detector import FINALISE, FINALISE_INSTRUCTION, HINT, LoopDetector, call_fingerprint
+
+
+def tool_call(name, arguments, call_id="call"):
+    return SimpleNamespace(id=call_id, type="function",
+                           function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+
+
+READ_A = tool_call("read_file", {"file_path": "a.py"})
+READ_B = tool_call("read_file", {"file_path": "b.py"})
+
+
+class RepeatingClient:
+    """Reads the same file until tool calls are forbidden, then answers."""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, tools, temperature, tool_choice=None):
+        self.requests.append({"messages": list(messages), "tool_choice": tool_choice})
+        if tool_choice == "none":
+            message = SimpleNamespace(role="assistant", content="# Analysis", tool_calls=None)
+        else:
+            call = tool_call("read_file", {"file_path": self.file_path}, f"call_{len(self.requests)}")
+            message = SimpleNamespace(role="assistant", content=None, tool_calls=[call])
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class TestLoopDetector:
+    """Tests for recognising repeats and cycles."""
+
+    def test_fingerprint_ignores_argument_formatting(self):
+        reordered = SimpleNamespace(function=SimpleNamespace(name="search_code",
+                                                             arguments='{"pattern": "x",  "directory": "."}'))
+        original = tool_call("search_code", {"directory": ".", "pattern": "x"})
+        assert call_fingerprint(reordered) == call_fingerprint(original)
+
+    def test_repeats_escalate_from_hints_to_finalisation(self):
+        detector = LoopDetector(max_hints=2)
+        assert detector.record_step([READ_A], ["x = 1"]) is None
+        assert detector.record_step([READ_A], ["x = 1"]) == HINT
+        kind, hint = detector.next_action()
+        assert kind == HINT and "read_file" in hint and "step 1" in hint
+        assert detector.next_action() is None
+        assert detector.record_step([READ_A], ["x = 1"]) == HINT
+        assert detector.record_step([READ_A], ["x = 1"]) == FINALISE
+        assert detector.next_action() == (FINALISE, FINALISE_INSTRUCTION)
+        detector.record_answer(llm_calls=5, max_steps=15, context_tokens=1000)
+        stats = detector.stats()
+        assert stats["repeated_calls"] == 3 and stats["hints"] == 2 and stats["forced_finalisations"] == 1
+        assert stats["max_steps_saved"] == 10 and stats["max_tokens_saved"] == 10000
+
+    def test_changed_result_or_new_call_is_progress(self):
+        detector = LoopDetector()
+        detector.record_step([READ_A], ["x = 1"])
+        assert detector.record_step([READ_A], ["x = 2"]) is None
+        assert detector.record_step([READ_A, READ_B], ["x = 2", "y = 1"]) is None
+        assert detector.stats()["repeated_calls"] == 1
+
+    def test_cycle(self):
+        detector = LoopDetector()
+        detector.record_step([READ_A], ["x = 1"])
+        detector.record_step([READ_B], ["y = 1"])
+        detector.record_step([READ_A], ["x = 1"])
+        assert detector.record_step([READ_B], ["y = 1"]) == HINT
+        assert detector.stats()["cycles"] == 1
+
+
+class TestAgentLoopDetection:
+    """Tests that the agent loop acts on the detector."""
+
+    def test_repeating_model_is_made_to_answer(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tech-writer-from-scratch.py")
+        spec = importlib.util.spec_from_file_location("tech_writer_from_scratch", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "a.py")
+            with open(file_path, "w") as f:
+                f.write("def main():\n    return 42\n" * 50)
+            agent = module.ReActAgent("gpt-4o-mini", transcript_dir=None)
+            agent.client = RepeatingClient(file_path)
+            agent.budget_overrides = {"max_steps": 15}
+            assert agent.run("Describe it.", temp_dir) == "# Analysis"
+
+        requests = agent.client.requests
+        assert len(requests) == 5
+        assert [r["tool_choice"] for r in requests] == [None, None, None, None, "none"]
+        assert requests[2]["messages"][-1]["role"] == "user" and "repeated" in requests[2]["messages"][-1]["content"]
+        stats = agent.loop_detector.stats()
+        assert stats["max_steps_saved"] == 10 and stats["pointers"] == 3
+        assert stats["max_tokens_saved"] > 0 and stats["pointer_tokens_saved"] > 0
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
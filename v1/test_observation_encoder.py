@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Tests for the compact observation encodings.
+"""
+
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from observation_encoder import ObservationEncoder, encode_lines, factor_paths, resolve_path
+
+BASE = "/work/repo"
+
+
+def encoder(encodings=None):
+    result = ObservationEncoder(encodings)
+    result.reset(BASE)
+    return result
+
+
+class TestEncodings:
+    """Tests for each encoding."""
+
+    def test_paths_made_relative_to_the_base(self):
+        result = {"directory": BASE, "files": [Path(f"{BASE}/src/a.py"), f"{BASE}/README.md", "/elsewhere/b.py"]}
+        assert encoder().relativise(result) == {"directory": BASE, "files": ["src/a.py", "README.md", "/elsewhere/b.py"]}
+        assert encoder().relativise({"content": f"{BASE}/src/a.py\nmore"})["content"].startswith(BASE)
+
+    def test_json_is_compact(self):
+        observation = encoder().encode("find_all_matching_files", [f"{BASE}/a.py", f"{BASE}/b.py"], "json")
+        assert observation == '["a.py","b.py"]'
+
+    def test_paths_grouped_by_directory_when_shorter(self):
+        paths = ["src/api/app.py", "src/api/routes.py", "src/api/models.py", "README.md"]
+        assert factor_paths({"files": paths}) == {
+            "files": {"src/api/": ["app.py", "routes.py", "models.py"], "./": ["README.md"]}
+        }
+        scattered = ["a/x.py", "b/y.py", "c/z.py"]
+        assert factor_paths(scattered) == scattered
+
+    def test_lines(self):
+        result = {
+            "content": "def f():\n    return \"x\"\n",
+            "directory": BASE,
+            "totals": {"count": 3, "loc": 40},
+            "groups": [{"key": "src", "count": 2, "loc": 30}, {"key": "tests", "count": 1, "loc": 10}],
+            "terms": ["route", "app"],
+        }
+        assert encode_lines(result).split("\n") == [
+            f"directory: {BASE}",
+            "totals: count=3, loc=40",
+            "groups (2):",
+            "key\tcount\tloc",
+            "src\t2\t30",
+            "tests\t1\t10",
+            "terms (2):",
+            "route",
+            "app",
+            "content:",
+            "def f():",
+            "    return \"x\"",
+            "",
+        ]
+
+    def test_overrides_and_stats(self):
+        listing = [f"{BASE}/src/module_{i}.py" for i in range(20)]
+        compact = encoder({"*": "paths", "read_file": "pretty"})
+        assert compact.encode("find_all_matching_files", listing, "json").startswith('{"src/":')
+        assert compact.encode("read_file", {"file": f"{BASE}/a.py"}, "lines") == json.dumps({"file": f"{BASE}/a.py"},
+                                                                                          indent=2)
+        stats = compact.stats()
+        assert stats["tools"]["find_all_matching_files"]["encoding"] == "paths"
+        assert stats["tools"]["read_file"]["tokens_saved"] == 0
+        assert stats["saving"] > 0.3
+        with pytest.raises(ValueError):
+            ObservationEncoder({"read_file": "yaml"})
+
+
+class TestAgentEncoding:
+    """Tests that the agent encodes results as each tool asks and accepts relative paths back."""
+
+    def test_relative_paths_round_trip(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tech-writer-from-scratch.py")
+        spec = importlib.util.spec_from_file_location("tech_writer_from_scratch", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        def call(name, arguments):
+            return SimpleNamespace(id="call", function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.makedirs(os.path.join(temp_dir, "pkg"))
+            for name in ("a.py", "b.py", "c.py"):
+                with open(os.path.join(temp_dir, "pkg", name), "w") as f:
+                    f.write(f"name = '{name}'\n")
+            agent = module.ReActAgent("gpt-4o-mini", transcript_dir=None)
+            agent.initialise_memory("Describe it.", temp_dir)
+            listing = agent.execute_tool(call("find_all_matching_files", {"directory": temp_dir, "pattern": "*.py"}))
+            assert {key: sorted(names) for key, names in json.loads(listing).items()} == {"pkg/": ["a.py", "b.py", "c.py"]}
+            observation = agent.execute_tool(call("read_file", {"file_path": "pkg/a.py"}))
+        assert observation == "file: pkg/a.py\ncontent:\nname = 'a.py'\n"
+        assert resolve_path("pkg/a.py", "/nonexistent") == "/nonexistent/pkg/a.py"
+        assert resolve_path(".", "/repo") == "/repo" and resolve_path("/abs/a.py", "/repo") == "/abs/a.py"
+
+    def test_relative_paths_never_resolve_to_the_working_directory(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tech-writer-from-scratch.py")
+        spec = importlib.util.spec_from_file_location("tech_writer_from_scratch", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        def call(name, arguments):
+            return SimpleNamespace(id="call", function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo, cwd = os.path.join(temp_dir, "repo"), os.path.join(temp_dir, "cwd")
+            for directory in (repo, cwd):
+                os.makedirs(directory)
+                with open(os.path.join(directory, "README.md"), "w") as f:
+                    f.write(f"# {os.path.basename(directory)}\n")
+            monkeypatch.chdir(cwd)
+            agent = module.ReActAgent("gpt-4o-mini", transcript_dir=None)
+            agent.initialise_memory("Describe it.", repo)
+            observation = agent.execute_tool(call("read_file", {"file_path": "README.md"}))
+            listing = agent.execute_tool(call("browse_directory", {"directory": "."}))
+        assert observation == "file: README.md\ncontent:\n# repo\n"
+        assert json.loads(listing)["directory"] == repo
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for the out-of-band observation store.
+"""
+
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from observation_store import HANDLE_PREFIX, ObservationStore
+from transcript_store import TranscriptStore
+
+CODE = "class Handler:\n    def handle(self):\n        return 1\n" + "# padding\n" * 1000
+
+
+def _read_file_observation(path="/repo/handler.py", content=CODE):
+    return json.dumps({"file_path": path, "content": content}, indent=2)
+
+
+class TestObservationStore:
+    """Tests for ObservationStore offload, dedupe and fetch."""
+
+    def test_small_observation_unchanged(self):
+        store = ObservationStore()
+        assert store.offload('{"result": 42}', "calculate") == '{"result": 42}'
+        assert len(store) == 0
+
+    def test_large_observation_replaced_by_reference(self):
+        store = ObservationStore()
+        text = store.offload(_read_file_observation(), "read_file")
+        assert text == json.dumps(json.loads(text), separators=(",", ":"), ensure_ascii=False)
+        reference = json.loads(text)
+        assert reference["stored_observation"].startswith(HANDLE_PREFIX)
+        assert reference["file_path"] == "/repo/handler.py"
+        assert reference["total_chars"] == len(CODE)
+        assert reference["preview"] == CODE[:store.preview_chars]
+        assert "1: class Handler:" in reference["outline"]
+
+    def test_identical_content_deduplicated(self):
+        store = ObservationStore()
+        first = json.loads(store.offload(_read_file_observation(), "read_file"))
+        second = json.loads(store.offload(_read_file_observation(), "read_file"))
+        assert first["stored_observation"] == second["stored_observation"]
+        assert len(store) == 1
+        assert store.stats()["observations_deduplicated"] == 1
+
+    def test_fetch_pages_through_content(self):
+        store = ObservationStore()
+        handle = json.loads(store.offload(_read_file_observation(), "read_file"))["stored_observation"]
+        pages, offset = [], 0
+        while offset is not None:
+            page = store.fetch(handle, offset, 3000)
+            pages.append(page["content"])
+            offset = page["next_offset"]
+        assert "".join(pages) == CODE
+        assert store.fetch("obs-missing") == {"error": "Unknown observation handle: obs-missing"}
+        assert "error" in store.fetch(handle, -1)
+
+    def test_texts_spilled_to_the_transcript(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            transcript = TranscriptStore(temp_dir)
+            transcript.start("gpt-4o-mini", "/repo")
+            store = ObservationStore(transcript=transcript)
+            handle = json.loads(store.offload(_read_file_observation(), "read_file"))["stored_observation"]
+            store.offload(_read_file_observation(), "read_file")
+            assert store.stats()["observations_spilled"] == 1 and store.stats()["resident_chars"] == 0
+            assert store.fetch(handle, 10, 20)["content"] == CODE[10:30]
+
+            # A store whose transcript is not being written keeps its texts in memory
+            transcript.close()
+            store.put("x" * 10)
+            assert store.stats()["resident_chars"] == 10
+
+    def test_disabled_store(self):
+        store = ObservationStore(threshold=0)
+        assert store.offload(_read_file_observation(), "read_file") == _read_file_observation()
+
+
+class TestAgentObservationStore:
+    """Tests for the agent's use of its observation store."""
+
+    def test_offload_and_fetch_through_agent(self):
+        os.environ.setdefault("OPENAI_API_KEY", "test")
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tech-writer-from-scratch.py")
+        spec = importlib.util.spec_from_file_location("tech_writer_from_scratch", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with open(os.path.join(temp_dir, "handler.py"), "w") as f:
+                f.write(CODE)
+            agent = module.ReActAgent(transcript_dir=os.path.join(temp_dir, "transcripts"))
+            agent.initialise_memory("Describe it.", temp_dir)
+            assert module.TOOLS.options("read_file")["encoding"] == "lines"
+            read = SimpleNamespace(id="call_1", function=SimpleNamespace(
+                name="read_file", arguments=json.dumps({"file_path": "handler.py"})
+            ))
+            try:
+                agent.execute_tool_calls([read])
+                reference = json.loads(agent.memory[-1]["content"])
+                assert reference["file"] == "handler.py" and reference["total_chars"] == len(CODE)
+                assert "1: class Handler:" in reference["outline"]
+
+                pages, offset = [], 0
+                while offset is not None:
+                    fetch = SimpleNamespace(id=f"call_{offset}", function=SimpleNamespace(
+                        name="fetch_observation",
+                        arguments=json.dumps({"handle": reference["stored_observation"], "offset": offset}),
+                    ))
+                    agent.execute_tool_calls([fetch])
+                    page = json.loads(agent.memory[-1]["content"])
+                    pages.append(page["content"])
+                    offset = page["next_offset"]
+            finally:
+                agent.tool_executor.close()
+        # The stored text is the file itself, not the encoded observation with its fields
+        assert "".join(pages) == CODE
+        assert agent.observations.stats()["fetches"] == len(pages)
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Tests for the repository manifest and the query_repo tool.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import manifest
+from manifest import build_manifest, get_manifest, invalidate_tree_versions, tree_fingerprint
+from repo_query import query_repo
+
+
+@pytest.fixture
+def codebase():
+    """Create a small codebase with a .gitignore and a hidden file."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        (root / ".gitignore").write_text("*.log\nbuild/\n")
+        (root / "src" / "api").mkdir(parents=True)
+        (root / "build").mkdir()
+        (root / "README.md").write_text("# Title\n\nSome text\n")
+        (root / "src" / "main.py").write_text(
+            "import os\n\n\nclass App:\n    def run(self):\n        pass\n\n\ndef main():\n    App().run()\n"
+        )
+        (root / "src" / "api" / "routes.py").write_text("def index():\n    # Health check\n    return 'ok'\n")
+        (root / "src" / "api" / "client.js").write_text("export function fetchAll() {}\nclass Client {}\n")
+        (root / "src" / "logo.png").write_bytes(b"\x89PNG\r\n\x1a\n\x00\x00\x00")
+        (root / "debug.log").write_text("ignored\n")
+        (root / "build" / "out.py").write_text("print('ignored')\n")
+        (root / ".env").write_text("SECRET=1\n")
+        yield str(root)
+
+
+class TestManifest:
+    """Tests for build_manifest."""
+
+    def test_respects_gitignore_and_hidden_files(self, codebase):
+        manifest = build_manifest(codebase)
+        assert sorted(manifest.iter_paths()) == [
+            "README.md", "src/api/client.js", "src/api/routes.py", "src/logo.png", "src/main.py"
+        ]
+
+    def test_sizes_lines_and_binary_flags(self, codebase):
+        manifest = build_manifest(codebase)
+        rows = {row.path: row for row in manifest}
+        assert rows["src/main.py"].lines == 10
+        assert rows["src/main.py"].size == os.path.getsize(os.path.join(codebase, "src", "main.py"))
+        assert rows["src/main.py"].language == "Python"
+        assert rows["src/logo.png"].is_binary
+        assert not rows["README.md"].is_binary
+
+    def test_directories_are_interned(self, codebase):
+        manifest = build_manifest(codebase)
+        assert sorted(manifest.directories) == ["", "src/", "src/api/"]
+        assert len(manifest.dir_ids) == len(manifest)
+
+    def test_hidden_flag(self, codebase):
+        manifest = build_manifest(codebase, include_hidden=True)
+        hidden = [row.path for row in manifest if row.is_hidden]
+        assert sorted(hidden) == [".env", ".gitignore"]
+
+    def test_zero_copy_slice(self, codebase):
+        manifest = build_manifest(codebase)
+        page = manifest.slice(1, 3)
+        assert len(page) == 2
+        assert [row.path for row in page] == [manifest.path(1), manifest.path(2)]
+        assert sum(page.sizes) == manifest.sizes[1] + manifest.sizes[2]
+        assert page.sizes.obj is manifest.sizes
+        page.release()
+
+    def test_missing_directory(self):
+        with pytest.raises(FileNotFoundError):
+            build_manifest("/nonexistent/directory")
+
+    def test_cached_manifest_follows_the_tree(self, codebase):
+        root = Path(codebase)
+        first = get_manifest(codebase)
+        assert get_manifest(codebase) is first
+        fingerprint = tree_fingerprint(codebase)
+        (root / "debug.log").write_text("still ignored\n")
+        (root / ".env").write_text("SECRET=2\n")
+        assert tree_fingerprint(codebase) == fingerprint
+
+        # Within the check interval the cached version stands; a new run invalidates it
+        (root / "src" / "b.py").write_text("x = 1\n")
+        assert query_repo(codebase, pattern="*.py", aggregates="count")["totals"] == {"count": 2}
+        invalidate_tree_versions(codebase)
+        assert query_repo(codebase, pattern="*.py", aggregates="count")["totals"] == {"count": 3}
+        routes = root / "src" / "api" / "routes.py"
+        routes.write_text("def index():\n    return 'ok'\n" * 50)
+        os.utime(routes, ns=(1, 1))
+        invalidate_tree_versions(codebase)
+        assert query_repo(codebase, path_prefix="src/api", pattern="*.py", aggregates="loc")["totals"] == {"loc": 100}
+
+    def test_queries_do_not_walk_the_tree(self, codebase, monkeypatch):
+        walks = []
+        fingerprint = manifest.tree_fingerprint
+        monkeypatch.setattr(manifest, "tree_fingerprint", lambda *args: walks.append(args) or fingerprint(*args))
+        invalidate_tree_versions(codebase)
+        for _ in range(10):
+            query_repo(codebase, pattern="*.py", aggregates="count")
+        assert len(walks) == 1
+
+        monkeypatch.setattr(manifest, "TREE_CHECK_INTERVAL", 0.0)
+        query_repo(codebase, pattern="*.py", aggregates="count")
+        assert len(walks) == 2
+
+
+class TestQueryRepo:
+    """Tests for the query_repo tool."""
+
+    def test_count_python_files(self, codebase):
+        result = query_repo(codebase, pattern="*.py", aggregates="count")
+        assert result["totals"] == {"count": 2}
+
+    def test_group_by_language(self, codebase):
+        result = query_repo(codebase, group_by="language", include_binary=False)
+        groups = {group["key"]: group for group in result["groups"]}
+        assert groups["Python"]["count"] == 2
+        assert groups["Python"]["loc"] == 13
+        assert groups["JavaScript"]["count"] == 1
+        assert "Other" not in groups
+
+    def test_path_prefix_and_largest(self, codebase):
+        result = query_repo(codebase, path_prefix="src/api", largest=1, largest_by="loc")
+        assert result["totals"]["count"] == 2
+        assert result["largest"][0]["path"] == "src/api/routes.py"
+
+    def test_symbols(self, codebase):
+        result = query_repo(codebase, target="symbols", group_by="kind")
+        groups = {group["key"]: group["count"] for group in result["groups"]}
+        assert groups == {"function": 3, "class": 2, "method": 1}
+
+        classes = query_repo(codebase, target="symbols", symbol_kind="class", language="Python")
+        assert classes["totals"] == {"count": 1, "files": 1}
+
+    def test_invalid_arguments(self, codebase):
+        assert "error" in query_repo(codebase, target="commits")
+        assert "error" in query_repo(codebase, group_by="author")
+        assert "error" in query_repo("/nonexistent/directory")
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Tests for the repository profiler and run budgets.
+"""
+
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import run_budget
+from run_budget import DEFAULT_MAX_STEPS, MAX_STEPS, MIN_STEPS, RunBudget, plan_budget, profile_repo
+
+
+def write_files(directory, files):
+    for name, content in files.items():
+        path = os.path.join(directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+
+def profile(source_files, languages=("Python",)):
+    return {"source_files": source_files, "languages": {name: {"files": 1, "lines": 1} for name in languages}}
+
+
+class ToolCallingClient:
+    """Reads a different file on every step until tool calls are forbidden, then answers."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, tools, temperature, tool_choice=None, timeout=None):
+        self.requests.append({"messages": list(messages), "tool_choice": tool_choice, "timeout": timeout})
+        time.sleep(self.latency)
+        if tool_choice == "none":
+            message = SimpleNamespace(role="assistant", content="# Partial analysis", tool_calls=None)
+        else:
+            arguments = json.dumps({"file_path": f"missing_{len(self.requests)}.py"})
+            call = SimpleNamespace(id=f"call_{len(self.requests)}", type="function",
+                                   function=SimpleNamespace(name="read_file", arguments=arguments))
+            message = SimpleNamespace(role="assistant", content=None, tool_calls=[call])
+        usage = SimpleNamespace(prompt_tokens=1000, completion_tokens=50)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+class TestProfile:
+    """Tests for profiling a repository from its manifest."""
+
+    def test_counts_files_lines_and_languages(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            write_files(temp_dir, {
+                "app.py": "x = 1\ny = 2\nz = 3\n",
+                "lib/util.py": "def f():\n    pass\n",
+                "web/index.js": "console.log(1);\n",
+                "README.md": "# App\n",
+                ".hidden.py": "secret = 1\n",
+            })
+            result = profile_repo(temp_dir)
+        assert result["files"] == 4 and result["source_files"] == 3
+        assert result["source_lines"] == 6 and result["lines"] == 7
+        assert list(result["languages"])[0] == "Python"
+        assert result["languages"]["Python"] == {"files": 2, "lines": 5}
+
+    def test_unreadable_directory(self):
+        assert profile_repo("/nonexistent/directory") is None
+
+
+class TestPlanBudget:
+    """Tests for deriving budgets from a profile."""
+
+    def test_steps_grow_with_the_repository(self):
+        small = plan_budget(profile(3)).max_steps
+        large = plan_budget(profile(3000)).max_steps
+        polyglot = plan_budget(profile(3000, ("Python", "JavaScript", "Go", "Markdown"))).max_steps
+        assert MIN_STEPS <= small < large < polyglot <= MAX_STEPS
+        assert plan_budget(profile(10 ** 9, ("Python", "Go", "C", "Java", "Rust", "Ruby"))).max_steps == MAX_STEPS
+
+    def test_token_budget_follows_the_steps_and_time_is_unlimited(self):
+        budget = plan_budget(profile(100), context_budget=1000)
+        assert budget.max_tokens == budget.max_steps * 1000
+        assert budget.max_seconds is None
+        assert plan_budget(profile(100), context_budget=0).max_tokens is None
+
+    def test_small_repositories_keep_the_former_step_budget(self):
+        assert plan_budget(profile(1)).max_steps >= DEFAULT_MAX_STEPS
+
+    def test_overrides(self):
+        budget = plan_budget(profile(100), max_steps=5, max_tokens=123, max_seconds=9)
+        assert (budget.max_steps, budget.max_tokens, budget.max_seconds) == (5, 123, 9)
+        assert plan_budget(None).max_steps == DEFAULT_MAX_STEPS
+
+
+class TestRunBudget:
+    """Tests for deciding when a run has to finish."""
+
+    def test_last_step(self):
+        budget = RunBudget(max_steps=3)
+        budget.record_call(10)
+        assert budget.exhaustion_reason() is None
+        budget.record_call(10)
+        assert budget.exhaustion_reason() == "steps"
+        assert budget.stats()["finalised"] == "steps" and budget.stats()["tokens"] == 20
+
+    def test_tokens_and_time(self):
+        budget = RunBudget(max_steps=10, max_tokens=1000)
+        budget.record_call(899)
+        assert budget.exhaustion_reason() is None
+        budget.record_call(1)
+        assert budget.exhaustion_reason() == "tokens"
+        budget = RunBudget(max_steps=10, max_seconds=10)
+        budget.started -= 9
+        assert budget.exhaustion_reason() == "time"
+
+    def test_deadline_allows_for_the_next_step_and_the_answer(self):
+        budget = RunBudget(max_steps=10, deadline=time.time() + run_budget.DEADLINE_MARGIN + 10)
+        assert budget.exhaustion_reason() is None
+        budget.step_seconds.append(4)
+        budget.record_call(100, seconds=3)
+        assert budget.next_step_estimate() == 7 and budget.exhaustion_reason() is None
+        budget.record_call(100, seconds=6.5)
+        assert budget.exhaustion_reason() == "deadline"
+        assert budget.stats()["deadline_hit"] and not budget.deadline_passed()
+        assert 0 < budget.request_timeout() <= 10
+
+    def test_resume_what_was_spent(self):
+        budget = RunBudget(max_steps=10, max_tokens=1000)
+        budget.record_call(300)
+        spent = budget.spent()
+        resumed = RunBudget(max_steps=10, max_tokens=1000)
+        resumed.resume({**spent, "seconds": 5.0})
+        assert (resumed.steps, resumed.tokens) == (1, 300) and resumed.stats()["seconds"] >= 5.0
+
+    def test_deadline_passed(self):
+        budget = RunBudget(deadline=time.time() + 1)
+        assert budget.deadline_passed() and budget.stats()["deadline_missed"]
+
+
+class TestAgentBudget:
+    """Tests that the agent plans its budget and finalises before it runs out."""
+
+    @pytest.mark.parametrize("overrides, reason", [({"max_steps": 4}, "steps"), ({"max_tokens": 2500}, "tokens")])
+    def test_partial_answer_when_the_budget_runs_out(self, monkeypatch, overrides, reason):
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tech-writer-from-scratch.py")
+        spec = importlib.util.spec_from_file_location("tech_writer_from_scratch", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            write_files(temp_dir, {"a.py": "x = 1\n"})
+            agent = module.ReflexionAgent("gpt-4o-mini", transcript_dir=None)
+            agent.client = ToolCallingClient()
+            agent.budget_overrides = overrides
+            assert agent.run("Describe it.", temp_dir) == "# Partial analysis"
+
+        requests = agent.client.requests
+        assert [r["tool_choice"] for r in requests[:-1]] == [None] * (len(requests) - 1)
+        assert requests[-1]["tool_choice"] == "none" and "Budget" in requests[-1]["messages"][-1]["content"]
+        assert agent.budget.stats()["finalised"] == reason
+        assert agent.profile["source_files"] == 1
+
+
+class TestAgentDeadline:
+    """Tests that the agent finishes before its deadline and always leaves a result."""
+
+    @pytest.fixture
+    def agent_module(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tech-writer-from-scratch.py")
+        spec = importlib.util.spec_from_file_location("tech_writer_from_scratch", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    def test_final_answer_forced_before_the_deadline(self, agent_module, monkeypatch):
+        monkeypatch.setattr(run_budget, "DEADLINE_MARGIN", 0.0)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            write_files(temp_dir, {"a.py": "x = 1\n"})
+            agent = agent_module.ReActAgent("gpt-4o-mini", transcript_dir=None)
+            agent.client = ToolCallingClient(latency=0.2)
+            agent.deadline = time.time() + 0.5
+            assert agent.run("Describe it.", temp_dir) == "# Partial analysis"
+            assert time.time() < agent.deadline
+
+        requests = agent.client.requests
+        assert [r["tool_choice"] for r in requests] == [None, "none"]
+        assert all(r["timeout"] == 1.0 for r in requests)  # The shortest timeout requests are given
+        stats = agent.budget.stats()
+        assert stats["finalised"] == "deadline" and stats["deadline_hit"] and not stats["deadline_missed"]
+
+    def test_missed_deadline_saves_the_partial_result(self, agent_module):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            write_files(temp_dir, {"a.py": "x = 1\n"})
+            agent = agent_module.ReActAgent("gpt-4o-mini", transcript_dir=None)
+            agent.client = ToolCallingClient()
+            agent.deadline = time.time() - 1
+            result = agent.run("Describe it.", temp_dir)
+            assert result == agent_module.DEADLINE_MISSED and agent.client.requests == []
+
+            run_info = {"cache": "off"}
+            agent.memory.append({"role": "assistant", "content": "# Notes so far"})
+            agent_module.store_run(None, run_info, result, agent, 1.0)
+            output_path = agent_module.save_results(result, "gpt-4o-mini", "react", "repo", run_info,
+                                                    Path(temp_dir) / "out" / "analysis.md")
+            assert output_path.name == "analysis.partial.md"
+            assert output_path.read_text() == "# Notes so far"
+            with open(output_path.with_suffix(".run.json")) as f:
+                saved = json.load(f)
+            assert saved["complete"] is False and saved["metrics"]["budget"]["deadline_missed"]
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
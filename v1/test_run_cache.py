@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for the whole-run result cache.
+"""
+
+import asyncio
+import importlib.util
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from run_cache import RunCache, repo_fingerprint, run_key
+
+
+def _write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+class FakeAsyncClient:
+    """Answers straight away; counts the requests it receives."""
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, tools, temperature):
+        self.calls += 1
+        message = SimpleNamespace(role="assistant", content="# Analysis", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class TestRepoFingerprint:
+    """Tests for identifying a codebase's content."""
+
+    def test_manifest_fingerprint_changes_with_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            _write(os.path.join(temp_dir, "a.py"), "x = 1\n")
+            first = repo_fingerprint(temp_dir)
+            assert first.startswith("manifest:")
+            assert repo_fingerprint(temp_dir) == first
+            _write(os.path.join(temp_dir, "b.py"), "y = 2\n")
+            assert repo_fingerprint(temp_dir) != first
+
+    @pytest.mark.skipif(shutil.which("git") is None, reason="requires git")
+    def test_git_tree_hash_when_clean(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            _write(os.path.join(temp_dir, "a.py"), "x = 1\n")
+            git = ["git", "-C", temp_dir, "-c", "user.name=test", "-c", "user.email=test@example.com"]
+            subprocess.run(git + ["init", "-q"], check=True)
+            subprocess.run(git + ["add", "a.py"], check=True)
+            subprocess.run(git + ["commit", "-q", "-m", "initial"], check=True)
+            assert repo_fingerprint(temp_dir).startswith("git:")
+            _write(os.path.join(temp_dir, "a.py"), "x = 2\n")
+            assert repo_fingerprint(temp_dir).startswith("manifest:")
+
+
+class TestRunCache:
+    """Tests for storing and replaying runs."""
+
+    def test_key_fields(self):
+        fields = run_key("git:abc", "Describe it.", "system prompt", "gpt-4o-mini", "react")
+        assert fields["key"] != run_key("git:abc", "Describe it.", "system prompt", "gpt-4o-mini", "reflexion")["key"]
+        assert fields["key"] == run_key("git:abc", "Describe it.", "system prompt", "gpt-4o-mini", "react")["key"]
+
+    def test_put_get(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = RunCache(temp_dir)
+            fields = run_key("git:abc", "Describe it.", "system prompt", "gpt-4o-mini", "react")
+            assert cache.get(fields["key"]) is None
+            cache.put(fields, "# Analysis", {"seconds": 12.5})
+            entry = cache.get(fields["key"])
+            assert entry["result"] == "# Analysis" and entry["metrics"] == {"seconds": 12.5}
+
+    def test_analyse_many_hit_and_refresh(self):
+        os.environ.setdefault("OPENAI_API_KEY", "test")
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tech-writer-from-scratch.py")
+        spec = importlib.util.spec_from_file_location("tech_writer_from_scratch", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo = os.path.join(temp_dir, "repo")
+            os.makedirs(repo)
+            _write(os.path.join(repo, "a.py"), "x = 1\n")
+            cache = RunCache(os.path.join(temp_dir, "runs"))
+            client = FakeAsyncClient()
+
+            def analyse(refresh=False):
+                return asyncio.run(module.analyse_many_async(
+                    [repo], "Describe it.", "gpt-4o-mini", client=client, run_cache=cache, refresh=refresh,
+                    transcript_dir=None
+                ))[0]
+
+            assert analyse()["run"]["cache"] == "miss"
+            hit = analyse()
+            assert hit["run"]["cache"] == "hit" and hit["result"] == "# Analysis"
+            assert client.calls == 1
+            assert analyse(refresh=True)["run"]["cache"] == "refresh"
+            assert client.calls == 2
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Tests for segment-based indexing and fan-out queries.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from manifest import build_manifest, manifest_to_bytes
+from repo_query import query_manifests, search_code
+from segments import SegmentSet, build_segments, merge_manifests
+
+
+@pytest.fixture
+def codebase():
+    """Create a codebase spread over enough directories to populate every shard."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        for i in range(12):
+            package = root / f"pkg{i:02d}" / ("sub" if i % 3 else "")
+            package.mkdir(parents=True, exist_ok=True)
+            (package / f"mod{i}.py").write_text(
+                f"class Model{i}:\n    def save(self):\n        return load_config()\n\ndef helper_{i}():\n    pass\n"
+            )
+            (package / "notes.md").write_text(f"# Notes {i}\n" + "line\n" * i)
+        (root / "main.py").write_text("def load_config():\n    return {}\n")
+        yield temp_dir
+
+
+NUM_SHARDS = 4
+
+
+class TestMergeManifests:
+    """Tests for building shards and merging them."""
+
+    def test_shards_are_disjoint_and_complete(self, codebase):
+        full = build_manifest(codebase)
+        shards = [build_manifest(codebase, shard=i, num_shards=NUM_SHARDS) for i in range(NUM_SHARDS)]
+        paths = [p for shard in shards for p in shard.iter_paths()]
+        assert sorted(paths) == sorted(full.iter_paths())
+        assert len(set(paths)) == len(paths)
+
+    def test_merge_matches_single_build(self, codebase):
+        full = build_manifest(codebase)
+        shards = [build_manifest(codebase, shard=i, num_shards=NUM_SHARDS) for i in range(NUM_SHARDS)]
+        merged = merge_manifests(shards)
+        assert manifest_to_bytes(merged, include_search=True) == manifest_to_bytes(full, include_search=True)
+
+    def test_overlapping_segments_rejected(self, codebase):
+        full = build_manifest(codebase)
+        with pytest.raises(ValueError):
+            merge_manifests([full, full])
+
+
+class TestSegmentSet:
+    """Tests for fan-out queries and compaction over a segment store."""
+
+    def test_fan_out_query_matches_single_manifest(self, codebase):
+        with tempfile.TemporaryDirectory() as store:
+            build_segments(codebase, store, workers=1, num_shards=NUM_SHARDS)
+            segments = SegmentSet.open(store)
+            full = build_manifest(codebase)
+            for kwargs in [
+                {"group_by": "top_directory", "largest": 3, "largest_by": "loc"},
+                {"target": "symbols", "group_by": "kind"},
+            ]:
+                assert segments.query(**kwargs) == query_manifests([full], **kwargs)
+
+    def test_search(self, codebase):
+        with tempfile.TemporaryDirectory() as store:
+            build_segments(codebase, store, workers=1, num_shards=NUM_SHARDS)
+            segments = SegmentSet.open(store)
+            expected = search_code(codebase, "load_config, save", max_results=0)["files"]
+            assert segments.search(["load_config", "save"], max_results=0) == expected
+            assert len(expected) == 12
+
+    def test_compact(self, codebase):
+        with tempfile.TemporaryDirectory() as store:
+            paths = build_segments(codebase, store, workers=2, num_shards=NUM_SHARDS)
+            before = SegmentSet.open(store)
+            assert len(before) == NUM_SHARDS
+            compacted = before.compact()
+
+            after = SegmentSet.open(store)
+            assert after.paths == [compacted]
+            assert not any(os.path.exists(path) for path in paths)
+            assert manifest_to_bytes(after.manifests[0], include_search=True) == \
+                manifest_to_bytes(build_manifest(codebase), include_search=True)
+
+    def test_superseded_segments_ignored(self, codebase):
+        with tempfile.TemporaryDirectory() as store:
+            paths = build_segments(codebase, store, workers=1, num_shards=NUM_SHARDS)
+            contents = [Path(path).read_bytes() for path in paths]
+            SegmentSet.open(store).compact()
+            # Simulate a crash after the merged segment was written but before cleanup
+            for path, data in zip(paths, contents):
+                Path(path).write_bytes(data)
+            segments = SegmentSet.open(store)
+            assert len(segments) == 1
+            assert segments.file_count == len(build_manifest(codebase))
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Tests for publishing manifests to shared memory and memory-mapped files.
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from manifest import build_manifest
+from shared_manifest import SharedManifest, open_manifest_file, worker_manifest, write_manifest_file
+
+
+@pytest.fixture
+def manifest():
+    """Build a manifest, with its symbol index, for a small codebase."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        (root / "pkg").mkdir()
+        (root / "pkg" / "models.py").write_text("class User:\n    def save(self):\n        pass\n")
+        (root / "pkg" / "views.py").write_text("def index():\n    return 'ok'\n")
+        (root / "README.md").write_text("# Readme\n")
+        manifest = build_manifest(temp_dir)
+        manifest.symbols()
+        yield manifest
+
+
+def _summarise(manifest):
+    symbols = manifest.symbols()
+    return (
+        list(manifest.iter_paths()),
+        list(manifest.sizes),
+        list(manifest.lines),
+        list(symbols.names),
+        list(symbols.kinds),
+    )
+
+
+def _worker_summary(_):
+    return _summarise(worker_manifest())
+
+
+class TestSharedManifest:
+    """Tests for SharedManifest and attach_manifest."""
+
+    def test_attach_in_same_process(self, manifest):
+        with SharedManifest(manifest) as shared:
+            attached = shared.attach()
+            assert _summarise(attached) == _summarise(manifest)
+            assert attached.sizes.readonly
+            del attached
+
+    @pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="requires fork")
+    def test_pool_workers_attach(self, manifest):
+        with SharedManifest(manifest) as shared:
+            with shared.pool(2, context=multiprocessing.get_context("fork")) as pool:
+                summaries = pool.map(_worker_summary, range(2))
+        assert summaries == [_summarise(manifest)] * 2
+
+
+class TestManifestFile:
+    """Tests for memory-mapped manifest files."""
+
+    def test_round_trip(self, manifest):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = write_manifest_file(manifest, os.path.join(temp_dir, "manifest.bin"))
+            mapped = open_manifest_file(path)
+            assert _summarise(mapped) == _summarise(manifest)
+            assert mapped.root == manifest.root
+            assert mapped[0].path == manifest[0].path
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Tests for per-step token, latency and cost telemetry.
+"""
+
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from telemetry import RunTelemetry, estimate_cost, usage_counts
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_script(name, module_name):
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(HERE, name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class TestRunTelemetry:
+    """Tests for recording and aggregating steps."""
+
+    def test_usage_counts_from_objects_and_dicts(self):
+        usage = SimpleNamespace(prompt_tokens=1000, completion_tokens=50,
+                                prompt_tokens_details=SimpleNamespace(cached_tokens=800))
+        assert usage_counts(usage) == {"prompt_tokens": 1000, "completion_tokens": 50, "cached_tokens": 800,
+                                       "reported_cost": None}
+        assert usage_counts({"prompt_tokens": 10, "cost": 0.002})["reported_cost"] == 0.002
+        assert usage_counts(None)["prompt_tokens"] == 0
+
+    def test_estimated_cost_discounts_cached_tokens(self):
+        assert estimate_cost("gpt-4o-mini", 1_000_000, 0) == pytest.approx(0.15)
+        assert estimate_cost("gpt-4o-mini", 1_000_000, 0, cached_tokens=1_000_000) == pytest.approx(0.075)
+        assert estimate_cost("unknown-model", 100, 100) is None
+
+    def test_summary_accumulates_every_step(self):
+        telemetry = RunTelemetry("gpt-4o-mini")
+        telemetry.record_llm_call({"prompt_tokens": 100, "completion_tokens": 10, "cost": 0.5}, 1.0)
+        telemetry.record_tool_call("read_file", 0.25, "x" * 300)
+        telemetry.record_tool_call("calculate", 0.25, "42")
+        telemetry.record_llm_call({"prompt_tokens": 200, "completion_tokens": 20, "cost": 0.25}, 2.0)
+        telemetry.record_replayed_call()
+        summary = telemetry.summary()
+        assert summary["llm_calls"] == 3 and summary["replayed_calls"] == 1
+        assert summary["total_tokens"] == 330 and summary["cost_usd"] == 0.75
+        assert summary["llm_seconds"] == 3.0 and summary["tool_seconds"] == 0.5
+        assert summary["observation_bytes"] == 302
+        assert [len(step["tools"]) for step in telemetry.steps] == [2, 0, 0]
+
+    def test_estimate_error_against_reported_prompt_tokens(self):
+        telemetry = RunTelemetry("gpt-4o-mini")
+        telemetry.record_llm_call({"prompt_tokens": 100, "completion_tokens": 10}, 1.0, estimated_prompt_tokens=90)
+        telemetry.record_llm_call({"prompt_tokens": 300, "completion_tokens": 10}, 1.0, estimated_prompt_tokens=330)
+        telemetry.record_llm_call(None, 1.0, estimated_prompt_tokens=50)
+        summary = telemetry.summary()
+        assert summary["estimated_prompt_tokens"] == 420 and summary["prompt_estimate_error"] == 0.05
+        assert RunTelemetry("gpt-4o-mini").summary()["prompt_estimate_error"] is None
+
+
+class TestAgentTelemetry:
+    """Tests for the agents' usage reporting."""
+
+    def test_openrouter_totals_are_summed_over_steps(self, monkeypatch):
+        monkeypatch.setenv("OPENROUTER_API_KEY", "test")
+        module = load_script("tech-writer-from-scratch-openrouter.py", "tech_writer_openrouter")
+        agent = module.ReActAgent("gpt-4o-mini")
+        call = {"id": "call_1", "type": "function",
+                "function": {"name": "calculate", "arguments": json.dumps({"expression": "6 * 7"})}}
+        responses = [
+            {"choices": [{"message": {"content": None, "tool_calls": [call]}}],
+             "usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110, "cost": 0.001}},
+            {"choices": [{"message": {"content": "# Analysis"}}],
+             "usage": {"prompt_tokens": 150, "completion_tokens": 40, "total_tokens": 190, "cost": 0.002}},
+        ]
+        agent.call_llm = lambda messages: responses.pop(0)
+        assert agent.run("Describe it.", HERE) == "# Analysis"
+        assert agent.token_usage == 300
+        assert agent.cost_usd == pytest.approx(0.003)
+        assert agent.telemetry.summary()["tool_calls"] == 1
+
+    def test_save_results_writes_telemetry_sidecar(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        module = load_script("tech-writer-from-scratch.py", "tech_writer_from_scratch")
+        agent = module.ReActAgent("gpt-4o-mini", transcript_dir=None)
+        agent.telemetry.record_llm_call({"prompt_tokens": 100, "completion_tokens": 10}, 0.5)
+        agent.telemetry.record_tool_call("read_file", 0.1, "contents")
+        run_info = {"cache": "off"}
+        module.store_run(None, run_info, "# Analysis", agent, 1.0)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            monkeypatch.chdir(temp_dir)
+            output_path = module.save_results("# Analysis", "gpt-4o-mini", "react", "repo", run_info)
+            with open(output_path.with_suffix(".telemetry.jsonl"), encoding="utf-8") as f:
+                lines = [json.loads(line) for line in f]
+            with open(output_path.with_suffix(".run.json"), encoding="utf-8") as f:
+                saved_run = json.load(f)
+        assert [line["type"] for line in lines] == ["step", "run"]
+        assert lines[0]["tools"][0]["observation_bytes"] == 8
+        assert lines[1]["prompt_tokens"] == 100 and lines[1]["cache"] == "off"
+        assert "steps" not in saved_run and saved_run["metrics"]["telemetry"]["llm_calls"] == 1
+
+
+class RecordingClient:
+    """Asks for one calculate call, then answers; records each request and reports cached prompt tokens."""
+
+    def __init__(self):
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, tools, temperature):
+        self.requests.append(list(messages))
+        if len(self.requests) == 1:
+            call = SimpleNamespace(id="call_1", type="function",
+                                   function=SimpleNamespace(name="calculate", arguments='{"expression": "6 * 7"}'))
+            message = SimpleNamespace(role="assistant", content=None, tool_calls=[call])
+        else:
+            message = SimpleNamespace(role="assistant", content="# Analysis", tool_calls=None)
+        usage = SimpleNamespace(prompt_tokens=2000, completion_tokens=20,
+                                prompt_tokens_details=SimpleNamespace(cached_tokens=1536 if self.requests[1:] else 0))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+class TestPromptCaching:
+    """Tests that the prompt prefix stays byte-stable and cached tokens are reported."""
+
+    def test_reflexion_instruction_only_at_the_tail(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        module = load_script("tech-writer-from-scratch.py", "tech_writer_from_scratch")
+        agent = module.ReflexionAgent("gpt-4o-mini", transcript_dir=None)
+        agent.client = RecordingClient()
+        assert agent.run("Describe it.", HERE) == "# Analysis"
+
+        first, second = agent.client.requests
+        assert json.dumps(second[:2]) == json.dumps(first)
+        assert second[-1] == {"role": "user", "content": module.REFLECTION_INSTRUCTION}
+        assert all(m.get("content") != module.REFLECTION_INSTRUCTION for m in agent.memory if isinstance(m, dict))
+        summary = agent.telemetry.summary()
+        assert summary["cached_tokens"] == 1536 and summary["prompt_cache_hit_rate"] == 0.384
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
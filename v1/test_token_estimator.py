@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for the offline token estimators and the incremental message token counts.
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import token_estimator
+from token_estimator import (MESSAGE_OVERHEAD_TOKENS, HeuristicEstimator, MessageTokenCache, get_estimator,
+                             message_tokens)
+
+
+class CountingEstimator:
+    """Counts one token per character and how many texts it was asked to count."""
+
+    name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+
+    def count(self, text):
+        self.calls += 1
+        return len(text)
+
+
+@pytest.fixture(autouse=True)
+def fresh_estimators():
+    get_estimator.cache_clear()
+    yield
+    get_estimator.cache_clear()
+
+
+class TestHeuristicEstimator:
+    """Tests for the heuristic estimate."""
+
+    def test_words_symbols_and_digits(self):
+        estimator = HeuristicEstimator()
+        assert estimator.count("") == 0
+        assert estimator.count("Hello, world!") == 4
+        assert estimator.count("getUserName") == 3
+        assert estimator.count("1234567") == 3
+        assert estimator.count("def f():\n    return 1\n") == 8
+
+    def test_follows_code_more_closely_than_characters(self):
+        estimator = HeuristicEstimator()
+        indented = "if x:\n" + "        y = 1\n" * 10
+        assert estimator.count(indented) < len(indented) / 4 * 1.5
+        assert estimator.count("é" * 8) == 8
+
+
+class TestGetEstimator:
+    """Tests for choosing an estimator."""
+
+    def test_heuristic_forced_or_without_tiktoken(self, monkeypatch):
+        monkeypatch.setenv("TECH_WRITER_TOKENIZER", "heuristic")
+        assert get_estimator("gpt-4o-mini").name == "heuristic"
+        get_estimator.cache_clear()
+        monkeypatch.setitem(sys.modules, "tiktoken", None)
+        monkeypatch.setenv("TECH_WRITER_TOKENIZER", "tiktoken")
+        assert get_estimator("gpt-4o-mini").name == "heuristic"
+        assert get_estimator("gpt-4o-mini") is get_estimator("gpt-4o-mini")
+
+    def test_tiktoken_when_installed(self, monkeypatch):
+        pytest.importorskip("tiktoken")
+        monkeypatch.delenv("TECH_WRITER_TOKENIZER", raising=False)
+        estimator = get_estimator("unknown-model")
+        assert estimator.name == f"tiktoken:{token_estimator.FALLBACK_ENCODING}"
+        assert estimator.count("Hello, world!") == 4
+
+
+class TestMessageTokens:
+    """Tests for counting chat messages."""
+
+    def test_content_and_tool_calls(self):
+        estimator = CountingEstimator()
+        call = SimpleNamespace(function=SimpleNamespace(name="read_file", arguments='{"a":1}'))
+        message = SimpleNamespace(role="assistant", content=None, tool_calls=[call])
+        assert message_tokens(message, estimator) == len("read_file") + 7 + MESSAGE_OVERHEAD_TOKENS
+        assert message_tokens({"role": "user", "content": "abc"}, estimator) == 3 + MESSAGE_OVERHEAD_TOKENS
+
+    def test_only_new_or_changed_messages_are_counted(self):
+        estimator = CountingEstimator()
+        cache = MessageTokenCache(estimator)
+        memory = [{"role": "user", "content": "x" * 10}]
+        for step in range(5):
+            memory.append({"role": "tool", "content": "y" * step})
+            assert cache.total(memory) == 10 + sum(range(step + 1)) + MESSAGE_OVERHEAD_TOKENS * len(memory)
+        assert cache.messages_counted == 6 and estimator.calls == 6
+        memory[0]["content"] = "short"
+        assert cache.total(memory) == 5 + sum(range(5)) + MESSAGE_OVERHEAD_TOKENS * len(memory)
+        assert cache.messages_counted == 7
+        cache.reset()
+        cache.total(memory)
+        assert cache.messages_counted == 6
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
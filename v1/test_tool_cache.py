@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Tests for memoization of pure tool calls.
+"""
+
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import manifest
+from manifest import invalidate_tree_versions
+from tool_cache import ToolCache
+from tool_registry import ToolRegistry
+
+
+def read_text(file_path: str) -> dict:
+    """
+    Read a file.
+
+    Args:
+        file_path: File to read
+    """
+    with open(file_path) as f:
+        return {"content": f.read()}
+
+
+def list_names(directory: str, suffix: str = "") -> list:
+    """
+    List the files in a directory tree.
+
+    Args:
+        directory: Directory to list
+        suffix: Only list names ending with this
+    """
+    return sorted(name for _, _, files in os.walk(directory) for name in files if name.endswith(suffix))
+
+
+@pytest.fixture
+def tools():
+    tools = ToolRegistry()
+    tools.register("read_text", read_text, pure=True, depends_on=["file_path"])
+    tools.register("list_names", list_names, pure=True, depends_on=["directory"])
+    return tools
+
+
+class CountingRunner:
+    def __init__(self, tools):
+        self.tools = tools
+        self.calls = 0
+
+    def __call__(self, name, arguments):
+        self.calls += 1
+        return self.tools[name](**arguments)
+
+
+class TestToolCache:
+    """Tests for ToolCache hits and dependency invalidation."""
+
+    def test_file_dependency(self, tools):
+        cache, run = ToolCache(tools), CountingRunner(tools)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "a.txt")
+            with open(path, "w") as f:
+                f.write("one")
+            assert cache.call("read_text", {"file_path": path}, run) == {"content": "one"}
+            assert cache.call("read_text", {"file_path": path}, run) == {"content": "one"}
+            assert run.calls == 1
+
+            # Touched but unchanged: still a hit
+            os.utime(path, ns=(1, 1))
+            cache.call("read_text", {"file_path": path}, run)
+            assert run.calls == 1
+
+            with open(path, "w") as f:
+                f.write("two")
+            assert cache.call("read_text", {"file_path": path}, run) == {"content": "two"}
+            assert run.calls == 2
+        assert cache.stats()["read_text"] == {"hits": 2, "misses": 1, "invalidated": 1, "hit_rate": 0.5}
+
+    def test_directory_dependency_and_defaults(self, tools):
+        cache, run = ToolCache(tools), CountingRunner(tools)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.makedirs(os.path.join(temp_dir, "pkg"))
+            open(os.path.join(temp_dir, "pkg", "a.py"), "w").close()
+            assert cache.call("list_names", {"directory": temp_dir}, run) == ["a.py"]
+            assert cache.call("list_names", {"directory": temp_dir, "suffix": ""}, run) == ["a.py"]
+            assert run.calls == 1
+
+            open(os.path.join(temp_dir, "pkg", "b.py"), "w").close()
+            invalidate_tree_versions(temp_dir)
+            assert cache.call("list_names", {"directory": temp_dir}, run) == ["a.py", "b.py"]
+            assert run.calls == 2
+
+    def test_directory_dependency_sees_rewrites_and_skips_ignored_paths(self, tools):
+        tools.register("read_tree", lambda directory: sorted(
+            open(os.path.join(root, name)).read() for root, dirs, files in os.walk(directory)
+            if ".git" not in root and "node_modules" not in root for name in files
+            if name != ".gitignore"
+        ), pure=True, depends_on=["directory"], parameters={
+            "type": "object", "properties": {"directory": {"type": "string"}}, "required": ["directory"]
+        })
+        cache, run = ToolCache(tools), CountingRunner(tools)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "a.py")
+            with open(path, "w") as f:
+                f.write("one")
+            with open(os.path.join(temp_dir, ".gitignore"), "w") as f:
+                f.write("node_modules/\n")
+            for ignored in (".git", "node_modules"):
+                os.makedirs(os.path.join(temp_dir, ignored))
+            assert cache.call("read_tree", {"directory": temp_dir}, run) == ["one"]
+
+            # Changes under .git and ignored directories do not invalidate the result
+            for ignored in (".git", "node_modules"):
+                open(os.path.join(temp_dir, ignored, "x"), "w").close()
+            invalidate_tree_versions(temp_dir)
+            assert cache.call("read_tree", {"directory": temp_dir}, run) == ["one"]
+            assert run.calls == 1
+
+            # Rewriting a file in place leaves every directory mtime alone
+            with open(path, "w") as f:
+                f.write("two")
+            os.utime(path, ns=(1, 1))
+            invalidate_tree_versions(temp_dir)
+            assert cache.call("read_tree", {"directory": temp_dir}, run) == ["two"]
+            assert run.calls == 2
+
+    def test_hits_do_not_walk_the_tree(self, tools, monkeypatch):
+        walks = []
+        fingerprint = manifest.tree_fingerprint
+        monkeypatch.setattr(manifest, "tree_fingerprint", lambda *args: walks.append(args) or fingerprint(*args))
+        cache, run = ToolCache(tools), CountingRunner(tools)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            open(os.path.join(temp_dir, "a.py"), "w").close()
+            for _ in range(10):
+                assert cache.call("list_names", {"directory": temp_dir}, run) == ["a.py"]
+        # One walk for the miss, shared with every hit after it
+        assert run.calls == 1 and len(walks) == 1
+
+    def test_disk_cache_across_instances(self, tools):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "a.txt")
+            with open(path, "w") as f:
+                f.write("one")
+            store = os.path.join(temp_dir, "cache")
+            run = CountingRunner(tools)
+            ToolCache(tools, directory=store).call("read_text", {"file_path": path}, run)
+            assert ToolCache(tools, directory=store).call("read_text", {"file_path": path}, run) == {"content": "one"}
+            assert run.calls == 1
+
+    def test_impure_tools_not_cached(self, tools):
+        tools.register("echo", lambda value: value, parameters={
+            "type": "object", "properties": {"value": {"type": "string"}}, "required": ["value"]
+        })
+        cache, run = ToolCache(tools), CountingRunner(tools)
+        cache.call("echo", {"value": "x"}, run)
+        cache.call("echo", {"value": "x"}, run)
+        assert run.calls == 2
+        assert cache.key("echo", {"value": "x"}) is None
+
+    def test_invalid_declarations(self, tools):
+        with pytest.raises(ValueError):
+            tools.register("read_other", read_text, depends_on=["file_path"])
+        with pytest.raises(ValueError):
+            tools.register("read_other", read_text, pure=True, depends_on=["path"])
+
+
+class TestUnchangedReferences:
+    """Tests for the agent's references to repeated tool results."""
+
+    def test_repeated_call_is_a_reference(self):
+        os.environ.setdefault("OPENAI_API_KEY", "test")
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tech-writer-from-scratch.py")
+        spec = importlib.util.spec_from_file_location("tech_writer_from_scratch", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        agent = module.ReActAgent(transcript_dir=None)
+        agent.initialise_memory("Describe it.", "/repo")
+        calls = [
+            SimpleNamespace(id=f"call_{i}", function=SimpleNamespace(
+                name="calculate", arguments=json.dumps({"expression": "6 * 7"})
+            ))
+            for i in range(2)
+        ]
+        try:
+            agent.execute_tool_calls(calls[:1])
+            agent.execute_tool_calls(calls[1:])
+        finally:
+            agent.tool_executor.close()
+        assert json.loads(agent.memory[2]["content"])["result"] == 42
+        assert json.loads(agent.memory[3]["content"])["unchanged_since_call"] == 1
+        assert agent.unchanged_references == 1
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
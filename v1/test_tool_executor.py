@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Tests for concurrent tool execution.
+"""
+
+import importlib.util
+import json
+import multiprocessing
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from tool_executor import ToolExecutor
+from tool_registry import ToolRegistry
+
+
+def wait(seconds: float) -> dict:
+    """
+    Sleep, then report how long.
+
+    Args:
+        seconds: How long to sleep
+    """
+    time.sleep(seconds)
+    return {"slept": seconds}
+
+
+def spin(seconds: float) -> dict:
+    """
+    Busy-wait, then report the worker's process id.
+
+    Args:
+        seconds: How long to spin
+    """
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+    return {"pid": os.getpid()}
+
+
+def _tool_call(call_id, name, **arguments):
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+
+
+@pytest.fixture
+def executor():
+    tools = ToolRegistry({"wait": wait})
+    tools.register("spin", spin, kind="cpu", timeout=0.5)
+    tools.register("slow", wait, timeout=0.2)
+    context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+    executor = ToolExecutor(tools, max_workers=4, max_processes=1, mp_context=context)
+    yield executor
+    executor.close()
+
+
+def _run(executor, calls):
+    return executor.run_all(lambda c: executor.call(c[0], c[1]), calls, [name for name, _ in calls])
+
+
+class TestToolExecutor:
+    """Tests for ToolExecutor dispatch, ordering and timeouts."""
+
+    def test_results_in_call_order_and_concurrent(self, executor):
+        calls = [("wait", {"seconds": s}) for s in (0.3, 0.1, 0.2)]
+        start = time.monotonic()
+        results = _run(executor, calls)
+        elapsed = time.monotonic() - start
+        assert [r["slept"] for r in results] == [0.3, 0.1, 0.2]
+        assert elapsed < 0.5
+
+    def test_thread_timeout(self, executor):
+        results = _run(executor, [("slow", {"seconds": 1.0}), ("wait", {"seconds": 0})])
+        assert results[0] == "Error: Tool slow timed out after 0.2s"
+        assert results[1] == {"slept": 0}
+
+    @pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="requires fork")
+    def test_cpu_tool_runs_in_process_and_is_killed_on_timeout(self, executor):
+        assert executor.call("spin", {"seconds": 0})["pid"] != os.getpid()
+        with pytest.raises(TimeoutError):
+            executor.call("spin", {"seconds": 5})
+        # A fresh pool is started after the timed-out one is terminated
+        assert executor.call("spin", {"seconds": 0})["pid"] != os.getpid()
+
+    def test_unpicklable_cpu_tool_runs_on_thread(self, executor):
+        def local_tool(value: int) -> dict:
+            """
+            Return the value.
+
+            Args:
+                value: Any integer
+            """
+            return {"value": value, "pid": os.getpid()}
+
+        executor.tools.register("local", local_tool, kind="cpu")
+        assert executor.call("local", {"value": 3}) == {"value": 3, "pid": os.getpid()}
+
+
+def _load_agent_module():
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tech-writer-from-scratch.py")
+    spec = importlib.util.spec_from_file_location("tech_writer_from_scratch", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class TestAgentToolCalls:
+    """Tests for TechWriterAgent.execute_tool_calls."""
+
+    def test_cpu_tool_runs_under_spawn(self):
+        module = _load_agent_module()
+        executor = ToolExecutor(module.TOOLS, max_processes=1, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            assert executor._runs_in_process("calculate")
+            assert executor.call("calculate", {"expression": "6 * 7"}) == {"expression": "6 * 7", "result": 42}
+        finally:
+            executor.close()
+
+    def test_memory_in_tool_call_order(self):
+        module = _load_agent_module()
+        agent = module.ReActAgent(transcript_dir=None)
+        agent.memory = []
+        try:
+            agent.execute_tool_calls([
+                _tool_call("call_a", "calculate", expression="6 * 7"),
+                _tool_call("call_b", "unknown_tool"),
+                _tool_call("call_c", "calculate", expression="1 +"),
+            ])
+        finally:
+            agent.tool_executor.close()
+        assert [m["tool_call_id"] for m in agent.memory] == ["call_a", "call_b", "call_c"]
+        assert json.loads(agent.memory[0]["content"])["result"] == 42
+        assert agent.memory[1]["content"] == "Error: Unknown tool unknown_tool"
+        assert "error" in json.loads(agent.memory[2]["content"])
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
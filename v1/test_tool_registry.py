@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for the tool registry.
+"""
+
+import os
+import sys
+from typing import Any, Dict, List
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from tool_registry import ToolRegistry, schema_from_function
+
+
+def lookup(directory: str, names: List[str], limit: int = 10, exact: bool = False) -> Dict[str, Any]:
+    """
+    Look things up.
+
+    Args:
+        directory: Directory to search
+        names: Names to look up
+        limit: Maximum number of results
+        exact: Whether to match names exactly
+
+    Returns:
+        Dictionary of results
+    """
+    return {"directory": directory, "names": names, "limit": limit, "exact": exact}
+
+
+class TestSchemaFromFunction:
+    """Tests for building schemas from signatures and docstrings."""
+
+    def test_types_descriptions_and_required(self):
+        schema = schema_from_function(lookup)
+        assert schema["description"] == "Look things up."
+        properties = schema["parameters"]["properties"]
+        assert {name: prop["type"] for name, prop in properties.items()} == {
+            "directory": "string", "names": "array", "limit": "integer", "exact": "boolean"
+        }
+        assert properties["limit"]["description"] == "Maximum number of results"
+        assert schema["parameters"]["required"] == ["directory", "names"]
+
+
+class TestToolRegistry:
+    """Tests for ToolRegistry registration and payload caching."""
+
+    def test_mapping_and_cached_payload(self):
+        tools = ToolRegistry({"lookup": lookup})
+        assert "lookup" in tools and tools["lookup"] is lookup
+        first = tools.definitions()
+        assert tools.definitions() is first
+        assert tools.definitions_json() is tools.definitions_json()
+        assert first[0]["function"]["name"] == "lookup"
+
+    def test_register_invalidates_payload(self):
+        tools = ToolRegistry({"lookup": lookup})
+        first = tools.definitions()
+        tools.register("lookup_again", lookup)
+        assert tools.definitions() is not first
+        assert len(tools.definitions()) == 2
+
+    def test_schema_override(self):
+        tools = ToolRegistry()
+        parameters = {
+            "type": "object",
+            "properties": {
+                "directory": {"type": "string", "description": "Root"},
+                "names": {"type": "array", "items": {"type": "string"}},
+                "exact": {"type": "boolean"},
+            },
+            "required": ["directory", "names"],
+        }
+        tools.register("lookup", lookup, parameters=parameters, description="Find names")
+        function = tools.definition("lookup")["function"]
+        assert function["parameters"] is parameters
+        assert function["description"] == "Find names"
+
+    def test_encoding(self):
+        tools = ToolRegistry()
+        tools.register("lookup", lookup, encoding="lines")
+        assert tools.options("lookup")["encoding"] == "lines"
+        with pytest.raises(ValueError):
+            tools.register("lookup", lookup, encoding="xml")
+
+    @pytest.mark.parametrize("name, parameters", [
+        ("bad name!", None),
+        ("lookup", {"type": "object", "properties": {"directory": {"type": "string"}}}),
+        ("lookup", {"type": "object", "properties": {"directory": {"type": "str"}, "names": {"type": "array"}}}),
+        ("lookup", {"type": "object", "properties": {"directory": {"type": "string"}, "names": {"type": "array"},
+                                                     "unknown": {"type": "string"}}}),
+        ("lookup", {"type": "object", "properties": {"directory": {"type": "string"}, "names": {"type": "array"}},
+                    "required": ["missing"]}),
+    ])
+    def test_invalid_schemas_rejected(self, name, parameters):
+        with pytest.raises(ValueError):
+            ToolRegistry().register(name, lookup, parameters=parameters)
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
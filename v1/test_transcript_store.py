@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-run transcripts and the eviction of observations to them.
+"""
+
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from context_budget import STUB_PREFIX
+from llm_cache import plain
+from token_estimator import HeuristicEstimator, MessageTokenCache
+from transcript_store import TranscriptStore, load_checkpoint
+
+
+def tool_call(call_id, name, arguments):
+    return SimpleNamespace(id=call_id, type="function",
+                           function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+
+
+def run_memory(store, reads, size=2000):
+    """Append a run of read_file calls and their observations to a store and return the memory."""
+    memory = [{"role": "system", "content": "You are a technical writer."}]
+    store.append(memory[0])
+    for i in range(reads):
+        call = tool_call(f"call_{i}", "read_file", {"file_path": f"f{i}.py"})
+        messages = [SimpleNamespace(role="assistant", content=None, tool_calls=[call]),
+                    {"role": "tool", "tool_call_id": f"call_{i}", "name": "read_file",
+                     "content": f"def f{i}():\n" + "    pass\n" * (size // 9)}]
+        for message in messages:
+            memory.append(message)
+            store.append(message)
+    return memory
+
+
+class TestTranscriptStore:
+    """Tests for writing, counting and reading back messages."""
+
+    def test_messages_written_and_counted(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            counter = MessageTokenCache(HeuristicEstimator())
+            store = TranscriptStore(temp_dir, token_counter=counter)
+            path = store.start("gpt-4o-mini", "/repo", run_id="run-1")
+            memory = run_memory(store, 2)
+            store.finish("# Analysis")
+            with open(path) as f:
+                records = [json.loads(line) for line in f]
+            assert path == os.path.join(temp_dir, "run-1.jsonl")
+            assert [r["type"] for r in records] == ["run"] + ["message"] * 5 + ["end"]
+            assert records[2]["message"]["tool_calls"][0]["function"]["name"] == "read_file"
+            assert records[-1]["result"] == "# Analysis" and records[-1]["stats"]["messages"] == 5
+            stats = store.stats()
+            assert stats["tokens"] == counter.total(memory) and counter.messages_counted == 5
+            assert stats["chars"] == sum(len(m["content"]) for m in memory if isinstance(m, dict))
+            assert stats["bytes"] == os.path.getsize(path)
+            assert store.read(4)["content"] == memory[4]["content"] and store.read(9) is None
+
+    def test_without_a_directory_only_counts(self):
+        store = TranscriptStore(None, keep_observations=0)
+        assert store.start("gpt-4o-mini", "/repo") is None
+        memory = run_memory(store, 3)
+        assert store.evict(memory) == 0 and store.stats()["messages"] == 7
+        assert store.fetch("msg-2") == {"error": "Unknown transcript handle: msg-2"}
+
+
+class TestEviction:
+    """Tests for evicting older observation bodies from memory."""
+
+    def test_older_observations_evicted_and_fetched_back(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = TranscriptStore(temp_dir, keep_observations=2)
+            store.start("gpt-4o-mini", "/repo")
+            memory = run_memory(store, 5)
+            original = memory[2]["content"]
+            assert store.evict(memory) > 0
+            tools = [m for m in memory if isinstance(m, dict) and m.get("role") == "tool"]
+            assert [m["content"].startswith(STUB_PREFIX) for m in tools] == [True, True, True, False, False]
+            assert "read_file" in tools[0]["content"] and "fetch_observation with handle msg-2" in tools[0]["content"]
+            page = store.fetch("msg-2", offset=0, length=100)
+            assert page["content"] == original[:100] and page["total_chars"] == len(original)
+            assert store.evict(memory) == 0
+
+            # Only observations that became old since the last call are considered
+            for message in run_memory(store, 1)[1:]:
+                memory.append(message)
+            store.evict(memory)
+            assert store.stats()["observations_evicted"] == 4
+
+    def test_short_observations_kept(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = TranscriptStore(temp_dir, keep_observations=0)
+            store.start("gpt-4o-mini", "/repo")
+            memory = run_memory(store, 3, size=100)
+            assert store.evict(memory) == 0
+
+
+class TestCheckpoints:
+    """Tests for checkpointing a transcript and resuming from it."""
+
+    def test_resume_from_the_last_complete_checkpoint(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = TranscriptStore(temp_dir)
+            path = store.start("gpt-4o-mini", "/repo", run_id="run-1", details={"agent_type": "react"})
+            run_memory(store, 1)
+            first = store.append_observation("obs-1", "stored")
+            store.checkpoint(1, {"tool_call_count": 1}, [{"step": 1}])
+            run_memory(store, 1)
+            second = store.append_observation("obs-2", "more")
+            store.checkpoint(2, {"tool_call_count": 2}, [{"step": 2}])
+            store.append({"role": "assistant", "content": "interrupted step"})
+            store.append_observation("obs-3", "lost")
+            store.close()
+            with open(path, "ab") as f:
+                f.write(b'{"type": "message", "index": 7, "mess')
+
+            checkpoint = load_checkpoint(path)
+            assert checkpoint["header"]["agent_type"] == "react" and checkpoint["step"] == 2
+            assert len(checkpoint["messages"]) == 6 and checkpoint["state"] == {"tool_call_count": 2}
+            assert checkpoint["observations"] == [("obs-1", first), ("obs-2", second)]
+            assert checkpoint["telemetry"] == [{"step": 1}, {"step": 2}] and not checkpoint["finished"]
+
+            resumed = TranscriptStore(temp_dir)
+            memory = resumed.resume(checkpoint)
+            assert resumed.stats()["messages"] == 6 and resumed.run_id == "run-1"
+            assert resumed.read(5)["content"] == memory[5]["content"]
+            assert resumed.read_observation(second) == "more" and resumed.read_observation(0) is None
+            resumed.append({"role": "assistant", "content": "# Analysis"})
+            resumed.finish("# Analysis")
+            with open(path) as f:
+                records = [json.loads(line) for line in f]
+            assert [r["type"] for r in records].count("run") == 1
+            assert records[-2]["index"] == 6 and records[-1]["result"] == "# Analysis"
+            assert load_checkpoint(path)["finished"]
+
+    def test_no_checkpoint(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = TranscriptStore(temp_dir)
+            path = store.start("gpt-4o-mini", "/repo")
+            store.close()
+            with pytest.raises(ValueError):
+                load_checkpoint(path)
+            with pytest.raises(ValueError):
+                load_checkpoint(os.path.join(temp_dir, "missing.jsonl"))
+
+
+class Interrupted(BaseException):
+    """Stands in for the process being killed in the middle of a step."""
+
+
+class FileReadingClient:
+    """Reads one file per step and answers after reads_before_answer steps, or is interrupted at a step."""
+
+    def __init__(self, reads_before_answer, interrupt_at=None):
+        self.reads_before_answer = reads_before_answer
+        self.interrupt_at = interrupt_at
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, tools, temperature, tool_choice=None, timeout=None):
+        self.requests.append(plain(messages))
+        step = len(self.requests)
+        if step == self.interrupt_at:
+            raise Interrupted()
+        if step > self.reads_before_answer or tool_choice == "none":
+            message = SimpleNamespace(role="assistant", content="# Analysis", tool_calls=None)
+        else:
+            message = SimpleNamespace(role="assistant", content=None,
+                                      tool_calls=[tool_call(f"call_{step}", "read_file", {"file_path": f"m{step}.py"})])
+        usage = SimpleNamespace(prompt_tokens=100, completion_tokens=10)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+class TestAgentTranscript:
+    """Tests that the agent writes its transcript and reads evicted observations back from it."""
+
+    def test_evicted_observation_fetched_through_the_tool(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tech-writer-from-scratch.py")
+        spec = importlib.util.spec_from_file_location("tech_writer_from_scratch", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for i in range(3):
+                with open(os.path.join(temp_dir, f"m{i}.py"), "w") as f:
+                    f.write(f"def m{i}():\n" + "    return 1\n" * 200)
+            agent = module.ReActAgent("gpt-4o-mini", transcript_dir=os.path.join(temp_dir, "transcripts"))
+            agent.transcript.keep_observations = 1
+            agent.initialise_memory("Describe it.", temp_dir)
+            for i in range(3):
+                call = tool_call(f"call_{i}", "read_file", {"file_path": f"m{i}.py"})
+                agent.check_llm_result(SimpleNamespace(role="assistant", content=None, tool_calls=[call]))
+                agent.execute_tool_calls([call])
+
+            first = agent.memory[3]
+            assert first["content"].startswith(STUB_PREFIX) and "msg-3" in first["content"]
+            assert not agent.memory[-1]["content"].startswith(STUB_PREFIX)
+            page = json.loads(agent.execute_tool(tool_call("fetch", "fetch_observation", {"handle": "msg-3"})))
+            assert page["content"].startswith("file: m0.py\ncontent:\ndef m0():")
+            assert agent.transcript.stats()["observations_evicted"] == 2
+            assert os.path.dirname(agent.transcript.path) == agent.transcript.directory
+
+    @pytest.mark.parametrize("agent_class", ["ReActAgent", "ReflexionAgent"])
+    def test_interrupted_run_resumed(self, monkeypatch, agent_class):
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tech-writer-from-scratch.py")
+        spec = importlib.util.spec_from_file_location("tech_writer_from_scratch", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for i in range(1, 6):
+                with open(os.path.join(temp_dir, f"m{i}.py"), "w") as f:
+                    f.write(f"def m{i}():\n    return {i}\n")
+            transcripts = os.path.join(temp_dir, "transcripts")
+
+            agent = getattr(module, agent_class)("gpt-4o-mini", transcript_dir=transcripts)
+            agent.client = FileReadingClient(reads_before_answer=4, interrupt_at=4)
+            agent.observations.threshold = 10  # Store every observation out of band
+            with pytest.raises(Interrupted):
+                agent.run("Describe it.", temp_dir)
+            interrupted_request = agent.client.requests[-1]
+            run_id = agent.transcript.run_id
+            agent.transcript.close()
+
+            checkpoint = load_checkpoint(os.path.join(transcripts, f"{run_id}.jsonl"))
+            assert checkpoint["step"] == 3 and checkpoint["header"]["agent_type"] == agent.agent_type
+            resumed = getattr(module, agent_class)("gpt-4o-mini", transcript_dir=transcripts)
+            resumed.client = FileReadingClient(reads_before_answer=0)
+            resumed.resume_from = checkpoint
+            assert resumed.run("Ignored", "/ignored") == "# Analysis"
+
+        # The resumed run sends exactly what the interrupted step would have
+        assert resumed.client.requests == [interrupted_request]
+        assert resumed.transcript.run_id == run_id and len(resumed.observations) == 3
+        assert resumed.observations.stats()["resident_chars"] == 0
+        assert resumed.directory == temp_dir and resumed.profile["source_files"] == 5
+        assert resumed.tool_call_count == 3 and resumed.budget.stats()["steps"] == 4
+        assert len(resumed.telemetry.steps) == 4
+
+
+    @pytest.mark.parametrize("agent_class", ["ReActAgent", "ReflexionAgent"])
+    def test_run_out_of_steps_resumed_with_a_final_step(self, monkeypatch, agent_class):
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tech-writer-from-scratch.py")
+        spec = importlib.util.spec_from_file_location("tech_writer_from_scratch", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for i in range(1, 4):
+                with open(os.path.join(temp_dir, f"m{i}.py"), "w") as f:
+                    f.write(f"def m{i}():\n    return {i}\n")
+            transcripts = os.path.join(temp_dir, "transcripts")
+
+            # Keeps reading files unless tool calls are forbidden; with finalisation turned off the run uses up its steps
+            agent = getattr(module, agent_class)("gpt-4o-mini", transcript_dir=transcripts)
+            agent.client = FileReadingClient(reads_before_answer=99)
+            agent.budget_overrides = {"max_steps": 3}
+            agent.next_step_instructions = lambda reflect=False: ((), False)
+            assert module.analysis_failed(agent.run("Describe it.", temp_dir))
+            checkpoint = load_checkpoint(agent.transcript.path)
+            assert checkpoint["step"] == 3
+
+            resumed = getattr(module, agent_class)("gpt-4o-mini", transcript_dir=transcripts)
+            resumed.client = FileReadingClient(reads_before_answer=99)
+            resumed.budget_overrides = {"max_steps": 3}
+            resumed.resume_from = checkpoint
+            assert resumed.run("Ignored", "/ignored") == "# Analysis"
+            assert len(resumed.client.requests) == 1 and resumed.budget.stats()["finalised"] == "steps"
+
+            # The final answer is checkpointed, so resuming again returns it without calling the model
+            checkpoint = load_checkpoint(resumed.transcript.path)
+            assert checkpoint["state"]["final_answer"] == "# Analysis"
+            again = getattr(module, agent_class)("gpt-4o-mini", transcript_dir=transcripts)
+            again.client = FileReadingClient(reads_before_answer=0)
+            again.resume_from = checkpoint
+            assert again.run("Ignored", "/ignored") == "# Analysis" and again.client.requests == []
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
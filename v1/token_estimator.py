@@ -0,0 +1,202 @@
+"""
+Offline token estimation for the tech writer agents.
+
+Nothing in a run knew what a message or a tool result cost in tokens until
+the API billed for it. This module estimates token counts locally, with no
+network calls:
+
+- TiktokenEstimator counts exactly with the model's BPE encoding when
+  tiktoken is installed (o200k_base for models tiktoken does not know);
+- HeuristicEstimator otherwise approximates BPE pre-tokenisation with a few
+  regular expressions: a token per short word piece (camelCase and
+  snake_case words split into their parts), per few digits, per couple of
+  symbols and per line break with its indentation, and one per non-ASCII
+  character. This follows the shape of code and prose much more closely
+  than a flat four characters per token.
+
+get_estimator picks one per model, or the one named by the
+TECH_WRITER_TOKENIZER environment variable ("tiktoken" or "heuristic").
+Any object with a name and a count(text) method can be used instead.
+
+MessageTokenCache counts chat messages and caches the count per message, so
+keeping a running total costs only the new or changed messages on each
+step rather than re-serialising the whole memory. Context budgeting, run
+budgets and telemetry all count through it; telemetry also compares the
+estimates with the prompt tokens the API reports, so the estimator's error
+is visible on every run.
+"""
+
+import functools
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Fixed per-message overhead of the chat format, in tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Encoding for models tiktoken has no mapping for
+FALLBACK_ENCODING = "o200k_base"
+
+_SUBWORDS = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])")
+_DIGITS = re.compile(r"\d+")
+_SYMBOLS = re.compile(r"[^\w\s]+")
+_LINE_BREAKS = re.compile(r"\n[ \t\n]*")
+_NON_ASCII = re.compile(r"[^\x00-\x7f]")
+
+# Letters BPE vocabularies typically keep in one token, digits per token and symbols per token
+SUBWORD_CHARS = 10
+DIGITS_PER_TOKEN = 3
+SYMBOLS_PER_TOKEN = 2
+
+
+class HeuristicEstimator:
+    """
+    Estimates BPE token counts from the word pieces, digits, symbols and line breaks in a text.
+    """
+
+    name = "heuristic"
+
+    def count(self, text: str) -> int:
+        """Estimate the tokens in a string."""
+        if not text:
+            return 0
+        tokens = sum(1 + (n - 1) // SUBWORD_CHARS for n in map(len, _SUBWORDS.findall(text)))
+        tokens += sum(-(-n // DIGITS_PER_TOKEN) for n in map(len, _DIGITS.findall(text)))
+        tokens += sum(-(-n // SYMBOLS_PER_TOKEN) for n in map(len, _SYMBOLS.findall(text)))
+        tokens += len(_LINE_BREAKS.findall(text))
+        if not text.isascii():
+            tokens += len(_NON_ASCII.findall(text))
+        return max(1, tokens)
+
+
+class TiktokenEstimator:
+    """
+    Counts tokens exactly with tiktoken.
+    """
+
+    def __init__(self, model_name: Optional[str] = None):
+        """
+        Initialise the estimator.
+
+        Args:
+            model_name: Model whose encoding to use (default, or if tiktoken does not know it: FALLBACK_ENCODING)
+
+        Raises:
+            ImportError: If tiktoken is not installed
+        """
+        import tiktoken
+
+        try:
+            self.encoding = tiktoken.encoding_for_model(model_name) if model_name else None
+        except KeyError:
+            self.encoding = None
+        if self.encoding is None:
+            self.encoding = tiktoken.get_encoding(FALLBACK_ENCODING)
+        self.name = f"tiktoken:{self.encoding.name}"
+
+    def count(self, text: str) -> int:
+        """Count the tokens in a string."""
+        return len(self.encoding.encode_ordinary(text)) if text else 0
+
+
+@functools.lru_cache(maxsize=None)
+def get_estimator(model_name: Optional[str] = None) -> Any:
+    """
+    Return the token estimator for a model, shared by every caller.
+
+    Args:
+        model_name: The model the tokens are for (optional)
+
+    Returns:
+        A TiktokenEstimator if tiktoken is installed, otherwise a HeuristicEstimator;
+        TECH_WRITER_TOKENIZER=heuristic forces the heuristic
+    """
+    choice = os.environ.get("TECH_WRITER_TOKENIZER", "").lower()
+    if choice != "heuristic":
+        try:
+            return TiktokenEstimator(model_name)
+        except ImportError:
+            if choice == "tiktoken":
+                logger.warning("TECH_WRITER_TOKENIZER is tiktoken but tiktoken is not installed; "
+                               "estimating tokens heuristically")
+        except Exception as e:
+            logger.warning(f"Could not load a tiktoken encoding ({e}); estimating tokens heuristically")
+    return HeuristicEstimator()
+
+
+def estimate_tokens(text: str, model_name: Optional[str] = None) -> int:
+    """Estimate the tokens in a string with the estimator for a model (see get_estimator)."""
+    return get_estimator(model_name).count(text)
+
+
+def _field(message: Any, name: str, default: Any = None) -> Any:
+    """Read a field from a message that is either a dict or an API response object."""
+    if isinstance(message, dict):
+        return message.get(name, default)
+    return getattr(message, name, default)
+
+
+def message_tokens(message: Any, estimator: Any = None) -> int:
+    """
+    Estimate the tokens a message costs when sent to the LLM.
+
+    Args:
+        message: A chat message, as a dict or an API response object
+        estimator: Token estimator (default: get_estimator())
+
+    Returns:
+        The tokens of its content and tool calls, plus the chat format's overhead
+    """
+    estimator = estimator or get_estimator()
+    tokens = estimator.count(_field(message, "content") or "")
+    for tool_call in _field(message, "tool_calls") or []:
+        function = _field(tool_call, "function")
+        tokens += estimator.count((_field(function, "name", "") or "") + (_field(function, "arguments", "") or ""))
+    return tokens + MESSAGE_OVERHEAD_TOKENS
+
+
+class MessageTokenCache:
+    """
+    Counts the tokens of chat messages, counting each message only once.
+    """
+
+    def __init__(self, estimator: Any = None):
+        """
+        Initialise the cache.
+
+        Args:
+            estimator: Token estimator (default: get_estimator())
+        """
+        self.estimator = estimator or get_estimator()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the counted messages, for a new run."""
+        self._counts: Dict[int, tuple] = {}
+        self.messages_counted = 0
+
+    def tokens(self, message: Any) -> int:
+        """Return the estimated tokens of a message, counting it only if it is new or has changed."""
+        # Keyed by identity and content length, so messages edited in place are counted again
+        content = _field(message, "content") or ""
+        key = id(message)
+        cached = self._counts.get(key)
+        if cached is None or cached[0] is not message or cached[1] != len(content):
+            cached = (message, len(content), message_tokens(message, self.estimator))
+            self._counts[key] = cached
+            self.messages_counted += 1
+        return cached[2]
+
+    def forget(self, message: Any) -> None:
+        """Drop the count of a message that has been replaced in memory, so the cache does not keep it alive."""
+        cached = self._counts.get(id(message))
+        if cached is not None and cached[0] is message:
+            del self._counts[id(message)]
+
+    def total(self, messages: List[Any]) -> int:
+        """Return the estimated tokens of a list of messages."""
+        return sum(map(self.tokens, messages))
+
@@ -0,0 +1,252 @@
+"""
+Memoization of pure tool calls for the tech writer agents.
+
+The same tool calls recur within a run and across runs: the same file list,
+the same file read, the same search. ToolCache keeps the result of each call
+to a tool registered with pure=True, keyed by the tool name and its
+arguments (with defaults filled in, so f(d) and f(d, "*") are the same
+call), in memory and optionally on disk.
+
+A cached result is only reused while the paths it depends on are unchanged.
+When a result is stored, each argument named in the tool's depends_on is
+fingerprinted:
+
+- a file by its modification time and size, and the SHA-1 of its content,
+  which is only re-read when the modification time or size has changed, so
+  touching a file without changing it keeps the result valid;
+- a directory by manifest.tree_version, the version of the tree the
+  manifest cache also checks against: a digest of the path, size and
+  modification time of every file beneath it and the modification time of
+  every directory, so adding, removing, renaming or rewriting a file
+  invalidates listings, queries and searches alike. The tree is walked
+  with the manifest's ignore rules (hidden files and the root .gitignore,
+  unless the call's include_hidden or respect_gitignore arguments say
+  otherwise), and at most once per manifest.TREE_CHECK_INTERVAL or run
+  rather than on every lookup, so a hit costs no walk of the tree;
+- a path that does not exist as missing, so "file not found" is cached until
+  the file appears.
+"""
+
+import hashlib
+import inspect
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from manifest import tree_version
+from tool_registry import ToolRegistry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1024
+
+
+def _file_sha1(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(path: str, respect_gitignore: bool = True, include_hidden: bool = False) -> Dict[str, Any]:
+    """
+    Fingerprint a file or directory that a tool result depends on.
+
+    Args:
+        path: The file or directory
+        respect_gitignore: For a directory, whether files matched by its .gitignore are left out
+        include_hidden: For a directory, whether hidden files and directories are included
+
+    Returns:
+        A JSON-serialisable description of the path's current state
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return {"kind": "missing"}
+    if os.path.isdir(path):
+        return {"kind": "dir", "tree": tree_version(path, respect_gitignore, include_hidden),
+                "respect_gitignore": respect_gitignore, "include_hidden": include_hidden}
+    try:
+        sha1 = _file_sha1(path)
+    except OSError:
+        sha1 = None
+    return {"kind": "file", "mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha1": sha1}
+
+
+def is_unchanged(path: str, recorded: Dict[str, Any]) -> bool:
+    """
+    Return whether a path is still in the state a fingerprint recorded.
+
+    A file whose modification time or size has changed is re-hashed, and
+    counts as unchanged if its content is the same; the fingerprint is then
+    updated so that the next check is a stat call again.
+    """
+    if recorded["kind"] == "dir":
+        return fingerprint(path, recorded.get("respect_gitignore", True), recorded.get("include_hidden", False)) == recorded
+    if recorded["kind"] != "file":
+        return fingerprint(path) == recorded
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if (stat.st_mtime_ns, stat.st_size) == (recorded["mtime_ns"], recorded["size"]):
+        return True
+    current = fingerprint(path)
+    if current["kind"] != "file" or current["sha1"] is None or current["sha1"] != recorded["sha1"]:
+        return False
+    recorded.update(mtime_ns=current["mtime_ns"], size=current["size"])
+    return True
+
+
+class ToolCache:
+    """
+    Caches the results of pure tools until the paths they depend on change.
+
+    Safe to share between agents and threads; an entry computed by two calls
+    at once is simply stored twice.
+    """
+
+    def __init__(self, tools: ToolRegistry, max_entries: int = DEFAULT_MAX_ENTRIES, directory: Optional[str] = None):
+        """
+        Initialise the cache.
+
+        Args:
+            tools: Registry of the tools, with their pure and depends_on options
+            max_entries: Results kept in memory, least recently used first out
+            directory: Directory to persist results in across runs (optional)
+        """
+        self.tools = tools
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def key(self, name: str, arguments: Dict[str, Any]) -> Optional[str]:
+        """
+        Return the cache key of a call to a pure tool, or None if it cannot be cached.
+
+        Arguments are bound to the tool function's signature with defaults
+        applied, so calls that differ only in spelling out a default share a key.
+        """
+        if name not in self.tools or not self.tools.options(name)["pure"]:
+            return None
+        try:
+            bound = inspect.signature(self.tools[name]).bind(**arguments)
+            bound.apply_defaults()
+            return f"{name}:{json.dumps(bound.arguments, sort_keys=True, default=str)}"
+        except (TypeError, ValueError):
+            return None
+
+    def _count(self, name: str, outcome: str) -> None:
+        with self._lock:
+            counts = self._stats.setdefault(name, {"hits": 0, "misses": 0, "invalidated": 0})
+            counts[outcome] += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("key") == key else None
+
+    def _store(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, default=str)
+            os.replace(temp_path, self._path(key))
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not write tool cache entry for {entry['tool']}: {e}")
+
+    def _dependencies(self, name: str, arguments: Dict[str, Any]) -> Dict[str, str]:
+        bound = inspect.signature(self.tools[name]).bind(**arguments)
+        bound.apply_defaults()
+        return {
+            arg: os.path.abspath(str(bound.arguments[arg]))
+            for arg in self.tools.options(name)["depends_on"]
+            if bound.arguments.get(arg) not in (None, "")
+        }
+
+    def _fingerprints(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Fingerprint a call's dependencies, walking directories with the call's own ignore rules."""
+        bound = inspect.signature(self.tools[name]).bind(**arguments)
+        bound.apply_defaults()
+        rules = {arg: bool(bound.arguments[arg]) for arg in ("respect_gitignore", "include_hidden")
+                 if arg in bound.arguments}
+        return {path: fingerprint(path, **rules) for path in self._dependencies(name, arguments).values()}
+
+    def call(self, name: str, arguments: Dict[str, Any], run: Callable[[str, Dict[str, Any]], Any]) -> Any:
+        """
+        Return a tool's result, from the cache if it is still valid.
+
+        Args:
+            name: The tool name
+            arguments: Keyword arguments for the tool function
+            run: Runs the tool when the result is not cached, e.g. ToolExecutor.call
+
+        Returns:
+            The tool's result; exceptions raised by run are not cached
+        """
+        key = self.key(name, arguments)
+        if key is None:
+            return run(name, arguments)
+
+        entry = self._load(key)
+        if entry is not None:
+            if all(is_unchanged(path, recorded) for path, recorded in entry["fingerprints"].items()):
+                self._count(name, "hits")
+                return entry["result"]
+            self._count(name, "invalidated")
+            logger.debug(f"Cached result of {name} invalidated by a change to its dependencies")
+        else:
+            self._count(name, "misses")
+
+        # Fingerprint before running, so that a change made during the call invalidates the result
+        fingerprints = self._fingerprints(name, arguments)
+        result = run(name, arguments)
+        self._store(key, {"key": key, "tool": name, "fingerprints": fingerprints, "result": result})
+        return result
+
+    def clear(self) -> None:
+        """Drop the results held in memory (results on disk are kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Return the hit counts and hit rate of each cached tool.
+
+        Returns:
+            Dictionary of tool name to its hits, misses, invalidated results and hit_rate
+        """
+        with self._lock:
+            stats = {name: dict(counts) for name, counts in self._stats.items()}
+        for counts in stats.values():
+            total = counts["hits"] + counts["misses"] + counts["invalidated"]
+            counts["hit_rate"] = round(counts["hits"] / total, 3) if total else 0.0
+        return stats
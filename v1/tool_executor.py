@@ -0,0 +1,202 @@
+"""
+Concurrent tool execution for the tech writer agents.
+
+When the model asks for several tool calls in one step, ToolExecutor runs
+them at the same time on a bounded thread pool and returns their results in
+the order the calls were made, so a step takes as long as its slowest tool
+rather than the sum of them all. Tools registered with kind="cpu" run in a
+pool of worker processes instead, where they do not hold the GIL and a call
+that overruns its timeout can be killed.
+
+Timeouts apply to every call. A timed-out call on a thread that has not
+started yet is cancelled; one that is already running cannot be interrupted
+and is left to finish in the background, with its result discarded.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from tool_registry import ToolRegistry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOOL_TIMEOUT = 120.0
+
+
+class ToolExecutor:
+    """
+    Runs the tool calls of one step concurrently.
+
+    Threads are used for I/O-bound tools and for dispatch; CPU-bound tools
+    (kind="cpu" in the registry) are sent to a multiprocessing pool that is
+    created on first use. Such tools must be module-level functions of an
+    importable module, so that they can be pickled by reference and, under
+    the "spawn" start method, imported by the worker; any that cannot be
+    pickled are run on a thread instead.
+    """
+
+    def __init__(self, tools: ToolRegistry, max_workers: int = 8, max_processes: Optional[int] = None,
+                 default_timeout: float = DEFAULT_TOOL_TIMEOUT, mp_context=None):
+        """
+        Initialise the executor.
+
+        Args:
+            tools: Registry of the tools to run
+            max_workers: Maximum number of tool calls running at once
+            max_processes: Size of the worker process pool (default: up to 4, bounded by CPU count)
+            default_timeout: Seconds a call may take when its tool sets no timeout
+            mp_context: Multiprocessing context for the process pool (default: the platform default)
+        """
+        self.tools = tools
+        self.default_timeout = default_timeout
+        self.max_processes = max_processes or min(4, os.cpu_count() or 1)
+        self._mp_context = mp_context or multiprocessing.get_context()
+        self._threads = ThreadPoolExecutor(max_workers, thread_name_prefix="tool")
+        self._processes = None
+        self._process_lock = threading.Lock()
+        self._picklable: Dict[str, bool] = {}
+
+    def timeout(self, name: str) -> float:
+        """Return the timeout in seconds for a tool."""
+        if name in self.tools:
+            return self.tools.options(name)["timeout"] or self.default_timeout
+        return self.default_timeout
+
+    def _runs_in_process(self, name: str) -> bool:
+        if self.tools.options(name)["kind"] != "cpu":
+            return False
+        if name not in self._picklable:
+            try:
+                pickle.dumps(self.tools[name])
+                self._picklable[name] = True
+            except (pickle.PicklingError, AttributeError, TypeError) as e:
+                logger.warning(f"Tool {name} cannot be sent to a worker process, running it on a thread: {e}")
+                self._picklable[name] = False
+        return self._picklable[name]
+
+    def _process_pool(self):
+        with self._process_lock:
+            if self._processes is None:
+                self._processes = self._mp_context.Pool(self.max_processes)
+            return self._processes
+
+    def _kill_process_pool(self, pool) -> None:
+        """Terminate a process pool, killing any call still running in it."""
+        with self._process_lock:
+            if self._processes is pool:
+                self._processes = None
+        pool.terminate()
+
+    def call(self, name: str, arguments: Dict[str, Any]) -> Any:
+        """
+        Call a tool with parsed arguments.
+
+        I/O-bound tools run in the calling thread. CPU-bound tools run in the
+        process pool; if one overruns its timeout the pool is terminated, which
+        also aborts any other CPU-bound call in flight, and a new pool is
+        started on the next call.
+
+        Args:
+            name: The tool name
+            arguments: Keyword arguments for the tool function
+
+        Returns:
+            The tool function's result
+
+        Raises:
+            TimeoutError: If a CPU-bound tool overruns its timeout
+        """
+        func = self.tools[name]
+        if not self._runs_in_process(name):
+            return func(**arguments)
+
+        timeout = self.timeout(name)
+        pool = self._process_pool()
+        pending = pool.apply_async(func, (), arguments)
+        try:
+            return pending.get(timeout)
+        except multiprocessing.TimeoutError:
+            logger.warning(f"Tool {name} timed out after {timeout}s; terminating its worker process")
+            self._kill_process_pool(pool)
+            raise TimeoutError(f"Tool {name} timed out after {timeout}s")
+
+    def run_all(self, fn: Callable[[Any], str], tool_calls: Sequence[Any], names: Sequence[str]) -> List[str]:
+        """
+        Run fn on each tool call concurrently and return the results in call order.
+
+        Args:
+            fn: Executes one tool call and returns its observation, e.g. TechWriterAgent.execute_tool
+            tool_calls: The tool calls of one step, in the order the model made them
+            names: The tool name of each call, used to look up its timeout
+
+        Returns:
+            The observation for each call, in the same order as tool_calls; a call
+            that overruns its timeout gets an error observation instead
+        """
+        return self.results([self.submit(fn, tool_call, name) for tool_call, name in zip(tool_calls, names)])
+
+    def submit(self, fn: Callable[[Any], str], tool_call: Any, name: str) -> tuple:
+        """
+        Start running fn on one tool call, e.g. as soon as a streamed completion has finished generating it.
+
+        Args:
+            fn: Executes the tool call and returns its observation
+            tool_call: The tool call
+            name: Its tool name, used to look up its timeout
+
+        Returns:
+            A handle to pass to results
+        """
+        return name, self._threads.submit(fn, tool_call), time.monotonic() + self.timeout(name)
+
+    def results(self, submitted: Sequence[tuple]) -> List[str]:
+        """
+        Wait for tool calls started with submit and return their observations in the same order.
+
+        A call that overruns its timeout gets an error observation instead.
+        """
+        results = []
+        for name, future, deadline in submitted:
+            try:
+                results.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+            except FutureTimeoutError:
+                future.cancel()
+                logger.warning(f"Tool {name} timed out after {self.timeout(name)}s")
+                results.append(f"Error: Tool {name} timed out after {self.timeout(name)}s")
+        return results
+
+    async def run_all_async(self, fn: Callable[[Any], str], tool_calls: Sequence[Any],
+                            names: Sequence[str]) -> List[str]:
+        """
+        Asyncio version of run_all: awaits the tool calls without blocking the event loop.
+
+        The calls still run on the executor's threads (or worker processes), so
+        blocking tools never stall other coroutines.
+        """
+        return list(await asyncio.gather(*(self.call_async(fn, c, n) for c, n in zip(tool_calls, names))))
+
+    async def call_async(self, fn: Callable[[Any], str], tool_call: Any, name: str) -> str:
+        """Run fn on one tool call on the executor's threads and await its observation, subject to its timeout."""
+        future = self._threads.submit(fn, tool_call)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout(name))
+        except asyncio.TimeoutError:
+            future.cancel()
+            logger.warning(f"Tool {name} timed out after {self.timeout(name)}s")
+            return f"Error: Tool {name} timed out after {self.timeout(name)}s"
+
+    def close(self) -> None:
+        """Stop the thread pool and terminate the process pool."""
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        with self._process_lock:
+            pool, self._processes = self._processes, None
+        if pool is not None:
+            pool.terminate()
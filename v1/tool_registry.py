@@ -0,0 +1,247 @@
+"""
+Tool registry for the tech writer agents.
+
+This module maps tool names to Python functions and builds each tool's JSON
+schema once, when the tool is registered, from its signature and the
+"param: description" lines of its docstring. Schemas are validated against
+the function at registration, may be overridden explicitly, and the list of
+tool definitions sent to the LLM is built once and handed out unchanged on
+every call.
+
+Tools can also declare how they may be cached: a pure tool returns the same
+result for the same arguments for as long as the files and directories named
+by its depends_on arguments are unchanged (see tool_cache.py), and how their
+results are encoded for the LLM (see observation_encoder.py).
+"""
+
+import inspect
+import json
+import logging
+import re
+import typing
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from observation_encoder import DEFAULT_ENCODING, ENCODINGS
+
+logger = logging.getLogger(__name__)
+
+# Tool names accepted by the OpenAI function calling API
+_TOOL_NAME_PATTERN = re.compile(r"^[a-zA-Z0-9_-]{1,64}$")
+
+JSON_SCHEMA_TYPES = {"string", "integer", "number", "boolean", "array", "object", "null"}
+
+# How a tool is executed: "io" tools run on threads, "cpu" tools in worker processes
+TOOL_KINDS = ["io", "cpu"]
+
+
+def _json_type(annotation: Any) -> str:
+    """Convert a Python type annotation to a JSON Schema type name."""
+    if annotation is inspect.Parameter.empty:
+        annotation = str
+    origin = typing.get_origin(annotation)
+    if annotation == str:
+        return "string"
+    if annotation == int:
+        return "integer"
+    if annotation == float or annotation == "number":
+        return "number"
+    if annotation == bool:
+        return "boolean"
+    if origin is list or annotation == list:
+        return "array"
+    if origin is dict or annotation == dict:
+        return "object"
+    # For complex types, default to string
+    return "string"
+
+
+def schema_from_function(func: Callable) -> Dict[str, Any]:
+    """
+    Build a tool's description and parameter schema from a Python function.
+
+    The description is the first paragraph of the docstring, and each
+    parameter's description is taken from a "param_name: description" line.
+
+    Args:
+        func: The tool function
+
+    Returns:
+        Dictionary with "description" and "parameters" (a JSON Schema object)
+    """
+    sig = inspect.signature(func)
+    docstring = inspect.getdoc(func) or ""
+    description = docstring.split("\n\n")[0] if docstring else ""
+
+    parameters: Dict[str, Any] = {"type": "object", "properties": {}, "required": []}
+    for param_name, param in sig.parameters.items():
+        if param_name == "self" or param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+
+        param_desc = ""
+        if docstring:
+            param_match = re.search(rf"{param_name}:\s*(.*?)(?:\n\s*\w+:|$)", docstring, re.DOTALL)
+            if param_match:
+                param_desc = param_match.group(1).strip()
+
+        parameters["properties"][param_name] = {
+            "type": _json_type(param.annotation),
+            "description": param_desc
+        }
+        if param.default is inspect.Parameter.empty:
+            parameters["required"].append(param_name)
+
+    return {"description": description, "parameters": parameters}
+
+
+def validate_tool(name: str, func: Callable, parameters: Dict[str, Any]) -> None:
+    """
+    Check that a tool's name and parameter schema are valid for its function.
+
+    Args:
+        name: The tool name
+        func: The tool function
+        parameters: The JSON Schema object describing the tool's arguments
+
+    Raises:
+        ValueError: If the name or schema is invalid, or does not match the function's signature
+    """
+    if not _TOOL_NAME_PATTERN.match(name):
+        raise ValueError(f"Invalid tool name {name!r}: use 1-64 letters, digits, underscores or hyphens")
+    if not callable(func):
+        raise ValueError(f"Tool {name} is not callable")
+    if parameters.get("type") != "object" or not isinstance(parameters.get("properties"), dict):
+        raise ValueError(f"Tool {name}: parameters must be a JSON Schema object with properties")
+
+    properties = parameters["properties"]
+    for prop_name, prop in properties.items():
+        prop_type = prop.get("type")
+        types = prop_type if isinstance(prop_type, list) else [prop_type]
+        if "enum" not in prop and not all(t in JSON_SCHEMA_TYPES for t in types):
+            raise ValueError(f"Tool {name}: parameter {prop_name} has invalid type {prop_type!r}")
+    unknown_required = set(parameters.get("required", [])) - set(properties)
+    if unknown_required:
+        raise ValueError(f"Tool {name}: required parameters {sorted(unknown_required)} are not in properties")
+
+    sig = inspect.signature(func)
+    accepts_any = any(p.kind == p.VAR_KEYWORD for p in sig.parameters.values())
+    for param_name, param in sig.parameters.items():
+        if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD) or param_name == "self":
+            continue
+        if param.default is inspect.Parameter.empty and param_name not in properties:
+            raise ValueError(f"Tool {name}: required argument {param_name} is missing from the schema")
+    if not accepts_any:
+        extra = set(properties) - set(sig.parameters)
+        if extra:
+            raise ValueError(f"Tool {name}: schema parameters {sorted(extra)} are not accepted by the function")
+
+
+class ToolRegistry(Mapping):
+    """
+    Mapping of tool names to functions, with their tool definitions built once.
+
+    Behaves as a read-only dict of name to function, so code that looks tools
+    up by name (TOOLS[name], name in TOOLS) works unchanged; tools are added
+    with register().
+    """
+
+    def __init__(self, tools: Optional[Dict[str, Callable]] = None):
+        self._functions: Dict[str, Callable] = {}
+        self._definitions: Dict[str, Dict[str, Any]] = {}
+        self._options: Dict[str, Dict[str, Any]] = {}
+        self._payload: Optional[List[Dict[str, Any]]] = None
+        self._payload_json: Optional[str] = None
+        for name, func in (tools or {}).items():
+            self.register(name, func)
+
+    def __getitem__(self, name: str) -> Callable:
+        return self._functions[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._functions)
+
+    def __len__(self) -> int:
+        return len(self._functions)
+
+    def register(self, name: str, func: Callable, parameters: Optional[Dict[str, Any]] = None,
+                 description: Optional[str] = None, kind: str = "io", timeout: Optional[float] = None,
+                 pure: bool = False, depends_on: Optional[List[str]] = None,
+                 encoding: str = DEFAULT_ENCODING) -> None:
+        """
+        Add a tool, building and validating its definition.
+
+        Args:
+            name: The tool name the LLM calls it by
+            func: The tool function
+            parameters: JSON Schema object for the arguments, replacing the one built from the signature
+            description: Tool description, replacing the first paragraph of the docstring
+                (which defaults to the tool name when the function has no docstring)
+            kind: "io" for tools that mostly wait on files or the network, "cpu" for
+                stateless, CPU-bound tools that should run in a worker process
+            timeout: Seconds a single call may take (default: the executor's default)
+            pure: Whether the result depends only on the arguments and the depends_on paths,
+                so that it can be cached
+            depends_on: Names of the arguments that hold the file or directory paths the result depends on
+            encoding: How results are encoded for the LLM, one of observation_encoder.ENCODINGS
+
+        Raises:
+            ValueError: If the tool name, schema or cache declaration is invalid
+        """
+        schema = schema_from_function(func)
+        if parameters is not None:
+            schema["parameters"] = parameters
+        if description is not None:
+            schema["description"] = description
+        schema["description"] = schema["description"] or name
+        validate_tool(name, func, schema["parameters"])
+        if kind not in TOOL_KINDS:
+            raise ValueError(f"Tool {name}: unknown kind {kind!r}. Use one of {TOOL_KINDS}.")
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Tool {name}: unknown encoding {encoding!r}. Use one of {ENCODINGS}.")
+        depends_on = list(depends_on or [])
+        if depends_on and not pure:
+            raise ValueError(f"Tool {name}: depends_on is only used by pure tools")
+        unknown = set(depends_on) - set(schema["parameters"]["properties"])
+        if unknown:
+            raise ValueError(f"Tool {name}: depends_on arguments {sorted(unknown)} are not in the schema")
+
+        if name in self._functions:
+            logger.warning(f"Replacing registered tool {name}")
+        self._functions[name] = func
+        self._definitions[name] = {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": schema["description"],
+                "parameters": schema["parameters"]
+            }
+        }
+        self._options[name] = {"kind": kind, "timeout": timeout, "pure": pure, "depends_on": depends_on,
+                               "encoding": encoding}
+        self._payload = None
+        self._payload_json = None
+
+    def options(self, name: str) -> Dict[str, Any]:
+        """Return the options ("kind", "timeout", "pure", "depends_on" and "encoding") of a registered tool."""
+        return self._options[name]
+
+    def definition(self, name: str) -> Dict[str, Any]:
+        """Return the tool definition of one registered tool."""
+        return self._definitions[name]
+
+    def definitions(self) -> List[Dict[str, Any]]:
+        """
+        Return the tool definitions for the LLM API.
+
+        The same list is returned on every call until another tool is
+        registered, so callers must not modify it.
+        """
+        if self._payload is None:
+            self._payload = list(self._definitions.values())
+        return self._payload
+
+    def definitions_json(self) -> str:
+        """Return the tool definitions serialised as JSON, for hand-built request bodies."""
+        if self._payload_json is None:
+            self._payload_json = json.dumps(self.definitions())
+        return self._payload_json
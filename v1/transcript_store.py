@@ -0,0 +1,463 @@
+"""
+Per-run transcripts of the tech writer agents' conversations, on disk.
+
+An agent's memory used to exist only in RAM: once a run ended, there was
+no record of what the model had been sent and had answered, and every tool
+observation stayed in memory for the whole run. TranscriptStore appends
+each message to a JSONL file for the run as it is added to memory:
+
+    {"type": "run", "run_id": ..., "model": ..., "directory": ..., "started": ...}
+    {"type": "message", "index": 0, "tokens": 812, "message": {"role": "system", ...}}
+    {"type": "observation", "handle": "obs-1a2b3c4d5e6f", "text": ...}
+    ...
+    {"type": "checkpoint", "step": 3, "messages": 9, "state": {...}, ...}
+    ...
+    {"type": "end", "result": ..., "stats": {...}}
+
+API message objects are written as plain JSON (see llm_cache.plain). The
+store keeps running counts of the messages, characters, bytes and
+estimated tokens written, so reporting the size of a run costs nothing per
+step.
+
+With keep_observations set, the bodies of all but the latest tool
+observations are evicted from memory once they are on disk: memory holds a
+stub (see context_budget.make_stub) with a handle such as msg-12, and the
+fetch_observation tool reads the body back from the transcript a page at a
+time. Memory then stays flat however long the run. The agent's
+ObservationStore spills the large observations it keeps out of the
+conversation here too, as observation lines, and reads them back by byte
+offset, so their text is not held in memory either.
+
+The transcript is also the run's checkpoint. After each step the agent
+appends a checkpoint line with the step, the number of messages so far,
+its state (budget spent, tool call log) and the telemetry recorded since
+the previous checkpoint. Only the new messages and
+that one line are written per step; the line is written in one write and
+synced to disk. load_checkpoint reads the last complete checkpoint of a
+transcript, ignoring a line torn by a crash and any messages after the
+checkpoint, and TranscriptStore.resume truncates the file there and carries
+on appending to it, so a resumed run keeps its run id and one transcript.
+
+A store belongs to one agent and is started afresh for each run.
+"""
+
+import datetime
+import json
+import logging
+import os
+import uuid
+from typing import Any, Dict, List, Optional
+
+from context_budget import STUB_PREFIX, make_stub
+from llm_cache import plain
+from observation_store import MAX_FETCH_LENGTH
+
+logger = logging.getLogger(__name__)
+
+HANDLE_PREFIX = "msg-"
+
+# Observations shorter than this many characters are not worth evicting
+DEFAULT_MIN_EVICT_CHARS = 1000
+
+
+def transcript_path(directory: str, run_id: str) -> str:
+    """Return the path of a run's transcript in a transcript directory."""
+    return os.path.join(directory, f"{run_id}.jsonl")
+
+
+def _field(message: Any, name: str, default: Any = None) -> Any:
+    """Read a field from a message that is either a dict or an API response object."""
+    if isinstance(message, dict):
+        return message.get(name, default)
+    return getattr(message, name, default)
+
+
+class TranscriptStore:
+    """
+    Appends an agent's messages to a JSONL transcript and keeps running counts of them.
+    """
+
+    def __init__(self, directory: Optional[str] = None, keep_observations: Optional[int] = None,
+                 min_evict_chars: int = DEFAULT_MIN_EVICT_CHARS, token_counter: Any = None):
+        """
+        Initialise the store.
+
+        Args:
+            directory: Directory to write transcripts to (None: keep the counts only)
+            keep_observations: Latest tool observations whose bodies stay in memory (None: never evict)
+            min_evict_chars: Observations shorter than this are never evicted
+            token_counter: Counts the tokens of a message with tokens(message), e.g. the
+                context budget's MessageTokenCache, so each message is counted only once
+        """
+        self.directory = directory
+        self.keep_observations = keep_observations
+        self.min_evict_chars = min_evict_chars
+        self.token_counter = token_counter
+        self._file = None
+        self.run_id: Optional[str] = None
+        self.path: Optional[str] = None
+        self._reset_counts()
+
+    def _reset_counts(self) -> None:
+        self._offsets: List[int] = []
+        self._tool_indexes: List[int] = []
+        self._calls: Dict[str, tuple] = {}
+        self._next_eviction = 0
+        self.messages = 0
+        self.chars = 0
+        self.bytes = 0
+        self.tokens = 0
+        self.evicted = 0
+        self.chars_evicted = 0
+        self.fetches = 0
+
+    def start(self, model_name: str, directory: str, run_id: Optional[str] = None,
+              details: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        Start the transcript of a new run, closing that of the previous one.
+
+        Args:
+            model_name: The model of the run
+            directory: The codebase being analysed
+            run_id: Identifier of the run (default: a new one from the time and a random suffix)
+            details: Further fields for the header line, e.g. the agent type (optional)
+
+        Returns:
+            The path of the transcript, or None if transcripts are not written
+        """
+        self.close()
+        self._reset_counts()
+        self.run_id = run_id or f"{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.path = None
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                path = transcript_path(self.directory, self.run_id)
+                self._file = open(path, "wb")
+                self.path = path
+            except OSError as e:
+                logger.warning(f"Could not open a transcript in {self.directory}: {e}; not writing one")
+        self._write({"type": "run", "run_id": self.run_id, "model": model_name, "directory": directory,
+                     **(details or {}), "started": datetime.datetime.now().isoformat(timespec="seconds")})
+        return self.path
+
+    def resume(self, checkpoint: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Carry on the transcript of an interrupted run from its last checkpoint.
+
+        The file is truncated after the checkpoint, dropping the messages of
+        the step that was interrupted, and later messages are appended to it.
+
+        Args:
+            checkpoint: The run's checkpoint, from load_checkpoint
+
+        Returns:
+            The messages of the run up to the checkpoint, as plain JSON data, to use as memory
+
+        Raises:
+            OSError: If the transcript cannot be reopened
+        """
+        self.close()
+        self._reset_counts()
+        self.run_id = checkpoint["header"]["run_id"]
+        self.path = checkpoint["path"]
+        self._file = open(self.path, "r+b")
+        self._file.truncate(checkpoint["end_offset"])
+        self._file.seek(checkpoint["end_offset"])
+        self.bytes = checkpoint["end_offset"]
+        messages = checkpoint["messages"]
+        for message, offset in zip(messages, checkpoint["offsets"]):
+            self._offsets.append(offset)
+            self._count(len(self._offsets) - 1, message)
+        return messages
+
+    def _write(self, record: Dict[str, Any]) -> bool:
+        """Append a record to the file, returning whether it was written."""
+        if self._file is None:
+            return False
+        line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8", "replace")
+        try:
+            self._file.write(line)
+            self._file.flush()
+            self.bytes += len(line)
+            return True
+        except OSError as e:
+            logger.warning(f"Could not write to the transcript {self.path}: {e}; not writing it any more")
+            self.close()
+            return False
+
+    def append(self, message: Any) -> int:
+        """
+        Append a message to the transcript as it is added to memory.
+
+        Args:
+            message: The message, as a dict or an API response object
+
+        Returns:
+            The index of the message, which is also its index in memory
+        """
+        index = len(self._offsets)
+        self._offsets.append(self.bytes)
+        tokens = self._count(index, message)
+        self._write({"type": "message", "index": index, "tokens": tokens, "message": plain(message)})
+        return index
+
+    def append_observation(self, handle: str, text: str) -> Optional[int]:
+        """
+        Append the text of an observation stored out of band, for ObservationStore to spill to.
+
+        Args:
+            handle: The observation's handle
+            text: The observation's text
+
+        Returns:
+            The byte offset to read it back from with read_observation, or None if it was not written
+        """
+        offset = self.bytes
+        if not self._write({"type": "observation", "handle": handle, "text": text}):
+            return None
+        return offset
+
+    def _count(self, index: int, message: Any) -> int:
+        """Add a message to the running counts and return its tokens."""
+        tokens = self.token_counter.tokens(message) if self.token_counter is not None else 0
+        self.messages += 1
+        self.chars += len(_field(message, "content") or "")
+        self.tokens += tokens
+        for tool_call in _field(message, "tool_calls") or []:
+            function = _field(tool_call, "function")
+            self._calls[_field(tool_call, "id")] = (_field(function, "name", ""), _field(function, "arguments", ""))
+        if _field(message, "role") == "tool":
+            self._tool_indexes.append(index)
+        return tokens
+
+    def checkpoint(self, step: int, state: Dict[str, Any], telemetry: List[Dict[str, Any]] = ()) -> None:
+        """
+        Record a checkpoint after a step, covering every message and observation appended so far.
+
+        Args:
+            step: The steps completed
+            state: The agent's state to restore on resuming
+            telemetry: The telemetry steps recorded since the last checkpoint
+        """
+        if self._file is None:
+            return
+        self._write({"type": "checkpoint", "step": step, "messages": self.messages, "state": state,
+                     "telemetry": list(telemetry)})
+        if self._file is not None:
+            try:
+                os.fsync(self._file.fileno())
+            except OSError as e:
+                logger.debug(f"Could not sync the transcript {self.path}: {e}")
+
+    def evict(self, memory: List[Any]) -> int:
+        """
+        Replace the bodies of older observations in memory with stubs, if keep_observations is set.
+
+        Only observations that are already in the transcript file are evicted,
+        each at most once, so a call costs only the observations that have
+        become old since the last one.
+
+        Args:
+            memory: The agent's message list, whose messages were all appended in order
+
+        Returns:
+            The characters evicted
+        """
+        if self.keep_observations is None or self.path is None:
+            return 0
+        evicted_chars = 0
+        last = len(self._tool_indexes) - self.keep_observations
+        while self._next_eviction < last:
+            index = self._tool_indexes[self._next_eviction]
+            self._next_eviction += 1
+            message = memory[index]
+            content = _field(message, "content") or ""
+            if len(content) < self.min_evict_chars or content.startswith(STUB_PREFIX):
+                continue
+            name, arguments = self._calls.get(_field(message, "tool_call_id"), (_field(message, "name", "tool"), ""))
+            handle = f"{HANDLE_PREFIX}{index}"
+            stub = make_stub(content, name, arguments,
+                             f"The full result is in the transcript. Call fetch_observation with handle {handle} "
+                             f"to read it.")
+            memory[index] = {**message, "content": stub}
+            if hasattr(self.token_counter, "forget"):
+                self.token_counter.forget(message)
+            evicted_chars += len(content) - len(stub)
+            self.evicted += 1
+        self.chars_evicted += evicted_chars
+        if evicted_chars:
+            logger.debug(f"Evicted {evicted_chars} characters of observations to the transcript")
+        return evicted_chars
+
+    def read(self, index: int) -> Optional[Dict[str, Any]]:
+        """
+        Read a message back from the transcript file.
+
+        Args:
+            index: The index of the message
+
+        Returns:
+            The message as plain JSON data, or None if it is not in the transcript
+        """
+        if not 0 <= index < len(self._offsets):
+            return None
+        return self._read_record(self._offsets[index], "message")
+
+    def read_observation(self, offset: int) -> Optional[str]:
+        """
+        Read the text of an observation back from the transcript file.
+
+        Args:
+            offset: The byte offset append_observation returned
+
+        Returns:
+            The text, or None if there is no observation at that offset
+        """
+        return self._read_record(offset, "observation", "text")
+
+    def _read_record(self, offset: int, kind: str, field: Optional[str] = None) -> Any:
+        """Read the record at a byte offset and return its field (default: the one named after its type)."""
+        if self.path is None:
+            return None
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                record = json.loads(f.readline())
+            if record.get("type") != kind:
+                raise ValueError(f"expected a {kind} record")
+            return record[field or kind]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not read the {kind} at byte {offset} of the transcript {self.path}: {e}")
+            return None
+
+    def fetch(self, handle: str, offset: int = 0, length: int = 4000) -> Dict[str, Any]:
+        """
+        Return a page of the content of a message in the transcript, as ObservationStore.fetch does.
+
+        Args:
+            handle: The message's handle, e.g. msg-12
+            offset: Character offset to start reading from
+            length: Number of characters to read, capped at MAX_FETCH_LENGTH
+
+        Returns:
+            The page with its offsets, or an error dictionary
+        """
+        index = handle[len(HANDLE_PREFIX):] if handle.startswith(HANDLE_PREFIX) else ""
+        message = self.read(int(index)) if index.isdigit() else None
+        if message is None:
+            return {"error": f"Unknown transcript handle: {handle}"}
+        if offset < 0 or length <= 0:
+            return {"error": "offset must be non-negative and length positive"}
+        text = message.get("content") or ""
+        self.fetches += 1
+        end = min(offset + min(length, MAX_FETCH_LENGTH), len(text))
+        return {
+            "handle": handle,
+            "offset": offset,
+            "end": end,
+            "total_chars": len(text),
+            "content": text[offset:end],
+            "next_offset": end if end < len(text) else None,
+        }
+
+    def finish(self, result: Any = None) -> None:
+        """Record the end of the run, with its result and the store's statistics, and close the transcript."""
+        self._write({"type": "end", "result": result, "stats": self.stats()})
+        self.close()
+
+    def close(self) -> None:
+        """Close the transcript file; the counts and reading back from it remain available."""
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the running counts of the run.
+
+        resident_chars is the message content left in memory after eviction;
+        compaction by the context budget shrinks memory further.
+        """
+        return {
+            "run_id": self.run_id,
+            "path": self.path,
+            "messages": self.messages,
+            "chars": self.chars,
+            "bytes": self.bytes,
+            "tokens": self.tokens,
+            "observations_evicted": self.evicted,
+            "chars_evicted": self.chars_evicted,
+            "resident_chars": self.chars - self.chars_evicted,
+            "fetches": self.fetches,
+        }
+
+
+def load_checkpoint(path: str) -> Dict[str, Any]:
+    """
+    Read the last complete checkpoint of a run from its transcript.
+
+    Reading stops at the first line that is not complete JSON, which a crash
+    can leave at the end of the file.
+
+    Args:
+        path: The transcript file (see transcript_path)
+
+    Returns:
+        The transcript's path and header; the step, messages (with their byte
+        offsets) and state of the last checkpoint, and where it ends in the
+        file; the handle and byte offset of every observation and each
+        telemetry step recorded up to it; and whether the run finished, with
+        its result
+
+    Raises:
+        ValueError: If the transcript cannot be read or has no checkpoint
+    """
+    header, checkpoint = None, None
+    messages, offsets, observations, telemetry = [], [], [], []
+    finished, result = False, None
+    offset = 0
+    try:
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Ignoring an incomplete line at byte {offset} of {path}")
+                    break
+                kind = record.get("type")
+                if kind == "run" and header is None:
+                    header = record
+                elif kind == "message":
+                    messages.append(record["message"])
+                    offsets.append(offset)
+                elif kind == "observation":
+                    observations.append((record["handle"], offset))
+                elif kind == "checkpoint":
+                    telemetry.extend(record.get("telemetry", []))
+                    checkpoint = dict(record, end_offset=offset + len(line), observations=list(observations),
+                                      telemetry=list(telemetry))
+                elif kind == "end":
+                    finished, result = True, record.get("result")
+                offset += len(line)
+    except OSError as e:
+        raise ValueError(f"Cannot read the transcript {path}: {e}")
+    if header is None or checkpoint is None:
+        raise ValueError(f"The transcript {path} has no checkpoint to resume from")
+    count = checkpoint["messages"]
+    return {
+        "path": path,
+        "header": header,
+        "step": checkpoint["step"],
+        "state": checkpoint["state"],
+        "messages": messages[:count],
+        "offsets": offsets[:count],
+        "observations": checkpoint["observations"],
+        "telemetry": checkpoint["telemetry"],
+        "end_offset": checkpoint["end_offset"],
+        "finished": finished,
+        "result": result,
+    }